@@ -2774,6 +2774,53 @@ def verify_set_specific_processing(program, selected_set, clean_dir):
         logger.error(f"❌ Error verifying set-specific processing: {e}")
         return True # Don't block processing due to verification error
 
+# ============================================================================
+# Processor output relay
+# ============================================================================
+# The exam processors log "time - LEVEL - message" records to stderr and, with
+# RESULT_EVENTS=1, write "@event {json}" progress events to stdout (see
+# scripts/run_log.py)
+SCRIPT_EVENT_PREFIX = "@event "
+SCRIPT_LOG_LEVEL = re.compile(r" - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ")
+
+def relay_script_output(script_name, output_lines, error_lines):
+    """Log a processor's captured output at its own levels and return its progress events."""
+    events = []
+    for line in output_lines:
+        if line.startswith(SCRIPT_EVENT_PREFIX):
+            try:
+                event = json.loads(line[len(SCRIPT_EVENT_PREFIX):])
+            except ValueError:
+                logger.info(f"{script_name}: {line}")
+                continue
+            events.append(event)
+            logger.info(f"{script_name} event: {event}")
+        elif line.strip():
+            logger.info(f"{script_name}: {line}")
+    level = logging.ERROR
+    for line in error_lines:
+        match = SCRIPT_LOG_LEVEL.search(line)
+        if match:
+            level = getattr(logging, match.group(1))
+        elif line.startswith("Traceback"):
+            level = logging.ERROR
+        # Other lines without a level continue the previous message
+        logger.log(level, f"{script_name}: {line}")
+    return events
+
+def summarize_script_events(events):
+    """One-line summary of a processor run's progress events, or "" without any."""
+    semesters = [e for e in events if e.get("event") == "semester_processed"]
+    if not semesters:
+        return ""
+    students = sum(e.get("students", 0) for e in semesters)
+    carryover = sum(e.get("carryover", 0) for e in semesters)
+    sets = {e.get("set") for e in semesters}
+    return (
+        f" Processed {len(semesters)} semester(s) across {len(sets)} set(s):"
+        f" {students} student result(s), {carryover} carryover."
+    )
+
 # ============================================================================
 # ENHANCED: Script Processing with STRICT ZIP Enforcement
 # ============================================================================
@@ -2791,20 +2838,12 @@ def process_script_with_strict_zip_enforcement(script_name, program, selected_se
    
         output_lines = result.stdout.splitlines()
         error_lines = result.stderr.splitlines()
-        # Log output
-        logger.info("=== SCRIPT STDOUT ===")
-        for line in output_lines:
-            logger.info(line)
-       
-        if error_lines:
-            logger.info("=== SCRIPT STDERR ===")
-            for line in error_lines:
-                logger.error(line)
+        events = relay_script_output(script_name, output_lines, error_lines)
         if result.returncode != 0:
             error_msg = "Script failed. Check logs for details."
             if error_lines:
                 error_msg += f" Error: {error_lines[-1]}"
-            return {"success": False, "error": error_msg, "output": output_lines}
+            return {"success": False, "error": error_msg, "output": output_lines, "events": events}
         # 🔒 STRICT ZIP ENFORCEMENT for ALL scripts
         clean_dir = get_clean_directory(script_name, program, selected_set)
    
@@ -2813,7 +2852,7 @@ def process_script_with_strict_zip_enforcement(script_name, program, selected_se
             logger.info(f"🔒 Enforcing STRICT ZIP-only policy for {script_name}")
             enforce_zip_only_policy(clean_dir)
    
-        return {"success": True, "output": output_lines}
+        return {"success": True, "output": output_lines, "events": events}
    
     except subprocess.TimeoutExpired:
         error_msg = f"Script timed out after 10 minutes: {script_name}"
@@ -4173,6 +4212,8 @@ def run_script(script_name):
             env["UPGRADE_THRESHOLD"] = str(upgrade_threshold)
             env["GENERATE_PDF"] = str(generate_pdf)
             env["TRACK_WITHDRAWN"] = str(track_withdrawn)
+            # Progress as JSON events on stdout; only warnings and errors on stderr
+            env["RESULT_EVENTS"] = "1"
        
             if processing_mode == 'manual' and selected_semesters:
                 env["SELECTED_SEMESTERS"] = ','.join(selected_semesters)
@@ -4230,7 +4271,8 @@ def run_script(script_name):
         # Handle exam processor results
         if script_name in ['exam_processor_nd', 'exam_processor_bn', 'exam_processor_bm']:
             if result.get("success"):
-                flash(f"{program} examination processing completed successfully!", "success")
+                summary = summarize_script_events(result.get("events", []))
+                flash(f"{program} examination processing completed successfully!{summary}", "success")
             else:
                 flash(f"Processing failed: {result.get('error', 'Unknown error')}", "error")
    
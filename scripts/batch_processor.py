@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+batch_processor.py
+
+Runs the ND, BN and BM regular processors over many sets in one go.
+
+The web form drives exactly one set per processor invocation (SELECTED_SET).
+At results season every set is run back to back. This entry point takes a
+list of sets - or every set whose RAW_RESULTS holds files newer than its last
+result ZIP - loads each program's course catalogue once in this process, and
+runs the sets in forked worker processes, at most --workers at a time. Each
+worker gets its own copy of the processors' global trackers, inherits the
+already-loaded catalogue, and writes its output to a per-set log.
+
+A status report (table on stdout, report.json next to the logs) lists every
+set with its outcome, run time, result ZIP and log file.
+
+Usage:
+    python scripts/batch_processor.py --programs ND BN --new
+    python scripts/batch_processor.py --sets ND-2024 SET47 --workers 2
+    python scripts/batch_processor.py --programs BM        # every BM set
+"""
+
+import argparse
+import glob
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+from multiprocessing.connection import wait
+
+from pdf_shards import available_cpus
+from stage_pipeline import DEFAULT_PIPELINE_WORKERS
+
+TIMESTAMP_FMT = "%Y-%m-%d_%H%M%S"
+
+# program -> (processor module, set lister, course data loader)
+PROGRAMS = {
+    "ND": ("exam_result_processor", "get_available_sets", "load_course_data"),
+    "BN": ("exam_processor_bn", "get_available_bn_sets", "load_bn_course_data"),
+    "BM": ("exam_processor_bm", "get_available_sets", "load_course_data"),
+}
+
+# ----------------------------
+# Choosing sets
+# ----------------------------
+
+
+def raw_files(raw_dir):
+    """Raw result workbooks directly under ``raw_dir`` (as the processors list them)."""
+    if not os.path.isdir(raw_dir):
+        return []
+    return [
+        os.path.join(raw_dir, f)
+        for f in os.listdir(raw_dir)
+        if f.lower().endswith((".xlsx", ".xls")) and not f.startswith("~$")
+    ]
+
+
+def has_new_raw_files(base_dir, program, set_name):
+    """True when a raw file is newer than the set's latest result ZIP (or there is none)."""
+    set_dir = os.path.join(base_dir, program, set_name)
+    raws = raw_files(os.path.join(set_dir, "RAW_RESULTS"))
+    if not raws:
+        return False
+    zips = glob.glob(os.path.join(set_dir, "CLEAN_RESULTS", f"{set_name}_RESULT-*.zip"))
+    if not zips:
+        return True
+    return max(os.path.getmtime(p) for p in raws) > max(os.path.getmtime(z) for z in zips)
+
+
+def collect_jobs(base_dir, programs, wanted_sets=None, new_only=False):
+    """[(program, set name)] to run, in program then set order."""
+    jobs = []
+    seen = set()
+    for program in programs:
+        module_name, list_sets, _ = PROGRAMS[program]
+        module = importlib.import_module(module_name)
+        for set_name in getattr(module, list_sets)(base_dir):
+            if set_name.upper().endswith("-COURSES"):
+                continue
+            seen.add(set_name)
+            if wanted_sets and set_name not in wanted_sets:
+                continue
+            if new_only and not has_new_raw_files(base_dir, program, set_name):
+                print(f"⏭️ {program} {set_name}: no new raw files")
+                continue
+            jobs.append((program, set_name))
+    for set_name in sorted(set(wanted_sets or ()) - seen):
+        print(f"⚠️ Set not found for {'/'.join(programs)}: {set_name}")
+    return jobs
+
+
+# ----------------------------
+# Running sets
+# ----------------------------
+
+
+def _run_set(module_name, env, log_path):
+    """Worker process: run one processor's main() for one set, output to ``log_path``."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    os.close(fd)
+    os.environ.update(env)
+    try:
+        importlib.import_module(module_name).main()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def latest_zip(base_dir, program, set_name, since):
+    """The set's newest result ZIP written at or after ``since``, if any."""
+    pattern = os.path.join(
+        base_dir, program, set_name, "CLEAN_RESULTS", f"{set_name}_RESULT-*.zip"
+    )
+    zips = [z for z in glob.glob(pattern) if os.path.getmtime(z) >= since - 1]
+    return max(zips, key=os.path.getmtime) if zips else None
+
+
+def run_batch(base_dir, jobs, workers, log_dir, semesters=None, pass_threshold=None):
+    """Run ``jobs`` at most ``workers`` at a time; return one status dict per job."""
+    ctx = multiprocessing.get_context("fork")
+    # Split the CPUs between concurrent sets unless the caller fixed the pools;
+    # stage pools also stay within the pipeline's default cap
+    per_set_cpus = max(1, available_cpus() // workers)
+    pipeline_workers = min(DEFAULT_PIPELINE_WORKERS, per_set_cpus)
+    env = {
+        "BASE_DIR": base_dir,
+        "PROCESSING_MODE": "auto",
+        "WEB_MODE": "false",
+        "PIPELINE_WORKERS": os.getenv("PIPELINE_WORKERS", str(pipeline_workers)),
+        "PDF_WORKERS": os.getenv("PDF_WORKERS", str(per_set_cpus)),
+    }
+    if semesters:
+        env["PROCESSING_MODE"] = "manual"
+        env["SELECTED_SEMESTERS"] = ",".join(semesters)
+    if pass_threshold is not None:
+        env["PASS_THRESHOLD"] = str(pass_threshold)
+
+    pending = list(jobs)
+    running = {}
+    report = []
+    while pending or running:
+        while pending and len(running) < workers:
+            program, set_name = pending.pop(0)
+            log_path = os.path.join(log_dir, f"{program}_{set_name}.log")
+            proc = ctx.Process(
+                target=_run_set,
+                args=(PROGRAMS[program][0], dict(env, SELECTED_SET=set_name), log_path),
+                name=f"{program}-{set_name}",
+            )
+            started = time.time()
+            proc.start()
+            print(f"🚀 Started {program} {set_name} (log: {log_path})")
+            running[proc.sentinel] = (proc, program, set_name, started, log_path)
+
+        for sentinel in wait(list(running)):
+            proc, program, set_name, started, log_path = running.pop(sentinel)
+            proc.join()
+            elapsed = time.time() - started
+            zip_path = latest_zip(base_dir, program, set_name, started)
+            if proc.exitcode != 0:
+                status = "failed"
+            elif zip_path is None:
+                status = "no output"
+            else:
+                status = "ok"
+            icon = {"ok": "✅", "no output": "⚠️", "failed": "❌"}[status]
+            print(f"{icon} {program} {set_name}: {status} in {elapsed:.1f}s")
+            report.append(
+                {
+                    "program": program,
+                    "set": set_name,
+                    "status": status,
+                    "exit_code": proc.exitcode,
+                    "seconds": round(elapsed, 1),
+                    "zip": zip_path,
+                    "log": log_path,
+                }
+            )
+    order = {job: i for i, job in enumerate(jobs)}
+    report.sort(key=lambda r: order[(r["program"], r["set"])])
+    return report
+
+
+def print_report(report):
+    print(f"\n{'='*60}")
+    print("BATCH STATUS REPORT")
+    print(f"{'='*60}")
+    print(f"{'PROGRAM':<8}{'SET':<16}{'STATUS':<11}{'TIME':>8}  ZIP")
+    for row in report:
+        zip_name = os.path.basename(row["zip"]) if row["zip"] else "-"
+        print(
+            f"{row['program']:<8}{row['set']:<16}{row['status']:<11}"
+            f"{row['seconds']:>7.1f}s  {zip_name}"
+        )
+    ok = sum(1 for row in report if row["status"] == "ok")
+    print(f"\n📊 {ok}/{len(report)} set(s) processed successfully")
+
+
+# ----------------------------
+# Entry point
+# ----------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--programs", nargs="+", choices=sorted(PROGRAMS), default=sorted(PROGRAMS)
+    )
+    parser.add_argument("--sets", nargs="+", help="set names (default: every set)")
+    parser.add_argument(
+        "--new", action="store_true", help="only sets with raw files newer than their last ZIP"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("BATCH_WORKERS", "0")) or None,
+        help="sets processed at the same time (default: BATCH_WORKERS or the CPUs)",
+    )
+    parser.add_argument("--semesters", nargs="+", help="semester keys (default: all)")
+    parser.add_argument("--pass-threshold", type=float)
+    args = parser.parse_args(argv)
+
+    # The processors resolve BASE_DIR when they are imported
+    base_dir = None
+    programs = [p for p in sorted(PROGRAMS) if p in args.programs]
+    for program in programs:
+        module = importlib.import_module(PROGRAMS[program][0])
+        base_dir = base_dir or module.normalize_path(module.BASE_DIR)
+    print(f"Using base directory: {base_dir}")
+
+    jobs = collect_jobs(base_dir, programs, set(args.sets or ()), args.new)
+    if not jobs:
+        print("⚠️ No sets to process")
+        return 0
+
+    # Load every program's course catalogue once; the workers inherit it
+    for program in sorted({program for program, _ in jobs}):
+        module_name, _, load_courses = PROGRAMS[program]
+        try:
+            getattr(importlib.import_module(module_name), load_courses)()
+        except Exception as e:
+            print(f"⚠️ Could not preload {program} course data: {e}")
+
+    workers = max(1, min(args.workers or available_cpus(), len(jobs)))
+    log_dir = os.path.join(base_dir, "BATCH_LOGS", datetime.now().strftime(TIMESTAMP_FMT))
+    os.makedirs(log_dir, exist_ok=True)
+    print(f"🎯 Processing {len(jobs)} set(s) with {workers} worker(s): {jobs}")
+
+    report = run_batch(base_dir, jobs, workers, log_dir, args.semesters, args.pass_threshold)
+    print_report(report)
+    report_path = os.path.join(log_dir, "report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Report written: {report_path}")
+    return 0 if all(row["status"] == "ok" for row in report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
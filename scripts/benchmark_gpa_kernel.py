@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+benchmark_gpa_kernel.py
+
+Times the row-wise ``DataFrame.apply`` GPA/TCPE chain the processors used to
+run against the columnar score_engine.derive_semester_results kernel on a
+synthetic cohort, and checks both produce the same columns.
+
+Usage:
+    python scripts/benchmark_gpa_kernel.py [--students 5000] [--courses 12]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from score_engine import (
+    classify_by_passed_share,
+    derive_semester_results,
+    not_reg_mask,
+)
+
+ND_GRADE_BANDS = ((70, 4.0), (60, 3.0), (50, 2.0), (45, 1.0))
+PASS_THRESHOLD = 50.0
+
+
+def build_cohort(n_students, n_courses, seed=2024):
+    """Synthetic mastersheet: integer scores with ~3% NOT REG cells."""
+    rng = np.random.default_rng(seed)
+    codes = [f"NSC{101 + i}" for i in range(n_courses)]
+    credit_units = {code: int(rng.integers(1, 5)) for code in codes}
+    scores = rng.normal(58, 15, size=(n_students, n_courses)).clip(0, 100).round(0)
+    mastersheet = pd.DataFrame(scores, columns=codes).astype(object)
+    not_reg = rng.random((n_students, n_courses)) < 0.03
+    mastersheet = mastersheet.mask(not_reg, "NOT REG")
+    mastersheet.insert(
+        0, "EXAM NUMBER", [f"FCTCONS/ND24/{i:04d}" for i in range(n_students)]
+    )
+    return mastersheet, codes, credit_units
+
+
+def get_grade_point(score):
+    score = float(score)
+    for low, point in ND_GRADE_BANDS:
+        if score >= low:
+            return point
+    return 0.0
+
+
+def row_wise(mastersheet, codes, credit_units, total_cu):
+    """The per-student apply chain the ND processor ran before the kernel."""
+    score_not_reg = not_reg_mask(mastersheet[codes])
+    out = pd.DataFrame(index=mastersheet.index)
+
+    def compute_failed_courses(row):
+        fails = [
+            c for c in codes
+            if not score_not_reg.at[row.name, c] and float(row[c] or 0) < PASS_THRESHOLD
+        ]
+        return ", ".join(sorted(fails)) if fails else ""
+
+    def calc_tcpe_tcup_tcuf(row):
+        tcpe, tcup, tcuf, registered = 0.0, 0, 0, 0
+        for code in codes:
+            if score_not_reg.at[row.name, code]:
+                continue
+            score_val = float(row[code])
+            cu = credit_units[code]
+            tcpe += get_grade_point(score_val) * cu
+            registered += cu
+            if score_val >= PASS_THRESHOLD:
+                tcup += cu
+            else:
+                tcuf += cu
+        return tcpe, tcup, tcuf, registered
+
+    def safe_mean(row):
+        values = [float(row[c]) for c in codes if not score_not_reg.at[row.name, c]]
+        return np.mean(values) if values else 0
+
+    out["FAILED COURSES"] = mastersheet.apply(compute_failed_courses, axis=1)
+    results = mastersheet.apply(calc_tcpe_tcup_tcuf, axis=1, result_type="expand")
+    out["TCPE"] = results[0].round(1)
+    out["CU Passed"] = results[1]
+    out["CU Failed"] = results[2]
+    out["Total Registered CU"] = results[3]
+    out["GPA"] = out.apply(
+        lambda row: round(row["TCPE"] / row["Total Registered CU"], 2)
+        if row["Total Registered CU"] > 0 else 0.0,
+        axis=1,
+    )
+    out["AVERAGE"] = mastersheet.apply(safe_mean, axis=1).round(0)
+
+    def status(row):
+        passed_percentage = (row["CU Passed"] / total_cu * 100) if total_cu > 0 else 0
+        if row["CU Failed"] == 0:
+            return "Passed"
+        if passed_percentage < 45:
+            return "Withdrawn"
+        return "Resit" if row["GPA"] >= 2.00 else "Probation"
+
+    out["REMARKS"] = out.apply(status, axis=1)
+    return out
+
+
+def kernel(mastersheet, codes, credit_units, total_cu):
+    results = derive_semester_results(
+        mastersheet[codes],
+        [credit_units[c] for c in codes],
+        ND_GRADE_BANDS,
+        PASS_THRESHOLD,
+        not_reg=not_reg_mask(mastersheet[codes]),
+    )
+    results["REMARKS"] = classify_by_passed_share(results, total_cu)
+    return results
+
+
+def best_of(func, repeats, *args):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--courses", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    mastersheet, codes, credit_units = build_cohort(args.students, args.courses)
+    total_cu = sum(credit_units.values())
+    print(f"📊 Cohort: {args.students} students x {args.courses} courses")
+
+    legacy_time, legacy = best_of(row_wise, args.repeats, mastersheet, codes, credit_units, total_cu)
+    kernel_time, fast = best_of(kernel, args.repeats, mastersheet, codes, credit_units, total_cu)
+
+    mismatched = []
+    for col in legacy.columns:
+        if col in ("FAILED COURSES", "REMARKS"):
+            same = legacy[col].tolist() == fast[col].tolist()
+        else:
+            same = np.array_equal(legacy[col].astype(float), fast[col].astype(float))
+        if not same:
+            mismatched.append(col)
+    print(f"🐢 Row-wise apply chain: {legacy_time * 1000:.1f} ms")
+    print(f"⚡ Columnar kernel:      {kernel_time * 1000:.1f} ms")
+    print(f"🚀 Speedup: {legacy_time / kernel_time:.1f}x")
+    if mismatched:
+        print(f"❌ Columns differ: {', '.join(mismatched)}")
+        raise SystemExit(1)
+    print("✅ Kernel output identical to the row-wise chain")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,9 +36,32 @@ import traceback
 import shutil
 import zipfile
 import tempfile
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+from openpyxl import load_workbook
+
+from carryover_engine import (
+    CarryoverColors,
+    ProgramProfile,
+    calculate_cgpa as engine_cgpa,
+    carryover_courses,
+    collect_semester_records,
+    exam_key,
+    generate_carryover_mastersheet as engine_carryover_mastersheet,
+    grade_point,
+    load_previous_gpas as engine_previous_gpas,
+    student_remarks,
+)
+from course_catalogue import load_catalogue
+from header_locator import (
+    HeaderLocation,
+    cell_texts,
+    has_keyword,
+    header_columns,
+    locate_header,
+    read_below_header,
+    sheet_head,
+)
+from resit_index import build_course_index, build_student_index, code_key, find_student
+from zip_patch import extract_member, find_member, is_mastersheet, patch_zip, write_tree
 
 
 # ============================================================
@@ -79,78 +102,47 @@ BASE_DIR = get_base_directory()
 TIMESTAMP_FMT = "%d-%m-%Y_%H%M%S"
 DEFAULT_PASS_THRESHOLD = 50.0
 DEFAULT_LOGO_PATH = os.path.join(os.path.dirname(__file__), "logo.png")
+# Course-catalogue cache namespace; bump when the course data builder changes
+BN_CATALOGUE_NAMESPACE = "bn-carryover-v1"
 print(f"🔧 BASE_DIR set to: {BASE_DIR}")
 
 
 # ============================================================
 # CRITICAL FIX 2: New ZIP Creation Function
 # ============================================================
-def create_updated_zip_from_directory(temp_extract_dir, updated_zip_path):
+def create_updated_zip(original_zip_path, mastersheet_member, mastersheet_path, updated_zip_path):
     """
-    Create a ZIP file from a directory with proper error handling.
+    Create the updated ZIP from the original with only the mastersheet replaced.
+
+    Every other member (the semester PDFs and sheets) is copied across as
+    compressed bytes, and the ZIP only appears under its name once complete.
 
     Args:
-        temp_extract_dir: Directory containing files to zip
+        original_zip_path: Result ZIP the mastersheet was extracted from
+        mastersheet_member: Name of the mastersheet inside that ZIP
+        mastersheet_path: Updated mastersheet file
         updated_zip_path: Path for the output ZIP file
 
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        with zipfile.ZipFile(updated_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(temp_extract_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_extract_dir)
-                    zipf.write(file_path, arcname)
-                    print(f"📁 Added to updated ZIP: {arcname}")
-
-        # Verify ZIP was created
-        if os.path.exists(updated_zip_path) and os.path.getsize(updated_zip_path) > 0:
-            print(
-                f"✅ SUCCESS: Created ZIP ({os.path.getsize(updated_zip_path):,} bytes)"
-            )
-
-            # Verify mastersheet is in ZIP
-            try:
-                with zipfile.ZipFile(updated_zip_path, "r") as test_zip:
-                    zip_files = test_zip.namelist()
-                    mastersheet_in_zip = any(
-                        "mastersheet" in f.lower() for f in zip_files
-                    )
-
-                    if mastersheet_in_zip:
-                        print(f"✅ Verified: Mastersheet is in the updated ZIP")
-                    else:
-                        print(f"⚠️ Warning: No mastersheet found in updated ZIP")
-
-            except Exception as e:
-                print(f"⚠️ Could not verify ZIP contents: {e}")
-
-            return True
-        else:
-            print(f"❌ ERROR: ZIP was not created properly")
-            return False
+        copied, written = patch_zip(
+            original_zip_path, {mastersheet_member: mastersheet_path}, updated_zip_path
+        )
+        print(
+            f"📁 Replaced in updated ZIP: {mastersheet_member} "
+            f"({copied} other files copied as-is)"
+        )
+        print(
+            f"✅ SUCCESS: Created ZIP ({os.path.getsize(updated_zip_path):,} bytes)"
+        )
+        return True
 
     except Exception as zip_error:
         print(f"❌ Error creating ZIP: {zip_error}")
         traceback.print_exc()
-
-        # Try fallback method using shutil.make_archive
-        try:
-            print("🔄 Attempting fallback ZIP creation method...")
-            temp_zip_dir = tempfile.mkdtemp()
-            shutil.copytree(temp_extract_dir, os.path.join(temp_zip_dir, "content"))
-            shutil.make_archive(
-                updated_zip_path.replace(".zip", ""), "zip", temp_zip_dir
-            )
-            shutil.rmtree(temp_zip_dir)
-            print(f"✅ Created ZIP using fallback method")
-            return True
-
-        except Exception as fallback_error:
-            print(f"❌ Fallback ZIP creation also failed: {fallback_error}")
-            return False
+        return False
 
 
 # ============================================================
@@ -307,24 +299,54 @@ def write_cgpa_summary_data_bn_safe(cgpa_ws, semester_data, all_withdrawn_studen
 # ============================================================
 # FIXED GPA CALCULATION FUNCTIONS
 # ============================================================
+# (minimum score, grade point) from the top band down - Nigerian 5.0 scale
+GRADE_BANDS = (
+    (70, 5.0),  # A
+    (60, 4.0),  # B
+    (50, 3.0),  # C
+    (45, 2.0),  # D
+    (40, 1.0),  # E
+)
+
+BN_PROFILE = ProgramProfile(
+    code="BN",
+    program_name="BASIC NURSING",
+    semester_keys=(
+        "N-FIRST-YEAR-FIRST-SEMESTER",
+        "N-FIRST-YEAR-SECOND-SEMESTER",
+        "N-SECOND-YEAR-FIRST-SEMESTER",
+        "N-SECOND-YEAR-SECOND-SEMESTER",
+        "N-THIRD-YEAR-FIRST-SEMESTER",
+        "N-THIRD-YEAR-SECOND-SEMESTER",
+    ),
+    grade_bands=GRADE_BANDS,
+    probation=False,
+    output_label="BN",
+    colors=CarryoverColors(
+        heading="366092",
+        courses=(
+            "E6F3FF",
+            "FFF0E6",
+            "E6FFE6",
+            "FFF6E6",
+            "F0E6FF",
+            "E6FFFF",
+            "FFE6F2",
+            "F5F5DC",
+            "E6F7FF",
+            "FFF5E6",
+        ),
+        failed="FFB6C1",
+        passed="90EE90",
+    ),
+    signatories=(),
+    previous_gpa_field="GPA_{semester}",
+)
+
+
 def get_grade_point(score):
     """Determine grade point based on score - NIGERIAN 5.0 SCALE - FIXED VERSION."""
-    try:
-        score = float(score)
-        if score >= 70:
-            return 5.0  # A
-        elif score >= 60:
-            return 4.0  # B
-        elif score >= 50:
-            return 3.0  # C
-        elif score >= 45:
-            return 2.0  # D
-        elif score >= 40:
-            return 1.0  # E
-        else:
-            return 0.0  # F
-    except (ValueError, TypeError):
-        return 0.0
+    return grade_point(score, GRADE_BANDS)
 
 
 def calculate_gpa_correctly(scores, credit_units_dict, course_code_to_unit):
@@ -458,22 +480,6 @@ def find_exam_number_column(df):
     return None
 
 
-def generate_remarks(resit_courses):
-    """Generate remarks for resit performance."""
-    passed_count = sum(
-        1
-        for course_data in resit_courses.values()
-        if course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD
-    )
-    total_count = len(resit_courses)
-    if passed_count == total_count:
-        return "All courses passed in resit"
-    elif passed_count > 0:
-        return f"{passed_count}/{total_count} courses passed in resit"
-    else:
-        return "No improvement in resit"
-
-
 def extract_class_from_set_name(set_name):
     """Extract class name from set_name (e.g., 'SET47' from 'SET47')"""
     return set_name
@@ -811,113 +817,13 @@ def load_bn_course_data():
 def _load_course_data_from_file_bn(course_file):
     """Generic function to load BN course data from Excel file."""
     try:
-        xl = pd.ExcelFile(course_file)
-        semester_course_titles = {}
-        semester_credit_units = {}
-        course_code_to_title = {}
-        course_code_to_unit = {}
-        print(f"📖 Available sheets: {xl.sheet_names}")
-        for sheet in xl.sheet_names:
-            sheet_standard = standardize_semester_key(sheet)
-            print(f"📖 Reading sheet: {sheet} (standardized: {sheet_standard})")
-            try:
-                df = pd.read_excel(
-                    course_file, sheet_name=sheet, engine="openpyxl", header=0
-                )
-                # Convert columns to string and clean
-                df.columns = [str(c).strip().upper() for c in df.columns]
-                # Look for course code, title, and credit unit columns with flexible matching
-                code_col = None
-                title_col = None
-                unit_col = None
-                for col in df.columns:
-                    col_clean = str(col).upper()
-                    if any(
-                        keyword in col_clean
-                        for keyword in ["COURSE CODE", "CODE", "COURSECODE"]
-                    ):
-                        code_col = col
-                    elif any(
-                        keyword in col_clean
-                        for keyword in ["COURSE TITLE", "TITLE", "COURSENAME"]
-                    ):
-                        title_col = col
-                    elif any(
-                        keyword in col_clean
-                        for keyword in ["CU", "CREDIT", "UNIT", "CREDIT UNIT"]
-                    ):
-                        unit_col = col
-                print(
-                    f"🔍 Detected columns - Code: {code_col}, Title: {title_col}, Unit: {unit_col}"
-                )
-                if not all([code_col, title_col, unit_col]):
-                    print(
-                        f"⚠️ Sheet '{sheet}' missing required columns - found: code={code_col}, title={title_col}, unit={unit_col}"
-                    )
-                    # Try to use first three columns as fallback
-                    if len(df.columns) >= 3:
-                        code_col, title_col, unit_col = (
-                            df.columns[0],
-                            df.columns[1],
-                            df.columns[2],
-                        )
-                        print(
-                            f"🔄 Using fallback columns: {code_col}, {title_col}, {unit_col}"
-                        )
-                    else:
-                        print(
-                            f"❌ Sheet '{sheet}' doesn't have enough columns - skipped"
-                        )
-                        continue
-                # Clean the data
-                df_clean = df.dropna(subset=[code_col]).copy()
-                if df_clean.empty:
-                    print(f"⚠️ Sheet '{sheet}' has no data after cleaning - skipped")
-                    continue
-                # Convert credit units to numeric, handling errors
-                df_clean[unit_col] = pd.to_numeric(df_clean[unit_col], errors="coerce")
-                df_clean = df_clean.dropna(subset=[unit_col])
-                # Remove rows with "TOTAL" in course code
-                df_clean = df_clean[
-                    ~df_clean[code_col]
-                    .astype(str)
-                    .str.contains("TOTAL", case=False, na=False)
-                ]
-                if df_clean.empty:
-                    print(
-                        f"⚠️ Sheet '{sheet}' has no valid rows after cleaning - skipped"
-                    )
-                    continue
-                codes = df_clean[code_col].astype(str).str.strip().tolist()
-                titles = df_clean[title_col].astype(str).str.strip().tolist()
-                units = df_clean[unit_col].astype(float).tolist()
-                print(f"📋 Found {len(codes)} courses in {sheet}:")
-                for i, (code, title, unit) in enumerate(
-                    zip(codes[:5], titles[:5], units[:5])
-                ):
-                    print(f" - '{code}': '{title}' (CU: {unit})")
-                # Create mapping dictionaries with OPTIMIZED variant generation
-                sheet_titles = {}
-                sheet_units = {}
-                for code, title, unit in zip(codes, titles, units):
-                    if not code or code.upper() in ["NAN", "NONE", ""]:
-                        continue
+        (
+            semester_course_titles,
+            semester_credit_units,
+            course_code_to_title,
+            course_code_to_unit,
+        ) = load_catalogue(course_file, BN_CATALOGUE_NAMESPACE, _build_bn_course_catalogue)
 
-                    # USE OPTIMIZED VARIANT GENERATION
-                    variants = generate_course_variants(code)
-
-                    # Add all variants to mappings
-                    for variant in variants:
-                        sheet_titles[variant] = title
-                        sheet_units[variant] = unit
-                        course_code_to_title[variant] = title
-                        course_code_to_unit[variant] = unit
-                semester_course_titles[sheet_standard] = sheet_titles
-                semester_credit_units[sheet_standard] = sheet_units
-            except Exception as e:
-                print(f"❌ Error processing sheet '{sheet}': {e}")
-                traceback.print_exc()
-                continue
         print(
             f"✅ Loaded course data for sheets: {list(semester_course_titles.keys())}"
         )
@@ -940,6 +846,120 @@ def _load_course_data_from_file_bn(course_file):
         return {}, {}, {}, {}
 
 
+def _build_bn_course_catalogue(course_sheets):
+    """Build the course lookups from the course workbook's sheets."""
+    semester_course_titles = {}
+    semester_credit_units = {}
+    course_code_to_title = {}
+    course_code_to_unit = {}
+    print(f"📖 Available sheets: {list(course_sheets)}")
+    for sheet, df in course_sheets.items():
+        sheet_standard = standardize_semester_key(sheet)
+        print(f"📖 Reading sheet: {sheet} (standardized: {sheet_standard})")
+        try:
+            # Convert columns to string and clean
+            df.columns = [str(c).strip().upper() for c in df.columns]
+            # Look for course code, title, and credit unit columns with flexible matching
+            code_col = None
+            title_col = None
+            unit_col = None
+            for col in df.columns:
+                col_clean = str(col).upper()
+                if any(
+                    keyword in col_clean
+                    for keyword in ["COURSE CODE", "CODE", "COURSECODE"]
+                ):
+                    code_col = col
+                elif any(
+                    keyword in col_clean
+                    for keyword in ["COURSE TITLE", "TITLE", "COURSENAME"]
+                ):
+                    title_col = col
+                elif any(
+                    keyword in col_clean
+                    for keyword in ["CU", "CREDIT", "UNIT", "CREDIT UNIT"]
+                ):
+                    unit_col = col
+            print(
+                f"🔍 Detected columns - Code: {code_col}, Title: {title_col}, Unit: {unit_col}"
+            )
+            if not all([code_col, title_col, unit_col]):
+                print(
+                    f"⚠️ Sheet '{sheet}' missing required columns - found: code={code_col}, title={title_col}, unit={unit_col}"
+                )
+                # Try to use first three columns as fallback
+                if len(df.columns) >= 3:
+                    code_col, title_col, unit_col = (
+                        df.columns[0],
+                        df.columns[1],
+                        df.columns[2],
+                    )
+                    print(
+                        f"🔄 Using fallback columns: {code_col}, {title_col}, {unit_col}"
+                    )
+                else:
+                    print(
+                        f"❌ Sheet '{sheet}' doesn't have enough columns - skipped"
+                    )
+                    continue
+            # Clean the data
+            df_clean = df.dropna(subset=[code_col]).copy()
+            if df_clean.empty:
+                print(f"⚠️ Sheet '{sheet}' has no data after cleaning - skipped")
+                continue
+            # Convert credit units to numeric, handling errors
+            df_clean[unit_col] = pd.to_numeric(df_clean[unit_col], errors="coerce")
+            df_clean = df_clean.dropna(subset=[unit_col])
+            # Remove rows with "TOTAL" in course code
+            df_clean = df_clean[
+                ~df_clean[code_col]
+                .astype(str)
+                .str.contains("TOTAL", case=False, na=False)
+            ]
+            if df_clean.empty:
+                print(
+                    f"⚠️ Sheet '{sheet}' has no valid rows after cleaning - skipped"
+                )
+                continue
+            codes = df_clean[code_col].astype(str).str.strip().tolist()
+            titles = df_clean[title_col].astype(str).str.strip().tolist()
+            units = df_clean[unit_col].astype(float).tolist()
+            print(f"📋 Found {len(codes)} courses in {sheet}:")
+            for i, (code, title, unit) in enumerate(
+                zip(codes[:5], titles[:5], units[:5])
+            ):
+                print(f" - '{code}': '{title}' (CU: {unit})")
+            # Create mapping dictionaries with OPTIMIZED variant generation
+            sheet_titles = {}
+            sheet_units = {}
+            for code, title, unit in zip(codes, titles, units):
+                if not code or code.upper() in ["NAN", "NONE", ""]:
+                    continue
+
+                # USE OPTIMIZED VARIANT GENERATION
+                variants = generate_course_variants(code)
+
+                # Add all variants to mappings
+                for variant in variants:
+                    sheet_titles[variant] = title
+                    sheet_units[variant] = unit
+                    course_code_to_title[variant] = title
+                    course_code_to_unit[variant] = unit
+            semester_course_titles[sheet_standard] = sheet_titles
+            semester_credit_units[sheet_standard] = sheet_units
+        except Exception as e:
+            print(f"❌ Error processing sheet '{sheet}': {e}")
+            traceback.print_exc()
+            continue
+
+    return (
+        semester_course_titles,
+        semester_credit_units,
+        course_code_to_title,
+        course_code_to_unit,
+    )
+
+
 def find_alternative_bn_course_files():
     """Look for alternative BN course files."""
     base_dirs = [
@@ -1071,61 +1091,48 @@ def find_credit_unit_simple(course_code, credit_units_dict):
 # ============================================================
 # CRITICAL FIXES: Mastersheet Reading Functions
 # ============================================================
+# Headings that mark the exam number column (and so the header row)
+MASTERSHEET_EXAM_KEYWORDS = ("EXAMS NUMBER", "EXAM NUMBER", "REG NO", "REGISTRATION")
+# Programme prefix ignored by the last-resort exam number match
+BN_EXAM_PREFIX = r"^(BN|NUR|NSC)"
+
+
 def read_mastersheet_with_flexible_headers(mastersheet_path, sheet_name):
     """FIXED VERSION: Read mastersheet with flexible header detection for BN - FIXED for EXAMS NUMBER"""
     print(f"🔍 FIXED: Reading BN mastersheet with flexible headers...")
-    # First, let's examine the actual structure
-    xl = pd.ExcelFile(mastersheet_path)
-    df_raw = pd.read_excel(mastersheet_path, sheet_name=sheet_name, header=None)
-    print(f"📊 Raw BN mastersheet shape: {df_raw.shape}")
-    print(f"📊 First 10 rows sample:")
-    for i in range(min(10, len(df_raw))):
-        print(f" Row {i}: {df_raw.iloc[i].dropna().tolist()}")
-    # Look for the header row that contains "EXAMS NUMBER" or similar
-    header_row_idx = None
-    for idx in range(len(df_raw)):
-        row_values = df_raw.iloc[idx].dropna().astype(str).str.upper().tolist()
-        row_combined = " ".join(row_values)
-        # Check for exam number indicators - FIXED for EXAMS NUMBER
-        if any(
-            keyword in row_combined
-            for keyword in ["EXAMS NUMBER", "EXAM NUMBER", "REG NO", "REGISTRATION"]
-        ):
-            header_row_idx = idx
-            print(f"✅ FOUND header row at index {idx}: {row_values}")
-            break
-    if header_row_idx is None:
-        print(f"❌ No header row found with exam number indicators")
-        # Try common header row positions
-        for idx in [5, 4, 3, 2, 1, 0]:
-            try:
-                df_test = pd.read_excel(
-                    mastersheet_path, sheet_name=sheet_name, header=idx
-                )
-                if len(df_test.columns) > 3:  # Reasonable number of columns
-                    header_row_idx = idx
-                    print(f"🔄 Using fallback header row: {idx}")
-                    break
-            except:
-                continue
-    if header_row_idx is None:
-        print(f"❌ Could not determine header row")
-        return None, None
-    # Read with the found header row
     try:
-        df = pd.read_excel(
-            mastersheet_path, sheet_name=sheet_name, header=header_row_idx
-        )
-        print(f"✅ Successfully read BN mastersheet with header row {header_row_idx}")
+        with pd.ExcelFile(mastersheet_path) as xl:
+            # Only the first rows are streamed to find the headings; the sheet
+            # itself is parsed once, below them
+            head = sheet_head(xl, sheet_name)
+            print(f"📊 First 10 rows sample:")
+            for i, cells in enumerate(head[:10]):
+                print(f" Row {i}: {[value for value in cells if value is not None]}")
+            # Look for the header row that contains "EXAMS NUMBER" or similar
+            location = locate_header(head, has_keyword(*MASTERSHEET_EXAM_KEYWORDS))
+            if location is not None:
+                print(f"✅ FOUND header row at index {location.row}: {cell_texts(location.cells)}")
+            else:
+                print(f"❌ No header row found with exam number indicators")
+                # Try common header row positions
+                width = max((len(cells) for cells in head), default=0)
+                for idx in [5, 4, 3, 2, 1, 0]:
+                    if idx < len(head) and width > 3:  # Reasonable number of columns
+                        location = HeaderLocation(idx, head[idx])
+                        print(f"🔄 Using fallback header row: {idx}")
+                        break
+            if location is None:
+                print(f"❌ Could not determine header row")
+                return None, None
+            # Read with the found header row
+            df = read_below_header(xl, sheet_name, location)
+        print(f"✅ Successfully read BN mastersheet with header row {location.row}")
         print(f"📊 Columns: {df.columns.tolist()}")
         # Find exam number column - FIXED for EXAMS NUMBER
         exam_col = None
         for col in df.columns:
             col_str = str(col).upper()
-            if any(
-                keyword in col_str
-                for keyword in ["EXAMS NUMBER", "EXAM NUMBER", "REG NO", "REGISTRATION"]
-            ):
+            if any(keyword in col_str for keyword in MASTERSHEET_EXAM_KEYWORDS):
                 exam_col = col
                 break
         if not exam_col:
@@ -1138,40 +1145,21 @@ def read_mastersheet_with_flexible_headers(mastersheet_path, sheet_name):
         return None, None
 
 
-def find_student_in_mastersheet_fixed(exam_no, mastersheet_df, exam_col):
-    """FIXED VERSION: Robust student matching in BN mastersheet"""
+def find_student_in_mastersheet_fixed(exam_no, mastersheet_df, exam_col, index=None):
+    """FIXED VERSION: Robust student matching in BN mastersheet
+
+    Matches the exact exam number, then a partial one, then one without the
+    programme prefix. Pass the sheet's ``index`` (build_student_index) when
+    looking up many students, so the sheet is indexed only once.
+    """
     if mastersheet_df is None or exam_col not in mastersheet_df.columns:
         return None
-    # Clean the exam number for matching
-    exam_no_clean = str(exam_no).strip().upper()
-    exam_no_clean = re.sub(r"[^A-Z0-9]", "", exam_no_clean)
-    # Method 1: Exact match after cleaning
-    for idx, row in mastersheet_df.iterrows():
-        current_exam = (
-            str(row[exam_col]).strip().upper() if pd.notna(row[exam_col]) else ""
-        )
-        current_exam_clean = re.sub(r"[^A-Z0-9]", "", current_exam)
-        if current_exam_clean == exam_no_clean:
-            return row
-    # Method 2: Partial match
-    for idx, row in mastersheet_df.iterrows():
-        current_exam = (
-            str(row[exam_col]).strip().upper() if pd.notna(row[exam_col]) else ""
-        )
-        current_exam_clean = re.sub(r"[^A-Z0-9]", "", current_exam)
-        if exam_no_clean in current_exam_clean or current_exam_clean in exam_no_clean:
-            return row
-    # Method 3: Try with different cleaning approaches
-    for idx, row in mastersheet_df.iterrows():
-        current_exam = (
-            str(row[exam_col]).strip().upper() if pd.notna(row[exam_col]) else ""
-        )
-        # Remove common prefixes/suffixes
-        current_clean = re.sub(r"^(BN|NUR|NSC)", "", current_exam)
-        exam_clean = re.sub(r"^(BN|NUR|NSC)", "", exam_no_clean)
-        if current_clean == exam_clean:
-            return row
-    return None
+    if index is None:
+        index = build_student_index(mastersheet_df[exam_col], BN_EXAM_PREFIX)
+    pos = find_student(index, exam_no)
+    if pos is None:
+        return None
+    return mastersheet_df.iloc[pos]
 
 
 def quick_fix_read_mastersheet(mastersheet_path, sheet_name):
@@ -1206,24 +1194,20 @@ def extract_mastersheet_from_zip(zip_path, semester_key):
         with zipfile.ZipFile(zip_path, "r") as zip_ref:
             all_files = zip_ref.namelist()
             print(f"📁 Files in ZIP: {all_files}")
-            mastersheet_files = [
-                f
-                for f in all_files
-                if "mastersheet" in f.lower() and f.endswith(".xlsx")
-            ]
-            if not mastersheet_files:
+            mastersheet_name = next(
+                (f for f in all_files if is_mastersheet(f)), None
+            )
+            if not mastersheet_name:
                 print(f"❌ No mastersheet found in ZIP")
                 return None, None
-            mastersheet_name = mastersheet_files[0]
             print(f"✅ Found mastersheet: {mastersheet_name}")
-            temp_dir = tempfile.mkdtemp()
-            temp_mastersheet_path = os.path.join(
-                temp_dir, f"mastersheet_{semester_key}.xlsx"
-            )
-            with open(temp_mastersheet_path, "wb") as f:
-                f.write(zip_ref.read(mastersheet_name))
-            print(f"✅ Extracted mastersheet to: {temp_mastersheet_path}")
-            return temp_mastersheet_path, temp_dir
+        temp_dir = tempfile.mkdtemp()
+        temp_mastersheet_path = os.path.join(
+            temp_dir, f"mastersheet_{semester_key}.xlsx"
+        )
+        extract_member(zip_path, mastersheet_name, temp_mastersheet_path)
+        print(f"✅ Extracted mastersheet to: {temp_mastersheet_path}")
+        return temp_mastersheet_path, temp_dir
     except Exception as e:
         print(f"❌ Error extracting mastersheet from ZIP: {e}")
         traceback.print_exc()
@@ -1398,12 +1382,7 @@ def find_matching_sheet(sheet_names, target_key):
 def create_carryover_zip(source_dir, zip_path):
     """Create ZIP file of carryover results."""
     try:
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(source_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, source_dir)
-                    zipf.write(file_path, arcname)
+        write_tree(source_dir, zip_path)
         print(f"✅ ZIP file created: {zip_path}")
         return True
     except Exception as e:
@@ -1416,187 +1395,32 @@ def create_carryover_zip(source_dir, zip_path):
 # ============================================================
 def load_previous_gpas(mastersheet_path, current_semester_key):
     """Load previous GPA data from mastersheet for BN CGPA calculation - FIXED with flexible headers."""
-    all_student_data = {}
-    current_standard = standardize_semester_key(current_semester_key)
-    # BN semesters
-    all_semesters = {
-        "N-FIRST-YEAR-FIRST-SEMESTER": [],
-        "N-FIRST-YEAR-SECOND-SEMESTER": ["N-FIRST-YEAR-FIRST-SEMESTER"],
-        "N-SECOND-YEAR-FIRST-SEMESTER": [
-            "N-FIRST-YEAR-FIRST-SEMESTER",
-            "N-FIRST-YEAR-SECOND-SEMESTER",
-        ],
-        "N-SECOND-YEAR-SECOND-SEMESTER": [
-            "N-FIRST-YEAR-FIRST-SEMESTER",
-            "N-FIRST-YEAR-SECOND-SEMESTER",
-            "N-SECOND-YEAR-FIRST-SEMESTER",
-        ],
-        "N-THIRD-YEAR-FIRST-SEMESTER": [
-            "N-FIRST-YEAR-FIRST-SEMESTER",
-            "N-FIRST-YEAR-SECOND-SEMESTER",
-            "N-SECOND-YEAR-FIRST-SEMESTER",
-            "N-SECOND-YEAR-SECOND-SEMESTER",
-        ],
-        "N-THIRD-YEAR-SECOND-SEMESTER": [
-            "N-FIRST-YEAR-FIRST-SEMESTER",
-            "N-FIRST-YEAR-SECOND-SEMESTER",
-            "N-SECOND-YEAR-FIRST-SEMESTER",
-            "N-SECOND-YEAR-SECOND-SEMESTER",
-            "N-THIRD-YEAR-FIRST-SEMESTER",
-        ],
-    }
-    semesters_to_load = all_semesters.get(current_standard, [])
-    print(f"📊 Loading previous BN GPAs for {current_standard}: {semesters_to_load}")
-    if not os.path.exists(mastersheet_path):
-        print(f"❌ BN Mastersheet not found: {mastersheet_path}")
-        return {}
-    try:
-        xl = pd.ExcelFile(mastersheet_path)
-        print(f"📖 Available sheets in BN mastersheet: {xl.sheet_names}")
-    except Exception as e:
-        print(f"❌ Error opening BN mastersheet: {e}")
-        return {}
-    for semester in semesters_to_load:
-        try:
-            sheet_name = find_matching_sheet(xl.sheet_names, semester)
-            if not sheet_name:
-                print(f"⚠️ Skipping BN semester {semester} - no matching sheet found")
-                continue
-            print(f"📖 Reading BN sheet '{sheet_name}' for semester {semester}")
-            # FIXED: Use flexible header reading for each previous semester sheet
-            df, exam_col = read_mastersheet_with_flexible_headers(
-                mastersheet_path, sheet_name
-            )
-            if df is None or exam_col is None:
-                print(f"⚠️ Could not read BN sheet '{sheet_name}' with flexible headers")
-                continue
-            gpa_col = None
-            credit_col = None
-            # ENHANCED: Prioritize total attempted credits for CGPA accuracy
-            for col in df.columns:
-                col_str = str(col).upper()
-                if "GPA" in col_str and "CGPA" not in col_str:
-                    gpa_col = col
-                if (
-                    "TCPE" in col_str
-                    or "TOTAL CREDIT" in col_str
-                    or "TOTAL UNIT" in col_str
-                ):
-                    credit_col = col  # Prioritize total attempted credits
-                elif "CU PASSED" in col_str or "CREDIT" in col_str or "UNIT" in col_str:
-                    credit_col = col  # Fallback
-            print(
-                f"🔍 Columns found - Exam: {exam_col}, GPA: {gpa_col}, Credits: {credit_col}"
-            )
-            if exam_col and gpa_col:
-                for idx, row in df.iterrows():
-                    try:
-                        exam_no = str(row[exam_col]).strip()
-                        if pd.isna(exam_no) or exam_no in ["", "NAN", "NONE"]:
-                            continue
-                        gpa_value = row[gpa_col]
-                        if pd.isna(gpa_value):
-                            continue
-                        credits = 30
-                        if (
-                            credit_col
-                            and credit_col in row
-                            and pd.notna(row[credit_col])
-                        ):
-                            try:
-                                credits = int(float(row[credit_col]))
-                            except (ValueError, TypeError):
-                                credits = 30
-                        if exam_no not in all_student_data:
-                            all_student_data[exam_no] = {"gpas": [], "credits": []}
-                        all_student_data[exam_no]["gpas"].append(float(gpa_value))
-                        all_student_data[exam_no]["credits"].append(credits)
-                        if idx < 3:
-                            print(
-                                f"📊 Loaded BN GPA for {exam_no}: {gpa_value} with {credits} credits"
-                            )
-                    except (ValueError, TypeError) as e:
-                        print(f"⚠️ Error processing row {idx} for BN {semester}: {e}")
-                        continue
-            else:
-                print(
-                    f"⚠️ Missing required columns in BN {sheet_name}: exam_col={exam_col}, gpa_col={gpa_col}"
-                )
-        except Exception as e:
-            print(f"⚠️ Could not load data from BN {semester}: {e}")
-            traceback.print_exc()
-    print(f"📊 Loaded cumulative BN data for {len(all_student_data)} students")
-    return all_student_data
+    return engine_previous_gpas(
+        BN_PROFILE,
+        mastersheet_path,
+        standardize_semester_key(current_semester_key),
+        lambda xl, key: find_matching_sheet(xl.sheet_names, key),
+        lambda xl, sheet_name: read_mastersheet_with_flexible_headers(mastersheet_path, sheet_name),
+    )
 
 
 def calculate_cgpa(student_data, current_gpa, current_credits):
     """Calculate Cumulative GPA for BN."""
-    if not student_data or not student_data.get("gpas"):
-        print(f"⚠️ No previous BN GPA data, using current GPA: {current_gpa}")
-        return current_gpa
-    total_grade_points = 0.0
-    total_credits = 0
-    print(f"🔢 Calculating BN CGPA from {len(student_data['gpas'])} previous semesters")
-    for prev_gpa, prev_credits in zip(student_data["gpas"], student_data["credits"]):
-        total_grade_points += prev_gpa * prev_credits
-        total_credits += prev_credits
-        print(
-            f" - GPA: {prev_gpa}, Credits: {prev_credits}, Running Total: {total_grade_points}/{total_credits}"
-        )
-    total_grade_points += current_gpa * current_credits
-    total_credits += current_credits
-    print(f"📊 Final BN calculation: {total_grade_points} / {total_credits}")
-    if total_credits > 0:
-        cgpa = round(total_grade_points / total_credits, 2)
-        print(f"✅ Calculated BN CGPA: {cgpa}")
-        return cgpa
-    else:
-        print(f"⚠️ No BN credits, returning current GPA: {current_gpa}")
-        return current_gpa
+    return engine_cgpa(BN_PROFILE, student_data, current_gpa, current_credits)
 
 
 # ============================================================
-# CRITICAL FIX: Enhanced Remarks Calculation - UPDATED: "Probation" changed to "Resit"
+# CRITICAL FIX: Enhanced Remarks Calculation
 # ============================================================
 def calculate_student_remarks(cu_passed, cu_failed, total_credits, gpa, student_had_carryover_update=False):
     """
     CRITICAL FIX: Calculate student remarks based on CURRENT performance.
     Override withdrawn status for students who passed all courses in resit.
-    
-    Args:
-        cu_passed: Credits passed
-        cu_failed: Credits failed  
-        total_credits: Total credits
-        gpa: Current GPA
-        student_had_carryover_update: Whether student had carryover updates
-    
-    Returns:
-        str: Remarks (PASSED, RESIT, or WITHDRAW)
+    Students with failures who passed 45% of their credits are RESIT (BN has no PROBATION).
     """
-    # Calculate passed percentage
-    passed_percent = cu_passed / total_credits if total_credits > 0 else 0
-    
-    # CRITICAL FIX: If student has NO failed courses (cu_failed == 0), they PASSED
-    # This overrides any previous withdrawn status
-    if cu_failed == 0:
-        if student_had_carryover_update:
-            print(f"  ✅ CARRYOVER STUDENT NOW PASSED: 0 failures, GPA: {gpa}")
-        return "PASSED"
-    
-    # CRITICAL FIX: If student passed less than 45% of courses, WITHDRAW
-    # But ONLY if they still have failures after carryover processing
-    elif passed_percent < 0.45:
-        if student_had_carryover_update:
-            print(f"  ⚠️ CARRYOVER STUDENT STILL WITHDRAWN: passed only {passed_percent*100:.1f}%")
-        return "WITHDRAW"
-    
-    # Has failures but passed ≥45%, assign RESIT (previously was "RESIT" or "PROBATION" based on GPA)
-    # UPDATED: All cases now return "RESIT" instead of "PROBATION"
-    else:
-        remarks = "RESIT"  # Changed from: "RESIT" if gpa >= 2.0 else "PROBATION"
-        if student_had_carryover_update:
-            print(f"  📝 CARRYOVER STUDENT {remarks}: GPA: {gpa}, {cu_failed} CU failed")
-        return remarks
+    return student_remarks(
+        BN_PROFILE, cu_passed, cu_failed, total_credits, gpa, student_had_carryover_update
+    )
 
 
 # ============================================================
@@ -1604,9 +1428,6 @@ def calculate_student_remarks(cu_passed, cu_failed, total_credits, gpa, student_
 # ============================================================
 def find_sheet_structure(ws):
     """FIXED: Find header row - BN compatible with EXAMS NUMBER"""
-    header_row = None
-    headers = {}
-
     # BN-specific keywords (EXAMS NUMBER is plural in BN)
     exam_keywords = [
         "EXAMS NUMBER",  # ← CRITICAL: BN uses plural
@@ -1616,30 +1437,20 @@ def find_sheet_structure(ws):
         "REGISTRATION",
     ]
 
-    # Search first 20 rows for headers
-    for row_idx in range(1, min(21, ws.max_row + 1)):
-        row_text = " ".join(
-            [
-                str(ws.cell(row_idx, col).value or "").upper()
-                for col in range(1, min(15, ws.max_column + 1))
-            ]
-        )
-
-        # Check if this row contains exam number indicators
-        if any(keyword in row_text for keyword in exam_keywords):
-            header_row = row_idx
-            print(f"✅ FOUND BN header row at: {row_idx}")
+    # Search first 20 rows (first 14 columns) for headers, reading them once
+    location = locate_header(sheet_head(ws, nrows=20), has_keyword(*exam_keywords), ncols=14)
+    if location is not None:
+        header_row = location.row + 1
+        print(f"✅ FOUND BN header row at: {header_row}")
 
-            # Build headers dictionary with both original and uppercase keys
-            for col_idx in range(1, ws.max_column + 1):
-                header_val = ws.cell(row=header_row, column=col_idx).value
-                if header_val:
-                    header_clean = str(header_val).strip()
-                    headers[header_clean] = col_idx
-                    headers[header_clean.upper()] = col_idx
+        # Build headers dictionary with both original and uppercase keys
+        headers = {}
+        for header_clean, col_idx in header_columns(location.cells).items():
+            headers[header_clean] = col_idx
+            headers[header_clean.upper()] = col_idx
 
-            print(f"📋 Found {len(set(headers.values()))} unique column headers")
-            return header_row, headers
+        print(f"📋 Found {len(set(headers.values()))} unique column headers")
+        return header_row, headers
 
     print(f"❌ No BN header row found")
     return None, {}
@@ -2089,96 +1900,11 @@ def update_cgpa_summary_sheet_fixed(wb, semester_key, header_row, set_name):
     # Create professional headers
     create_professional_headers_bn(cgpa_ws, set_name, semester_key)
 
-    # Collect data from all semester sheets
-    semester_keys = [
-        "N-FIRST-YEAR-FIRST-SEMESTER",
-        "N-FIRST-YEAR-SECOND-SEMESTER",
-        "N-SECOND-YEAR-FIRST-SEMESTER",
-        "N-SECOND-YEAR-SECOND-SEMESTER",
-        "N-THIRD-YEAR-FIRST-SEMESTER",
-        "N-THIRD-YEAR-SECOND-SEMESTER",
-    ]
-
-    # Track withdrawn students across ALL semesters
-    all_withdrawn_students = set()
-
-    # FIRST PASS: Identify withdrawn students from CURRENT data
-    for key in semester_keys:
-        sheet_name = find_matching_sheet(wb.sheetnames, key)
-        if not sheet_name:
-            continue
-
-        ws = wb[sheet_name]
-        header_row_found, headers_dict = find_sheet_structure(ws)
-        if not header_row_found:
-            continue
-
-        exam_col = headers_dict.get("EXAM NUMBER") or headers_dict.get("EXAMS NUMBER")
-        remarks_col = headers_dict.get("REMARKS")
-
-        if not all([exam_col, remarks_col]):
-            continue
-
-        # Read CURRENT remarks from worksheet
-        for row in range(header_row_found + 1, ws.max_row + 1):
-            exam_no = ws.cell(row, exam_col).value
-            if not exam_no or "SUMMARY" in str(exam_no).upper():
-                break
-
-            # Read CURRENT remarks (includes any updates)
-            remarks = ws.cell(row, remarks_col).value or ""
-            if "WITHDRAW" in str(remarks).upper():
-                all_withdrawn_students.add(str(exam_no).strip().upper())
-
-    print(f" ✅ Found {len(all_withdrawn_students)} withdrawn BN students")
-
-    # SECOND PASS: Collect semester data with CURRENT values
-    semester_data = {}
-    for key in semester_keys:
-        sheet_name = find_matching_sheet(wb.sheetnames, key)
-        if not sheet_name:
-            continue
-
-        ws = wb[sheet_name]
-        header_row_found, headers_dict = find_sheet_structure(ws)
-        if not header_row_found:
-            continue
-
-        exam_col = headers_dict.get("EXAM NUMBER") or headers_dict.get("EXAMS NUMBER")
-        name_col = headers_dict.get("NAME")
-        gpa_col = headers_dict.get("GPA")
-        credits_col = headers_dict.get("TCPE")
-
-        if not all([exam_col, name_col, gpa_col]):
-            continue
-
-        data = {}
-        for row in range(header_row_found + 1, ws.max_row + 1):
-            exam_no_cell = ws.cell(row, exam_col).value
-            if not exam_no_cell or "SUMMARY" in str(exam_no_cell).upper():
-                break
-
-            exam_no = str(exam_no_cell).strip().upper()
-
-            # Read CURRENT values from worksheet
-            name = ws.cell(row, name_col).value
-            gpa_val = ws.cell(row, gpa_col).value
-            credits_val = ws.cell(row, credits_col).value if credits_col else 0
-
-            is_withdrawn = exam_no in all_withdrawn_students
-
-            try:
-                data[exam_no] = {
-                    "name": name,
-                    "gpa": float(gpa_val) if gpa_val else 0,
-                    "credits": float(credits_val) if credits_val else 0,
-                    "withdrawn": is_withdrawn,
-                }
-            except (ValueError, TypeError):
-                continue
-
-        semester_data[key] = data
-        print(f" ✅ Collected data for {len(data)} students in {key}")
+    # One read of each semester sheet gives both the withdrawn students and
+    # the CURRENT semester data; withdrawn status persists across semesters
+    semester_data, all_withdrawn_students = collect_semester_records(
+        BN_PROFILE, wb, find_matching_sheet, find_sheet_structure
+    )
 
     # Compile and write student data with professional formatting
     write_cgpa_summary_data_with_formatting(
@@ -3125,6 +2851,8 @@ def update_mastersheet_with_recalculation_COMPLETE_FIX(
     COMPLETELY REWRITTEN VERSION - Enhanced matching and robust score updates
     WITH ALL CRITICAL FIXES APPLIED
     """
+    from openpyxl.styles import Font, PatternFill
+
     print(f"\n{'='*80}")
     print(f"🔄 COMPLETELY REWRITTEN: UPDATING BN MASTERSHEET")
     print(f"{'='*80}")
@@ -3274,7 +3002,13 @@ def update_mastersheet_with_recalculation_COMPLETE_FIX(
                     print(f" 📖 Course: '{header}' -> normalized: '{normalized}'")
                     break
         print(f"✅ Mapped {len(course_column_map)} unique course columns")
-        print(f"📊 Total course variants: {len(course_columns)}")
+
+        # Resit codes are looked up among the course codes and all their variants
+        course_lookup = build_course_index(
+            {course_code_to_header[code]: col for code, col in course_column_map.items()},
+            generate_course_variants,
+        )
+        print(f"📊 Total course variants: {len(course_lookup)}")
         if not course_column_map:
             print(f"❌ No course columns found!")
             return False
@@ -3348,20 +3082,14 @@ def update_mastersheet_with_recalculation_COMPLETE_FIX(
         # ================================================================
         print(f"\n📇 PHASE 7: Building student index for fast lookup...")
 
-        student_rows = {}
+        # exam_cells[pos] is the exam number cell of worksheet row header_row + 1 + pos
+        exam_cells = []
         for row_idx in range(header_row + 1, ws.max_row + 1):
             exam_no = ws.cell(row_idx, exam_col).value
-
-            if not exam_no or str(exam_no).upper() in ["", "NAN", "NONE"]:
-                continue
-            if "SUMMARY" in str(exam_no).upper():
+            if exam_no is not None and "SUMMARY" in str(exam_no).upper():
                 break
-
-            exam_normalized = re.sub(r"[^A-Z0-9]", "", str(exam_no).strip().upper())
-            student_rows[exam_normalized] = {
-                "row": row_idx,
-                "original_exam": str(exam_no).strip(),
-            }
+            exam_cells.append(exam_no)
+        student_rows = build_student_index(exam_cells, BN_EXAM_PREFIX).exact
 
         print(f"✅ Indexed {len(student_rows)} students in mastersheet")
 
@@ -3397,8 +3125,9 @@ def update_mastersheet_with_recalculation_COMPLETE_FIX(
                 update_log.append(msg)
                 continue
 
-            row_idx = student_rows[exam_normalized]["row"]
-            original_exam = student_rows[exam_normalized]["original_exam"]
+            pos = student_rows[exam_normalized]
+            row_idx = header_row + 1 + pos
+            original_exam = str(exam_cells[pos]).strip()
 
             print(f"\n🎯 Updating: {original_exam} (row {row_idx})")
             student_courses_updated = 0
@@ -3407,14 +3136,14 @@ def update_mastersheet_with_recalculation_COMPLETE_FIX(
                 original_code = course_data["original_code"]
                 new_score = course_data["score"]
 
-                # Find course column using normalized lookup
-                if course_normalized not in course_column_map:
+                # Find course column by code or code variant
+                if course_normalized not in course_lookup:
                     msg = f"COURSE NOT FOUND: {original_exam} - {original_code} (normalized: {course_normalized})"
                     print(f" ⚠️ {msg}")
                     update_log.append(msg)
                     continue
 
-                course_col = course_column_map[course_normalized]
+                course_col = course_lookup[course_normalized]
                 old_score = ws.cell(row=row_idx, column=course_col).value
 
                 # Update the score
@@ -3549,8 +3278,9 @@ def update_mastersheet_with_recalculation_COMPLETE_FIX(
                 )
 
                 # FIXED: Calculate CGPA for the current sheet if CGPA column exists
-                if exam_no in cgpa_data:
-                    cgpa = calculate_cgpa(cgpa_data[exam_no], gpa, total_credits)
+                previous = cgpa_data.get(exam_key(exam_no))
+                if previous is not None:
+                    cgpa = calculate_cgpa(previous, gpa, total_credits)
                 else:
                     cgpa = gpa
 
@@ -3858,296 +3588,18 @@ def generate_carryover_mastersheet(
     course_code_to_unit,
 ):
     """Generate BN CARRYOVER_mastersheet."""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "BN_CARRYOVER_RESULTS"
-    program_name = "BASIC NURSING"
-    program_abbr = "BN"
-    if os.path.exists(DEFAULT_LOGO_PATH):
-        try:
-            from openpyxl.drawing.image import Image
-
-            img = Image(DEFAULT_LOGO_PATH)
-            img.width = 80
-            img.height = 80
-            ws.add_image(img, "A1")
-        except Exception as e:
-            print(f"⚠️ Could not add logo: {e}")
-    current_year = 2025
-    next_year = 2026
-    year, sem_num, level, sem_display, set_code, current_semester_name = (
-        get_semester_display_info(semester_key)
-    )
-    all_courses = set()
-    for student in carryover_data:
-        all_courses.update(student["RESIT_COURSES"].keys())
-    previous_semesters = get_previous_semesters_for_display(semester_key)
-    headers = ["S/N", "EXAM NUMBER", "NAME"]
-    for prev_sem in previous_semesters:
-        headers.append(f"GPA {prev_sem}")
-    course_headers = []
-    for course in sorted(all_courses):
-        course_headers.extend([f"{course}", f"{course}_RESIT"])
-    headers.extend(course_headers)
-    headers.extend([f"GPA {current_semester_name}", "CGPA", "REMARKS"])
-    total_columns = len(headers)
-    last_column = get_column_letter(total_columns)
-    # Header section
-    ws.merge_cells(f"A3:{last_column}3")
-    title_cell = ws["A3"]
-    title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA-ABUJA"
-    title_cell.font = Font(bold=True, size=14)
-    title_cell.alignment = Alignment(horizontal="center", vertical="center")
-    ws.merge_cells(f"A4:{last_column}4")
-    subtitle_cell = ws["A4"]
-    subtitle_cell.value = f"RESIT - {current_year}/{next_year} SESSION {program_name} {level} {sem_display} EXAMINATIONS RESULT — {datetime.now().strftime('%B %d, %Y')}"
-    subtitle_cell.font = Font(bold=True, size=12)
-    subtitle_cell.alignment = Alignment(horizontal="center", vertical="center")
-    print(f"🔍 BN Courses found in resit data: {sorted(all_courses)}")
-    print(
-        f"📊 BN GPA columns for {semester_key}: Previous={previous_semesters}, Current={current_semester_name}"
+    courses = carryover_courses(carryover_data)
+    return engine_carryover_mastersheet(
+        BN_PROFILE,
+        carryover_data,
+        output_dir,
+        semester_key,
+        timestamp,
+        get_semester_display_info(semester_key),
+        get_previous_semesters_for_display(semester_key),
+        {course: find_course_title(course, course_titles, course_code_to_title) for course in courses},
+        {course: find_credit_unit(course, course_units, course_code_to_unit) for course in courses},
     )
-    # Course title row
-    title_row = [""] * 3
-    for prev_sem in previous_semesters:
-        title_row.extend([""])
-    for course in sorted(all_courses):
-        course_title = find_course_title(course, course_titles, course_code_to_title)
-        if len(course_title) > 30:
-            course_title = course_title[:27] + "..."
-        title_row.extend([course_title, course_title])
-    title_row.extend(["", "", ""])
-    ws.append(title_row)
-    # Credit unit row
-    credit_row = [""] * 3
-    for prev_sem in previous_semesters:
-        credit_row.extend([""])
-    for course in sorted(all_courses):
-        credit_unit = find_credit_unit(course, course_units, course_code_to_unit)
-        credit_row.extend([f"CU: {credit_unit}", f"CU: {credit_unit}"])
-    credit_row.extend(["", "", ""])
-    ws.append(credit_row)
-    # Code row
-    code_row = ["S/N", "EXAM NUMBER", "NAME"]
-    for prev_sem in previous_semesters:
-        code_row.append(f"GPA {prev_sem}")
-    for course in sorted(all_courses):
-        code_row.append(f"{course}")
-        code_row.append(f"{course}_RESIT")
-    code_row.extend([f"GPA {current_semester_name}", "CGPA", "REMARKS"])
-    ws.append(code_row)
-    # Apply formatting to header rows
-    course_colors = [
-        "E6F3FF",
-        "FFF0E6",
-        "E6FFE6",
-        "FFF6E6",
-        "F0E6FF",
-        "E6FFFF",
-        "FFE6F2",
-        "F5F5DC",
-        "E6F7FF",
-        "FFF5E6",
-    ]
-    start_col = 4
-    if previous_semesters:
-        start_col += len(previous_semesters)
-    color_index = 0
-    for course in sorted(all_courses):
-        for row in [5, 6, 7]:
-            for offset in [0, 1]:
-                cell = ws.cell(row=row, column=start_col + offset)
-                cell.fill = PatternFill(
-                    start_color=course_colors[color_index % len(course_colors)],
-                    end_color=course_colors[color_index % len(course_colors)],
-                    fill_type="solid",
-                )
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = Border(
-                    left=Side(style="thin"),
-                    right=Side(style="thin"),
-                    top=Side(style="thin"),
-                    bottom=Side(style="thin"),
-                )
-        for offset in [0, 1]:
-            cell = ws.cell(row=5, column=start_col + offset)
-            cell.alignment = Alignment(
-                text_rotation=90, horizontal="center", vertical="center"
-            )
-            cell.font = Font(bold=True, size=9)
-        color_index += 1
-        start_col += 2
-    # Format basic info columns
-    for row in [5, 6, 7]:
-        for col in range(1, 4):
-            cell = ws.cell(row=row, column=col)
-            cell.fill = PatternFill(
-                start_color="366092", end_color="366092", fill_type="solid"
-            )
-            cell.font = Font(color="FFFFFF", bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
-    # Add student data
-    row_idx = 8
-    failed_counts = {course: 0 for course in all_courses}
-    # CRITICAL FIX: Proper serial numbers from 1 to n
-    serial_number = 1
-    for student in carryover_data:
-        exam_no = student["EXAM NUMBER"]
-        # Serial Number (PROPERLY SORTED from 1 to n)
-        ws.cell(row=row_idx, column=1, value=serial_number)
-        serial_number += 1
-        ws.cell(row=row_idx, column=2, value=student["EXAM NUMBER"])
-        ws.cell(row=row_idx, column=3, value=student["NAME"])
-        # Previous GPAs
-        gpa_col = 4
-        for prev_sem in previous_semesters:
-            gpa_value = student.get(f"GPA_{prev_sem}", "")
-            ws.cell(row=row_idx, column=gpa_col, value=gpa_value)
-            gpa_col += 1
-        # Course scores
-        course_col = gpa_col
-        color_index = 0
-        for course in sorted(all_courses):
-            for offset in [0, 1]:
-                cell = ws.cell(row=row_idx, column=course_col + offset)
-                cell.fill = PatternFill(
-                    start_color=course_colors[color_index % len(course_colors)],
-                    end_color=course_colors[color_index % len(course_colors)],
-                    fill_type="solid",
-                )
-            if course in student["RESIT_COURSES"]:
-                course_data = student["RESIT_COURSES"][course]
-                orig_cell = ws.cell(
-                    row=row_idx, column=course_col, value=course_data["original_score"]
-                )
-                if course_data["original_score"] < DEFAULT_PASS_THRESHOLD:
-                    orig_cell.fill = PatternFill(
-                        start_color="FFB6C1", end_color="FFB6C1", fill_type="solid"
-                    )
-                resit_cell = ws.cell(
-                    row=row_idx, column=course_col + 1, value=course_data["resit_score"]
-                )
-                if course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD:
-                    resit_cell.fill = PatternFill(
-                        start_color="90EE90", end_color="90EE90", fill_type="solid"
-                    )
-                else:
-                    resit_cell.fill = PatternFill(
-                        start_color="FFD580", end_color="FFD580", fill_type="solid"
-                    )
-                    failed_counts[course] += 1
-            else:
-                ws.cell(row=row_idx, column=course_col, value="")
-                ws.cell(row=row_idx, column=course_col + 1, value="")
-            color_index += 1
-            course_col += 2
-        # Current GPA and CGPA
-        ws.cell(row=row_idx, column=course_col, value=student["CURRENT_GPA"])
-        ws.cell(row=row_idx, column=course_col + 1, value=student["CURRENT_CGPA"])
-        # Remarks
-        remarks = generate_remarks(student["RESIT_COURSES"])
-        ws.cell(row=row_idx, column=course_col + 2, value=remarks)
-        row_idx += 1
-    # Add failed counts row
-    failed_row_idx = row_idx
-    ws.cell(row=failed_row_idx, column=1, value="FAILED COUNT BY COURSE:").font = Font(
-        bold=True
-    )
-    for col in range(1, len(headers) + 1):
-        cell = ws.cell(row=failed_row_idx, column=col)
-        cell.fill = PatternFill(
-            start_color="FFFF99", end_color="FFFF99", fill_type="solid"
-        )
-    course_col = gpa_col
-    for course in sorted(all_courses):
-        count_cell = ws.cell(
-            row=failed_row_idx, column=course_col + 1, value=failed_counts[course]
-        )
-        count_cell.font = Font(bold=True)
-        count_cell.fill = PatternFill(
-            start_color="FFFF99", end_color="FFFF99", fill_type="solid"
-        )
-        course_col += 2
-    # Add summary section
-    summary_start_row = failed_row_idx + 2
-    total_students = len(carryover_data)
-    passed_all = sum(
-        1
-        for student in carryover_data
-        if all(
-            course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD
-            for course_data in student["RESIT_COURSES"].values()
-        )
-    )
-    carryover_count = total_students - passed_all
-    total_failed_attempts = sum(failed_counts.values())
-    summary_data = [
-        ["BN CARRYOVER SUMMARY"],
-        [
-            f"A total of {total_students} students registered and sat for the Carryover Examination"
-        ],
-        [f"A total of {passed_all} students passed all carryover courses"],
-        [
-            f"A total of {carryover_count} students failed one or more carryover courses and must repeat them"
-        ],
-        [f"Total failed resit attempts: {total_failed_attempts} across all courses"],
-        [
-            f"BN Carryover processing completed on {datetime.now().strftime('%B %d, %Y at %H:%M:%S')}"
-        ],
-    ]
-    for i, row_data in enumerate(summary_data):
-        row_num = summary_start_row + i
-        if row_data[0]:
-            ws.merge_cells(
-                start_row=row_num, start_column=1, end_row=row_num, end_column=10
-            )
-            cell = ws.cell(row=row_num, column=1, value=row_data[0])
-            if i == 0:
-                cell.font = Font(bold=True, size=12, underline="single")
-            else:
-                cell.font = Font(bold=False, size=11)
-            cell.alignment = Alignment(horizontal="left", vertical="center")
-    # Apply borders to data area
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-    for row in ws.iter_rows(
-        min_row=7, max_row=row_idx - 1, min_col=1, max_col=len(headers)
-    ):
-        for cell in row:
-            cell.border = thin_border
-    # Freeze panes and adjust column widths
-    ws.freeze_panes = "D8"
-    # Set column widths
-    ws.column_dimensions["A"].width = 8  # S/N
-    ws.column_dimensions["B"].width = 18  # EXAM NUMBER
-    ws.column_dimensions["C"].width = 35  # NAME
-    # Set GPA column widths
-    for col in range(4, 4 + len(previous_semesters)):
-        ws.column_dimensions[get_column_letter(col)].width = 15
-    # Set course column widths
-    for col in range(4 + len(previous_semesters), len(headers) - 2):
-        ws.column_dimensions[get_column_letter(col)].width = 12
-    # Set summary column widths
-    for col in range(len(headers) - 2, len(headers) + 1):
-        ws.column_dimensions[get_column_letter(col)].width = 15
-    # Save the file
-    filename = f"BN_CARRYOVER_mastersheet_{timestamp}.xlsx"
-    filepath = os.path.join(output_dir, filename)
-    wb.save(filepath)
-    wb.close()
-    print(f"✅ BN CARRYOVER mastersheet generated: {filepath}")
-    return filepath
 
 
 def generate_individual_reports(
@@ -4398,6 +3850,14 @@ def process_carryover_results(
 
         print(f"\n🎯 PROCESSING BN RESIT SCORES...")
 
+        # Exam numbers and course columns are indexed once for all resit rows
+        student_index = build_student_index(
+            mastersheet_df[mastersheet_exam_col], BN_EXAM_PREFIX
+        )
+        course_index = build_course_index(
+            mastersheet_df.columns, generate_course_variants
+        )
+
         # CRITICAL FIX 6: Add progress indicators
         total_students = len(resit_df)
         print(f"🎯 Processing {total_students} students with progress indicators...")
@@ -4415,7 +3875,7 @@ def process_carryover_results(
 
                 # FIXED: Use enhanced student matching
                 student_data = find_student_in_mastersheet_fixed(
-                    exam_no, mastersheet_df, mastersheet_exam_col
+                    exam_no, mastersheet_df, mastersheet_exam_col, student_index
                 )
                 if student_data is None:
                     print(f"⚠️ BN Student {exam_no} not found in mastersheet - skipping")
@@ -4454,17 +3914,11 @@ def process_carryover_results(
                         if pd.isna(original_score):
                             continue
                     else:
-                        # Try to find course with similar name
-                        course_found = False
-                        for ms_col in mastersheet_df.columns:
-                            if col.upper() == ms_col.upper() or col.replace(
-                                " ", ""
-                            ) == ms_col.replace(" ", ""):
-                                original_score = student_data.get(ms_col)
-                                course_found = True
-                                break
-                        if not course_found:
+                        # Try to find course with a matching code
+                        ms_col = course_index.get(code_key(col))
+                        if ms_col is None:
                             continue
+                        original_score = student_data.get(ms_col)
                     try:
                         original_score_val = (
                             float(original_score)
@@ -4533,9 +3987,10 @@ def process_carryover_results(
                     student_record["CURRENT_GPA"] = updated_gpa
                     student_record["CURRENT_CREDITS"] = total_credits
                     # Recalculate CGPA
-                    if exam_no in cgpa_data:
+                    previous = cgpa_data.get(exam_key(exam_no))
+                    if previous is not None:
                         student_record["CURRENT_CGPA"] = calculate_cgpa(
-                            cgpa_data[exam_no], updated_gpa, total_credits
+                            previous, updated_gpa, total_credits
                         )
                     else:
                         student_record["CURRENT_CGPA"] = updated_gpa
@@ -4645,26 +4100,23 @@ def process_carryover_results(
                     updated_zip_path = os.path.join(clean_dir_parent, updated_zip_name)
                     original_zip_path = os.path.join(clean_dir_parent, latest_zip_name)
                     print(f"✅ Found latest BN ZIP: {original_zip_path}")
-                    # Extract the ZIP to temporary directory
+                    # Temporary directory for the extracted mastersheet
                     temp_extract_dir = tempfile.mkdtemp()
                     try:
-                        with zipfile.ZipFile(original_zip_path, "r") as zip_ref:
-                            zip_ref.extractall(temp_extract_dir)
-                        print(f"✅ Extracted to temp directory: {temp_extract_dir}")
-                        # Find the mastersheet in the extracted files
+                        # Only the mastersheet is extracted; the other members
+                        # are copied into the updated ZIP as they are
+                        mastersheet_member = find_member(original_zip_path)
                         mastersheet_path = None
-                        for root, dirs, files in os.walk(temp_extract_dir):
-                            for file in files:
-                                if "mastersheet" in file.lower() and file.endswith(
-                                    ".xlsx"
-                                ):
-                                    mastersheet_path = os.path.join(root, file)
-                                    print(
-                                        f"✅ Found BN mastersheet: {mastersheet_path}"
-                                    )
-                                    break
-                            if mastersheet_path:
-                                break
+                        if mastersheet_member:
+                            mastersheet_path = extract_member(
+                                original_zip_path,
+                                mastersheet_member,
+                                os.path.join(
+                                    temp_extract_dir,
+                                    os.path.basename(mastersheet_member),
+                                ),
+                            )
+                            print(f"✅ Extracted {mastersheet_member} to: {temp_extract_dir}")
                         if not mastersheet_path:
                             print(f"❌ No BN mastersheet found in ZIP")
                         else:
@@ -4707,8 +4159,11 @@ def process_carryover_results(
                                 print(f"📦 Creating updated BN ZIP: {updated_zip_name}")
 
                                 # CRITICAL FIX 2: Use new robust ZIP creation function
-                                zip_success = create_updated_zip_from_directory(
-                                    temp_extract_dir, updated_zip_path
+                                zip_success = create_updated_zip(
+                                    original_zip_path,
+                                    mastersheet_member,
+                                    mastersheet_path,
+                                    updated_zip_path,
                                 )
 
                                 if zip_success:
@@ -4726,8 +4181,11 @@ def process_carryover_results(
                                     f"❌ BN Mastersheet update had some errors, but continuing"
                                 )
                                 # Even if update had errors, try to create the ZIP anyway
-                                zip_success = create_updated_zip_from_directory(
-                                    temp_extract_dir, updated_zip_path
+                                zip_success = create_updated_zip(
+                                    original_zip_path,
+                                    mastersheet_member,
+                                    mastersheet_path,
+                                    updated_zip_path,
                                 )
 
                     except Exception as e:
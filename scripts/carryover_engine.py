@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+carryover_engine.py
+
+The carryover steps the ND, BN and BM processors have in common, written
+once and parameterised by a ProgramProfile.
+
+nd_carryover_processor.py, bn_carryover_processor.py and
+bm_carryover_processor.py each carried their own copy of the grade-point
+scale, the CGPA arithmetic, the loading of previous-semester GPAs, the
+CGPA_SUMMARY data collection and the CARRYOVER_mastersheet layout. The
+copies had drifted apart only in data: semester keys, grading scale,
+whether a weak GPA means PROBATION or RESIT, the mastersheet colours. That
+data now lives in each processor's profile, and the processors keep thin
+wrappers with their old signatures that call in here, so a fix or a speed-up
+lands for all three programmes at once.
+
+What differs by more than data stays in the processors and reaches the
+engine as arguments: how a semester sheet is found and parsed, the
+programme's CGPA_SUMMARY styling, ND's extra mastersheet formatting.
+
+The engine keeps the processors' print-based reporting.
+"""
+
+import os
+import traceback
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from student_block import read_student_block
+
+DEFAULT_PASS_THRESHOLD = 50.0
+DEFAULT_LOGO_PATH = os.path.join(os.path.dirname(__file__), "logo.png")
+
+# Credits assumed for a previous semester whose sheet gives none
+DEFAULT_SEMESTER_CREDITS = 30
+
+# First student row of a CARRYOVER_mastersheet; rows 5-7 hold the headings
+CARRYOVER_FIRST_ROW = 8
+
+# code:                "ND", "BN" or "BM"
+# program_name:        programme name as the result headings print it
+# semester_keys:       standard semester keys, in programme order
+# grade_bands:         (minimum score, grade point) from the top band down
+# probation:           True if failures with a GPA under 2.0 are PROBATION, not RESIT
+# output_label:        prefix of the carryover mastersheet's file name and summary
+# colors:              CarryoverColors of the carryover mastersheet
+# signatories:         (left, right) rows printed under the carryover summary
+# previous_gpa_field:  carryover record key of a previous semester's GPA, formatted
+#                      with number (1 for the first semester) and semester (its display name)
+ProgramProfile = namedtuple(
+    "ProgramProfile",
+    [
+        "code",
+        "program_name",
+        "semester_keys",
+        "grade_bands",
+        "probation",
+        "output_label",
+        "colors",
+        "signatories",
+        "previous_gpa_field",
+    ],
+)
+
+# heading: fill of the S/N, EXAM NUMBER and NAME headings
+# courses: fills cycled over the course column pairs
+# failed:  fill of an original score below the pass mark
+# passed:  fill of a resit score at or above the pass mark
+CarryoverColors = namedtuple("CarryoverColors", ["heading", "courses", "failed", "passed"])
+
+# ncols:     number of heading columns
+# previous:  number of previous-semester GPA columns, from column 4
+# end_row:   row after the last student
+CarryoverLayout = namedtuple("CarryoverLayout", ["ncols", "previous", "end_row"])
+
+THIN_BORDER = Border(
+    left=Side(style="thin"),
+    right=Side(style="thin"),
+    top=Side(style="thin"),
+    bottom=Side(style="thin"),
+)
+
+
+def _solid(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+def _label(profile, text):
+    return f"{profile.output_label} {text}" if profile.output_label else text
+
+
+# ----------------------------
+# Grades, CGPA and remarks
+# ----------------------------
+def grade_point(score, bands):
+    """Grade point of one score on the scale ``bands``; non-numbers get 0."""
+    try:
+        score = float(score)
+    except (ValueError, TypeError):
+        return 0.0
+    for minimum, points in bands:
+        if score >= minimum:
+            return points
+    return 0.0
+
+
+def previous_semesters(profile, semester_key):
+    """Standard keys of the semesters before ``semester_key``, or [] if it is not one of the profile's."""
+    if semester_key not in profile.semester_keys:
+        return []
+    return list(profile.semester_keys[: profile.semester_keys.index(semester_key)])
+
+
+def exam_key(value):
+    """The form exam numbers are keyed by: stripped and upper-cased."""
+    return str(value).strip().upper()
+
+
+def calculate_cgpa(profile, student_data, current_gpa, current_credits):
+    """Credit-weighted CGPA over the previous semesters' GPAs and the current one."""
+    scale = f"{profile.grade_bands[0][1]} scale"
+    if not student_data or not student_data.get("gpas"):
+        print(f"⚠️ No previous {profile.code} GPA data, using current GPA: {current_gpa}")
+        return current_gpa
+
+    total_grade_points = 0.0
+    total_credits = 0
+    print(
+        f"🔢 Calculating {profile.code} CGPA from {len(student_data['gpas'])} previous semesters ({scale})"
+    )
+    for prev_gpa, prev_credits in zip(student_data["gpas"], student_data["credits"]):
+        total_grade_points += prev_gpa * prev_credits
+        total_credits += prev_credits
+        print(
+            f" - GPA: {prev_gpa}, Credits: {prev_credits}, Running Total: {total_grade_points}/{total_credits}"
+        )
+
+    total_grade_points += current_gpa * current_credits
+    total_credits += current_credits
+    print(f"📊 Final {profile.code} calculation: {total_grade_points} / {total_credits}")
+
+    if total_credits > 0:
+        cgpa = round(total_grade_points / total_credits, 2)
+        print(f"✅ Calculated {profile.code} CGPA ({scale}): {cgpa}")
+        return cgpa
+    print(f"⚠️ No {profile.code} credits, returning current GPA: {current_gpa}")
+    return current_gpa
+
+
+def student_remarks(profile, cu_passed, cu_failed, total_credits, gpa, student_had_carryover_update=False):
+    """
+    PASSED with no failed credits, WITHDRAW with under 45% of the credits
+    passed, otherwise RESIT; PROBATION instead of RESIT below a 2.0 GPA for
+    programmes that use it.
+    """
+    passed_percent = cu_passed / total_credits if total_credits > 0 else 0
+
+    # No failures left overrides any earlier withdrawn status
+    if cu_failed == 0:
+        if student_had_carryover_update:
+            print(f"  ✅ CARRYOVER STUDENT NOW PASSED: 0 failures, GPA: {gpa}")
+        return "PASSED"
+
+    if passed_percent < 0.45:
+        if student_had_carryover_update:
+            print(f"  ⚠️ CARRYOVER STUDENT STILL WITHDRAWN: passed only {passed_percent*100:.1f}%")
+        return "WITHDRAW"
+
+    remarks = "PROBATION" if profile.probation and gpa < 2.0 else "RESIT"
+    if student_had_carryover_update:
+        print(f"  📝 CARRYOVER STUDENT {remarks}: GPA: {gpa}, {cu_failed} CU failed")
+    return remarks
+
+
+def generate_remarks(resit_courses):
+    """Remarks of a carryover record: how many of its resit courses were passed."""
+    passed_count = sum(
+        1
+        for course_data in resit_courses.values()
+        if course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD
+    )
+    total_count = len(resit_courses)
+    if passed_count == total_count:
+        return "All courses passed in resit"
+    elif passed_count > 0:
+        return f"{passed_count}/{total_count} courses passed in resit"
+    else:
+        return "No improvement in resit"
+
+
+# ----------------------------
+# Previous semesters
+# ----------------------------
+def _gpa_and_credit_columns(columns):
+    gpa_col = None
+    total_col = None
+    fallback_col = None
+    for col in columns:
+        col_str = str(col).upper()
+        if "GPA" in col_str and "CGPA" not in col_str:
+            gpa_col = col
+        if "TCPE" in col_str or "TOTAL CREDIT" in col_str or "TOTAL UNIT" in col_str:
+            total_col = col
+        elif "CU PASSED" in col_str or "CREDIT" in col_str or "UNIT" in col_str:
+            fallback_col = col
+    # Total attempted credits weight the CGPA correctly; credits passed are a fallback
+    return gpa_col, total_col if total_col is not None else fallback_col
+
+
+def load_previous_gpas(profile, mastersheet_path, semester_key, match_sheet, read_sheet):
+    """
+    {exam number: {"gpas": [...], "credits": [...]}} over the semesters
+    before the standard key ``semester_key``, keyed by exam_key.
+
+    ``match_sheet(xl, key)`` names a semester's sheet of the open
+    pd.ExcelFile ``xl`` and ``read_sheet(xl, sheet_name)`` parses it, returning (DataFrame, exam number column) or (None, None).
+    Each sheet is parsed once and its rows are taken as whole columns.
+    """
+    all_student_data = {}
+    semesters_to_load = previous_semesters(profile, semester_key)
+    print(f"📊 Loading previous {profile.code} GPAs for {semester_key}: {semesters_to_load}")
+    if not semesters_to_load:
+        return all_student_data
+    if not os.path.exists(mastersheet_path):
+        print(f"❌ {profile.code} Mastersheet not found: {mastersheet_path}")
+        return {}
+    try:
+        xl = pd.ExcelFile(mastersheet_path)
+        print(f"📖 Available sheets in {profile.code} mastersheet: {xl.sheet_names}")
+    except Exception as e:
+        print(f"❌ Error opening {profile.code} mastersheet: {e}")
+        return {}
+
+    with xl:
+        for semester in semesters_to_load:
+            try:
+                sheet_name = match_sheet(xl, semester)
+                if not sheet_name:
+                    print(f"⚠️ Skipping {profile.code} semester {semester} - no matching sheet found")
+                    continue
+                print(f"📖 Reading {profile.code} sheet '{sheet_name}' for semester {semester}")
+                df, exam_col = read_sheet(xl, sheet_name)
+                if df is None or df.empty or exam_col is None:
+                    print(f"⚠️ Could not read {profile.code} sheet '{sheet_name}'")
+                    continue
+
+                gpa_col, credit_col = _gpa_and_credit_columns(df.columns)
+                print(f"🔍 Columns found - Exam: {exam_col}, GPA: {gpa_col}, Credits: {credit_col}")
+                if not gpa_col:
+                    print(
+                        f"⚠️ Missing required columns in {profile.code} {sheet_name}: exam_col={exam_col}, gpa_col={gpa_col}"
+                    )
+                    continue
+
+                exams = df[exam_col].map(exam_key)
+                gpas = pd.to_numeric(df[gpa_col], errors="coerce")
+                if credit_col is not None:
+                    credits = pd.to_numeric(df[credit_col], errors="coerce")
+                    credits = credits.where(np.isfinite(credits), DEFAULT_SEMESTER_CREDITS)
+                else:
+                    credits = pd.Series(DEFAULT_SEMESTER_CREDITS, index=df.index)
+                keep = gpas.notna() & ~exams.isin(("", "NAN", "NONE", "SUMMARY"))
+
+                loaded = 0
+                for exam_no, gpa, credit in zip(exams[keep], gpas[keep], credits[keep]):
+                    record = all_student_data.setdefault(exam_no, {"gpas": [], "credits": []})
+                    record["gpas"].append(float(gpa))
+                    record["credits"].append(int(credit))
+                    loaded += 1
+                    if loaded <= 3:
+                        print(f"📊 Loaded {profile.code} GPA for {exam_no}: {gpa} with {int(credit)} credits")
+                print(f"✅ Loaded {loaded} student records from {sheet_name}")
+            except Exception as e:
+                print(f"⚠️ Could not load data from {profile.code} {semester}: {e}")
+                traceback.print_exc()
+
+    print(f"📊 Loaded cumulative {profile.code} data for {len(all_student_data)} students")
+    return all_student_data
+
+
+# ----------------------------
+# CGPA_SUMMARY data
+# ----------------------------
+def _number(value):
+    return float(value) if value else 0
+
+
+def collect_semester_records(profile, wb, match_sheet, find_structure):
+    """
+    Read every semester sheet of ``wb`` once for the CGPA summary.
+
+    Returns (semester_data, withdrawn): semester_data maps each semester key
+    found to {exam number: {"name", "gpa", "credits", "remarks",
+    "withdrawn"}}, and withdrawn is the set of exam numbers whose remarks say
+    WITHDRAW in any semester. A student withdrawn in one semester is marked
+    withdrawn in all of them.
+    """
+    withdrawn = set()
+    semester_data = {}
+    for key in profile.semester_keys:
+        sheet_name = match_sheet(wb.sheetnames, key)
+        if not sheet_name:
+            continue
+        ws = wb[sheet_name]
+        header_row, headers = find_structure(ws)
+        if not header_row:
+            continue
+
+        exam_col = headers.get("EXAM NUMBER") or headers.get("EXAMS NUMBER")
+        name_col = headers.get("NAME")
+        gpa_col = headers.get("GPA")
+        credits_col = headers.get("TCPE")
+        remarks_col = headers.get("REMARKS")
+        if not exam_col:
+            continue
+
+        columns = [col for col in (exam_col, name_col, gpa_col, credits_col, remarks_col) if col]
+        block = read_student_block(ws, header_row, exam_col, ncols=max(columns))
+        values = block.values
+
+        if remarks_col:
+            remarks = values[remarks_col].fillna("").astype(str).str.upper()
+            withdrawn.update(
+                exam_key(exam_no) for exam_no in values.loc[remarks.str.contains("WITHDRAW"), exam_col]
+            )
+        if not (name_col and gpa_col):
+            continue
+
+        data = {}
+        for row in values.itertuples(index=False, name=None):
+            try:
+                data[exam_key(row[exam_col - 1])] = {
+                    "name": row[name_col - 1],
+                    "gpa": _number(row[gpa_col - 1]),
+                    "credits": _number(row[credits_col - 1]) if credits_col else 0,
+                    "remarks": row[remarks_col - 1] if remarks_col else "",
+                }
+            except (ValueError, TypeError):
+                continue
+        semester_data[key] = data
+        print(f" ✅ Collected data for {len(data)} students in {key}")
+
+    for data in semester_data.values():
+        for exam_no, record in data.items():
+            record["withdrawn"] = exam_no in withdrawn
+    print(f" ✅ Found {len(withdrawn)} withdrawn {profile.code} students")
+    return semester_data, withdrawn
+
+
+# ----------------------------
+# CARRYOVER_mastersheet
+# ----------------------------
+def carryover_courses(carryover_data):
+    """Sorted codes of every course resat by the students of ``carryover_data``."""
+    courses = set()
+    for student in carryover_data:
+        courses.update(student["RESIT_COURSES"].keys())
+    return sorted(courses)
+
+
+def generate_carryover_mastersheet(
+    profile,
+    carryover_data,
+    output_dir,
+    semester_key,
+    timestamp,
+    display_info,
+    previous_display,
+    course_titles,
+    course_units,
+    finish=None,
+):
+    """
+    Write the programme's CARRYOVER_mastersheet and return its path.
+
+    ``display_info`` is get_semester_display_info(semester_key),
+    ``previous_display`` the display names of the previous semesters, and
+    ``course_titles`` / ``course_units`` give the title and credit units of
+    every course in carryover_courses(carryover_data). ``finish(ws, layout)``
+    may restyle the sheet, given a CarryoverLayout, before it is saved.
+    """
+    colors = profile.colors
+    wb = Workbook()
+    ws = wb.active
+    ws.title = f"{profile.code}_CARRYOVER_RESULTS"
+    if os.path.exists(DEFAULT_LOGO_PATH):
+        try:
+            from openpyxl.drawing.image import Image
+
+            img = Image(DEFAULT_LOGO_PATH)
+            img.width = 80
+            img.height = 80
+            ws.add_image(img, "A1")
+        except Exception as e:
+            print(f"⚠️ Could not add logo: {e}")
+    current_year = 2025
+    next_year = 2026
+    year, sem_num, level, sem_display, set_code, current_semester_name = display_info
+    courses = carryover_courses(carryover_data)
+
+    code_row = ["S/N", "EXAM NUMBER", "NAME"]
+    code_row.extend(f"GPA {prev_sem}" for prev_sem in previous_display)
+    for course in courses:
+        code_row.extend([f"{course}", f"{course}_RESIT"])
+    code_row.extend([f"GPA {current_semester_name}", "CGPA", "REMARKS"])
+    ncols = len(code_row)
+    last_column = get_column_letter(ncols)
+
+    ws.merge_cells(f"A3:{last_column}3")
+    title_cell = ws["A3"]
+    title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA-ABUJA"
+    title_cell.font = Font(bold=True, size=14)
+    title_cell.alignment = Alignment(horizontal="center", vertical="center")
+    ws.merge_cells(f"A4:{last_column}4")
+    subtitle_cell = ws["A4"]
+    subtitle_cell.value = f"RESIT - {current_year}/{next_year} SESSION {profile.program_name} {level} {sem_display} EXAMINATIONS RESULT — {datetime.now().strftime('%B %d, %Y')}"
+    subtitle_cell.font = Font(bold=True, size=12)
+    subtitle_cell.alignment = Alignment(horizontal="center", vertical="center")
+    print(f"🔍 {_label(profile, 'Courses')} found in resit data: {courses}")
+    print(
+        f"📊 {_label(profile, 'GPA')} columns for {semester_key}: Previous={previous_display}, Current={current_semester_name}"
+    )
+
+    # Course title, credit unit and code rows (sheet rows 5-7)
+    blanks = [""] * (3 + len(previous_display))
+    title_row = list(blanks)
+    credit_row = list(blanks)
+    for course in courses:
+        course_title = course_titles[course]
+        if len(course_title) > 30:
+            course_title = course_title[:27] + "..."
+        title_row.extend([course_title, course_title])
+        credit_row.extend([f"CU: {course_units[course]}"] * 2)
+    title_row.extend(["", "", ""])
+    credit_row.extend(["", "", ""])
+    ws.append(title_row)
+    ws.append(credit_row)
+    ws.append(code_row)
+
+    course_fills = [_solid(color) for color in colors.courses]
+    first_course_col = 4 + len(previous_display)
+    for idx, course in enumerate(courses):
+        col = first_course_col + 2 * idx
+        for row in (5, 6, 7):
+            for offset in (0, 1):
+                cell = ws.cell(row=row, column=col + offset)
+                cell.fill = course_fills[idx % len(course_fills)]
+                cell.font = Font(bold=True)
+                cell.alignment = Alignment(horizontal="center", vertical="center")
+                cell.border = THIN_BORDER
+        for offset in (0, 1):
+            cell = ws.cell(row=5, column=col + offset)
+            cell.alignment = Alignment(text_rotation=90, horizontal="center", vertical="center")
+            cell.font = Font(bold=True, size=9)
+    heading_fill = _solid(colors.heading)
+    for row in (5, 6, 7):
+        for col in range(1, 4):
+            cell = ws.cell(row=row, column=col)
+            cell.fill = heading_fill
+            cell.font = Font(color="FFFFFF", bold=True)
+            cell.alignment = Alignment(horizontal="center", vertical="center")
+            cell.border = THIN_BORDER
+
+    # Student rows, numbered 1..n in carryover_data order
+    failed_fill = _solid(colors.failed)
+    passed_fill = _solid(colors.passed)
+    retry_fill = _solid("FFD580")
+    failed_counts = {course: 0 for course in courses}
+    row_idx = CARRYOVER_FIRST_ROW
+    for serial_number, student in enumerate(carryover_data, start=1):
+        ws.cell(row=row_idx, column=1, value=serial_number)
+        ws.cell(row=row_idx, column=2, value=student["EXAM NUMBER"])
+        ws.cell(row=row_idx, column=3, value=student["NAME"])
+        for i, prev_sem in enumerate(previous_display):
+            field = profile.previous_gpa_field.format(number=i + 1, semester=prev_sem)
+            ws.cell(row=row_idx, column=4 + i, value=student.get(field, ""))
+
+        resits = student["RESIT_COURSES"]
+        for idx, course in enumerate(courses):
+            col = first_course_col + 2 * idx
+            for offset in (0, 1):
+                ws.cell(row=row_idx, column=col + offset).fill = course_fills[idx % len(course_fills)]
+            if course not in resits:
+                ws.cell(row=row_idx, column=col, value="")
+                ws.cell(row=row_idx, column=col + 1, value="")
+                continue
+            course_data = resits[course]
+            orig_cell = ws.cell(row=row_idx, column=col, value=course_data["original_score"])
+            if course_data["original_score"] < DEFAULT_PASS_THRESHOLD:
+                orig_cell.fill = failed_fill
+            resit_cell = ws.cell(row=row_idx, column=col + 1, value=course_data["resit_score"])
+            if course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD:
+                resit_cell.fill = passed_fill
+            else:
+                resit_cell.fill = retry_fill
+                failed_counts[course] += 1
+
+        result_col = first_course_col + 2 * len(courses)
+        ws.cell(row=row_idx, column=result_col, value=student["CURRENT_GPA"])
+        ws.cell(row=row_idx, column=result_col + 1, value=student["CURRENT_CGPA"])
+        ws.cell(row=row_idx, column=result_col + 2, value=generate_remarks(resits))
+        row_idx += 1
+
+    # Failed count row
+    failed_row_idx = row_idx
+    count_fill = _solid("FFFF99")
+    ws.cell(row=failed_row_idx, column=1, value="FAILED COUNT BY COURSE:").font = Font(bold=True)
+    for col in range(1, ncols + 1):
+        ws.cell(row=failed_row_idx, column=col).fill = count_fill
+    for idx, course in enumerate(courses):
+        count_cell = ws.cell(
+            row=failed_row_idx, column=first_course_col + 2 * idx + 1, value=failed_counts[course]
+        )
+        count_cell.font = Font(bold=True)
+        count_cell.fill = count_fill
+
+    # Summary section
+    summary_start_row = failed_row_idx + 2
+    total_students = len(carryover_data)
+    passed_all = sum(
+        1
+        for student in carryover_data
+        if all(
+            course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD
+            for course_data in student["RESIT_COURSES"].values()
+        )
+    )
+    summary_data = [
+        [_label(profile, "CARRYOVER SUMMARY")],
+        [f"A total of {total_students} students registered and sat for the Carryover Examination"],
+        [f"A total of {passed_all} students passed all carryover courses"],
+        [
+            f"A total of {total_students - passed_all} students failed one or more carryover courses and must repeat them"
+        ],
+        [f"Total failed resit attempts: {sum(failed_counts.values())} across all courses"],
+        [
+            f"{_label(profile, 'Carryover')} processing completed on {datetime.now().strftime('%B %d, %Y at %H:%M:%S')}"
+        ],
+    ]
+    summary_data.extend(list(row) for row in profile.signatories)
+    for i, row_data in enumerate(summary_data):
+        row_num = summary_start_row + i
+        if len(row_data) == 1:
+            if row_data[0]:
+                ws.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=10)
+                cell = ws.cell(row=row_num, column=1, value=row_data[0])
+                if i == 0:
+                    cell.font = Font(bold=True, size=12, underline="single")
+                else:
+                    cell.font = Font(bold=False, size=11)
+                cell.alignment = Alignment(horizontal="left", vertical="center")
+        elif len(row_data) == 2:
+            left_cell = ws.cell(row=row_num, column=1, value=row_data[0])
+            right_cell = ws.cell(row=row_num, column=4, value=row_data[1])
+            # The last rows hold the signature lines and names
+            if i >= len(summary_data) - 3:
+                left_cell.alignment = Alignment(horizontal="left")
+                right_cell.alignment = Alignment(horizontal="left")
+                left_cell.font = Font(bold=True, size=11)
+                right_cell.font = Font(bold=True, size=11)
+
+    for row in ws.iter_rows(min_row=7, max_row=row_idx - 1, min_col=1, max_col=ncols):
+        for cell in row:
+            cell.border = THIN_BORDER
+    ws.freeze_panes = "D8"
+    ws.column_dimensions["A"].width = 8  # S/N
+    ws.column_dimensions["B"].width = 18  # EXAM NUMBER
+    ws.column_dimensions["C"].width = 35  # NAME
+    for col in range(4, first_course_col):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+    for col in range(first_course_col, ncols - 2):
+        ws.column_dimensions[get_column_letter(col)].width = 12
+    for col in range(ncols - 2, ncols + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+
+    if finish is not None:
+        finish(ws, CarryoverLayout(ncols, len(previous_display), row_idx))
+
+    prefix = f"{profile.output_label}_" if profile.output_label else ""
+    filepath = os.path.join(output_dir, f"{prefix}CARRYOVER_mastersheet_{timestamp}.xlsx")
+    wb.save(filepath)
+    wb.close()
+    print(f"✅ {_label(profile, 'CARRYOVER')} mastersheet generated: {filepath}")
+    return filepath
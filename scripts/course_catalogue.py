@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+course_catalogue.py
+
+Cached course-catalogue loader shared by the regular and carryover processors.
+
+Every processor turns its program's course-code-creditUnit workbook into a
+handful of lookup dictionaries (course maps, credit units, titles, semester
+lookups). load_catalogue reads all sheets of the workbook in one open, hands
+them to the processor's own builder function and caches what it returns:
+
+  * in memory for the rest of the process, and
+  * on disk in a .catalogue_cache folder next to the workbook, so the
+    separate processes the launcher spawns reuse one parse.
+
+An entry is reused while the workbook's mtime/size are unchanged, or - after
+a copy or touch - while its SHA-256 still matches. The lookups handed out
+are read-only (FrozenDict); call .copy() for a mutable dict.
+"""
+
+import os
+import pickle
+
+import pandas as pd
+
+from input_cache import file_sha256
+
+CACHE_DIRNAME = ".catalogue_cache"
+CACHE_FORMAT = 1
+
+# (namespace, absolute path) -> ((mtime_ns, size), frozen result)
+_MEMORY_CACHE = {}
+
+
+class FrozenDict(dict):
+    """A dict that refuses in-place changes, so a cached catalogue stays intact."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("course catalogue lookups are read-only; use .copy()")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def copy(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _disk_entry(course_file, namespace):
+    name = f"{namespace}-{os.path.basename(course_file)}.pkl".replace(os.sep, "_")
+    return os.path.join(os.path.dirname(course_file), CACHE_DIRNAME, name)
+
+
+def _read_disk(entry, stamp, course_file):
+    """Return (data, still_fresh_stamp) from a disk entry, or (None, False)."""
+    try:
+        with open(entry, "rb") as f:
+            payload = pickle.load(f)
+    except Exception:
+        return None, False
+    if payload.get("format") != CACHE_FORMAT:
+        return None, False
+    if payload.get("stamp") == stamp:
+        return payload["data"], True
+    if payload.get("sha256") == file_sha256(course_file):
+        return payload["data"], False
+    return None, False
+
+
+def _write_disk(entry, stamp, course_file, data):
+    tmp = f"{entry}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        payload = {
+            "format": CACHE_FORMAT,
+            "stamp": stamp,
+            "sha256": file_sha256(course_file),
+            "data": data,
+        }
+        with open(tmp, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, entry)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_course_sheets(course_file):
+    """Read every sheet of a course workbook (header row 0) in one open."""
+    return pd.read_excel(course_file, sheet_name=None, engine="openpyxl", header=0)
+
+
+def load_catalogue(course_file, namespace, builder):
+    """
+    Return ``builder(sheets)`` for ``course_file``, cached in memory and on disk.
+
+    ``namespace`` names the builder (include a version, e.g. "nd-regular-v1",
+    and bump it when the builder changes). ``sheets`` is the
+    {sheet name: DataFrame} dict from read_course_sheets. Exceptions raised by
+    the builder propagate and nothing is cached.
+    """
+    course_file = os.path.abspath(course_file)
+    stamp = _stamp(course_file)
+    memory_key = (namespace, course_file)
+
+    cached = _MEMORY_CACHE.get(memory_key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    entry = _disk_entry(course_file, namespace)
+    data, fresh = _read_disk(entry, stamp, course_file)
+    if data is None:
+        data = builder(read_course_sheets(course_file))
+        _write_disk(entry, stamp, course_file, data)
+    elif not fresh:
+        # Same content under a new mtime - refresh the stamp
+        _write_disk(entry, stamp, course_file, data)
+
+    frozen = freeze(data)
+    _MEMORY_CACHE[memory_key] = (stamp, frozen)
+    return frozen
+
+
+def clear_catalogue_cache():
+    """Forget the in-memory catalogues (disk entries are left in place)."""
+    _MEMORY_CACHE.clear()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+course_matcher.py
+
+Indexed course-header matcher shared by the ND and BN regular processors.
+
+A CourseMatcher is built once per semester course map (the output of
+load_course_data) and holds a code index, the normalised-title index and an
+inverted word index. Each matcher keeps an LRU cache of its header -> course
+decisions, keyed by the header alone, so a header seen in one CA/OBJ/EXAM
+sheet is not matched again in the next sheet, file or semester that uses the
+same course map. A changed catalogue gives a new course map and so a new
+matcher with an empty cache.
+"""
+
+import difflib
+import re
+from collections import OrderedDict, defaultdict
+
+# Header -> course decisions kept per matcher.
+MATCH_CACHE_SIZE = 4096
+_NO_MATCH = object()
+
+# One matcher per course map object and configuration, keyed by id(course_map)
+# so a lookup does not walk the map; the entry keeps the map alive.
+_MATCHERS = {}
+
+
+class CourseMatcher:
+    """
+    Match raw sheet headers (course codes or titles) to entries of a
+    ``{normalised title: course info}`` map.
+
+    The decision order is the processors' original one: course code (when
+    ``match_codes``), exact normalised title, containment, word overlap
+    (with a +2 bonus per shared key word, needing a score of 2), and finally
+    a difflib ratio above 0.6.
+    """
+
+    def __init__(self, course_map, normalize, key_words=(), match_codes=False):
+        self.course_map = course_map
+        self.normalize = normalize
+        self.key_words = frozenset(key_words)
+        self.match_codes = match_codes
+        self.titles = list(course_map.keys())
+        self.fingerprint = course_map_fingerprint(
+            course_map, normalize, key_words, match_codes
+        )
+        # header -> matched title (or None), least recently used first
+        self._matches = OrderedDict()
+
+        # Code index: lower-cased code -> title (later titles win, as before)
+        self.code_index = {}
+        if match_codes:
+            for title, info in course_map.items():
+                self.code_index[info["code"].lower()] = title
+
+        # Inverted word index: word -> positions of titles containing it
+        self.title_words = [set(title.split()) for title in self.titles]
+        self.word_index = defaultdict(list)
+        for pos, words in enumerate(self.title_words):
+            for word in words:
+                self.word_index[word].append(pos)
+
+    def match(self, header):
+        """Return the course info for ``header`` or None when nothing matches."""
+        if not isinstance(header, str):
+            return None
+
+        title = self._matches.get(header, _NO_MATCH)
+        if title is _NO_MATCH:
+            title = self._decide(header)
+            self._matches[header] = title
+            if len(self._matches) > MATCH_CACHE_SIZE:
+                self._matches.popitem(last=False)
+        else:
+            self._matches.move_to_end(header)
+
+        return self.course_map[title] if title is not None else None
+
+    def clear(self):
+        """Forget the cached header decisions."""
+        self._matches.clear()
+
+    def _decide(self, header):
+        """Run the matching cascade and return the matched title (or None)."""
+        normalized = self.normalize(header)
+
+        if self.match_codes:
+            # Headers like 'NUR221' or 'NUR221_CA' carry the code up front
+            if " " in normalized:
+                potential_code = normalized.split(" ")[0]
+            elif "_" in normalized:
+                potential_code = normalized.split("_")[0]
+            else:
+                potential_code = normalized
+            potential_code = re.sub(r"[^a-z0-9]", "", potential_code)
+            if potential_code in self.code_index:
+                return self.code_index[potential_code]
+
+        if normalized in self.course_map:
+            return normalized
+
+        for title in self.titles:
+            if title in normalized or normalized in title:
+                return title
+
+        # Word overlap, only over titles sharing at least one word
+        column_words = set(normalized.split())
+        common_counts = defaultdict(int)
+        for word in column_words:
+            for pos in self.word_index.get(word, ()):
+                common_counts[pos] += 1
+
+        best_pos = None
+        best_score = 0
+        for pos in sorted(common_counts):
+            score = common_counts[pos] + 2 * len(
+                column_words & self.key_words & self.title_words[pos]
+            )
+            if score > best_score:
+                best_score = score
+                best_pos = pos
+        if best_pos is not None and best_score >= 2:
+            return self.titles[best_pos]
+
+        return self._fuzzy_match(normalized, common_counts)
+
+    def _fuzzy_match(self, normalized, candidates):
+        """
+        difflib fallback. The word-index candidates are scored first; any other
+        title is only scored when difflib's cheap upper bounds say it could
+        still beat them, so the result is the same as a full scan.
+        """
+        ratios = {}
+        for pos in candidates:
+            ratios[pos] = difflib.SequenceMatcher(
+                None, normalized, self.titles[pos]
+            ).ratio()
+        floor = max(ratios.values(), default=0.0)
+
+        def could_win(bound):
+            return bound > 0.6 and bound >= floor
+
+        best_pos = None
+        best_ratio = 0
+        for pos, title in enumerate(self.titles):
+            ratio = ratios.get(pos)
+            if ratio is None:
+                matcher = difflib.SequenceMatcher(None, normalized, title)
+                if not could_win(matcher.real_quick_ratio()):
+                    continue
+                if not could_win(matcher.quick_ratio()):
+                    continue
+                ratio = matcher.ratio()
+            if ratio > best_ratio and ratio > 0.6:
+                best_ratio = ratio
+                best_pos = pos
+
+        return self.titles[best_pos] if best_pos is not None else None
+
+
+def course_map_fingerprint(course_map, normalize, key_words=(), match_codes=False):
+    """Hashable identity of a course map plus the matching configuration."""
+    return (
+        tuple((title, info["code"]) for title, info in course_map.items()),
+        normalize,
+        tuple(key_words),
+        match_codes,
+    )
+
+
+def get_course_matcher(course_map, normalize, key_words=(), match_codes=False):
+    """
+    Return the CourseMatcher for ``course_map``, building it on first use.
+
+    Lookups cost the same whatever the size of the map; the fingerprint is
+    only computed when a matcher is built.
+    """
+    key = (id(course_map), normalize, tuple(key_words), match_codes)
+    matcher = _MATCHERS.get(key)
+    if matcher is not None and matcher.course_map is course_map:
+        return matcher
+    matcher = CourseMatcher(course_map, normalize, key_words, match_codes)
+    # A reloaded catalogue replaces the matcher built for its earlier copy
+    for old_key, old in list(_MATCHERS.items()):
+        if old.fingerprint == matcher.fingerprint:
+            old.clear()
+            del _MATCHERS[old_key]
+    _MATCHERS[key] = matcher
+    return matcher
+
+
+def clear_match_cache():
+    """Forget every cached header decision and matcher."""
+    for matcher in _MATCHERS.values():
+        matcher.clear()
+    _MATCHERS.clear()
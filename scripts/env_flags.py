@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+env_flags.py
+
+On/off switches read from the environment.
+
+The processors and their helper modules are tuned through environment
+variables (MASTERSHEET_CHECKPOINT, PARSED_INPUT_CACHE, RESULT_EVENTS, ...).
+env_flag reads them all the same way, so "1", "true", "yes" and "on" turn a
+switch on and "0", "false", "no" and "off" turn it off everywhere.
+"""
+
+import os
+
+TRUE_VALUES = frozenset(("1", "true", "yes", "on"))
+FALSE_VALUES = frozenset(("0", "false", "no", "off"))
+
+
+def env_flag(name, default=False):
+    """
+    The switch ``name``: True or False when it is set to a recognised value
+    (case and surrounding spaces ignored), ``default`` when it is unset,
+    empty or anything else.
+    """
+    value = os.getenv(name, "").strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return default
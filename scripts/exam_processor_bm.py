@@ -12,7 +12,7 @@ FIXED VERSION with:
 
 from openpyxl.cell import MergedCell
 from openpyxl.drawing.image import Image as XLImage
-from openpyxl import load_workbook, Workbook
+from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 import os
@@ -36,26 +36,58 @@ import traceback
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.platypus import (
-    SimpleDocTemplate,
     Table,
     TableStyle,
     Paragraph,
     Spacer,
-    PageBreak,
     Image,
 )
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+
+from course_catalogue import load_catalogue
+from input_cache import ParsedInputCache, cache_enabled, course_workbooks_sha256
+from input_manifest import InputManifest, optional_file_sha256
+from pdf_shards import build_student_pdf, deferred_rendering
+from report_template import (
+    CENTER_ALIGN_STYLE,
+    HEADER_STYLE,
+    LEFT_ALIGN_STYLE,
+    MAIN_HEADER_STYLE,
+    REMARKS_STYLE,
+    SAMPLE_STYLES,
+    SIGNATURE_STYLE,
+    SUBTITLE_STYLE,
+    TITLE_STYLE,
+    Letterhead,
+)
+from run_log import configure_logging, log_event
+from score_engine import (
+    classify_by_failed_share,
+    compute_course_scores,
+    derive_semester_results,
+    round_exact,
+)
+from sheet_merge import merge_score_sheets, registrations, report_summary
+from sheet_styles import (
+    MEDIUM_BORDER,
+    THIN_BORDER,
+    alignment,
+    font,
+    solid_fill,
+    text_width,
+    with_classes,
+)
+from stage_pipeline import StagePipeline, queue_raw_prefetch
+from student_history import StudentHistory, program_histories
+from student_registry import StudentRegistry
+from workbook_io import RAW_SHEETS, WorkbookSession, forget_raw_sheets, load_raw_sheets
 
 # ----------------------------
 # BM-Specific Configuration
 # ----------------------------
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -102,6 +134,51 @@ BASE_DIR = get_base_directory()
 # BM directories under BM folder
 BM_BASE_DIR = os.path.join(BASE_DIR, "BM")
 BM_COURSES_DIR = os.path.join(BM_BASE_DIR, "BM-COURSES")
+# Bump when the raw-sheet reading/matching/merging changes, so stale
+# entries in the parsed-input cache are not reused
+BM_INPUT_CACHE_VERSION = 1
+# Course-catalogue cache namespace; bump when build_course_catalogue changes
+BM_CATALOGUE_NAMESPACE = "bm-regular-v1"
+# The run's mastersheet workbooks stay open here and are saved once per
+# semester (before the summary sheets re-read them), not once per sheet
+MASTERSHEET_SESSION = WorkbookSession()
+
+# Every saved semester also goes to the set's student_history.sqlite, so a run
+# that only processes later semesters knows earlier withdrawals and carryovers
+HISTORY_COLUMNS = {
+    "exam_number": "EXAMS NUMBER",
+    "name": "NAME",
+    "gpa": "GPA",
+    "cu_passed": "CU Passed",
+    "cu_failed": "CU Failed",
+    "remarks": "REMARKS",
+    "failed_courses": "FAILED COURSES",
+}
+
+
+def record_semester_history(output_dir, semester_key, mastersheet):
+    """Store a saved semester sheet in the set's student history."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return
+    try:
+        count = history.record_semester(semester_key, mastersheet, HISTORY_COLUMNS)
+        logger.info(f"📚 Stored {count} {semester_key} results in student history")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store {semester_key} in student history: {e}")
+
+
+def record_carryover_history(output_dir, semester_key, carryover_students):
+    """Store a semester's carryover list (even an empty one) in the student history."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return
+    try:
+        history.record_carryover(semester_key, carryover_students)
+    except Exception as e:
+        logger.warning(
+            f"⚠️ Could not store {semester_key} carryover in student history: {e}"
+        )
 
 # Ensure directories exist
 os.makedirs(BASE_DIR, exist_ok=True)
@@ -201,6 +278,9 @@ def process_uploaded_file(uploaded_file_path, base_dir_norm):
         if result is not None:
             logger.info(f"✅ Successfully processed uploaded file")
 
+            # Write the set's mastersheet before zipping
+            MASTERSHEET_SESSION.close()
+
             # Zip the results
             result_folder = os.path.join(clean_dir, f"{set_name}_RESULT-{ts}")
             if os.path.exists(result_folder):
@@ -383,10 +463,24 @@ def process_in_non_interactive_mode(params, base_dir_norm):
         set_output_dir = os.path.join(clean_dir, f"{bm_set}_RESULT-{ts}")
         os.makedirs(set_output_dir, exist_ok=True)
 
+        # Semesters whose inputs match the last run reuse that run's PDFs
+        INPUT_MANIFEST.open(os.path.dirname(clean_dir))
+        manifest_settings = {
+            "set": bm_set,
+            "pass_threshold": params["pass_threshold"],
+            "upgrade_min_threshold": upgrade_min_threshold,
+            "courses": course_workbooks_sha256(BM_COURSES_DIR),
+            "logo": optional_file_sha256(DEFAULT_LOGO_PATH),
+        }
+
         # Track semesters processed for this set
         semesters_processed = []
 
         # Process selected semesters
+        # Semesters are scored in order (each one's CGPA needs the last);
+        # raw workbooks are parsed and PDFs rendered in worker processes
+        pipeline = StagePipeline()
+        semester_stages = []
         for semester_key in semesters_to_process:
             if semester_key not in SEMESTER_ORDER:
                 logger.warning(f"⚠️ Skipping unknown semester: {semester_key}")
@@ -401,62 +495,110 @@ def process_in_non_interactive_mode(params, base_dir_norm):
                     break
 
             if semester_files_exist:
-                logger.info(f"\n🎯 Processing {semester_key} in {bm_set}...")
-                try:
-                    # Process the semester with the upgrade threshold
-                    result = process_semester_files(
-                        semester_key,
-                        raw_files,
-                        raw_dir,
-                        clean_dir,
-                        ts,
-                        params["pass_threshold"],
-                        semester_course_maps,
-                        semester_credit_units,
-                        semester_lookup,
-                        semester_course_titles,
-                        DEFAULT_LOGO_PATH,
-                        bm_set,
-                        previous_gpas=None,
-                        upgrade_min_threshold=upgrade_min_threshold,
+                logger.info(f"\n🎯 Queued {semester_key} in {bm_set}")
+                # Process the semester with the upgrade threshold
+                stage = pipeline.add(
+                    f"process:{semester_key}",
+                    process_semester_files,
+                    semester_key,
+                    raw_files,
+                    raw_dir,
+                    clean_dir,
+                    ts,
+                    params["pass_threshold"],
+                    semester_course_maps,
+                    semester_credit_units,
+                    semester_lookup,
+                    semester_course_titles,
+                    DEFAULT_LOGO_PATH,
+                    bm_set,
+                    previous_gpas=None,
+                    upgrade_min_threshold=upgrade_min_threshold,
+                    # Ordering only: a failed prefetch must not drop the semester,
+                    # which then reads its raw workbook in-process
+                    after=[
+                        *queue_semester_prefetch(pipeline, semester_key, raw_files, raw_dir),
+                        *([semester_stages[-1][1]] if semester_stages else []),
+                    ],
+                )
+                semester_stages.append((semester_key, stage))
+                INPUT_MANIFEST.note(
+                    semester_key,
+                    [
+                        os.path.join(raw_dir, rf)
+                        for rf in semester_raw_files(semester_key, raw_files)
+                    ],
+                    manifest_settings,
+                )
+                if INPUT_MANIFEST.unchanged(semester_key):
+                    logger.info(
+                        f"♻️ {semester_key} inputs unchanged since the last run; its PDF will be reused"
                     )
-
-                    if result is not None and result.get("success", False):
-                        logger.info(f"✅ Successfully processed {semester_key}")
-                        total_processed += 1
-                        semesters_processed.append(semester_key)
-                    else:
-                        logger.error(f"❌ Failed to process {semester_key}")
-
-                except Exception as e:
-                    logger.error(f"❌ Error processing {semester_key}: {e}")
-                    traceback.print_exc()
             else:
                 logger.warning(
                     f"⚠️ No files found for {semester_key} in {bm_set}, skipping..."
                 )
+        restore_withdrawals_from_history(clean_dir, [key for key, _ in semester_stages])
+        with deferred_rendering(pipeline):
+            pipeline.run()
+        forget_raw_sheets()
+        for semester_key, stage in semester_stages:
+            result = pipeline.results.get(stage)
+            if result is not None and result.get("success", False):
+                logger.info(f"✅ Successfully processed {semester_key}")
+                total_processed += 1
+                semesters_processed.append(semester_key)
+            elif stage in pipeline.errors:
+                logger.error(f"❌ Error processing {semester_key}: {pipeline.errors[stage]}")
+            else:
+                logger.error(f"❌ Failed to process {semester_key}")
+
+        # Write the set's mastersheet before zipping
+        MASTERSHEET_SESSION.close()
 
         # Only create ZIP if semesters were actually processed
         if semesters_processed:
             logger.info(
                 f"📦 Creating ZIP for {bm_set} ({len(semesters_processed)} semesters)"
             )
-            create_bm_zip_for_set(clean_dir, bm_set, ts, set_output_dir)
+            if create_bm_zip_for_set(clean_dir, bm_set, ts, set_output_dir):
+                zip_path = os.path.join(clean_dir, f"{bm_set}_RESULT-{ts}.zip")
+                recorded = INPUT_MANIFEST.commit(zip_path, set_output_dir)
+                if recorded:
+                    logger.info(f"📝 Input manifest updated for {len(recorded)} semester(s)")
+                log_event(
+                    logger,
+                    "set_processed",
+                    f"📦 {bm_set} results zipped: {zip_path}",
+                    program="BM",
+                    set=bm_set,
+                    semesters=semesters_processed,
+                    zip=zip_path,
+                )
         else:
             logger.warning(f"⚠️ No semesters processed for {bm_set}, skipping ZIP")
             if os.path.exists(set_output_dir):
                 shutil.rmtree(set_output_dir)
 
-    logger.info(f"\n📊 PROCESSING SUMMARY: {total_processed} semester(s) processed")
+    log_event(
+        logger,
+        "run_finished",
+        f"\n📊 PROCESSING SUMMARY: {total_processed} semester(s) processed",
+        program="BM",
+        semesters=total_processed,
+        students=len(STUDENTS),
+        withdrawn=len(STUDENTS.withdrawals),
+        carryover=STUDENTS.carryover_count(),
+    )
 
     # NEW: Print BM-specific summaries
     logger.info("\n📊 BM STUDENT TRACKING SUMMARY:")
-    logger.info("Total unique BM students tracked: {}".format(len(STUDENT_TRACKER)))
-    logger.info("Total BM withdrawn students: {}".format(len(WITHDRAWN_STUDENTS)))
+    logger.info("Total unique BM students tracked: {}".format(len(STUDENTS)))
+    logger.info("Total BM withdrawn students: {}".format(len(STUDENTS.withdrawals)))
 
-    if CARRYOVER_STUDENTS:
+    if STUDENTS.carryover:
         logger.info("\n📋 BM CARRYOVER STUDENT SUMMARY:")
-        logger.info("Total BM carryover students: {}".format(len(CARRYOVER_STUDENTS)))
+        logger.info("Total BM carryover students: {}".format(STUDENTS.carryover_count()))
 
     return total_processed > 0
 
@@ -524,10 +666,12 @@ SEMESTER_ORDER = [
     "M-THIRD-YEAR-SECOND-SEMESTER",
 ]
 
-# Global student tracker
-STUDENT_TRACKER = {}
-WITHDRAWN_STUDENTS = {}
-CARRYOVER_STUDENTS = {}  # New global carryover tracker for BM
+# Global student tracker (presence, withdrawals and carryover)
+STUDENTS = StudentRegistry(SEMESTER_ORDER)
+
+# What each semester's last result was built from; unchanged semesters reuse
+# their PDF from the last result ZIP instead of rendering it again
+INPUT_MANIFEST = InputManifest(SEMESTER_ORDER)
 
 # ----------------------------
 # NEW: CGPA SUMMARY SHEET FUNCTION
@@ -539,7 +683,7 @@ def create_bm_cgpa_summary_sheet(mastersheet_path, timestamp, set_name):
         logger.info("📊 Creating BM CGPA Summary Sheet...")
 
         # Load the mastersheet workbook
-        wb = load_workbook(mastersheet_path)
+        wb = MASTERSHEET_SESSION.open(mastersheet_path)
 
         # Collect GPA data from all BM semesters
         cgpa_data = {}
@@ -656,134 +800,100 @@ def create_bm_cgpa_summary_sheet(mastersheet_path, timestamp, set_name):
         # Create summary dataframe
         summary_df = pd.DataFrame(summary_data)
 
-        # Add the summary sheet to the workbook
-        if "CGPA_SUMMARY" in wb.sheetnames:
-            del wb["CGPA_SUMMARY"]
-
-        ws = wb.create_sheet("CGPA_SUMMARY")
-
         # Determine the number of columns needed to span the student data
         short_semesters = [semester_short_codes.get(sem, sem) for sem in SEMESTER_ORDER]
         headers = ["EXAMS NUMBER", "NAME"] + short_semesters + ["CGPA", "STATUS", "GRADUATED"]
         num_columns = len(headers)
+        last_letter = get_column_letter(num_columns)
 
-        # Create professional title - EXPANDED TO MATCH STUDENT HEADING WIDTH
-        title_row1 = 1
-        ws.merge_cells(f'A{title_row1}:{get_column_letter(num_columns)}{title_row1}')
-        title_cell1 = ws[f'A{title_row1}']
-        title_cell1.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA"
-        title_cell1.font = Font(bold=True, size=16, color="FFFFFF")
-        title_cell1.alignment = Alignment(horizontal="center", vertical="center")
-        title_cell1.fill = PatternFill(
-            start_color="1E90FF", end_color="1E90FF", fill_type="solid"
-        )
-
-        title_row2 = 2
-        ws.merge_cells(f'A{title_row2}:{get_column_letter(num_columns)}{title_row2}')
-        title_cell2 = ws[f'A{title_row2}']
-        title_cell2.value = "DEPARTMENT OF MIDWIFERY"
-        title_cell2.font = Font(bold=True, size=14, color="FFFFFF")
-        title_cell2.alignment = Alignment(horizontal="center", vertical="center")
-        title_cell2.fill = PatternFill(
-            start_color="1E90FF", end_color="1E90FF", fill_type="solid"
-        )
-
-        # Add set record title - EXPANDED TO MATCH STUDENT HEADING WIDTH
-        set_row = title_row2 + 1
-        ws.merge_cells(f'A{set_row}:{get_column_letter(num_columns)}{set_row}')
-        set_cell = ws[f'A{set_row}']
-        set_cell.value = f"{set_name.upper()} - CGPA SUMMARY"
-        set_cell.font = Font(bold=True, size=12, color="000000")
-        set_cell.alignment = Alignment(horizontal="center", vertical="center")
-        set_cell.fill = PatternFill(
-            start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"
-        )
-
-        # Write header (start from row 4)
-        header_row = set_row + 1
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=header_row, column=col_idx, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(
-                start_color="4A90E2", end_color="4A90E2", fill_type="solid"
-            )
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
-
-        # Write data - ensure exam numbers don't have .0
-        for row_idx, row_data in enumerate(summary_data, header_row + 1):
-            for col_idx, header in enumerate(headers, 1):
-                value = row_data.get(header, "")
-                # Remove .0 from exam numbers if they appear
-                if header == "EXAMS NUMBER" and isinstance(value, str) and value.endswith('.0'):
-                    value = value[:-2]
-                cell = ws.cell(row=row_idx, column=col_idx, value=value)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = Border(
-                    left=Side(style="thin"),
-                    right=Side(style="thin"),
-                    top=Side(style="thin"),
-                    bottom=Side(style="thin"),
-                )
-
-                # Apply color coding for STATUS column
-                if header == "STATUS":
-                    if value == "Withdrawn":
-                        cell.fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")  # Red
-                        cell.font = Font(bold=True, color="FFFFFF")
-                    else:  # Active
-                        cell.fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")  # Green
-                        cell.font = Font(bold=True, color="006400")
-
-                # Apply color coding for GRADUATED column
-                elif header == "GRADUATED":
-                    if value == "Graduated":
-                        cell.fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")  # Green
-                        cell.font = Font(bold=True, color="006400")
-                    elif value == "Withdrawn":
-                        cell.fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")  # Red
-                        cell.font = Font(bold=True, color="FFFFFF")
-                    else:  # In Progress
-                        cell.fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")  # Yellow
-                        cell.font = Font(bold=True, color="000000")
+        # Ensure exam numbers don't have .0
+        summary_rows = []
+        for row_data in summary_data:
+            values = [row_data.get(header, "") for header in headers]
+            if isinstance(values[0], str) and values[0].endswith('.0'):
+                values[0] = values[0][:-2]
+            summary_rows.append(values)
 
         # AUTO-FIT COLUMN WIDTHS for all columns
+        column_widths = {}
         for col_idx, header in enumerate(headers, 1):
-            max_length = len(str(header))
-            column_letter = get_column_letter(col_idx)
-            
-            # Check all rows in this column
-            for row_idx in range(header_row + 1, ws.max_row + 1):
-                cell_value = ws.cell(row=row_idx, column=col_idx).value
-                if cell_value is not None:
-                    # Remove .0 from exam numbers for width calculation
-                    cell_value_str = str(cell_value)
-                    if col_idx == 1 and cell_value_str.endswith('.0'):  # EXAMS NUMBER column
-                        cell_value_str = cell_value_str[:-2]
-                    cell_length = len(cell_value_str)
-                    if cell_length > max_length:
-                        max_length = cell_length
-            
+            max_length = max(
+                len(str(header)),
+                text_width(row[col_idx - 1] for row in summary_rows if row[col_idx - 1] is not None),
+            )
             # Set width with some padding, but reasonable limits
             adjusted_width = min(max_length + 2, 30)  # Cap at 30 characters
             if adjusted_width < 8:  # Minimum width
                 adjusted_width = 8
-            ws.column_dimensions[column_letter].width = adjusted_width
+            column_widths[col_idx] = adjusted_width
 
         # Specific column width adjustments for better readability
-        ws.column_dimensions['A'].width = 15  # EXAMS NUMBER
-        ws.column_dimensions['B'].width = 25  # NAME
+        column_widths[1] = 15  # EXAMS NUMBER
+        column_widths[2] = 25  # NAME
         # Semester columns (Y1S1, Y1S2, etc.) will auto-fit
-        ws.column_dimensions[get_column_letter(len(headers) - 2)].width = 10  # CGPA column
-        ws.column_dimensions[get_column_letter(len(headers) - 1)].width = 12  # STATUS column
-        ws.column_dimensions[get_column_letter(len(headers))].width = 12     # GRADUATED column
+        column_widths[num_columns - 2] = 10  # CGPA column
+        column_widths[num_columns - 1] = 12  # STATUS column
+        column_widths[num_columns] = 12      # GRADUATED column
+
+        # Every data cell is centred and bordered; STATUS and GRADUATED are colour coded
+        data_style = {
+            "alignment": alignment(horizontal="center", vertical="center"),
+            "border": THIN_BORDER,
+        }
+        green = {"fill": solid_fill("00FF00"), "font": font(bold=True, color="006400")}
+        red = {"fill": solid_fill("FF0000"), "font": font(bold=True, color="FFFFFF")}
+        yellow = {"fill": solid_fill("FFFF00"), "font": font(bold=True, color="000000")}
+        status_col = headers.index("STATUS")
+        status_styles = with_classes(data_style, {"Withdrawn": red, "Active": green})
+        graduated_col = headers.index("GRADUATED")
+        graduated_styles = with_classes(
+            data_style, {"Graduated": green, "Withdrawn": red, "In Progress": yellow}
+        )
+
+        def write_sheet(sink):
+            sink.set_widths(column_widths)
 
-        wb.save(mastersheet_path)
+            # Create professional title - EXPANDED TO MATCH STUDENT HEADING WIDTH
+            title_rows = [
+                (
+                    "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA",
+                    {"font": font(bold=True, size=16, color="FFFFFF"), "fill": solid_fill("1E90FF")},
+                ),
+                (
+                    "DEPARTMENT OF MIDWIFERY",
+                    {"font": font(bold=True, size=14, color="FFFFFF"), "fill": solid_fill("1E90FF")},
+                ),
+                # Add set record title
+                (
+                    f"{set_name.upper()} - CGPA SUMMARY",
+                    {"font": font(bold=True, size=12, color="000000"), "fill": solid_fill("D3D3D3")},
+                ),
+            ]
+            for value, style in title_rows:
+                sink.merge(f"A{sink.next_row}:{last_letter}{sink.next_row}")
+                sink.append(
+                    [value],
+                    [{**style, "alignment": alignment(horizontal="center", vertical="center")}],
+                )
+
+            # Write header (start from row 4)
+            header_style = {
+                "font": font(bold=True, color="FFFFFF"),
+                "fill": solid_fill("4A90E2"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+                "border": THIN_BORDER,
+            }
+            sink.append(headers, [header_style] * num_columns)
+
+            for values in summary_rows:
+                styles = [data_style] * num_columns
+                styles[status_col] = status_styles.get(values[status_col], status_styles["Active"])
+                styles[graduated_col] = graduated_styles.get(
+                    values[graduated_col], graduated_styles["In Progress"]
+                )
+                sink.append(values, styles)
+
+        MASTERSHEET_SESSION.write_sheet(mastersheet_path, "CGPA_SUMMARY", write_sheet)
         logger.info("✅ BM CGPA Summary sheet created successfully with professional title and two status columns")
 
         return summary_df
@@ -801,7 +911,7 @@ def create_bm_analysis_sheet(mastersheet_path, timestamp, set_name):
     try:
         logger.info("📈 Creating BM Analysis Sheet...")
 
-        wb = load_workbook(mastersheet_path)
+        wb = MASTERSHEET_SESSION.open(mastersheet_path)
 
         # Map semester names to short codes
         semester_short_codes = {
@@ -991,7 +1101,7 @@ def create_bm_analysis_sheet(mastersheet_path, timestamp, set_name):
                 
             ws.column_dimensions[column_letter].width = adjusted_width
 
-        wb.save(mastersheet_path)
+        MASTERSHEET_SESSION.mark_dirty(mastersheet_path)
         logger.info("✅ BM Analysis sheet created successfully with professional title")
 
         return analysis_df
@@ -1071,7 +1181,7 @@ def apply_upgrade_rule(mastersheet, ordered_codes, min_threshold):
 
                 # Log first few upgrades for visibility
                 if upgraded_count <= 5:
-                    logger.info(f"🔼 {exam_no} - {code}: {original_score} → 50")
+                    logger.debug(f"🔼 {exam_no} - {code}: {original_score} → 50")
 
     if upgraded_count > 0:
         logger.info(
@@ -1128,9 +1238,7 @@ def normalize_for_matching(s):
 
 def initialize_student_tracker():
     """Initialize the global student tracker."""
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-    STUDENT_TRACKER = {}
-    WITHDRAWN_STUDENTS = {}
+    STUDENTS.clear()
 
 
 def update_student_tracker(semester_key, exam_numbers, withdrawn_students=None):
@@ -1138,80 +1246,36 @@ def update_student_tracker(semester_key, exam_numbers, withdrawn_students=None):
     Update the student tracker with current semester's students.
     This helps track which students are present in each semester.
     """
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-
     logger.info(f"📊 Updating student tracker for {semester_key}")
     logger.info(f"📝 Current students in this semester: {len(exam_numbers)}")
 
     # Track withdrawn students
-    if withdrawn_students:
-        for exam_no in withdrawn_students:
-            if exam_no not in WITHDRAWN_STUDENTS:
-                WITHDRAWN_STUDENTS[exam_no] = {
-                    "withdrawn_semester": semester_key,
-                    "withdrawn_date": datetime.now().strftime(TIMESTAMP_FMT),
-                    "reappeared_semesters": [],
-                }
-                logger.info(f"🚫 Marked as withdrawn: {exam_no} in {semester_key}")
-
-    for exam_no in exam_numbers:
-        if exam_no not in STUDENT_TRACKER:
-            STUDENT_TRACKER[exam_no] = {
-                "first_seen": semester_key,
-                "last_seen": semester_key,
-                "semesters_present": [semester_key],
-                "status": "Active",
-                "withdrawn": False,
-                "withdrawn_semester": None,
-            }
-        else:
-            STUDENT_TRACKER[exam_no]["last_seen"] = semester_key
-            if semester_key not in STUDENT_TRACKER[exam_no]["semesters_present"]:
-                STUDENT_TRACKER[exam_no]["semesters_present"].append(semester_key)
-
-            # Check if student was previously withdrawn and has reappeared
-            if STUDENT_TRACKER[exam_no]["withdrawn"]:
-                logger.warning(f"⚠️ PREVIOUSLY WITHDRAWN STUDENT REAPPEARED: {exam_no}")
-                if exam_no in WITHDRAWN_STUDENTS:
-                    if (
-                        semester_key
-                        not in WITHDRAWN_STUDENTS[exam_no]["reappeared_semesters"]
-                    ):
-                        WITHDRAWN_STUDENTS[exam_no]["reappeared_semesters"].append(
-                            semester_key
-                        )
+    for exam_no in withdrawn_students or ():
+        withdrawn_date = datetime.now().strftime(TIMESTAMP_FMT)
+        if STUDENTS.withdraw(exam_no, semester_key, withdrawn_date, mark_record=False):
+            logger.debug(f"🚫 Marked as withdrawn: {exam_no} in {semester_key}")
 
-    logger.info(f"📈 Total unique students tracked: {len(STUDENT_TRACKER)}")
-    logger.info(f"🚫 Total withdrawn students: {len(WITHDRAWN_STUDENTS)}")
+    reappeared, _ = STUDENTS.record_semester(semester_key, exam_numbers)
+    for exam_no in reappeared:
+        logger.warning(f"⚠️ PREVIOUSLY WITHDRAWN STUDENT REAPPEARED: {exam_no}")
+
+    logger.info(f"📈 Total unique students tracked: {len(STUDENTS)}")
+    logger.info(f"🚫 Total withdrawn students: {len(STUDENTS.withdrawals)}")
 
 
 def mark_student_withdrawn(exam_no, semester_key):
     """Mark a student as withdrawn in a specific semester."""
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-
-    if exam_no in STUDENT_TRACKER:
-        STUDENT_TRACKER[exam_no]["withdrawn"] = True
-        STUDENT_TRACKER[exam_no]["withdrawn_semester"] = semester_key
-        STUDENT_TRACKER[exam_no]["status"] = "Withdrawn"
-
-    if exam_no not in WITHDRAWN_STUDENTS:
-        WITHDRAWN_STUDENTS[exam_no] = {
-            "withdrawn_semester": semester_key,
-            "withdrawn_date": datetime.now().strftime(TIMESTAMP_FMT),
-            "reappeared_semesters": [],
-        }
+    STUDENTS.withdraw(exam_no, semester_key, datetime.now().strftime(TIMESTAMP_FMT))
 
 
 def is_student_withdrawn(exam_no):
     """Check if a student has been withdrawn in any previous semester."""
-    return exam_no in WITHDRAWN_STUDENTS
+    return STUDENTS.is_withdrawn(exam_no)
 
 
 def get_withdrawal_history(exam_no):
     """Get withdrawal history for a student."""
-    if exam_no in WITHDRAWN_STUDENTS:
-        return WITHDRAWN_STUDENTS[exam_no]
-    return None
+    return STUDENTS.withdrawal(exam_no)
 
 
 def filter_out_withdrawn_students(mastersheet, semester_key):
@@ -1219,22 +1283,14 @@ def filter_out_withdrawn_students(mastersheet, semester_key):
     Filter out students who were withdrawn in previous semesters.
     Returns filtered mastersheet and list of removed students.
     """
-    removed_students = []
-    filtered_mastersheet = mastersheet.copy()
-
-    for idx, row in mastersheet.iterrows():
-        exam_no = str(row["EXAMS NUMBER"]).strip()
-        if is_student_withdrawn(exam_no):
-            withdrawal_history = get_withdrawal_history(exam_no)
-            # Only remove if student was withdrawn in a PREVIOUS semester
-            if (
-                withdrawal_history
-                and withdrawal_history["withdrawn_semester"] != semester_key
-            ):
-                removed_students.append(exam_no)
-                filtered_mastersheet = filtered_mastersheet[
-                    filtered_mastersheet["EXAMS NUMBER"] != exam_no
-                ]
+    # Only remove students who were withdrawn in a PREVIOUS semester
+    stripped = mastersheet["EXAMS NUMBER"].astype(str).str.strip()
+    removed_students = stripped[
+        stripped.isin(STUDENTS.withdrawn_before(semester_key))
+    ].tolist()
+    filtered_mastersheet = mastersheet[
+        ~mastersheet["EXAMS NUMBER"].isin(removed_students)
+    ].copy()
 
     if removed_students:
         logger.info(
@@ -1242,20 +1298,52 @@ def filter_out_withdrawn_students(mastersheet, semester_key):
         )
         for exam_no in removed_students:
             withdrawal_history = get_withdrawal_history(exam_no)
-            logger.info(
-                f"   - {exam_no} (withdrawn in {withdrawal_history['withdrawn_semester']})"
+            logger.debug(
+                f"   - {exam_no} (withdrawn in {withdrawal_history.withdrawn_semester})"
             )
 
     return filtered_mastersheet, removed_students
 
 
+def restore_withdrawals_from_history(clean_dir, semester_keys):
+    """
+    Track students withdrawn in stored semesters that come before every
+    semester in ``semester_keys`` (those this run does not re-process).
+    """
+    positions = [SEMESTER_ORDER.index(k) for k in semester_keys if k in SEMESTER_ORDER]
+    history = StudentHistory.for_path(clean_dir)
+    if not positions or history is None:
+        return
+    try:
+        withdrawals = history.withdrawals(SEMESTER_ORDER[: min(positions)])
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read withdrawals from student history: {e}")
+        return
+    for exam_no, semester_key, recorded_at in withdrawals:
+        STUDENTS.withdraw(exam_no, semester_key, recorded_at, mark_record=False)
+    if withdrawals:
+        logger.info(
+            f"📚 Restored {len(withdrawals)} earlier withdrawals from student history"
+        )
+
+
 # ----------------------------
 # Carryover Management for BM
 # ----------------------------
 def initialize_carryover_tracker():
     """Initialize the global carryover tracker for BM."""
-    global CARRYOVER_STUDENTS
-    CARRYOVER_STUDENTS = {}
+    STUDENTS.carryover = {}
+
+    # Sets with a student history keep each recorded semester's carryover
+    # list there; JSON files are only read for the semesters it lacks
+    covered = set()
+    for history_set, history in program_histories(BM_BASE_DIR):
+        try:
+            for exam_no, semester_key in history.carryover_keys():
+                STUDENTS.mark_carryover(exam_no, semester_key)
+            covered.update((history_set, key) for key in history.semesters())
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load carryover from {history.path}: {e}")
 
     # Load previous carryover records from all JSON files
     carryover_jsons = glob.glob(
@@ -1267,13 +1355,15 @@ def initialize_carryover_tracker():
         try:
             with open(jf, "r") as f:
                 data = json.load(f)
+                json_set = os.path.relpath(jf, BM_BASE_DIR).split(os.sep)[0]
                 for student in data:
-                    student_key = f"{student['exam_number']}_{student['semester']}"
-                    CARRYOVER_STUDENTS[student_key] = student
+                    if (json_set, student["semester"]) in covered:
+                        continue
+                    STUDENTS.mark_carryover(student["exam_number"], student["semester"])
         except Exception as e:
             logger.warning(f"⚠️ Failed to load carryover from {jf}: {e}")
 
-    logger.info(f"📂 Loaded {len(CARRYOVER_STUDENTS)} previous carryover records")
+    logger.info(f"📂 Loaded {STUDENTS.carryover_count()} previous carryover records")
 
 
 def identify_carryover_students(
@@ -1341,8 +1431,7 @@ def identify_carryover_students(
             carryover_students.append(carryover_data)
 
             # Update global tracker
-            student_key = "{}_{}".format(exam_no, semester_key)
-            CARRYOVER_STUDENTS[student_key] = carryover_data
+            STUDENTS.mark_carryover(exam_no, semester_key)
 
     return carryover_students
 
@@ -1460,7 +1549,7 @@ def save_carryover_records(carryover_students, output_dir, set_name, semester_ke
             )
             student_path = os.path.join(individual_dir, student_filename)
             student_df.to_csv(student_path, index=False)
-            logger.info(f"✅ Saved individual carryover report: {student_path}")
+            logger.debug(f"✅ Saved individual carryover report: {student_path}")
 
     logger.info("📁 BM Carryover records saved in: {}".format(carryover_dir))
     return carryover_dir
@@ -1554,6 +1643,10 @@ def get_grade(score):
         return "F"
 
 
+# NBTE 5.0 scale as (minimum score, grade point) bands - see get_grade_point
+BM_GRADE_BANDS = ((70, 5.0), (60, 4.0), (50, 3.0), (45, 2.0), (40, 1.0))
+
+
 def get_grade_point(score):
     """Convert score to grade point for GPA calculation."""
     try:
@@ -1608,14 +1701,29 @@ def load_course_data():
 
     logger.info(f"Loading BM course data from: {course_file}")
 
-    xl = pd.ExcelFile(course_file)
+    (
+        semester_course_maps,
+        semester_credit_units,
+        semester_lookup,
+        semester_course_titles,
+    ) = load_catalogue(course_file, BM_CATALOGUE_NAMESPACE, build_course_catalogue)
+    logger.info(f"Loaded BM course sheets: {list(semester_course_maps.keys())}")
+    return (
+        semester_course_maps,
+        semester_credit_units,
+        semester_lookup,
+        semester_course_titles,
+    )
+
+
+def build_course_catalogue(course_sheets):
+    """Build the load_course_data maps from the course workbook's sheets."""
     semester_course_maps = {}
     semester_credit_units = {}
     semester_lookup = {}
     semester_course_titles = {}  # code -> title mapping
 
-    for sheet in xl.sheet_names:
-        df = pd.read_excel(course_file, sheet_name=sheet, engine="openpyxl", header=0)
+    for sheet, df in course_sheets.items():
         df.columns = [str(c).strip() for c in df.columns]
         expected = ["COURSE CODE", "COURSE TITLE", "CU"]
         if not all(col in df.columns for col in expected):
@@ -1661,7 +1769,6 @@ def load_course_data():
 
     if not semester_course_maps:
         raise ValueError("No course data loaded from BM course workbook")
-    logger.info(f"Loaded BM course sheets: {list(semester_course_maps.keys())}")
     return (
         semester_course_maps,
         semester_credit_units,
@@ -1829,7 +1936,7 @@ def load_previous_gpas_from_processed_files(
 
     try:
         df = pd.read_excel(mastersheet_path, sheet_name=prev_semester, header=5)
-        logger.info(f"📋 Columns in {prev_semester}: {df.columns.tolist()}")
+        logger.debug(f"📋 Columns in {prev_semester}: {df.columns.tolist()}")
 
         exam_col = None
         gpa_col = None
@@ -1843,7 +1950,7 @@ def load_previous_gpas_from_processed_files(
                 break
 
         if exam_col and gpa_col:
-            logger.info(f"✅ Found columns: '{exam_col}', '{gpa_col}'")
+            logger.debug(f"✅ Found columns: '{exam_col}', '{gpa_col}'")
 
             for idx, row in df.iterrows():
                 exam_no = str(row[exam_col]).strip()
@@ -2287,116 +2394,74 @@ def generate_individual_student_pdf(
     """
     Create a PDF with one page per student matching the sample format exactly.
     """
-    doc = SimpleDocTemplate(
-        out_pdf_path,
+    doc_kwargs = dict(
         pagesize=A4,
         rightMargin=40,
         leftMargin=40,
         topMargin=20,
         bottomMargin=20,
     )
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    header_style = ParagraphStyle(
-        "CustomHeader",
-        parent=styles["Normal"],
-        fontSize=10,
-        alignment=TA_CENTER,
-        spaceAfter=2,
-    )
-
-    main_header_style = ParagraphStyle(
-        "MainHeader",
-        parent=styles["Normal"],
-        fontSize=16,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=6,
-        textColor=colors.HexColor("#800080"),
-    )
-
-    title_style = ParagraphStyle(
-        "CustomTitle",
-        parent=styles["Normal"],
-        fontSize=12,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=4,
-    )
-
-    subtitle_style = ParagraphStyle(
-        "SubtitleStyle",
-        parent=styles["Normal"],
-        fontSize=10,
-        alignment=TA_CENTER,
-        spaceAfter=10,
-        textColor=colors.red,
-    )
-
-    # Left alignment style for course code and title
-    left_align_style = ParagraphStyle(
-        "LeftAlign",
-        parent=styles["Normal"],
-        fontSize=9,
-        alignment=TA_LEFT,
-        leftIndent=4,
-    )
-
-    center_align_style = ParagraphStyle(
-        "CenterAlign", parent=styles["Normal"], fontSize=9, alignment=TA_CENTER
-    )
-
-    # Style for remarks with smaller font
-    remarks_style = ParagraphStyle(
-        "RemarksStyle", parent=styles["Normal"], fontSize=8, alignment=TA_LEFT
-    )
-
-    elems = []
-
-    for idx, r in mastersheet_df.iterrows():
-        # Logo and header
-        logo_img = None
-        if logo_path and os.path.exists(logo_path):
-            try:
-                logo_img = Image(logo_path, width=0.8 * inch, height=0.8 * inch)
-            except Exception as e:
-                logger.warning(f"Warning: Could not load logo: {e}")
+    # Styles are built once, at import, in report_template
+    styles = SAMPLE_STYLES
+    header_style = HEADER_STYLE
+    main_header_style = MAIN_HEADER_STYLE
+    title_style = TITLE_STYLE
+    subtitle_style = SUBTITLE_STYLE
+    left_align_style = LEFT_ALIGN_STYLE
+    center_align_style = CENTER_ALIGN_STYLE
+    remarks_style = REMARKS_STYLE
+
+    # Static top of every page: laid out once, drawn from a shared PDF form
+    letterhead_elems = []
+    # Logo and header
+    logo_img = None
+    if logo_path and os.path.exists(logo_path):
+        try:
+            logo_img = Image(logo_path, width=0.8 * inch, height=0.8 * inch)
+        except Exception as e:
+            logger.warning(f"Warning: Could not load logo: {e}")
 
-        # Header table with logo and title
-        if logo_img:
-            header_data = [
+    # Header table with logo and title
+    if logo_img:
+        header_data = [
+            [
+                logo_img,
+                Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style),
+            ]
+        ]
+        header_table = Table(header_data, colWidths=[1.0 * inch, 5.0 * inch])
+        header_table.setStyle(
+            TableStyle(
                 [
-                    logo_img,
-                    Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style),
+                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                    ("ALIGN", (0, 0), (0, 0), "LEFT"),
+                    ("ALIGN", (1, 0), (1, 0), "CENTER"),
                 ]
-            ]
-            header_table = Table(header_data, colWidths=[1.0 * inch, 5.0 * inch])
-            header_table.setStyle(
-                TableStyle(
-                    [
-                        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                        ("ALIGN", (0, 0), (0, 0), "LEFT"),
-                        ("ALIGN", (1, 0), (1, 0), "CENTER"),
-                    ]
-                )
-            )
-            elems.append(header_table)
-        else:
-            elems.append(
-                Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style)
             )
+        )
+        letterhead_elems.append(header_table)
+    else:
+        letterhead_elems.append(
+            Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style)
+        )
+
+    # Address and contact info
+    letterhead_elems.append(Paragraph("P.O.Box 507, Gwagwalada-Abuja, Nigeria", header_style))
+    letterhead_elems.append(Paragraph("<b>EXAMINATIONS OFFICE</b>", header_style))
+    letterhead_elems.append(Paragraph("fctsonexamsoffice@gmail.com", header_style))
 
-        # Address and contact info
-        elems.append(Paragraph("P.O.Box 507, Gwagwalada-Abuja, Nigeria", header_style))
-        elems.append(Paragraph("<b>EXAMINATIONS OFFICE</b>", header_style))
-        elems.append(Paragraph("fctsonexamsoffice@gmail.com", header_style))
+    letterhead_elems.append(Spacer(1, 8))
+    letterhead_elems.append(Paragraph("STUDENT'S ACADEMIC PROGRESS REPORT", title_style))
+    letterhead_elems.append(Paragraph("(THIS IS NOT A TRANSCRIPT)", subtitle_style))
 
-        elems.append(Spacer(1, 8))
-        elems.append(Paragraph("STUDENT'S ACADEMIC PROGRESS REPORT", title_style))
-        elems.append(Paragraph("(THIS IS NOT A TRANSCRIPT)", subtitle_style))
+    letterhead_elems.append(Spacer(1, 8))
+    letterhead = Letterhead(letterhead_elems)
 
-        elems.append(Spacer(1, 8))
+    # One (exam number, flowables) entry per student; pdf_shards lays them out
+    student_pages = []
+
+    for idx, r in mastersheet_df.iterrows():
+        elems = [letterhead]
 
         # Student particulars - SEPARATE FROM PASSPORT PHOTO
         exam_no = str(r.get("EXAMS NUMBER", r.get("REG. No", "")))
@@ -2521,7 +2586,7 @@ def generate_individual_student_pdf(
                     # Use the upgraded score for PDF display
                     score_val = 50.0
                     score_display = "50"
-                    logger.info(f"🔼 PDF: Upgraded score for {exam_no} - {code}: → 50")
+                    logger.debug(f"🔼 PDF: Upgraded score for {exam_no} - {code}: → 50")
                 else:
                     score_display = str(int(round(score_val)))
                 # -----------------------
@@ -2604,14 +2669,14 @@ def generate_individual_student_pdf(
         if cgpa_data and exam_no in cgpa_data:
             cgpa = calculate_cgpa(cgpa_data[exam_no], current_gpa, total_units_passed)
 
-        logger.info(f"📊 PDF GENERATION for {exam_no}:")
-        logger.info(f"   Current GPA: {current_gpa}")
-        logger.info(f"   Previous GPA available: {previous_gpa is not None}")
-        logger.info(f"   CGPA available: {cgpa is not None}")
+        logger.debug(f"📊 PDF GENERATION for {exam_no}:")
+        logger.debug(f"   Current GPA: {current_gpa}")
+        logger.debug(f"   Previous GPA available: {previous_gpa is not None}")
+        logger.debug(f"   CGPA available: {cgpa is not None}")
         if previous_gpa is not None:
-            logger.info(f"   Previous GPA value: {previous_gpa}")
+            logger.debug(f"   Previous GPA value: {previous_gpa}")
         if cgpa is not None:
-            logger.info(f"   CGPA value: {cgpa}")
+            logger.debug(f"   CGPA value: {cgpa}")
 
         # Get values from dataframe
         tcpe = round(total_grade_points, 1)
@@ -2635,7 +2700,7 @@ def generate_individual_student_pdf(
         # remarks
         if (
             previously_withdrawn
-            and withdrawal_history["withdrawn_semester"] == semester_key
+            and withdrawal_history.withdrawn_semester == semester_key
         ):
             # This is the actual withdrawal semester - show normal withdrawal
             # remarks
@@ -2649,7 +2714,7 @@ def generate_individual_student_pdf(
         elif previously_withdrawn:
             # Student was withdrawn in a previous semester but appears here -
             # this shouldn't happen due to filtering
-            withdrawn_semester = withdrawal_history["withdrawn_semester"]
+            withdrawn_semester = withdrawal_history.withdrawn_semester
             year, sem_num, level, sem_display, set_code = get_semester_display_info(
                 withdrawn_semester
             )
@@ -2706,7 +2771,7 @@ def generate_individual_student_pdf(
         # Add previous GPA if available (from first year second semester
         # upward)
         if previous_gpa is not None:
-            logger.info(f"✅ ADDING PREVIOUS GPA to PDF: {previous_gpa}")
+            logger.debug(f"✅ ADDING PREVIOUS GPA to PDF: {previous_gpa}")
             summary_data.append(
                 [
                     Paragraph("<b>TCUP:</b>", styles["Normal"]),
@@ -2722,7 +2787,7 @@ def generate_individual_student_pdf(
 
         # Add CGPA if available (from second semester onward)
         if cgpa is not None:
-            logger.info(f"✅ ADDING CGPA to PDF: {cgpa}")
+            logger.debug(f"✅ ADDING CGPA to PDF: {cgpa}")
             summary_data.append(
                 [
                     Paragraph("<b>TCUF:</b>", styles["Normal"]),
@@ -2783,21 +2848,11 @@ def generate_individual_student_pdf(
             [
                 Paragraph(
                     "<b>EXAMS SECRETARY</b>",
-                    ParagraphStyle(
-                        "SigStyle",
-                        parent=styles["Normal"],
-                        fontSize=10,
-                        alignment=TA_CENTER,
-                    ),
+                    SIGNATURE_STYLE,
                 ),
                 Paragraph(
                     "<b>V.P. ACADEMICS</b>",
-                    ParagraphStyle(
-                        "SigStyle",
-                        parent=styles["Normal"],
-                        fontSize=10,
-                        alignment=TA_CENTER,
-                    ),
+                    SIGNATURE_STYLE,
                 ),
             ],
         ]
@@ -2813,11 +2868,14 @@ def generate_individual_student_pdf(
         )
         elems.append(sig_table)
 
-        # Page break for next student
-        if idx < len(mastersheet_df) - 1:
-            elems.append(PageBreak())
+        student_pages.append((exam_no, elems))
 
-    doc.build(elems)
+    if INPUT_MANIFEST.restore(semester_key, out_pdf_path):
+        logger.info(
+            f"♻️ Reused unchanged {semester_key} PDF from the last result: {out_pdf_path}"
+        )
+        return
+    build_student_pdf(student_pages, out_pdf_path, doc_kwargs)
     logger.info(f"✅ Individual student PDF written: {out_pdf_path}")
 
 
@@ -2826,6 +2884,36 @@ def generate_individual_student_pdf(
 # ----------------------------
 
 
+def semester_raw_files(semester_key, raw_files):
+    """The files in ``raw_files`` that belong to ``semester_key``."""
+    semester_files = []
+    for rf in raw_files:
+        detected_sem, _, _, _, _, _ = detect_semester_from_filename(rf)
+        if detected_sem == semester_key:
+            semester_files.append(rf)
+    return semester_files
+
+
+def queue_semester_prefetch(pipeline, semester_key, raw_files, raw_dir):
+    """
+    Parse a semester's raw workbooks in the pipeline's workers ahead of
+    process_single_file. Files with a parsed-input cache entry are skipped.
+    Returns the parse stage names.
+    """
+    paths = []
+    for rf in semester_raw_files(semester_key, raw_files):
+        raw_path = os.path.join(raw_dir, rf)
+        if cache_enabled():
+            try:
+                input_cache, input_cache_key = bm_input_cache(raw_path, semester_key)
+                if input_cache.contains(input_cache_key):
+                    continue
+            except OSError:
+                pass
+        paths.append(raw_path)
+    return queue_raw_prefetch(pipeline, paths, RAW_SHEETS, dtype=str)
+
+
 def process_semester_files(
     semester_key,
     raw_files,
@@ -2850,11 +2938,7 @@ def process_semester_files(
     logger.info(f"{'='*60}")
 
     # Filter files for this semester
-    semester_files = []
-    for rf in raw_files:
-        detected_sem, _, _, _, _, _ = detect_semester_from_filename(rf)
-        if detected_sem == semester_key:
-            semester_files.append(rf)
+    semester_files = semester_raw_files(semester_key, raw_files)
 
     if not semester_files:
         logger.warning(f"⚠️ No files found for semester {semester_key}")
@@ -2921,6 +3005,8 @@ def process_semester_files(
             mastersheet_path = os.path.join(
                 clean_dir, f"{set_name}_RESULT-{ts}", f"mastersheet_{ts}.xlsx"
             )
+            # The summary sheets re-read the semester sheets from disk
+            MASTERSHEET_SESSION.flush(mastersheet_path)
             if os.path.exists(mastersheet_path):
                 create_bm_cgpa_summary_sheet(mastersheet_path, ts, set_name)
                 create_bm_analysis_sheet(mastersheet_path, ts, set_name)
@@ -2979,6 +3065,19 @@ def compute_remarks(row, total_cu, pass_threshold):
         return "Resit"
 
 
+def bm_input_cache(path, semester_key):
+    """Parsed-input cache and entry key for one BM raw file."""
+    input_cache = ParsedInputCache.for_raw_file(path)
+    input_cache_key = input_cache.key(
+        path,
+        "BM",
+        BM_INPUT_CACHE_VERSION,
+        semester_key,
+        course_workbooks_sha256(BM_COURSES_DIR),
+    )
+    return input_cache, input_cache_key
+
+
 def process_single_file(
     path,
     output_dir,
@@ -3006,20 +3105,37 @@ def process_single_file(
     os.makedirs(output_subdir, exist_ok=True)
     logger.info(f"📁 Created output directory: {output_subdir}")
 
-    try:
-        xl = pd.ExcelFile(path)
-    except Exception as e:
-        logger.error(f"Error opening excel {path}: {e}")
-        return None
+    # Reuse the merged CA/OBJ/EXAM frame from an earlier run with identical inputs
+    input_cache = None
+    input_cache_key = None
+    merged = None
+    if cache_enabled():
+        try:
+            input_cache, input_cache_key = bm_input_cache(path, semester_key)
+            merged = input_cache.load(input_cache_key)
+        except OSError as e:
+            logger.warning(f"⚠️ Parsed-input cache unavailable: {e}")
+            input_cache = None
+    from_input_cache = merged is not None
+    if from_input_cache:
+        logger.info(f"⚡ Loaded merged CA/OBJ/EXAM data for {fname} from parsed-input cache")
+    else:
+        expected_sheets = ["CA", "OBJ", "EXAM"]
+        try:
+            # Open the workbook once and parse every CA/OBJ/EXAM sheet from it
+            # (already parsed when the pipeline prefetched it)
+            raw = load_raw_sheets(path, expected_sheets, dtype=str)
+        except Exception as e:
+            logger.error(f"Error opening excel {path}: {e}")
+            return None
 
-    expected_sheets = ["CA", "OBJ", "EXAM"]
-    dfs = {}
-    for s in expected_sheets:
-        if s in xl.sheet_names:
-            dfs[s] = pd.read_excel(path, sheet_name=s, dtype=str)
-    if not dfs:
-        logger.error("No CA/OBJ/EXAM sheets detected — skipping file.")
-        return None
+        for s in expected_sheets:
+            if s in raw.errors:
+                raise raw.errors[s][0]
+        dfs = dict(raw.frames)
+        if not dfs:
+            logger.error("No CA/OBJ/EXAM sheets detected — skipping file.")
+            return None
 
     # Use the provided semester key
     sem = semester_key
@@ -3053,109 +3169,55 @@ def process_single_file(
     filtered_credit_units = {c: credit_units[c] for c in ordered_codes}
     total_cu = sum(filtered_credit_units.values())
 
-    reg_no_cols = {
-        s: find_column_by_names(
-            df,
-            [
-                "REG. No",
-                "Reg No",
-                "Registration Number",
-                "Mat No",
-                "Exam No",
-                "Student ID",
-            ],
-        )
-        for s, df in dfs.items()
-    }
-    name_cols = {
-        s: find_column_by_names(df, ["NAME", "Full Name", "Candidate Name"])
-        for s, df in dfs.items()
-    }
-
-    merged = None
-    for s, df in dfs.items():
-        df = df.copy()
-        regcol = reg_no_cols.get(s)
-        namecol = name_cols.get(s)
-        if not regcol:
-            regcol = df.columns[0] if len(df.columns) > 0 else None
-        if not namecol and len(df.columns) > 1:
-            namecol = df.columns[1]
-
-        if regcol is None:
-            logger.warning(f"Skipping sheet {s}: no reg column found")
-            continue
-
-        df["REG. No"] = df[regcol].astype(str).str.strip()
-        if namecol:
-            df["NAME"] = df[namecol].astype(str).str.strip()
-        else:
-            df["NAME"] = pd.NA
-
-        to_drop = [c for c in [regcol, namecol] if c and c not in ["REG. No", "NAME"]]
-        df.drop(columns=to_drop, errors="ignore", inplace=True)
-
-        for col in [c for c in df.columns if c not in ["REG. No", "NAME"]]:
-            norm = normalize_course_name(col)
-            matched_code = None
-            for title, code in zip(
-                ordered_titles, [course_map[t] for t in ordered_titles]
-            ):
-                if normalize_course_name(title) == norm:
-                    matched_code = code
-                    break
-            if matched_code:
-                newcol = f"{matched_code}_{s.upper()}"
-                df.rename(columns={col: newcol}, inplace=True)
+    if not from_input_cache:
+        reg_no_cols = {
+            s: find_column_by_names(
+                df,
+                [
+                    "REG. No",
+                    "Reg No",
+                    "Registration Number",
+                    "Mat No",
+                    "Exam No",
+                    "Student ID",
+                ],
+            )
+            for s, df in dfs.items()
+        }
+        name_cols = {
+            s: find_column_by_names(df, ["NAME", "Full Name", "Candidate Name"])
+            for s, df in dfs.items()
+        }
 
-        cur_cols = ["REG. No", "NAME"] + [
-            c for c in df.columns if c.endswith(f"_{s.upper()}")
-        ]
-        cur = df[cur_cols].copy()
-        if merged is None:
-            merged = cur
-        else:
-            merged = merged.merge(cur, on="REG. No", how="outer", suffixes=("", "_dup"))
-            if "NAME_dup" in merged.columns:
-                merged["NAME"] = merged["NAME"].combine_first(merged["NAME_dup"])
-                merged.drop(columns=["NAME_dup"], inplace=True)
+        # First title (in course order) with the header's normalised name
+        title_codes = {}
+        for title in ordered_titles:
+            title_codes.setdefault(normalize_course_name(title), course_map[title])
+
+        # One categorical-keyed alignment of the sheets; course columns become
+        # (code, component) pairs
+        merged, merge_report = merge_score_sheets(
+            dfs,
+            reg_no_cols,
+            name_cols,
+            lambda col: title_codes.get(normalize_course_name(col)),
+        )
+        merge_issues = report_summary(merge_report)
+        if merge_issues:
+            logger.warning(f"⚠️ {fname}: {merge_issues}")
 
     if merged is None or merged.empty:
         logger.error("No data merged from sheets — skipping file.")
         return None
+    if input_cache is not None and not from_input_cache:
+        input_cache.store(input_cache_key, merged)
 
-    mastersheet = merged[["REG. No", "NAME"]].copy()
+    mastersheet = registrations(merged)
     mastersheet.rename(columns={"REG. No": "EXAMS NUMBER"}, inplace=True)
 
+    course_scores = compute_course_scores(merged, ordered_codes)
     for code in ordered_codes:
-        ca_col = f"{code}_CA"
-        obj_col = f"{code}_OBJ"
-        exam_col = f"{code}_EXAM"
-
-        ca_series = (
-            pd.to_numeric(merged[ca_col], errors="coerce")
-            if ca_col in merged.columns
-            else pd.Series([0] * len(merged), index=merged.index)
-        )
-        obj_series = (
-            pd.to_numeric(merged[obj_col], errors="coerce")
-            if obj_col in merged.columns
-            else pd.Series([0] * len(merged), index=merged.index)
-        )
-        exam_series = (
-            pd.to_numeric(merged[exam_col], errors="coerce")
-            if exam_col in merged.columns
-            else pd.Series([0] * len(merged), index=merged.index)
-        )
-
-        ca_norm = (ca_series / 20) * 100
-        obj_norm = (obj_series / 20) * 100
-        exam_norm = (exam_series / 80) * 100
-        ca_norm = ca_norm.fillna(0).clip(upper=100)
-        obj_norm = obj_norm.fillna(0).clip(upper=100)
-        exam_norm = exam_norm.fillna(0).clip(upper=100)
-        total = (ca_norm * 0.2) + (((obj_norm + exam_norm) / 2) * 0.8)
-        mastersheet[code] = total.round(0).clip(upper=100).values
+        mastersheet[code] = course_scores[code].values
 
     # Apply upgrade rule if specified
     if should_use_interactive_mode():
@@ -3178,59 +3240,32 @@ def process_single_file(
         if c not in mastersheet.columns:
             mastersheet[c] = 0
 
-    # Calculate TCPE, TCUP, TCUF correctly FIRST
-    def calc_tcpe_tcup_tcuf(row):
-        tcpe = 0.0
-        tcup = 0
-        tcuf = 0
-
-        for code in ordered_codes:
-            score = float(row.get(code, 0) or 0)
-            cu = filtered_credit_units.get(code, 0)
-            gp = get_grade_point(score)
-
-            # TCPE: Grade Point × Credit Units
-            tcpe += gp * cu
-
-            # TCUP/TCUF: Count credit units based on pass/fail
-            if score >= pass_threshold:
-                tcup += cu
-            else:
-                tcuf += cu
-
-        return tcpe, tcup, tcuf
-
-    # Apply calculations to each row
-    results = mastersheet.apply(calc_tcpe_tcup_tcuf, axis=1, result_type="expand")
-    mastersheet["TCPE"] = results[0].round(1)
-    mastersheet["CU Passed"] = results[1]
-    mastersheet["CU Failed"] = results[2]
-    
-    # Calculate GPA BEFORE remarks
-    def calculate_gpa(row):
-        tcpe = row["TCPE"]
-        return round((tcpe / total_cu), 2) if total_cu > 0 else 0.0
+    # Calculate TCPE, TCUP, TCUF, FAILED COURSES and AVERAGE in one columnar
+    # pass over the score matrix
+    semester_results = derive_semester_results(
+        mastersheet[ordered_codes],
+        [filtered_credit_units.get(code, 0) for code in ordered_codes],
+        BM_GRADE_BANDS,
+        pass_threshold,
+        skip_blank=True,
+    )
+    mastersheet["TCPE"] = semester_results["TCPE"]
+    mastersheet["CU Passed"] = semester_results["CU Passed"]
+    mastersheet["CU Failed"] = semester_results["CU Failed"]
 
-    mastersheet["GPA"] = mastersheet.apply(calculate_gpa, axis=1)
+    # GPA BEFORE remarks - NBTE GPA is TCPE over the semester's total CU
+    if total_cu > 0:
+        semester_results["GPA"] = round_exact(semester_results["TCPE"] / total_cu, 2)
+    else:
+        semester_results["GPA"] = 0.0
+    mastersheet["GPA"] = semester_results["GPA"]
 
-    # NOW calculate FAILED COURSES and REMARKS after GPA is available
-    def get_failed_courses(row):
-        """Get list of failed courses for a student."""
-        fails = [c for c in ordered_codes if float(row.get(c, 0) or 0) < pass_threshold]
-        return ", ".join(sorted(fails)) if fails else ""
+    mastersheet["FAILED COURSES"] = semester_results["FAILED COURSES"]
 
-    # Add FAILED COURSES column
-    mastersheet["FAILED COURSES"] = mastersheet.apply(get_failed_courses, axis=1)
-    
-    # FIXED: Use the corrected compute_remarks function with proper NBTE logic
-    mastersheet["REMARKS"] = mastersheet.apply(
-        lambda row: compute_remarks(row, total_cu, pass_threshold), 
-        axis=1
-    )
+    # FIXED: Same NBTE rule as compute_remarks, applied to every student at once
+    mastersheet["REMARKS"] = classify_by_failed_share(semester_results, total_cu)
 
-    mastersheet["AVERAGE"] = (
-        mastersheet[[c for c in ordered_codes]].mean(axis=1).round(0)
-    )
+    mastersheet["AVERAGE"] = semester_results["AVERAGE"]
 
     # Filter out previously withdrawn students
     mastersheet, removed_students = filter_out_withdrawn_students(
@@ -3245,7 +3280,7 @@ def process_single_file(
             exam_no = str(row["EXAMS NUMBER"]).strip()
             withdrawn_students.append(exam_no)
             mark_student_withdrawn(exam_no, semester_key)
-            logger.info(f"🚫 Student {exam_no} marked as withdrawn in {semester_key}")
+            logger.debug(f"🚫 Student {exam_no} marked as withdrawn in {semester_key}")
 
     # Update student tracker
     exam_numbers = mastersheet["EXAMS NUMBER"].astype(str).str.strip().tolist()
@@ -3255,6 +3290,7 @@ def process_single_file(
     carryover_students = identify_carryover_students(
         mastersheet, semester_key, set_name, pass_threshold
     )
+    record_carryover_history(output_subdir, semester_key, carryover_students)
 
     if carryover_students:
         carryover_dir = save_carryover_records(
@@ -3301,58 +3337,28 @@ def process_single_file(
     # Save to Excel
     out_xlsx = os.path.join(output_subdir, f"mastersheet_{ts}.xlsx")
 
-    if not os.path.exists(out_xlsx):
-        wb = Workbook()
-        if wb.active:
-            wb.remove(wb.active)
-    else:
-        wb = load_workbook(out_xlsx)
-
-    if sem not in wb.sheetnames:
-        ws = wb.create_sheet(title=sem)
-    else:
-        ws = wb[sem]
-
-    try:
-        ws.delete_rows(1, ws.max_row)
-        ws.delete_cols(1, ws.max_column)
-    except Exception:
-        pass
-
-    ws.insert_rows(1, 2)
     logo_path_norm = os.path.normpath(logo_path) if logo_path else None
-    if logo_path_norm and os.path.exists(logo_path_norm):
-        try:
-            img = XLImage(logo_path_norm)
-            img.width, img.height = 110, 110
-            ws.add_image(img, "A1")
-        except Exception as e:
-            logger.warning(f"⚠ Could not place logo: {e}")
-
-    ws.merge_cells("C1:Q1")
-    title_cell = ws["C1"]
-    title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA-ABUJA"
-    title_cell.font = Font(bold=True, size=16, color="FFFFFF")
-    title_cell.alignment = Alignment(horizontal="center", vertical="center")
-    title_cell.fill = PatternFill(
-        start_color="1E90FF", end_color="1E90FF", fill_type="solid"
-    )
-    border = Border(
-        left=Side(style="medium"),
-        right=Side(style="medium"),
-        top=Side(style="medium"),
-        bottom=Side(style="medium"),
-    )
-    title_cell.border = border
 
     # Use expanded semester name in the subtitle
     expanded_semester_name = f"{level_display} {semester_display}"
-
-    ws.merge_cells("C2:Q2")
-    subtitle_cell = ws["C2"]
-    subtitle_cell.value = f"{datetime.now().year}/{datetime.now().year + 1} SESSION  BASIC MIDWIFERY {expanded_semester_name} EXAMINATIONS RESULT — {datetime.now().strftime('%B %d, %Y')}"
-    subtitle_cell.font = Font(bold=True, size=12, color="000000")
-    subtitle_cell.alignment = Alignment(horizontal="center", vertical="center")
+    top_rows = [
+        (
+            "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA-ABUJA",
+            {
+                "font": font(bold=True, size=16, color="FFFFFF"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+                "fill": solid_fill("1E90FF"),
+                "border": MEDIUM_BORDER,
+            },
+        ),
+        (
+            f"{datetime.now().year}/{datetime.now().year + 1} SESSION  BASIC MIDWIFERY {expanded_semester_name} EXAMINATIONS RESULT — {datetime.now().strftime('%B %d, %Y')}",
+            {
+                "font": font(bold=True, size=12, color="000000"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+            },
+        ),
+    ]
 
     # FIXED: Remove the upgrade notice from the header to prevent covering course titles
     # The upgrade notice will only appear in the summary section
@@ -3363,187 +3369,94 @@ def process_single_file(
         if c in ordered_codes:
             display_course_titles.append(t)
 
-    ws.append([""] * 3 + display_course_titles + [""] * 5)
-    for i, cell in enumerate(
-        ws[start_row][3 : 3 + len(display_course_titles)], start=3
-    ):
-        cell.alignment = Alignment(
-            horizontal="center", vertical="center", text_rotation=45
-        )
-        cell.font = Font(bold=True, size=9)
-    ws.row_dimensions[start_row].height = 18
-
     cu_list = [filtered_credit_units.get(c, "") for c in ordered_codes]
-    ws.append([""] * 3 + cu_list + [""] * 5)
-    for cell in ws[start_row + 1][3 : 3 + len(cu_list)]:
-        cell.alignment = Alignment(
-            horizontal="center", vertical="center", text_rotation=135
-        )
-        cell.font = Font(bold=True, size=9)
-        cell.fill = PatternFill(
-            start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"
-        )
-
+    cu_row = [""] * 3 + cu_list + [""] * 5
     headers = out_cols
-    ws.append(headers)
-    for cell in ws[start_row + 2]:
-        cell.font = Font(bold=True, size=10, color="FFFFFF")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.fill = PatternFill(
-            start_color="4A90E2", end_color="4A90E2", fill_type="solid"
-        )
-        cell.border = Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        )
-
-    for _, r in mastersheet.iterrows():
-        rowvals = [r[col] for col in headers]
-        ws.append(rowvals)
-
-    # FIXED: Freeze the column headers (S/N, EXAMS NUMBER, NAME, etc.) at row start_row + 3
-    # This ensures all column headers remain visible when scrolling
-    ws.freeze_panes = ws.cell(row=start_row + 3, column=1)
-
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-    for row in ws.iter_rows(
-        min_row=start_row + 3, max_row=ws.max_row, min_col=1, max_col=ws.max_column
-    ):
-        for cell in row:
-            cell.border = thin_border
 
     # Colorize course columns - SPECIAL COLOR FOR UPGRADED SCORES
-    upgraded_fill = PatternFill(
-        start_color="E6FFCC", end_color="E6FFCC", fill_type="solid"
-    )  # Light green for upgraded scores
-    passed_fill = PatternFill(
-        start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"
-    )  # Normal green for passed
-    failed_fill = PatternFill(
-        start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"
-    )  # White for failed
-
-    for idx, code in enumerate(ordered_codes, start=4):
-        col_letter = get_column_letter(idx)
-        for r_idx in range(start_row + 3, ws.max_row + 1):
-            cell = ws.cell(row=r_idx, column=idx)
-            try:
-                val = float(cell.value) if cell.value not in (None, "") else 0
-                if (
-                    upgrade_min_threshold is not None
-                    and upgrade_min_threshold <= val <= 49
-                ):
-                    # This score was upgraded - use special color
-                    cell.fill = upgraded_fill
-                    # Dark green for upgraded scores
-                    cell.font = Font(color="006600", bold=True)
-                elif val >= pass_threshold:
-                    cell.fill = passed_fill
-                    cell.font = Font(color="006100")
-                else:
-                    cell.fill = failed_fill
-                    cell.font = Font(color="FF0000", bold=True)
-            except Exception:
-                continue
+    score_styles = {
+        # Light green fill / dark green text for upgraded scores
+        "upgraded": {"fill": solid_fill("E6FFCC"), "font": font(color="006600", bold=True)},
+        "passed": {"fill": solid_fill("C6EFCE"), "font": font(color="006100")},
+        # White fill for failed
+        "failed": {"fill": solid_fill("FFFFFF"), "font": font(color="FF0000", bold=True)},
+    }
 
-    # FIXED: Apply specific column alignments
-    left_align_columns = ["CU Passed", "CU Failed", "TCPE", "GPA", "AVERAGE"]
+    def score_class(value):
+        try:
+            val = float(value) if value not in (None, "") else 0
+            if (
+                upgrade_min_threshold is not None
+                and upgrade_min_threshold <= val <= 49
+            ):
+                # This score was upgraded - use special color
+                return "upgraded"
+            return "passed" if val >= pass_threshold else "failed"
+        except Exception:
+            return None
+
+    # Colour classes come from the DataFrame rows being written
+    score_classes = [
+        [score_class(value) for value in mastersheet[code].tolist()]
+        for code in ordered_codes
+    ]
 
-    for col_idx, col_name in enumerate(headers, start=1):
+    # FIXED: Apply specific column alignments; every student-row cell is bordered
+    left_align_columns = ["CU Passed", "CU Failed", "TCPE", "GPA", "AVERAGE"]
+    data_styles = []
+    for col_name in headers:
+        styles = {"border": THIN_BORDER}
         if col_name in left_align_columns:
-            col_letter = get_column_letter(col_idx)
-            for row_idx in range(start_row + 3, ws.max_row + 1):  # Start from data rows
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.alignment = Alignment(horizontal="left", vertical="center")
-
+            styles["alignment"] = alignment(horizontal="left", vertical="center")
         # Center align S/N column
         elif col_name == "S/N":
-            col_letter = get_column_letter(col_idx)
-            for row_idx in range(start_row + 3, ws.max_row + 1):  # Start from data rows
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
+            styles["alignment"] = alignment(horizontal="center", vertical="center")
+        data_styles.append(styles)
+    score_cell_styles = [
+        with_classes(data_styles[3 + pos], score_styles) for pos in range(len(ordered_codes))
+    ]
 
     # FIXED: Colorize REMARKS column based on status
-    remarks_col_index = None
-    for col_idx, col_name in enumerate(headers, 1):
-        if col_name == "REMARKS":
-            remarks_col_index = col_idx
-            break
-
-    if remarks_col_index:
-        # Define colors for different remarks
-        passed_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")  # Green
-        resit_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")   # Yellow
-        probation_fill = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Orange
-        withdrawn_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")  # Red
+    remarks_col = headers.index("REMARKS")
+    remarks_cell_styles = with_classes(
+        data_styles[remarks_col],
+        {
+            # Green / dark green text
+            "Passed": {"fill": solid_fill("00FF00"), "font": font(bold=True, color="006400")},
+            # Yellow / dark yellow text
+            "Resit": {"fill": solid_fill("FFFF00"), "font": font(bold=True, color="8B8000")},
+            # Orange / dark orange text
+            "Probation": {"fill": solid_fill("FFA500"), "font": font(bold=True, color="8B4500")},
+            # Red / dark red text
+            "Withdrawn": {"fill": solid_fill("FF0000"), "font": font(bold=True, color="8B0000")},
+        },
+    )
+    remarks_values = [str(v).strip() if v else "" for v in mastersheet["REMARKS"].tolist()]
+    # The writer may run again at a later save; keep the rows as written now
+    sheet_rows = mastersheet[headers]
 
-        for row_idx in range(start_row + 3, ws.max_row + 1):
-            cell = ws.cell(row=row_idx, column=remarks_col_index)
-            remark_value = str(cell.value).strip() if cell.value else ""
-            
-            if remark_value == "Passed":
-                cell.fill = passed_fill
-                cell.font = Font(bold=True, color="006400")  # Dark green text
-            elif remark_value == "Resit":
-                cell.fill = resit_fill
-                cell.font = Font(bold=True, color="8B8000")  # Dark yellow text
-            elif remark_value == "Probation":
-                cell.fill = probation_fill
-                cell.font = Font(bold=True, color="8B4500")  # Dark orange text
-            elif remark_value == "Withdrawn":
-                cell.fill = withdrawn_fill
-                cell.font = Font(bold=True, color="8B0000")  # Dark red text
-
-    # FIXED: Auto-fit column widths for ALL columns
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        
-        # Skip the first few header rows when calculating max length
-        for cell in column:
-            if cell.row >= start_row + 2:  # Start from header row
-                try:
-                    if cell.value:
-                        cell_length = len(str(cell.value))
-                        if cell_length > max_length:
-                            max_length = cell_length
-                except:
-                    pass
-        
+    # FIXED: Auto-fit column widths for ALL columns, measured from the
+    # credit-unit row down (the title rows above are skipped)
+    column_widths = {}
+    for col_idx, col_name in enumerate(headers, start=1):
+        max_length = max(
+            text_width([cu_row[col_idx - 1]] if col_idx <= len(cu_row) and cu_row[col_idx - 1] else []),
+            len(str(col_name)),
+            text_width(v for v in mastersheet[col_name].tolist() if v),
+        )
         # Add some padding and set a reasonable maximum width
         adjusted_width = min(max_length + 2, 50)  # Cap at 50 characters wide
         if adjusted_width < 8:  # Minimum width
             adjusted_width = 8
-        ws.column_dimensions[column_letter].width = adjusted_width
+        column_widths[col_idx] = adjusted_width
 
     # Special handling for NAME column - make it wider
-    name_col_index = None
-    for col_idx, col_name in enumerate(headers, 1):
-        if col_name == "NAME":
-            name_col_index = col_idx
-            break
-    
-    if name_col_index:
-        name_col_letter = get_column_letter(name_col_index)
-        ws.column_dimensions[name_col_letter].width = 30  # Fixed width for names
+    if "NAME" in headers:
+        column_widths[headers.index("NAME") + 1] = 30  # Fixed width for names
 
     # Special handling for FAILED COURSES column - make it wider
-    failed_courses_col_index = None
-    for col_idx, col_name in enumerate(headers, 1):
-        if col_name == "FAILED COURSES":
-            failed_courses_col_index = col_idx
-            break
-    
-    if failed_courses_col_index:
-        failed_courses_col_letter = get_column_letter(failed_courses_col_index)
-        ws.column_dimensions[failed_courses_col_letter].width = 40  # Wider for course lists
+    if "FAILED COURSES" in headers:
+        column_widths[headers.index("FAILED COURSES") + 1] = 40  # Wider for course lists
 
     # Fails per course row
     fails_per_course = (
@@ -3555,17 +3468,6 @@ def process_single_file(
         + fails_per_course
         + [""] * (len(headers) - 3 - len(ordered_codes))
     )
-    ws.append(footer_vals)
-    for cell in ws[ws.max_row]:
-        if 4 <= cell.column < 4 + len(ordered_codes):
-            cell.fill = PatternFill(
-                start_color="F0E68C", end_color="F0E68C", fill_type="solid"
-            )
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-        elif cell.column == 3:
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
 
     # COMPREHENSIVE SUMMARY BLOCK
     total_students = len(mastersheet)
@@ -3575,35 +3477,27 @@ def process_single_file(
     withdrawn_count = len(mastersheet[mastersheet["REMARKS"] == "Withdrawn"])
 
     # Add withdrawn student tracking to summary
-    ws.append([])
-    ws.append(["SUMMARY"])
-    ws.append(
-        [f"A total of {total_students} students registered and sat for the Examination"]
-    )
-    ws.append(
+    summary_rows = [
+        [],
+        ["SUMMARY"],
+        [f"A total of {total_students} students registered and sat for the Examination"],
         [
             f"A total of {passed_all} students passed in all courses registered and are to proceed to Second Semester, BM I"
-        ]
-    )
-    ws.append(
+        ],
         [
             f"A total of {resit_count} students with Grade Point Average (GPA) of 2.00 and above failed various courses, but passed at least 45% of the total registered credit units, and are to carry these courses over to the next session."
-        ]
-    )
-    ws.append(
+        ],
         [
             f"A total of {probation_count} students with Grade Point Average (GPA) below 2.00 failed various courses, but passed at least 45% of the total registered credit units, and are placed on Probation, to carry these courses over to the next session."
-        ]
-    )
-    ws.append(
+        ],
         [
             f"A total of {withdrawn_count} students failed in more than 45% of their registered credit units in various courses and have been advised to withdraw"
-        ]
-    )
+        ],
+    ]
 
     # FIXED: Keep the upgrade notice only in the summary section, not in the header
     if upgrade_min_threshold is not None:
-        ws.append(
+        summary_rows.append(
             [
                 f"✅ Upgraded all scores between {upgrade_min_threshold}–49 to 50 as per management decision ({upgraded_scores_count} scores upgraded)"
             ]
@@ -3611,72 +3505,107 @@ def process_single_file(
 
     # Add removed withdrawn students info
     if removed_students:
-        ws.append(
+        summary_rows.append(
             [
                 f"NOTE: {len(removed_students)} previously withdrawn students were removed from this semester's results as they should not be processed."
             ]
         )
 
-    ws.append(
+    summary_rows.append(
         [
             "The above decisions are in line with the provisions of the General Information Section of the General NMCN/NBTE Examinations Regulations (Pg 4) adopted by the College."
         ]
     )
-    ws.append([])
-    ws.append(
-        [
-            "________________________",
-            "",
-            "",
-            "________________________",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
-    )
-    ws.append(
-        [
-            "Mrs. Abini Hauwa",
-            "",
-            "",
-            "Mrs. Olukemi Ogunleye",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
-    )
-    ws.append(
-        [
-            "Head of Exams",
-            "",
-            "",
-            "Chairman, BM Program C'tee",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
+    summary_rows.append([])
+    summary_rows.append(["________________________", "", "", "________________________"] + [""] * 9)
+    summary_rows.append(["Mrs. Abini Hauwa", "", "", "Mrs. Olukemi Ogunleye"] + [""] * 9)
+    summary_rows.append(["Head of Exams", "", "", "Chairman, BM Program C'tee"] + [""] * 9)
+
+    def write_sheet(sink):
+        sink.set_widths(column_widths)
+        # FIXED: Freeze the column headers (S/N, EXAMS NUMBER, NAME, etc.) at row start_row + 3
+        # This ensures all column headers remain visible when scrolling
+        sink.freeze(start_row + 3)
+        if logo_path_norm and os.path.exists(logo_path_norm):
+            try:
+                img = XLImage(logo_path_norm)
+                img.width, img.height = 110, 110
+                sink.add_image(img, "A1")
+            except Exception as e:
+                logger.warning(f"⚠ Could not place logo: {e}")
+        for value, style in top_rows:
+            sink.merge(f"C{sink.next_row}:Q{sink.next_row}")
+            sink.append([None, None, value], [None, None, style])
+
+        # The heading rows sit one row below start_row: start_row itself is a
+        # spacer whose blank course cells carry the rotated title style
+        sink.set_height(start_row, 18)
+        sink.append(
+            [None] * (3 + len(display_course_titles)),
+            [None] * 3
+            + [{
+                "alignment": alignment(horizontal="center", vertical="center", text_rotation=45),
+                "font": font(bold=True, size=9),
+            }] * len(display_course_titles),
+        )
+        # Course titles, with the grey credit-unit style
+        sink.append(
+            [""] * 3 + display_course_titles + [""] * 5,
+            [None] * 3
+            + [{
+                "alignment": alignment(horizontal="center", vertical="center", text_rotation=135),
+                "font": font(bold=True, size=9),
+                "fill": solid_fill("D3D3D3"),
+            }] * len(cu_list),
+        )
+        # Credit units, in the blue heading style
+        header_style = {
+            "font": font(bold=True, size=10, color="FFFFFF"),
+            "alignment": alignment(horizontal="center", vertical="center"),
+            "fill": solid_fill("4A90E2"),
+            "border": THIN_BORDER,
+        }
+        sink.append(
+            cu_row + [None] * (len(headers) - len(cu_row)),
+            [header_style] * len(headers),
+        )
+        # Column headings, bordered like the student rows
+        sink.append(headers, data_styles)
+
+        for i, rowvals in enumerate(sheet_rows.itertuples(index=False, name=None)):
+            styles = list(data_styles)
+            for pos, classes in enumerate(score_classes):
+                if classes[i] is not None:
+                    styles[3 + pos] = score_cell_styles[pos][classes[i]]
+            if remarks_values[i] in remarks_cell_styles:
+                styles[remarks_col] = remarks_cell_styles[remarks_values[i]]
+            sink.append(rowvals, styles)
+
+        label_style = {"font": font(bold=True), "alignment": alignment(horizontal="center")}
+        sink.append(
+            footer_vals,
+            [None, None, label_style]
+            + [{**label_style, "fill": solid_fill("F0E68C")}] * len(ordered_codes),
+        )
+        for row_values in summary_rows:
+            sink.append(row_values)
+
+    MASTERSHEET_SESSION.write_sheet(out_xlsx, sem, write_sheet)
+    logger.info(f"✅ Mastersheet sheet written: {sem} → {out_xlsx}")
+    log_event(
+        logger,
+        "semester_processed",
+        f"📊 {sem}: {len(mastersheet)} students, {len(carryover_students)} carryover",
+        program="BM",
+        set=set_name,
+        semester=sem,
+        file=fname,
+        students=len(mastersheet),
+        remarks=mastersheet["REMARKS"].value_counts().to_dict(),
+        carryover=len(carryover_students),
+        upgraded_scores=upgraded_scores_count,
     )
-
-    wb.save(out_xlsx)
-    logger.info(f"✅ Mastersheet saved: {out_xlsx}")
+    record_semester_history(output_subdir, sem, mastersheet)
 
     # Generate individual student PDF with previous GPAs and CGPA
     safe_sem = re.sub(r"[^\w\-]", "_", sem)
@@ -3684,14 +3613,14 @@ def process_single_file(
         output_subdir, f"mastersheet_students_{ts}_{safe_sem}.pdf"
     )
 
-    logger.info(f"📊 FINAL CHECK before PDF generation:")
-    logger.info(f"   Previous GPAs loaded: {len(previous_gpas)}")
-    logger.info(
+    logger.debug(f"📊 FINAL CHECK before PDF generation:")
+    logger.debug(f"   Previous GPAs loaded: {len(previous_gpas)}")
+    logger.debug(
         f"   CGPA data available for: {len(cgpa_data) if cgpa_data else 0} students"
     )
     if previous_gpas:
         sample = list(previous_gpas.items())[:3]
-        logger.info(f"   Sample GPAs: {sample}")
+        logger.debug(f"   Sample GPAs: {sample}")
 
     try:
         generate_individual_student_pdf(
@@ -3836,7 +3765,10 @@ def main():
                     f"\n🎯 PROCESSING SELECTED SEMESTERS for {bm_set}: {[get_semester_display_info(sem)[3] for sem in semesters_to_process]}"
                 )
 
-                # Process selected semesters in the correct order
+                # Semesters are scored in order (each one's CGPA needs the
+                # last); raw workbooks are parsed and PDFs rendered in workers
+                pipeline = StagePipeline()
+                semester_stages = []
                 for semester_key in semesters_to_process:
                     if semester_key not in SEMESTER_ORDER:
                         logger.warning(f"⚠️ Skipping unknown semester: {semester_key}")
@@ -3851,8 +3783,10 @@ def main():
                             break
 
                     if semester_files_exist:
-                        logger.info(f"\n🎯 Processing {semester_key} in {bm_set}...")
-                        result = process_semester_files(
+                        logger.info(f"\n🎯 Queued {semester_key} in {bm_set}")
+                        stage = pipeline.add(
+                            f"process:{semester_key}",
+                            process_semester_files,
                             semester_key,
                             raw_files,
                             raw_dir,
@@ -3865,16 +3799,33 @@ def main():
                             semester_course_titles,
                             DEFAULT_LOGO_PATH,
                             bm_set,
+                            # Ordering only: a failed prefetch must not drop the semester,
+                            # which then reads its raw workbook in-process
+                            after=[
+                                *queue_semester_prefetch(pipeline, semester_key, raw_files, raw_dir),
+                                *([semester_stages[-1][1]] if semester_stages else []),
+                            ],
                         )
-
-                        if result is not None and result.get("success", False):
-                            logger.info(f"✅ Successfully processed {semester_key}")
-                        else:
-                            logger.error(f"❌ Failed to process {semester_key}")
+                        semester_stages.append((semester_key, stage))
                     else:
                         logger.warning(
                             f"⚠️ No files found for {semester_key} in {bm_set}, skipping..."
                         )
+                restore_withdrawals_from_history(
+                    clean_dir, [key for key, _ in semester_stages]
+                )
+                with deferred_rendering(pipeline):
+                    pipeline.run()
+                forget_raw_sheets()
+                for semester_key, stage in semester_stages:
+                    result = pipeline.results.get(stage)
+                    if result is not None and result.get("success", False):
+                        logger.info(f"✅ Successfully processed {semester_key}")
+                    else:
+                        logger.error(f"❌ Failed to process {semester_key}")
+
+                # Write the set's mastersheet before zipping
+                MASTERSHEET_SESSION.close()
 
                 # Zip the results after processing all semesters for this set
                 result_folder = os.path.join(clean_dir, f"{bm_set}_RESULT-{ts}")
@@ -3892,37 +3843,28 @@ def main():
 
             # Print student tracking summary
             logger.info(f"\n📊 STUDENT TRACKING SUMMARY:")
-            logger.info(f"Total unique students tracked: {len(STUDENT_TRACKER)}")
-            logger.info(f"Total withdrawn students: {len(WITHDRAWN_STUDENTS)}")
+            logger.info(f"Total unique students tracked: {len(STUDENTS)}")
+            logger.info(f"Total withdrawn students: {len(STUDENTS.withdrawals)}")
 
             # NEW: Print carryover summary
-            if CARRYOVER_STUDENTS:
+            if STUDENTS.carryover:
                 logger.info(f"\n📋 BM CARRYOVER STUDENT SUMMARY:")
-                logger.info(f"Total BM carryover students: {len(CARRYOVER_STUDENTS)}")
+                logger.info(f"Total BM carryover students: {STUDENTS.carryover_count()}")
 
             # Print withdrawn students who reappeared
-            reappeared_count = 0
-            for exam_no, data in WITHDRAWN_STUDENTS.items():
-                if data["reappeared_semesters"]:
-                    reappeared_count += 1
-                    logger.warning(
-                        f"🚨 {exam_no}: Withdrawn in {data['withdrawn_semester']}, reappeared in {data['reappeared_semesters']}"
-                    )
+            reappeared = STUDENTS.reappeared()
+            for exam_no, data in reappeared:
+                logger.warning(
+                    f"🚨 {exam_no}: Withdrawn in {data.withdrawn_semester}, reappeared in {data.reappeared_semesters}"
+                )
 
-            if reappeared_count > 0:
+            if reappeared:
                 logger.warning(
-                    f"🚨 ALERT: {reappeared_count} previously withdrawn students have reappeared in later semesters!"
+                    f"🚨 ALERT: {len(reappeared)} previously withdrawn students have reappeared in later semesters!"
                 )
 
             # Analyze student progression
-            sem_counts = {}
-            for student_data in STUDENT_TRACKER.values():
-                sem_count = len(student_data["semesters_present"])
-                if sem_count not in sem_counts:
-                    sem_counts[sem_count] = 0
-                sem_counts[sem_count] += 1
-
-            for sem_count, student_count in sorted(sem_counts.items()):
+            for sem_count, student_count in STUDENTS.semester_counts().items():
                 logger.info(
                     f"Students present in {sem_count} semester(s): {student_count}"
                 )
@@ -3951,9 +3893,9 @@ def main():
     finally:
         # Cleanup
         logger.info("\n📊 Final Summary:")
-        logger.info(f"   Students tracked: {len(STUDENT_TRACKER)}")
-        logger.info(f"   Carryover students: {len(CARRYOVER_STUDENTS)}")
-        logger.info(f"   Withdrawn students: {len(WITHDRAWN_STUDENTS)}")
+        logger.info(f"   Students tracked: {len(STUDENTS)}")
+        logger.info(f"   Carryover students: {STUDENTS.carryover_count()}")
+        logger.info(f"   Withdrawn students: {len(STUDENTS.withdrawals)}")
 
 
 if __name__ == "__main__":
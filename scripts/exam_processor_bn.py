@@ -17,7 +17,7 @@ UPDATED WITH FIXES:
 """
 from openpyxl.cell import MergedCell
 from openpyxl.drawing.image import Image as XLImage
-from openpyxl import load_workbook, Workbook
+from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 import os
@@ -26,7 +26,6 @@ import re
 import pandas as pd
 from datetime import datetime
 import platform
-import difflib
 import math
 import glob
 import tempfile
@@ -40,24 +39,57 @@ import logging
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.platypus import (
-    SimpleDocTemplate,
     Table,
     TableStyle,
     Paragraph,
     Spacer,
-    PageBreak,
     Image,
 )
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+
+from course_catalogue import load_catalogue
+from course_matcher import get_course_matcher
+from input_cache import ParsedInputCache, cache_enabled, course_workbooks_sha256
+from input_manifest import InputManifest, optional_file_sha256
+from pdf_shards import build_student_pdf, deferred_rendering
+from report_template import (
+    CENTER_ALIGN_STYLE,
+    HEADER_STYLE,
+    LEFT_ALIGN_STYLE,
+    MAIN_HEADER_STYLE,
+    REMARKS_STYLE,
+    SAMPLE_STYLES,
+    SIGNATURE_STYLE,
+    SUBTITLE_STYLE,
+    TITLE_STYLE,
+    Letterhead,
+)
+from run_log import configure_logging, log_event
+from score_engine import (
+    classify_by_passed_share,
+    compute_course_scores,
+    derive_semester_results,
+)
+from semester_results import SemesterResultStore
+from sheet_merge import merge_score_sheets, registrations, report_summary
+from sheet_styles import (
+    MEDIUM_BORDER,
+    THIN_BORDER,
+    alignment,
+    font,
+    solid_fill,
+    text_width,
+    with_classes,
+)
+from stage_pipeline import StagePipeline, queue_raw_prefetch
+from student_history import StudentHistory, program_histories
+from student_registry import StudentRegistry
+from workbook_io import RAW_SHEETS, WorkbookSession, forget_raw_sheets, load_raw_sheets
 
 # ----------------------------
 # Logging Configuration
 # ----------------------------
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # ----------------------------
@@ -104,6 +136,11 @@ BASE_DIR = get_base_directory()
 # UPDATED: BN directories now under BN folder
 BN_BASE_DIR = os.path.join(BASE_DIR, "BN")
 BN_COURSES_DIR = os.path.join(BN_BASE_DIR, "BN-COURSES")
+# Bump when the raw-sheet reading/matching/merging changes, so stale
+# entries in the parsed-input cache are not reused
+BN_INPUT_CACHE_VERSION = 1
+# Course-catalogue cache namespace; bump when build_bn_course_catalogue changes
+BN_CATALOGUE_NAMESPACE = "bn-regular-v1"
 
 # Ensure directories exist
 os.makedirs(BASE_DIR, exist_ok=True)
@@ -136,10 +173,77 @@ ORIGINAL_THRESHOLD = 50.0
 UPGRADE_MIN = 0 # Defaults to 0 (disabled) - no upgrades unless explicitly set
 UPGRADE_MAX = 49
 
-# Global student tracker
-STUDENT_TRACKER = {}
-WITHDRAWN_STUDENTS = {}
-CARRYOVER_STUDENTS = {} # New global carryover tracker
+# Global student tracker (presence, withdrawals and carryover)
+STUDENTS = StudentRegistry(BN_SEMESTER_ORDER)
+
+# What each semester's last result was built from; unchanged semesters reuse
+# their PDF from the last result ZIP instead of rendering it again
+INPUT_MANIFEST = InputManifest(BN_SEMESTER_ORDER)
+
+# Per-run copy of each saved semester sheet's GPA/credit columns, so previous
+# and cumulative CGPA lookups do not re-read mastersheet_{ts}.xlsx
+SEMESTER_RESULTS = SemesterResultStore()
+SEMESTER_RESULT_COLUMNS = ["EXAMS NUMBER", "GPA", "CU Passed", "CU Failed"]
+
+# The run's mastersheet workbooks stay open here and are saved once per
+# semester (before the summary sheets re-read them), not once per sheet
+MASTERSHEET_SESSION = WorkbookSession()
+
+# Every saved semester also goes to the set's student_history.sqlite, so a run
+# that only processes later semesters finds earlier CGPAs and withdrawals
+# without the previous runs' workbooks
+HISTORY_COLUMNS = {
+    "exam_number": "EXAMS NUMBER",
+    "name": "NAME",
+    "gpa": "GPA",
+    "cu_passed": "CU Passed",
+    "cu_failed": "CU Failed",
+    "remarks": "REMARKS",
+    "failed_courses": "FAILED COURSES",
+}
+
+def record_semester_history(output_dir, semester_key, mastersheet):
+    """Store a saved semester sheet in the set's student history."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return
+    try:
+        count = history.record_semester(semester_key, mastersheet, HISTORY_COLUMNS)
+        logger.info(f"📚 Stored {count} {semester_key} results in student history")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store {semester_key} in student history: {e}")
+
+def record_carryover_history(output_dir, semester_key, carryover_students):
+    """Store a semester's carryover list (even an empty one) in the student history."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return
+    try:
+        history.record_carryover(semester_key, carryover_students)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store {semester_key} carryover in student history: {e}")
+
+def load_semester_history(output_dir, semester_key):
+    """A semester's stored results (HISTORY_COLUMNS headers), or None."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return None
+    try:
+        return history.semester_results(semester_key, HISTORY_COLUMNS)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read {semester_key} from student history: {e}")
+        return None
+
+def load_history_gpas(output_dir, semester_key):
+    """{exam number: GPA} of a stored semester (one indexed query), or {}."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return {}
+    try:
+        return history.gpas(semester_key)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read {semester_key} GPAs from student history: {e}")
+        return {}
 
 def is_web_mode():
     """Check if running in web mode (file upload)"""
@@ -414,9 +518,22 @@ def process_in_non_interactive_mode(params, base_dir_norm):
         set_output_dir = os.path.join(clean_dir, "{}_RESULT-{}".format(bn_set, ts))
         os.makedirs(set_output_dir, exist_ok=True)
         logger.info(f"📁 Created BN set output directory: {set_output_dir}")
+        # Semesters whose inputs match the last run reuse that run's PDFs
+        INPUT_MANIFEST.open(os.path.dirname(clean_dir))
+        manifest_settings = {
+            "set": bn_set,
+            "pass_threshold": params["pass_threshold"],
+            "upgrade_min_threshold": upgrade_min_threshold,
+            "courses": course_workbooks_sha256(BN_COURSES_DIR),
+            "logo": optional_file_sha256(DEFAULT_LOGO_PATH),
+        }
        
         # Process selected semesters
         semester_processed = 0
+        # Semesters are scored in order (each one's CGPA needs the last);
+        # raw workbooks are parsed and PDFs rendered in worker processes
+        pipeline = StagePipeline()
+        semester_stages = []
         for semester_key in semesters_to_process:
             if semester_key not in BN_SEMESTER_ORDER:
                 logger.warning(f"⚠️ Skipping unknown semester: {semester_key}")
@@ -435,47 +552,76 @@ def process_in_non_interactive_mode(params, base_dir_norm):
                     continue
            
             if semester_files_exist:
-                logger.info(f"\n🎯 Processing BN {semester_key} in {bn_set}...")
+                # Add file existence check
                 try:
-                    # Add file existence check
-                    if not check_bn_files_exist(raw_dir, semester_key):
-                        logger.error(
-                            f"❌ Skipping {semester_key} - no valid files found"
-                        )
-                        continue
-                   
-                    # Process the semester with the upgrade threshold
-                    result = process_bn_semester_files(
-                        semester_key,
-                        raw_files,
-                        raw_dir,
-                        set_output_dir,
-                        ts,
-                        params["pass_threshold"],
-                        semester_course_maps,
-                        semester_credit_units,
-                        semester_lookup,
-                        semester_course_titles,
-                        DEFAULT_LOGO_PATH,
-                        bn_set,
-                        previous_gpas=None,
-                        upgrade_min_threshold=upgrade_min_threshold,
-                    )
-                   
-                    if result and result.get("success", False):
-                        logger.info(f"✅ Successfully processed {semester_key}")
-                        total_processed += result.get("files_processed", 0)
-                        semester_processed += result.get("files_processed", 0)
-                    else:
-                        logger.error(f"❌ Failed to process {semester_key}")
+                    files_exist = check_bn_files_exist(raw_dir, semester_key)
                 except Exception as e:
                     logger.error(f"❌ Error processing {semester_key}: {e}")
                     traceback.print_exc()
+                    continue
+                if not files_exist:
+                    logger.error(
+                        f"❌ Skipping {semester_key} - no valid files found"
+                    )
+                    continue
+               
+                logger.info(f"\n🎯 Queued BN {semester_key} in {bn_set}")
+                # Process the semester with the upgrade threshold
+                stage = pipeline.add(
+                    f"process:{semester_key}",
+                    process_bn_semester_files,
+                    semester_key,
+                    raw_files,
+                    raw_dir,
+                    set_output_dir,
+                    ts,
+                    params["pass_threshold"],
+                    semester_course_maps,
+                    semester_credit_units,
+                    semester_lookup,
+                    semester_course_titles,
+                    DEFAULT_LOGO_PATH,
+                    bn_set,
+                    previous_gpas=None,
+                    upgrade_min_threshold=upgrade_min_threshold,
+                    # Ordering only: a failed prefetch must not drop the semester,
+                    # which then reads its raw workbook in-process
+                    after=[
+                        *queue_bn_semester_prefetch(pipeline, semester_key, raw_files, raw_dir),
+                        *([semester_stages[-1][1]] if semester_stages else []),
+                    ],
+                )
+                semester_stages.append((semester_key, stage))
+                INPUT_MANIFEST.note(
+                    semester_key,
+                    [os.path.join(raw_dir, rf) for rf in bn_semester_raw_files(semester_key, raw_files)],
+                    manifest_settings,
+                )
+                if INPUT_MANIFEST.unchanged(semester_key):
+                    logger.info(
+                        f"♻️ {semester_key} inputs unchanged since the last run; its PDF will be reused"
+                    )
             else:
                 logger.warning(
                     f"⚠️ No files found for {semester_key} in {bn_set}, skipping..."
                 )
+        restore_withdrawals_from_history(clean_dir, [key for key, _ in semester_stages])
+        with deferred_rendering(pipeline):
+            pipeline.run()
+        forget_raw_sheets()
+        for semester_key, stage in semester_stages:
+            result = pipeline.results.get(stage)
+            if result and result.get("success", False):
+                logger.info(f"✅ Successfully processed {semester_key}")
+                total_processed += result.get("files_processed", 0)
+                semester_processed += result.get("files_processed", 0)
+            elif stage in pipeline.errors:
+                logger.error(f"❌ Error processing {semester_key}: {pipeline.errors[stage]}")
+            else:
+                logger.error(f"❌ Failed to process {semester_key}")
        
+        # Write the set's mastersheet before zipping
+        MASTERSHEET_SESSION.close()
         # Create ZIP of BN results ONLY if files were processed
         if semester_processed > 0:
             try:
@@ -484,6 +630,23 @@ def process_in_non_interactive_mode(params, base_dir_norm):
                 )
                 if zip_success:
                     logger.info(f"✅ Successfully created ZIP for {bn_set}")
+                    zip_path = os.path.join(clean_dir, f"{bn_set}_RESULT-{ts}.zip")
+                    recorded = INPUT_MANIFEST.commit(zip_path, set_output_dir)
+                    if recorded:
+                        logger.info(f"📝 Input manifest updated for {len(recorded)} semester(s)")
+                    log_event(
+                        logger,
+                        "set_processed",
+                        f"📦 {bn_set} results zipped: {zip_path}",
+                        program="BN",
+                        set=bn_set,
+                        semesters=[
+                            key
+                            for key, stage in semester_stages
+                            if (pipeline.results.get(stage) or {}).get("success", False)
+                        ],
+                        zip=zip_path,
+                    )
                 else:
                     logger.warning(
                         f"⚠️ ZIP creation failed for {bn_set}, files remain in: {set_output_dir}"
@@ -504,13 +667,23 @@ def process_in_non_interactive_mode(params, base_dir_norm):
         logger.error(" - Course data files are available")
         return False
    
+    log_event(
+        logger,
+        "run_finished",
+        f"\n📊 PROCESSING SUMMARY: {total_processed} BN file(s) processed",
+        program="BN",
+        files=total_processed,
+        students=len(STUDENTS),
+        withdrawn=len(STUDENTS.withdrawals),
+        carryover=STUDENTS.carryover_count(),
+    )
     # Print BN-specific summaries
     logger.info("\n📊 BN STUDENT TRACKING SUMMARY:")
-    logger.info(f"Total unique BN students tracked: {len(STUDENT_TRACKER)}")
-    logger.info(f"Total BN withdrawn students: {len(WITHDRAWN_STUDENTS)}")
-    if CARRYOVER_STUDENTS:
+    logger.info(f"Total unique BN students tracked: {len(STUDENTS)}")
+    logger.info(f"Total BN withdrawn students: {len(STUDENTS.withdrawals)}")
+    if STUDENTS.carryover:
         logger.info("\n📋 BN CARRYOVER STUDENT SUMMARY:")
-        logger.info(f"Total BN carryover students: {len(CARRYOVER_STUDENTS)}")
+        logger.info(f"Total BN carryover students: {STUDENTS.carryover_count()}")
    
     return True
 
@@ -619,7 +792,7 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
         logger.info("📊 Creating BN CGPA Summary Sheet...")
       
         # Validate inputs
-        if not os.path.exists(mastersheet_path):
+        if not MASTERSHEET_SESSION.exists(mastersheet_path):
             logger.error(f"❌ Mastersheet not found: {mastersheet_path}")
             return None
           
@@ -628,7 +801,7 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
             return None
       
         # Load the mastersheet workbook
-        wb = load_workbook(mastersheet_path)
+        wb = MASTERSHEET_SESSION.open(mastersheet_path)
       
         # FIXED: Calculate the correct position for CGPA_SUMMARY sheet
         # We want it after the last semester sheet but before ANALYSIS
@@ -704,7 +877,7 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
                 ]
               
                 # Log available columns for debugging
-                logger.info(f"📋 Columns in {sheet_name}: {df.columns.tolist()}")
+                logger.debug(f"📋 Columns in {sheet_name}: {df.columns.tolist()}")
               
                 # Find exam number column - FIXED: Use specific column names
                 exam_col = None
@@ -743,10 +916,10 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
                     col_str = str(col).upper().strip()
                     if "GPA" in col_str and not any(x in col_str for x in ["CGPA", "PREVIOUS", "OVERALL"]):
                         gpa_col = col
-                        logger.info(f"✅ Found GPA column: '{col}'")
+                        logger.debug(f"✅ Found GPA column: '{col}'")
                     elif "NAME" in col_str:
                         name_col = col
-                        logger.info(f"✅ Found NAME column: '{col}'")
+                        logger.debug(f"✅ Found NAME column: '{col}'")
               
                 if not exam_col or not gpa_col:
                     logger.warning(f"⚠️ Missing required columns in {sheet_name}")
@@ -758,7 +931,7 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
                 for col in df.columns:
                     if str(col).strip().upper() == "REMARKS":
                         remarks_col_name = col
-                        logger.info(f"✅ Found REMARKS column: '{col}'")
+                        logger.debug(f"✅ Found REMARKS column: '{col}'")
                         break
               
                 if not remarks_col_name:
@@ -835,7 +1008,7 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
                               
                                 # Debug logging for first few students
                                 if students_processed <= 3:
-                                    logger.info(f"📝 Status captured: {exam_no} in {sheet_name} -> '{remarks}'")
+                                    logger.debug(f"📝 Status captured: {exam_no} in {sheet_name} -> '{remarks}'")
                             else:
                                 # If no remarks in REMARKS column, try to determine from other data
                                 cu_passed = row.get("CU Passed", 0)
@@ -959,14 +1132,6 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
         # Convert summary_df back to list of dicts to include S/N
         summary_data = summary_df.to_dict(orient='records')
       
-        # Add the summary sheet to the workbook
-        if "CGPA_SUMMARY" in wb.sheetnames:
-            del wb["CGPA_SUMMARY"]
-      
-        # FIXED: Insert CGPA_SUMMARY at the calculated position (after last semester)
-        ws = wb.create_sheet("CGPA_SUMMARY", cgpa_sheet_position)
-        logger.info(f"✅ CGPA_SUMMARY sheet created at position {cgpa_sheet_position}")
-      
         # Add document headings - FIXED: Expanded to match analysis sheet exactly
         headers = (
             ["S/N", "EXAM NO", "NAME", "PROB HIST"]  # Moved STATUS to last
@@ -974,117 +1139,104 @@ def create_bn_cgpa_summary_sheet(mastersheet_path, ts, semester_credit_units, se
             + ["CGPA", "STATUS"]
         )
         last_letter = get_column_letter(len(headers))
+        summary_rows = [tuple(row_data.get(header, "") for header in headers) for row_data in summary_data]
       
         # FIXED HEADER SECTION: Adjust starting row to avoid logo coverage
         start_row = 6 # Start from row 6 to leave space for logo
       
-        # Add logo if provided
-        if logo_path and os.path.exists(logo_path):
-            try:
-                img = XLImage(logo_path)
-                img.width, img.height = 110, 80
-                img.anchor = "A1"
-                ws.add_image(img)
-            except Exception as e:
-                logger.warning(f"⚠️ Could not place logo in CGPA_SUMMARY: {e}")
+        # Auto-adjust column widths
+        column_widths = {}
+        for col_idx, header in enumerate(headers, 1):
+            max_length = max(len(str(header)), text_width(row[col_idx - 1] or "" for row in summary_rows))
+            column_widths[col_idx] = min(max_length + 2, 50)
       
-        # College name - FIXED: Start from row 1 but merge across columns (expanded to fit)
-        ws.merge_cells(f"C1:{last_letter}1")
-        title_cell = ws["C1"]
-        title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA"
-        title_cell.font = Font(bold=True, size=16, color="FFFFFF")
-        title_cell.alignment = Alignment(horizontal="center", vertical="center")
-        title_cell.fill = PatternFill(
-            start_color="1E90FF", end_color="1E90FF", fill_type="solid"
+        # Every data cell is left aligned and bordered; STATUS cells are colour coded
+        data_style = {
+            "alignment": alignment(horizontal="left", vertical="center"),
+            "border": THIN_BORDER,
+        }
+        status_col = headers.index("STATUS")
+        status_styles = with_classes(
+            data_style,
+            {
+                "Withdrawn": {"fill": solid_fill("FFCCCB"), "font": font(bold=True, color="CC0000")},
+                # UPDATED: Changed from 'Probation' to 'Resit'
+                "Resit": {"fill": solid_fill("FFA500"), "font": font(bold=True, color="FFFFFF")},
+                "Passed": {"fill": solid_fill("C6EFCE"), "font": font(bold=True, color="006100")},
+            },
         )
+        row_styles = [data_style] * len(headers)
       
-        # Department
-        ws.merge_cells(f"C2:{last_letter}2")
-        dept_cell = ws["C2"]
-        dept_cell.value = "Department of Nursing"
-        dept_cell.font = Font(bold=True, size=14, color="000000")
-        dept_cell.alignment = Alignment(horizontal="center", vertical="center")
+        def write_sheet(sink):
+            sink.set_widths(column_widths)
+            # Freeze headings
+            sink.freeze(start_row + 1)
       
-        # Set name and title
-        ws.merge_cells(f"C3:{last_letter}3")
-        set_title_cell = ws["C3"]
-        set_title_cell.value = f"Set: {set_name} - CGPA Summary Sheet"
-        set_title_cell.font = Font(bold=True, size=12, color="000000")
-        set_title_cell.alignment = Alignment(horizontal="center", vertical="center")
-      
-        # Add spacing rows
-        ws.row_dimensions[4].height = 5
-        ws.row_dimensions[5].height = 5
+            # Add logo if provided
+            if logo_path and os.path.exists(logo_path):
+                try:
+                    img = XLImage(logo_path)
+                    img.width, img.height = 110, 80
+                    sink.add_image(img, "A1")
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not place logo in CGPA_SUMMARY: {e}")
       
-        # Write header starting from row 6
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=start_row, column=col_idx, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(
-                start_color="4A90E2", end_color="4A90E2", fill_type="solid"
+            # College name - FIXED: Start from row 1 but merge across columns (expanded to fit)
+            for row in (1, 2, 3):
+                sink.merge(f"C{row}:{last_letter}{row}")
+            sink.append(
+                [None, None, "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA"],
+                [None, None, {
+                    "font": font(bold=True, size=16, color="FFFFFF"),
+                    "alignment": alignment(horizontal="center", vertical="center"),
+                    "fill": solid_fill("1E90FF"),
+                }],
             )
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
+            # Department
+            sink.append(
+                [None, None, "Department of Nursing"],
+                [None, None, {
+                    "font": font(bold=True, size=14, color="000000"),
+                    "alignment": alignment(horizontal="center", vertical="center"),
+                }],
+            )
+            # Set name and title
+            sink.append(
+                [None, None, f"Set: {set_name} - CGPA Summary Sheet"],
+                [None, None, {
+                    "font": font(bold=True, size=12, color="000000"),
+                    "alignment": alignment(horizontal="center", vertical="center"),
+                }],
             )
       
-        # Write data starting from row 7
-        for row_idx, row_data in enumerate(summary_data, start_row + 1):
-            for col_idx, header in enumerate(headers, 1):
-                value = row_data.get(header, "")
-                cell = ws.cell(row=row_idx, column=col_idx, value=value)
-              
-                # Color code status cells
-                if header == "STATUS":
-                    if value == "Withdrawn":
-                        cell.fill = PatternFill(
-                            start_color="FFCCCB", end_color="FFCCCB", fill_type="solid"
-                        )
-                        cell.font = Font(bold=True, color="CC0000")
-                    elif value == "Resit":  # UPDATED: Changed from 'Probation' to 'Resit'
-                        cell.fill = PatternFill(
-                            start_color="FFA500", end_color="FFA500", fill_type="solid"
-                        )
-                        cell.font = Font(bold=True, color="FFFFFF")
-                    elif value == "Resit":  # This case remains for original Resit
-                        cell.fill = PatternFill(
-                            start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"
-                        )
-                        cell.font = Font(bold=True, color="9C6500")
-                    elif value == "Passed":
-                        cell.fill = PatternFill(
-                            start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"
-                        )
-                        cell.font = Font(bold=True, color="006100")
-              
-                cell.alignment = Alignment(horizontal="left", vertical="center")
-                cell.border = Border(
-                    left=Side(style="thin"),
-                    right=Side(style="thin"),
-                    top=Side(style="thin"),
-                    bottom=Side(style="thin"),
-                )
+            # Add spacing rows
+            sink.set_height(4, 5)
+            sink.set_height(5, 5)
+            sink.skip(2)
       
-        # Auto-adjust column widths
-        for col_idx, header in enumerate(headers, 1):
-            col_letter = get_column_letter(col_idx)
-            max_length = len(str(header))
-          
-            for row_idx in range(start_row + 1, len(summary_data) + start_row + 1):
-                cell_value = str(ws.cell(row=row_idx, column=col_idx).value or "")
-                max_length = max(max_length, len(cell_value))
-          
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[col_letter].width = adjusted_width
+            # Write header starting from row 6
+            header_style = {
+                "font": font(bold=True, color="FFFFFF"),
+                "fill": solid_fill("4A90E2"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+                "border": THIN_BORDER,
+            }
+            sink.append(headers, [header_style] * len(headers))
       
-        # Freeze headings
-        ws.freeze_panes = ws.cell(row=start_row + 1, column=1)
+            # Write data starting from row 7
+            for values in summary_rows:
+                styles = row_styles
+                if values[status_col] in status_styles:
+                    styles = list(row_styles)
+                    styles[status_col] = status_styles[values[status_col]]
+                sink.append(values, styles)
       
-        # Save the workbook
-        wb.save(mastersheet_path)
+        # Add the summary sheet to the workbook
+        # FIXED: Insert CGPA_SUMMARY at the calculated position (after last semester)
+        MASTERSHEET_SESSION.write_sheet(
+            mastersheet_path, "CGPA_SUMMARY", write_sheet, index=cgpa_sheet_position
+        )
+        logger.info(f"✅ CGPA_SUMMARY sheet created at position {cgpa_sheet_position}")
         logger.info("✅ BN CGPA Summary sheet created successfully with CORRECT status display and POSITION")
       
         # Print detailed summary statistics
@@ -1106,7 +1258,7 @@ def create_bn_analysis_sheet(mastersheet_path, ts, semester_credit_units, set_na
     """Create an analysis sheet with comprehensive statistics for BN - UPDATED WITH RESIT ONLY AND FIXED HEADER."""
     try:
         logger.info("📈 Creating BN Analysis Sheet...")
-        wb = load_workbook(mastersheet_path)
+        wb = MASTERSHEET_SESSION.open(mastersheet_path)
      
         # Collect data from all semesters - UPDATED STRUCTURE
         analysis_data = {
@@ -1359,7 +1511,7 @@ def create_bn_analysis_sheet(mastersheet_path, ts, semester_credit_units, set_na
      
         # Freeze headings
         ws.freeze_panes = ws.cell(row=start_row + 1, column=1)
-        wb.save(mastersheet_path)
+        MASTERSHEET_SESSION.mark_dirty(mastersheet_path)
         logger.info(
             "✅ BN Analysis sheet created successfully with auto-adjusted columns and FIXED withdrawn counting"
         )
@@ -1401,35 +1553,55 @@ def load_previous_cgpas_from_processed_files(
         logger.warning(f"⚠️ Unknown semester progression for {current_semester_key}")
         return previous_cgpas
    
+    # Every saved semester - this run's included - is in the set's student
+    # history, which answers with one indexed query
+    previous_cgpas = load_history_gpas(output_dir, prev_semester)
+    if previous_cgpas:
+        logger.info(
+            f"⚡ Loaded {len(previous_cgpas)} previous CGPAs from {prev_semester} "
+            "in the student history"
+        )
+        return previous_cgpas
+   
     # Load from mastersheet
     mastersheet_path = os.path.join(output_dir, f"mastersheet_{timestamp}.xlsx")
-    if os.path.exists(mastersheet_path):
+    # Without the history, semesters saved earlier in this run are served
+    # from memory and only older ones from the workbook
+    stored_results = SEMESTER_RESULTS.get(mastersheet_path, prev_semester)
+    stored_from = "in-memory"
+    if stored_results is not None or os.path.exists(mastersheet_path):
         try:
-            logger.info(f"🔍 Loading previous CGPA data from: {prev_semester}")
-            # CRITICAL FIX: Read Excel properly and find header row
-            df_raw = pd.read_excel(
-                mastersheet_path, sheet_name=prev_semester, header=None
-            )
-           
-            # Find the actual header row
-            header_row_idx = None
-            for idx, row in df_raw.iterrows():
-                row_values = [str(val).strip().upper() for val in row if pd.notna(val)]
-                if any(
-                    "EXAMS NUMBER" in val or ("EXAM" in val and "NUMBER" in val)
-                    for val in row_values
-                ):
-                    header_row_idx = idx
-                    break
-           
-            if header_row_idx is None:
-                logger.warning(f"⚠️ Could not find header row in {prev_semester}")
-                return previous_cgpas
-           
-            # Read again with correct header
-            df = pd.read_excel(
-                mastersheet_path, sheet_name=prev_semester, header=header_row_idx
-            )
+            if stored_results is not None:
+                logger.info(
+                    f"⚡ Using {stored_from} results of {prev_semester} (no workbook re-read)"
+                )
+                df = stored_results
+            else:
+                logger.info(f"🔍 Loading previous CGPA data from: {prev_semester}")
+                # CRITICAL FIX: Read Excel properly and find header row
+                df_raw = pd.read_excel(
+                    mastersheet_path, sheet_name=prev_semester, header=None
+                )
+               
+                # Find the actual header row
+                header_row_idx = None
+                for idx, row in df_raw.iterrows():
+                    row_values = [str(val).strip().upper() for val in row if pd.notna(val)]
+                    if any(
+                        "EXAMS NUMBER" in val or ("EXAM" in val and "NUMBER" in val)
+                        for val in row_values
+                    ):
+                        header_row_idx = idx
+                        break
+               
+                if header_row_idx is None:
+                    logger.warning(f"⚠️ Could not find header row in {prev_semester}")
+                    return previous_cgpas
+               
+                # Read again with correct header
+                df = pd.read_excel(
+                    mastersheet_path, sheet_name=prev_semester, header=header_row_idx
+                )
            
             # Clean column names
             df.columns = [str(col).strip() for col in df.columns]
@@ -1477,7 +1649,7 @@ def load_previous_cgpas_from_processed_files(
                             previous_cgpas[exam_no] = float(cgpa)
                             cgpas_loaded += 1
                             if cgpas_loaded <= 5:
-                                logger.info(f"📝 Loaded CGPA: {exam_no} → {cgpa}")
+                                logger.debug(f"📝 Loaded CGPA: {exam_no} → {cgpa}")
                         except (ValueError, TypeError):
                             continue
                
@@ -1544,27 +1716,33 @@ def load_all_previous_cgpas_for_cumulative(output_dir, current_semester_key, tim
     for semester in semesters_to_load:
         try:
             logger.info(f"📖 Loading cumulative data from: {semester}")
-            # CRITICAL FIX: Read Excel properly
-            df_raw = pd.read_excel(mastersheet_path, sheet_name=semester, header=None)
-           
-            # Find header row
-            header_row_idx = None
-            for idx, row in df_raw.iterrows():
-                row_values = [str(val).strip().upper() for val in row if pd.notna(val)]
-                if any(
-                    "EXAMS NUMBER" in val or ("EXAM" in val and "NUMBER" in val)
-                    for val in row_values
-                ):
-                    header_row_idx = idx
-                    break
-           
-            if header_row_idx is None:
-                logger.warning(f"⚠️ Could not find header in {semester}")
-                continue
-           
-            df = pd.read_excel(
-                mastersheet_path, sheet_name=semester, header=header_row_idx
-            )
+            # Semesters saved earlier in this run are served from memory,
+            # semesters saved by earlier runs from the set's student history
+            df = SEMESTER_RESULTS.get(mastersheet_path, semester)
+            if df is None:
+                df = load_semester_history(output_dir, semester)
+            if df is None:
+                # CRITICAL FIX: Read Excel properly
+                df_raw = pd.read_excel(mastersheet_path, sheet_name=semester, header=None)
+               
+                # Find header row
+                header_row_idx = None
+                for idx, row in df_raw.iterrows():
+                    row_values = [str(val).strip().upper() for val in row if pd.notna(val)]
+                    if any(
+                        "EXAMS NUMBER" in val or ("EXAM" in val and "NUMBER" in val)
+                        for val in row_values
+                    ):
+                        header_row_idx = idx
+                        break
+               
+                if header_row_idx is None:
+                    logger.warning(f"⚠️ Could not find header in {semester}")
+                    continue
+               
+                df = pd.read_excel(
+                    mastersheet_path, sheet_name=semester, header=header_row_idx
+                )
             df.columns = [str(col).strip() for col in df.columns]
            
             exam_col = find_exam_number_column(df)
@@ -1754,7 +1932,7 @@ def validate_resit_withdrawal_logic(mastersheet, total_cu):
                 correct = f"❌ WRONG! (got '{status}')"
                 errors += 1
            
-            logger.info(
+            logger.debug(
                 f" {exam_no}: GPA={gpa:.2f}, Passed={passed_pct:.1f}%, Failed={cu_failed}, Status={status} {correct}"
             )
        
@@ -1786,7 +1964,7 @@ def validate_resit_withdrawal_logic(mastersheet, total_cu):
                 correct = f"❌ WRONG! (got '{status}')"
                 errors += 1
            
-            logger.info(
+            logger.debug(
                 f" {exam_no}: GPA={gpa:.2f}, Passed={passed_pct:.1f}%, Status={status} {correct}"
             )
        
@@ -1818,7 +1996,7 @@ def validate_resit_withdrawal_logic(mastersheet, total_cu):
                 correct = f"❌ WRONG! (got '{status}')"
                 errors += 1
            
-            logger.info(
+            logger.debug(
                 f" {exam_no}: GPA={gpa:.2f}, Passed={passed_pct:.1f}%, Status={status} {correct}"
             )
        
@@ -1907,8 +2085,7 @@ def identify_carryover_students(
                 }
                 carryover_students.append(carryover_data)
                 # Update global tracker
-                student_key = f"{exam_no}_{semester_key}"
-                CARRYOVER_STUDENTS[student_key] = carryover_data
+                STUDENTS.mark_carryover(exam_no, semester_key)
    
     logger.info(
         f"📊 Identified {len(carryover_students)} carryover students"
@@ -1922,61 +2099,24 @@ def update_student_tracker(
     Update the student tracker with current semester's students.
     UPDATED: Tracks resit status (formerly probation status)
     """
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
     logger.info(f"📊 Updating student tracker for {semester_key}")
     logger.info(f"📝 Current students in this semester: {len(exam_numbers)}")
    
     # Track withdrawn students
-    if withdrawn_students:
-        for exam_no in withdrawn_students:
-            if exam_no not in WITHDRAWN_STUDENTS:
-                WITHDRAWN_STUDENTS[exam_no] = {
-                    "withdrawn_semester": semester_key,
-                    "withdrawn_date": datetime.now().strftime(TIMESTAMP_FMT),
-                    "reappeared_semesters": [],
-                }
-                logger.info(f"🚫 Marked as withdrawn: {exam_no} in {semester_key}")
-   
-    # Track resit students (formerly probation students)
-    resit_count = 0  # UPDATED: Changed from probation_count
-    for exam_no in exam_numbers:
-        if exam_no not in STUDENT_TRACKER:
-            STUDENT_TRACKER[exam_no] = {
-                "first_seen": semester_key,
-                "last_seen": semester_key,
-                "semesters_present": [semester_key],
-                "status": "Active",
-                "withdrawn": False,
-                "withdrawn_semester": None,
-                "resit_history": [],  # UPDATED: Changed from probation_history
-                "current_resit": False,  # UPDATED: Changed from current_probation
-            }
-        else:
-            STUDENT_TRACKER[exam_no]["last_seen"] = semester_key
-            if semester_key not in STUDENT_TRACKER[exam_no]["semesters_present"]:
-                STUDENT_TRACKER[exam_no]["semesters_present"].append(semester_key)
-           
-            # Check if student was previously withdrawn and has reappeared
-            if STUDENT_TRACKER[exam_no]["withdrawn"]:
-                logger.warning(f"⚠️ PREVIOUSLY WITHDRAWN STUDENT REAPPEARED: {exam_no}")
-                if exam_no in WITHDRAWN_STUDENTS:
-                    if (
-                        semester_key
-                        not in WITHDRAWN_STUDENTS[exam_no]["reappeared_semesters"]
-                    ):
-                        WITHDRAWN_STUDENTS[exam_no]["reappeared_semesters"].append(
-                            semester_key
-                        )
-       
-        # Update resit status if this student is on resit (formerly probation)
-        if resit_students and exam_no in resit_students:  # UPDATED: Changed from probation_students
-            if semester_key not in STUDENT_TRACKER[exam_no]["resit_history"]:  # UPDATED
-                STUDENT_TRACKER[exam_no]["resit_history"].append(semester_key)  # UPDATED
-            STUDENT_TRACKER[exam_no]["current_resit"] = True  # UPDATED
-            resit_count += 1  # UPDATED
-   
-    logger.info(f"📈 Total unique students tracked: {len(STUDENT_TRACKER)}")
-    logger.info(f"🚫 Total withdrawn students: {len(WITHDRAWN_STUDENTS)}")
+    for exam_no in withdrawn_students or ():
+        withdrawn_date = datetime.now().strftime(TIMESTAMP_FMT)
+        if STUDENTS.withdraw(exam_no, semester_key, withdrawn_date, mark_record=False):
+            logger.debug(f"🚫 Marked as withdrawn: {exam_no} in {semester_key}")
+   
+    # Track presence and resit students (formerly probation students)
+    reappeared, resit_count = STUDENTS.record_semester(
+        semester_key, exam_numbers, flagged=resit_students
+    )
+    for exam_no in reappeared:
+        logger.warning(f"⚠️ PREVIOUSLY WITHDRAWN STUDENT REAPPEARED: {exam_no}")
+   
+    logger.info(f"📈 Total unique students tracked: {len(STUDENTS)}")
+    logger.info(f"🚫 Total withdrawn students: {len(STUDENTS.withdrawals)}")
     logger.info(f"⚠️ Total resit students: {resit_count}")  # UPDATED
 
 # ----------------------------
@@ -1992,14 +2132,17 @@ def load_bn_course_data():
     if not os.path.exists(course_file):
         raise FileNotFoundError(f"BN course file not found: {course_file}")
    
-    xl = pd.ExcelFile(course_file)
+    return load_catalogue(course_file, BN_CATALOGUE_NAMESPACE, build_bn_course_catalogue)
+
+
+def build_bn_course_catalogue(course_sheets):
+    """Build the load_bn_course_data maps from the course workbook's sheets."""
     semester_course_maps = {}
     semester_credit_units = {}
     semester_lookup = {}
     semester_course_titles = {}
    
-    for sheet in xl.sheet_names:
-        df = pd.read_excel(course_file, sheet_name=sheet, engine="openpyxl", header=0)
+    for sheet, df in course_sheets.items():
         df.columns = [str(c).strip() for c in df.columns]
        
         expected = ["COURSE CODE", "COURSE TITLE", "CU"]
@@ -2198,75 +2341,35 @@ def normalize_course_name(name):
    
     return normalized.strip()
 
+# Bonus (+2) words for BN word-based matching
+BN_COURSE_KEY_WORDS = ("nursing", "health", "care", "maternal", "child", "community", "psychiatric")
+
+def get_bn_course_matcher(course_map):
+    """Indexed, memoized BN matcher for one semester's course map (see course_matcher)."""
+    return get_course_matcher(course_map, normalize_course_name, BN_COURSE_KEY_WORDS)
+
 def find_best_course_match(column_name, course_map):
     """Find the best matching BN course using enhanced matching algorithm."""
-    if not isinstance(column_name, str):
-        return None
-   
-    normalized_column = normalize_course_name(column_name)
-   
-    # First try exact match
-    if normalized_column in course_map:
-        return course_map[normalized_column]
-   
-    # Try partial matches with higher priority
-    for course_norm, course_info in course_map.items():
-        # Check if one is contained in the other
-        if course_norm in normalized_column or normalized_column in course_norm:
-            return course_info
-   
-    # Try word-based matching
-    column_words = set(normalized_column.split())
-    best_match = None
-    best_score = 0
-   
-    for course_norm, course_info in course_map.items():
-        course_words = set(course_norm.split())
-        common_words = column_words.intersection(course_words)
-       
-        if common_words:
-            score = len(common_words)
-            # Bonus for matching BN key words
-            bn_key_words = [
-                "nursing",
-                "health",
-                "care",
-                "maternal",
-                "child",
-                "community",
-                "psychiatric",
-            ]
-            for word in bn_key_words:
-                if word in column_words and word in course_words:
-                    score += 2
-           
-            if score > best_score:
-                best_score = score
-                best_match = course_info
-   
-    # Require at least 2 common words or 1 key word with good match
-    if best_match and best_score >= 2:
-        return best_match
-   
-    # Final fallback: use difflib for fuzzy matching
-    best_match = None
-    best_ratio = 0
-    for course_norm, course_info in course_map.items():
-        ratio = difflib.SequenceMatcher(None, normalized_column, course_norm).ratio()
-        if ratio > best_ratio and ratio > 0.6:
-            best_ratio = ratio
-            best_match = course_info
-   
-    return best_match
+    return get_bn_course_matcher(course_map).match(column_name)
 
 # ----------------------------
 # Carryover Management for BN - FIXED VERSION
 # ----------------------------
 def initialize_carryover_tracker():
     """Initialize the global carryover tracker for BN."""
-    global CARRYOVER_STUDENTS
-    CARRYOVER_STUDENTS = {}
+    STUDENTS.carryover = {}
    
+    # Sets with a student history keep each recorded semester's carryover
+    # list there; JSON files are only read for the semesters it lacks
+    covered = set()
+    for history_set, history in program_histories(BN_BASE_DIR):
+        try:
+            for exam_no, semester_key in history.carryover_keys():
+                STUDENTS.mark_carryover(exam_no, semester_key)
+            covered.update((history_set, key) for key in history.semesters())
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load carryover from {history.path}: {e}")
+
     # Load previous carryover records from all JSON files
     carryover_jsons = glob.glob(
         os.path.join(BN_BASE_DIR, "**/co_student*.json"), recursive=True
@@ -2278,13 +2381,15 @@ def initialize_carryover_tracker():
         try:
             with open(jf, "r") as f:
                 data = json.load(f)
+                json_set = os.path.relpath(jf, BN_BASE_DIR).split(os.sep)[0]
                 for student in data:
-                    student_key = f"{student['exam_number']}_{student['semester']}"
-                    CARRYOVER_STUDENTS[student_key] = student
+                    if (json_set, student["semester"]) in covered:
+                        continue
+                    STUDENTS.mark_carryover(student["exam_number"], student["semester"])
         except Exception as e:
             logger.warning(f"⚠️ Failed to load carryover from {jf}: {e}")
    
-    logger.info(f"📂 Loaded {len(CARRYOVER_STUDENTS)} previous carryover records")
+    logger.info(f"📂 Loaded {STUDENTS.carryover_count()} previous carryover records")
 
 def save_carryover_records(carryover_students, output_dir, set_name, semester_key):
     """
@@ -2429,6 +2534,9 @@ def calculate_semester_gpa(
         "total_units": total_units,
     }
 
+# 5.0 scale as (minimum score, grade point) bands - see get_grade_point
+BN_GRADE_BANDS = ((70, 5.0), (60, 4.0), (50, 3.0), (45, 2.0), (40, 1.0))
+
 def get_grade_point(score):
     """Convert numeric score to grade point (5.0 scale)."""
     try:
@@ -2537,9 +2645,9 @@ def detect_bn_semester_from_filename(filename):
     for pattern, semester_key in semester_patterns.items():
         match = re.search(pattern, filename_upper)
         if match:
-            logger.info(f"✅ MATCHED: '{filename}' → '{semester_key}'")
-            logger.info(f" Pattern: {pattern}")
-            logger.info(f" Matched text: '{match.group()}'")
+            logger.debug(f"✅ MATCHED: '{filename}' → '{semester_key}'")
+            logger.debug(f" Pattern: {pattern}")
+            logger.debug(f" Matched text: '{match.group()}'")
             return semester_key
    
     # If no match, log and raise error
@@ -2599,56 +2707,29 @@ def find_exam_number_column(df):
 # ----------------------------
 def initialize_student_tracker():
     """Initialize the global student tracker."""
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-    STUDENT_TRACKER = {}
-    WITHDRAWN_STUDENTS = {}
+    STUDENTS.clear()
 
 def mark_student_withdrawn(exam_no, semester_key):
     """Mark a student as withdrawn in a specific semester."""
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-    if exam_no in STUDENT_TRACKER:
-        STUDENT_TRACKER[exam_no]["withdrawn"] = True
-        STUDENT_TRACKER[exam_no]["withdrawn_semester"] = semester_key
-        STUDENT_TRACKER[exam_no]["status"] = "Withdrawn"
-   
-    if exam_no not in WITHDRAWN_STUDENTS:
-        WITHDRAWN_STUDENTS[exam_no] = {
-            "withdrawn_semester": semester_key,
-            "withdrawn_date": datetime.now().strftime(TIMESTAMP_FMT),
-            "reappeared_semesters": [],
-        }
+    STUDENTS.withdraw(exam_no, semester_key, datetime.now().strftime(TIMESTAMP_FMT))
 
 def is_student_withdrawn(exam_no):
     """Check if a student has been withdrawn in any previous semester."""
-    return exam_no in WITHDRAWN_STUDENTS
+    return STUDENTS.is_withdrawn(exam_no)
 
 def get_withdrawal_history(exam_no):
     """Get withdrawal history for a student."""
-    if exam_no in WITHDRAWN_STUDENTS:
-        return WITHDRAWN_STUDENTS[exam_no]
-    return None
+    return STUDENTS.withdrawal(exam_no)
 
 def filter_out_withdrawn_students(mastersheet, semester_key):
     """
     Filter out students who were withdrawn in previous semesters.
     Returns filtered mastersheet and list of removed students.
     """
-    removed_students = []
-    filtered_mastersheet = mastersheet.copy()
-   
-    for idx, row in mastersheet.iterrows():
-        exam_no = str(row["EXAMS NUMBER"]).strip()
-        if is_student_withdrawn(exam_no):
-            withdrawal_history = get_withdrawal_history(exam_no)
-            # Only remove if student was withdrawn in a PREVIOUS semester
-            if (
-                withdrawal_history
-                and withdrawal_history["withdrawn_semester"] != semester_key
-            ):
-                removed_students.append(exam_no)
-                filtered_mastersheet = filtered_mastersheet[
-                    filtered_mastersheet["EXAMS NUMBER"] != exam_no
-                ]
+    # Only remove students who were withdrawn in a PREVIOUS semester
+    stripped = mastersheet["EXAMS NUMBER"].astype(str).str.strip()
+    removed_students = stripped[stripped.isin(STUDENTS.withdrawn_before(semester_key))].tolist()
+    filtered_mastersheet = mastersheet[~mastersheet["EXAMS NUMBER"].isin(removed_students)].copy()
    
     if removed_students:
         logger.info(
@@ -2656,12 +2737,31 @@ def filter_out_withdrawn_students(mastersheet, semester_key):
         )
         for exam_no in removed_students:
             withdrawal_history = get_withdrawal_history(exam_no)
-            logger.info(
-                f" - {exam_no} (withdrawn in {withdrawal_history['withdrawn_semester']})"
+            logger.debug(
+                f" - {exam_no} (withdrawn in {withdrawal_history.withdrawn_semester})"
             )
    
     return filtered_mastersheet, removed_students
 
+def restore_withdrawals_from_history(clean_dir, semester_keys):
+    """
+    Track students withdrawn in stored semesters that come before every
+    semester in ``semester_keys`` (those this run does not re-process).
+    """
+    positions = [BN_SEMESTER_ORDER.index(k) for k in semester_keys if k in BN_SEMESTER_ORDER]
+    history = StudentHistory.for_path(clean_dir)
+    if not positions or history is None:
+        return
+    try:
+        withdrawals = history.withdrawals(BN_SEMESTER_ORDER[: min(positions)])
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read withdrawals from student history: {e}")
+        return
+    for exam_no, semester_key, recorded_at in withdrawals:
+        STUDENTS.withdraw(exam_no, semester_key, recorded_at, mark_record=False)
+    if withdrawals:
+        logger.info(f"📚 Restored {len(withdrawals)} earlier withdrawals from student history")
+
 # ----------------------------
 # Set Selection Functions
 # ----------------------------
@@ -2810,7 +2910,7 @@ def apply_upgrade_rule(mastersheet, ordered_codes, min_threshold):
                
                 # Log first few upgrades for visibility
                 if upgraded_count <= 5:
-                    logger.info(f"🔼 {exam_no} - {code}: {original_score} → 50")
+                    logger.debug(f"🔼 {exam_no} - {code}: {original_score} → 50")
    
     if upgraded_count > 0:
         logger.info(
@@ -2897,7 +2997,7 @@ def load_previous_gpas_from_processed_files(
     try:
         # Read the Excel file properly, skipping the header rows
         df = pd.read_excel(mastersheet_path, sheet_name=prev_semester, header=5)
-        logger.info(f"📋 Columns in {prev_semester}: {df.columns.tolist()}")
+        logger.debug(f"📋 Columns in {prev_semester}: {df.columns.tolist()}")
        
         # Find the actual column names
         exam_col = None
@@ -2930,7 +3030,7 @@ def load_previous_gpas_from_processed_files(
                         previous_cgpas[exam_no] = float(gpa)
                         cgpas_loaded += 1
                         if cgpas_loaded <= 5:
-                            logger.info(f"📝 Loaded CGPA: {exam_no} → {gpa}")
+                            logger.debug(f"📝 Loaded CGPA: {exam_no} → {gpa}")
                     except (ValueError, TypeError):
                         continue
            
@@ -3235,8 +3335,7 @@ def generate_individual_student_pdf(
     upgrade_min_threshold=None,
 ):
     """Create a PDF with one page per student matching the sample format exactly with UPDATED TERMINOLOGY AND RESIT ONLY."""
-    doc = SimpleDocTemplate(
-        out_pdf_path,
+    doc_kwargs = dict(
         pagesize=A4,
         rightMargin=40,
         leftMargin=40,
@@ -3244,107 +3343,66 @@ def generate_individual_student_pdf(
         bottomMargin=20,
     )
    
-    styles = getSampleStyleSheet()
-   
-    # Custom styles
-    header_style = ParagraphStyle(
-        "CustomHeader",
-        parent=styles["Normal"],
-        fontSize=10,
-        alignment=TA_CENTER,
-        spaceAfter=2,
-    )
-   
-    main_header_style = ParagraphStyle(
-        "MainHeader",
-        parent=styles["Normal"],
-        fontSize=16,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=6,
-        textColor=colors.HexColor("#800080"),
-    )
-   
-    title_style = ParagraphStyle(
-        "CustomTitle",
-        parent=styles["Normal"],
-        fontSize=12,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=4,
-    )
-   
-    subtitle_style = ParagraphStyle(
-        "SubtitleStyle",
-        parent=styles["Normal"],
-        fontSize=10,
-        alignment=TA_CENTER,
-        spaceAfter=10,
-        textColor=colors.red,
-    )
-   
-    # Left alignment style for course code and title
-    left_align_style = ParagraphStyle(
-        "LeftAlign",
-        parent=styles["Normal"],
-        fontSize=9,
-        alignment=TA_LEFT,
-        leftIndent=4,
-    )
+    # Styles are built once, at import, in report_template
+    styles = SAMPLE_STYLES
+    header_style = HEADER_STYLE
+    main_header_style = MAIN_HEADER_STYLE
+    title_style = TITLE_STYLE
+    subtitle_style = SUBTITLE_STYLE
+    left_align_style = LEFT_ALIGN_STYLE
+    center_align_style = CENTER_ALIGN_STYLE
+    remarks_style = REMARKS_STYLE
+
+    # Static top of every page: laid out once, drawn from a shared PDF form
+    letterhead_elems = []
+    # Logo and header
+    logo_img = None
+    if logo_path and os.path.exists(logo_path):
+        try:
+            logo_img = Image(logo_path, width=0.8 * inch, height=0.8 * inch)
+        except Exception as e:
+            logger.warning(f"Could not load logo: {e}")
    
-    center_align_style = ParagraphStyle(
-        "CenterAlign", parent=styles["Normal"], fontSize=9, alignment=TA_CENTER
-    )
+    # Header table with logo and title
+    if logo_img:
+        header_data = [
+            [
+                logo_img,
+                Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style),
+            ]
+        ]
+        header_table = Table(header_data, colWidths=[1.0 * inch, 5.0 * inch])
+        header_table.setStyle(
+            TableStyle(
+                [
+                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                    ("ALIGN", (0, 0), (0, 0), "LEFT"),
+                    ("ALIGN", (1, 0), (1, 0), "CENTER"),
+                ]
+            )
+        )
+        letterhead_elems.append(header_table)
+    else:
+        letterhead_elems.append(
+            Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style)
+        )
    
-    # Style for remarks with smaller font
-    remarks_style = ParagraphStyle(
-        "RemarksStyle", parent=styles["Normal"], fontSize=8, alignment=TA_LEFT
-    )
+    # Address and contact info
+    letterhead_elems.append(Paragraph("P.O.Box 507, Gwagwalada-Abuja, Nigeria", header_style))
+    letterhead_elems.append(Paragraph("<b>EXAMINATIONS OFFICE</b>", header_style))
+    letterhead_elems.append(Paragraph("fctsonexamsoffice@gmail.com", header_style))
+    letterhead_elems.append(Spacer(1, 8))
    
-    elems = []
+    letterhead_elems.append(Paragraph("STUDENT'S ACADEMIC PROGRESS REPORT", title_style))
+    letterhead_elems.append(Paragraph("(THIS IS NOT A TRANSCRIPT)", subtitle_style))
+    letterhead_elems.append(Spacer(1, 8))
+    letterhead = Letterhead(letterhead_elems)
+
+    # One (exam number, flowables) entry per student; pdf_shards lays them out
+    student_pages = []
    
     for idx, r in mastersheet_df.iterrows():
-        # Logo and header
-        logo_img = None
-        if logo_path and os.path.exists(logo_path):
-            try:
-                logo_img = Image(logo_path, width=0.8 * inch, height=0.8 * inch)
-            except Exception as e:
-                logger.warning(f"Could not load logo: {e}")
-       
-        # Header table with logo and title
-        if logo_img:
-            header_data = [
-                [
-                    logo_img,
-                    Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style),
-                ]
-            ]
-            header_table = Table(header_data, colWidths=[1.0 * inch, 5.0 * inch])
-            header_table.setStyle(
-                TableStyle(
-                    [
-                        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                        ("ALIGN", (0, 0), (0, 0), "LEFT"),
-                        ("ALIGN", (1, 0), (1, 0), "CENTER"),
-                    ]
-                )
-            )
-            elems.append(header_table)
-        else:
-            elems.append(
-                Paragraph("FCT COLLEGE OF NURSING SCIENCES", main_header_style)
-            )
-       
-        # Address and contact info
-        elems.append(Paragraph("P.O.Box 507, Gwagwalada-Abuja, Nigeria", header_style))
-        elems.append(Paragraph("<b>EXAMINATIONS OFFICE</b>", header_style))
-        elems.append(Paragraph("fctsonexamsoffice@gmail.com", header_style))
-        elems.append(Spacer(1, 8))
-       
-        elems.append(Paragraph("STUDENT'S ACADEMIC PROGRESS REPORT", title_style))
-        elems.append(Paragraph("(THIS IS NOT A TRANSCRIPT)", subtitle_style))
-        elems.append(Spacer(1, 8))
+        elems = [letterhead]
        
         # Student particulars - SEPARATE FROM PASSPORT PHOTO
         exam_no = str(r.get("EXAMS NUMBER", r.get("REG. No", "")))
@@ -3576,7 +3634,7 @@ def generate_individual_student_pdf(
        
         if (
             previously_withdrawn
-            and withdrawal_history["withdrawn_semester"] == semester_key
+            and withdrawal_history.withdrawn_semester == semester_key
         ):
             if failed_courses_formatted:
                 final_remarks_lines.append(
@@ -3588,7 +3646,7 @@ def generate_individual_student_pdf(
             else:
                 final_remarks_lines.append("Withdrawn")
         elif previously_withdrawn:
-            withdrawn_semester = withdrawal_history["withdrawn_semester"]
+            withdrawn_semester = withdrawal_history.withdrawn_semester
             year, sem_num, level, sem_display, set_code = get_semester_display_info(
                 withdrawn_semester
             )
@@ -3693,21 +3751,11 @@ def generate_individual_student_pdf(
             [
                 Paragraph(
                     "<b>EXAMS SECRETARY</b>",
-                    ParagraphStyle(
-                        "SigStyle",
-                        parent=styles["Normal"],
-                        fontSize=10,
-                        alignment=TA_CENTER,
-                    ),
+                    SIGNATURE_STYLE,
                 ),
                 Paragraph(
                     "<b>HOD NURSING</b>",
-                    ParagraphStyle(
-                        "SigStyle",
-                        parent=styles["Normal"],
-                        fontSize=10,
-                        alignment=TA_CENTER,
-                    ),
+                    SIGNATURE_STYLE,
                 ),
             ],
         ]
@@ -3724,16 +3772,51 @@ def generate_individual_student_pdf(
        
         elems.append(sig_table)
        
-        # Page break for next student
-        if idx < len(mastersheet_df) - 1:
-            elems.append(PageBreak())
+        student_pages.append((exam_no, elems))
    
-    doc.build(elems)
+    if INPUT_MANIFEST.restore(semester_key, out_pdf_path):
+        logger.info(f"♻️ Reused unchanged {semester_key} PDF from the last result: {out_pdf_path}")
+        return
+    build_student_pdf(student_pages, out_pdf_path, doc_kwargs)
     logger.info(f"✅ Individual student PDF written: {out_pdf_path}")
 
 # ----------------------------
 # Main BN Processing Functions - UPDATED WITH ND LOGIC AND COLUMN STRUCTURE
 # ----------------------------
+def bn_semester_raw_files(semester_key, raw_files):
+    """The files in ``raw_files`` that belong to BN ``semester_key``."""
+    semester_files = []
+    for rf in raw_files:
+        try:
+            detected_sem = detect_bn_semester_from_filename(rf)
+            if detected_sem == semester_key:
+                semester_files.append(rf)
+        except ValueError as e:
+            logger.warning(f"⚠️ Could not detect semester for {rf}: {e}")
+            continue
+    return semester_files
+
+
+def queue_bn_semester_prefetch(pipeline, semester_key, raw_files, raw_dir):
+    """
+    Parse a BN semester's raw workbooks in the pipeline's workers ahead of
+    process_bn_single_file. Files with a parsed-input cache entry are
+    skipped. Returns the parse stage names.
+    """
+    paths = []
+    for rf in bn_semester_raw_files(semester_key, raw_files):
+        raw_path = os.path.join(raw_dir, rf)
+        if cache_enabled():
+            try:
+                input_cache, input_cache_key = bn_input_cache(raw_path, semester_key)
+                if input_cache.contains(input_cache_key):
+                    continue
+            except OSError:
+                pass
+        paths.append(raw_path)
+    return queue_raw_prefetch(pipeline, paths, RAW_SHEETS, dtype=str, header=0)
+
+
 def process_bn_semester_files(
     semester_key,
     raw_files,
@@ -3756,15 +3839,7 @@ def process_bn_semester_files(
     logger.info(f"{'='*60}")
    
     # Filter files for this semester
-    semester_files = []
-    for rf in raw_files:
-        try:
-            detected_sem = detect_bn_semester_from_filename(rf)
-            if detected_sem == semester_key:
-                semester_files.append(rf)
-        except ValueError as e:
-            logger.warning(f"⚠️ Could not detect semester for {rf}: {e}")
-            continue
+    semester_files = bn_semester_raw_files(semester_key, raw_files)
    
     if not semester_files:
         logger.warning(f"⚠️ No files found for semester {semester_key}")
@@ -3836,6 +3911,8 @@ def process_bn_semester_files(
     if files_processed > 0:
         # Create CGPA summary after processing all files
         mastersheet_path = os.path.join(output_dir, "mastersheet_{}.xlsx".format(ts))
+        # The summary sheets re-read the semester sheets from disk
+        MASTERSHEET_SESSION.flush(mastersheet_path)
         if os.path.exists(mastersheet_path):
             try:
                 create_bn_cgpa_summary_sheet(
@@ -3853,6 +3930,19 @@ def process_bn_semester_files(
     else:
         return {"success": False, "files_processed": 0, "error": "No files processed"}
 
+def bn_input_cache(path, semester_key):
+    """Parsed-input cache and entry key for one BN raw file."""
+    input_cache = ParsedInputCache.for_raw_file(path)
+    input_cache_key = input_cache.key(
+        path,
+        "BN",
+        BN_INPUT_CACHE_VERSION,
+        semester_key,
+        course_workbooks_sha256(BN_COURSES_DIR),
+    )
+    return input_cache, input_cache_key
+
+
 def process_bn_single_file(
     path,
     raw_dir, # Added
@@ -3882,45 +3972,64 @@ def process_bn_single_file(
  
     logger.info(f"🔍 Processing BN file: {fname} for semester: {semester_key}")
  
-    try:
-        xl = pd.ExcelFile(path)
-        logger.info(f"✅ Successfully opened BN Excel file: {fname}")
-        logger.info(f"📋 Sheets found: {xl.sheet_names}")
+    # Reuse the merged CA/OBJ/EXAM frame from an earlier run with identical inputs
+    input_cache = None
+    input_cache_key = None
+    merged = None
+    if cache_enabled():
+        try:
+            input_cache, input_cache_key = bn_input_cache(path, semester_key)
+            merged = input_cache.load(input_cache_key)
+        except OSError as e:
+            logger.warning(f"⚠️ Parsed-input cache unavailable: {e}")
+            input_cache = None
+    from_input_cache = merged is not None
+    if from_input_cache:
+        logger.info(f"⚡ Loaded merged CA/OBJ/EXAM data for {fname} from parsed-input cache")
+    else:
+        expected_sheets = ["CA", "OBJ", "EXAM"]
+        try:
+            # Open the workbook once and parse every CA/OBJ/EXAM sheet from it
+            # (already parsed when the pipeline prefetched it)
+            raw = load_raw_sheets(path, expected_sheets, dtype=str, header=0)
+            logger.info(f"✅ Successfully opened BN Excel file: {fname}")
+            logger.debug(f"📋 Sheets found: {raw.sheet_names}")
      
-        # Check if file has any sheets
-        if not xl.sheet_names:
-            logger.error(f"❌ Excel file has no sheets: {path}")
+            # Check if file has any sheets
+            if not raw.sheet_names:
+                logger.error(f"❌ Excel file has no sheets: {path}")
+                return None
+        except Exception as e:
+            logger.error(f"❌ Error opening BN excel {path}: {e}")
             return None
-    except Exception as e:
-        logger.error(f"❌ Error opening BN excel {path}: {e}")
-        return None
  
-    expected_sheets = ["CA", "OBJ", "EXAM"]
-    dfs = {}
+        dfs = {}
  
-    for s in expected_sheets:
-        if s in xl.sheet_names:
-            try:
-                dfs[s] = pd.read_excel(path, sheet_name=s, dtype=str, header=0)
-                logger.info(f"✅ Loaded BN sheet {s} with shape: {dfs[s].shape}")
+        for s in expected_sheets:
+            if s in raw.sheet_names:
+                try:
+                    if s in raw.errors:
+                        raise raw.errors[s][0]
+                    dfs[s] = raw.frames[s]
+                    logger.debug(f"✅ Loaded BN sheet {s} with shape: {dfs[s].shape}")
              
-                # Check if data is in transposed format and transform if needed
-                if detect_data_format(dfs[s], s):
-                    logger.info(
-                        f"🔄 BN Data in {s} sheet is in transposed format, transforming..."
-                    )
-                    dfs[s] = transform_transposed_data(dfs[s], s)
-                    logger.info(f"✅ Transformed BN {s} sheet to wide format")
-            except Exception as e:
-                logger.error(f"❌ Error reading BN sheet {s}: {e}")
+                    # Check if data is in transposed format and transform if needed
+                    if detect_data_format(dfs[s], s):
+                        logger.debug(
+                            f"🔄 BN Data in {s} sheet is in transposed format, transforming..."
+                        )
+                        dfs[s] = transform_transposed_data(dfs[s], s)
+                        logger.debug(f"✅ Transformed BN {s} sheet to wide format")
+                except Exception as e:
+                    logger.error(f"❌ Error reading BN sheet {s}: {e}")
+                    dfs[s] = pd.DataFrame()
+            else:
+                logger.warning(f"⚠️ BN Sheet {s} not found in {fname}")
                 dfs[s] = pd.DataFrame()
-        else:
-            logger.warning(f"⚠️ BN Sheet {s} not found in {fname}")
-            dfs[s] = pd.DataFrame()
  
-    if not dfs:
-        logger.error("No CA/OBJ/EXAM sheets detected — skipping file.")
-        return None
+        if not dfs:
+            logger.error("No CA/OBJ/EXAM sheets detected — skipping file.")
+            return None
  
     # Use the provided semester key
     sem = semester_key
@@ -3947,6 +4056,7 @@ def process_bn_single_file(
         return None
  
     course_map = semester_course_maps[sem]
+    course_matcher = get_bn_course_matcher(course_map)
     credit_units = semester_credit_units[sem]
     course_titles = semester_course_titles[sem]
  
@@ -3960,108 +4070,47 @@ def process_bn_single_file(
     total_cu = sum(filtered_credit_units.values()) if filtered_credit_units else 0
     logger.info(f"📊 Total credit units for {semester_key}: {total_cu}")
  
-    reg_no_cols = {
-        s: find_column_by_names(
-            df, ["REG. No", "Reg No", "Registration Number", "EXAM NUMBER"]
-        )
-        for s, df in dfs.items()
-    }
- 
-    name_cols = {
-        s: find_column_by_names(df, ["NAME", "Full Name", "Candidate Name"])
-        for s, df in dfs.items()
-    }
+    if not from_input_cache:
+        reg_no_cols = {
+            s: find_column_by_names(
+                df, ["REG. No", "Reg No", "Registration Number", "EXAM NUMBER"]
+            )
+            for s, df in dfs.items()
+        }
  
-    merged = None
+        name_cols = {
+            s: find_column_by_names(df, ["NAME", "Full Name", "Candidate Name"])
+            for s, df in dfs.items()
+        }
  
-    for s, df in dfs.items():
-        df = df.copy()
-        regcol = reg_no_cols.get(s)
-        namecol = name_cols.get(s)
-     
-        if not regcol:
-            regcol = df.columns[0] if len(df.columns) > 0 else None
-     
-        if not namecol and len(df.columns) > 1:
-            namecol = df.columns[1]
-     
-        if regcol is None:
-            logger.warning(f"Skipping sheet {s}: no reg column found")
-            continue
-     
-        df["REG. No"] = df[regcol].astype(str).str.strip()
-        if namecol:
-            df["NAME"] = df[namecol].astype(str).str.strip()
-        else:
-            df["NAME"] = pd.NA
-     
-        to_drop = [c for c in [regcol, namecol] if c and c not in ["REG. No", "NAME"]]
-        df.drop(columns=to_drop, errors="ignore", inplace=True)
-     
-        # Enhanced course matching using the new algorithm
-        for col in [c for c in df.columns if c not in ["REG. No", "NAME"]]:
-            best_match = find_best_course_match(col, course_map)
-            if best_match:
-                matched_code = best_match["code"]
-                newcol = "{}_{}".format(matched_code, s.upper())
-                df.rename(columns={col: newcol}, inplace=True)
-                logger.info(f"✅ Matched '{col}' -> '{matched_code}'")
-     
-        cur_cols = ["REG. No", "NAME"] + [
-            c for c in df.columns if c.endswith("_{}".format(s.upper()))
-        ]
-        cur = df[cur_cols].copy()
-     
-        if merged is None:
-            merged = cur
-        else:
-            merged = merged.merge(cur, on="REG. No", how="outer", suffixes=("", "_dup"))
-            if "NAME_dup" in merged.columns:
-                merged["NAME"] = merged["NAME"].combine_first(merged["NAME_dup"])
-                merged.drop(columns=["NAME_dup"], inplace=True)
+        # One categorical-keyed alignment of the sheets; course columns become
+        # (code, component) pairs
+        merged, merge_report = merge_score_sheets(
+            dfs,
+            reg_no_cols,
+            name_cols,
+            lambda col: (course_matcher.match(col) or {}).get("code"),
+        )
+        merge_issues = report_summary(merge_report)
+        if merge_issues:
+            logger.warning(f"⚠️ {fname}: {merge_issues}")
  
     if merged is None or merged.empty:
         logger.error("No data merged from sheets — skipping file.")
         return None
+    if input_cache is not None and not from_input_cache:
+        input_cache.store(input_cache_key, merged)
  
-    mastersheet = merged[["REG. No", "NAME"]].copy()
+    mastersheet = registrations(merged)
     mastersheet.rename(columns={"REG. No": "EXAMS NUMBER"}, inplace=True)
     mastersheet["EXAMS NUMBER"] = mastersheet["EXAMS NUMBER"].apply(
         lambda x: str(int(float(x))) if "." in str(x) else str(x)
     )
  
+    course_scores = compute_course_scores(merged, ordered_codes)
     for code in ordered_codes:
-        ca_col = "{}_CA".format(code)
-        obj_col = "{}_OBJ".format(code)
-        exam_col = "{}_EXAM".format(code)
-     
-        ca_series = (
-            pd.to_numeric(merged[ca_col], errors="coerce")
-            if ca_col in merged.columns
-            else pd.Series([0] * len(merged), index=merged.index)
-        )
-        obj_series = (
-            pd.to_numeric(merged[obj_col], errors="coerce")
-            if obj_col in merged.columns
-            else pd.Series([0] * len(merged), index=merged.index)
-        )
-        exam_series = (
-            pd.to_numeric(merged[exam_col], errors="coerce")
-            if exam_col in merged.columns
-            else pd.Series([0] * len(merged), index=merged.index)
-        )
-     
-        ca_norm = (ca_series / 20) * 100
-        obj_norm = (obj_series / 20) * 100
-        exam_norm = (exam_series / 80) * 100
-     
-        ca_norm = ca_norm.fillna(0).clip(upper=100)
-        obj_norm = obj_norm.fillna(0).clip(upper=100)
-        exam_norm = exam_norm.fillna(0).clip(upper=100)
-     
-        total = (ca_norm * 0.2) + (((obj_norm + exam_norm) / 2) * 0.8)
-        mastersheet[code] = total.round(0).clip(upper=100).values
- 
+        mastersheet[code] = course_scores[code].values
+
     # APPLY FLEXIBLE UPGRADE RULE
     if should_use_interactive_mode():
         upgrade_min_threshold, upgraded_scores_count = get_upgrade_threshold_from_user(
@@ -4099,71 +4148,31 @@ def process_bn_single_file(
             1 for code in ordered_codes if float(row.get(code, 0) or 0) < pass_threshold
         )
         passed_pct = (cu_passed / total_cu * 100) if total_cu > 0 else 0
-        logger.info(
+        logger.debug(
             f" {exam_no}: Passed={cu_passed}({passed_pct:.1f}%), Failed={cu_failed}, Total CU={total_cu}"
         )
  
-    # (RE)CALCULATE REMARKS AND METRICS AFTER POSSIBLE UPDATES
-    def compute_failed_courses(row):
-        """Compute failed courses list for the new column structure."""
-        fails = [c for c in ordered_codes if float(row.get(c, 0) or 0) < pass_threshold]
-        if not fails:
-            return ""
-        return ", ".join(sorted(fails))
- 
-    def compute_student_remarks(row):
-        """Compute student status for the new REMARKS column - USING UPDATED ND LOGIC"""
-        # FIXED: Pass total_cu to determine_student_status
-        status = determine_student_status(row, total_cu, pass_threshold)
-        return status
- 
-    # Calculate TCPE, TCUP, TCUF correctly
-    # (RE)CALCULATE METRICS AFTER POSSIBLE UPGRADES
-    def calc_tcpe_tcup_tcuf(row):
-        tcpe = 0.0
-        tcup = 0
-        tcuf = 0
-        for code in ordered_codes:
-            score = float(row.get(code, 0) or 0)
-            cu = filtered_credit_units.get(code, 0)
-            gp = get_grade_point(score)
-            tcpe += gp * cu
-            if score >= pass_threshold:
-                tcup += cu
-            else:
-                tcuf += cu
-        return tcpe, tcup, tcuf
- 
-    results = mastersheet.apply(calc_tcpe_tcup_tcuf, axis=1, result_type="expand")
-    mastersheet["TCPE"] = results[0].round(1)
-    mastersheet["CU Passed"] = results[1].astype(int)
-    mastersheet["CU Failed"] = results[2].astype(int)
- 
-    # <<< GPA MUST COME FIRST >>>
-    mastersheet["GPA"] = mastersheet.apply(
-        lambda row: calculate_semester_gpa(
-            row, ordered_codes, filtered_credit_units, pass_threshold
-        )["gpa"],
-        axis=1,
+    # (RE)CALCULATE REMARKS AND METRICS AFTER POSSIBLE UPGRADES
+    # TCPE, CU Passed/Failed, GPA, AVERAGE and FAILED COURSES come from one
+    # columnar pass over the score matrix instead of per-row apply chains
+    semester_results = derive_semester_results(
+        mastersheet[ordered_codes],
+        [filtered_credit_units.get(code, 0) for code in ordered_codes],
+        BN_GRADE_BANDS,
+        pass_threshold,
+        skip_blank=True,
     )
+    for col in ["TCPE", "CU Passed", "CU Failed", "GPA", "AVERAGE", "FAILED COURSES"]:
+        mastersheet[col] = semester_results[col]
  
-    mastersheet["AVERAGE"] = mastersheet[ordered_codes].mean(axis=1).round(0)
- 
-    # Now REMARKS sees the real GPA
-    mastersheet["FAILED COURSES"] = mastersheet.apply(compute_failed_courses, axis=1)
-    mastersheet["REMARKS"] = mastersheet.apply(compute_student_remarks, axis=1)
- 
-    # Calculate GPA using the new function
-    def calculate_gpa(row):
-        gpa_data = calculate_semester_gpa(
-            row, ordered_codes, filtered_credit_units, pass_threshold
+    # REMARKS sees the real GPA (GPA < 2.00 with >= 45% passed is a Resit for BN)
+    if total_cu == 0:
+        logger.error("❌ CRITICAL: total_cu is 0! Cannot calculate percentage.")
+        mastersheet["REMARKS"] = "Error"
+    else:
+        mastersheet["REMARKS"] = classify_by_passed_share(
+            semester_results, total_cu, below_gpa_status="Resit"
         )
-        return gpa_data["gpa"]
- 
-    mastersheet["GPA"] = mastersheet.apply(calculate_gpa, axis=1)
-    mastersheet["AVERAGE"] = (
-        mastersheet[[c for c in ordered_codes]].mean(axis=1).round(0)
-    )
  
     # VALIDATE RESIT/WITHDRAWAL LOGIC (like ND script)  # UPDATED: Changed from PROBATION to RESIT
     validate_resit_withdrawal_logic(mastersheet, total_cu)  # UPDATED
@@ -4176,12 +4185,11 @@ def process_bn_single_file(
     # Identify withdrawn students in this semester (after filtering)
     withdrawn_students = []
     for idx, row in mastersheet.iterrows():
-        student_status = determine_student_status(row, total_cu, pass_threshold)
-        if student_status == "Withdrawn":
+        if row["REMARKS"] == "Withdrawn":
             exam_no = str(row["EXAMS NUMBER"]).strip()
             withdrawn_students.append(exam_no)
             mark_student_withdrawn(exam_no, semester_key)
-            logger.info(f"🚫 Student {exam_no} marked as withdrawn in {semester_key}")
+            logger.debug(f"🚫 Student {exam_no} marked as withdrawn in {semester_key}")
  
     # UPDATED: Identify resit students for tracking (formerly probation students)
     resit_students = []  # UPDATED: Changed from probation_students
@@ -4200,6 +4208,7 @@ def process_bn_single_file(
     carryover_students = identify_carryover_students(
         mastersheet, semester_key, set_name, pass_threshold
     )
+    record_carryover_history(output_dir, semester_key, carryover_students)
  
     if carryover_students:
         carryover_dir = save_carryover_records(
@@ -4257,72 +4266,43 @@ def process_bn_single_file(
  
     out_xlsx = os.path.join(output_subdir, "mastersheet_{}.xlsx".format(ts))
  
-    if not os.path.exists(out_xlsx):
-        wb = Workbook()
-        if wb.active:
-            wb.remove(wb.active)
-    else:
-        wb = load_workbook(out_xlsx)
- 
-    if sem not in wb.sheetnames:
-        ws = wb.create_sheet(title=sem)
-    else:
-        ws = wb[sem]
- 
-    try:
-        ws.delete_rows(1, ws.max_row)
-        ws.delete_cols(1, ws.max_column)
-    except Exception:
-        pass
- 
-    ws.insert_rows(1, 4)
- 
     logo_path_norm = os.path.normpath(logo_path) if logo_path else None
-    if logo_path_norm and os.path.exists(logo_path_norm):
-        try:
-            img = XLImage(logo_path_norm)
-            img.width, img.height = 110, 80
-            img.anchor = "A1"
-            ws.add_image(img, "A1")
-        except Exception as e:
-            logger.warning(f"⚠ Could not place logo: {e}")
  
     # FIXED MERGE RANGE
     last_letter = get_column_letter(len(out_cols))
-    ws.merge_cells(f"C1:{last_letter}1")
-    title_cell = ws["C1"]
-    title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA"
-    title_cell.font = Font(bold=True, size=16, color="FFFFFF")
-    title_cell.alignment = Alignment(horizontal="center", vertical="center")
-    title_cell.fill = PatternFill(
-        start_color="1E90FF", end_color="1E90FF", fill_type="solid"
-    )
- 
-    border = Border(
-        left=Side(style="medium"),
-        right=Side(style="medium"),
-        top=Side(style="medium"),
-        bottom=Side(style="medium"),
-    )
-    title_cell.border = border
- 
-    ws.merge_cells(f"C2:{last_letter}2")
-    dept_cell = ws["C2"]
-    dept_cell.value = "DEPARTMENT OF NURSING"
-    dept_cell.font = Font(bold=True, size=14, color="000000")
-    dept_cell.alignment = Alignment(horizontal="center", vertical="center")
- 
-    ws.merge_cells(f"C3:{last_letter}3")
-    set_result_cell = ws["C3"]
-    set_result_cell.value = f"{set_name} BASIC NURSING {level_display} {semester_display} RESULT"
-    set_result_cell.font = Font(bold=True, size=12, color="000000")
-    set_result_cell.alignment = Alignment(horizontal="center", vertical="center")
- 
-    ws.merge_cells(f"C4:{last_letter}4")
-    session_cell = ws["C4"]
-    session_cell.value = f"{datetime.now().year}/{datetime.now().year + 1} SESSION — {datetime.now().strftime('%B %d, %Y')}"
-    session_cell.font = Font(bold=True, size=12, color="000000")
-    session_cell.alignment = Alignment(horizontal="center", vertical="center")
+    session_title = f"{datetime.now().year}/{datetime.now().year + 1} SESSION — {datetime.now().strftime('%B %d, %Y')}"
+    top_rows = [
+        (
+            "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA",
+            {
+                "font": font(bold=True, size=16, color="FFFFFF"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+                "fill": solid_fill("1E90FF"),
+                "border": MEDIUM_BORDER,
+            },
+        ),
+        (
+            "DEPARTMENT OF NURSING",
+            {
+                "font": font(bold=True, size=14, color="000000"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+            },
+        ),
+        (
+            f"{set_name} BASIC NURSING {level_display} {semester_display} RESULT",
+            {
+                "font": font(bold=True, size=12, color="000000"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+            },
+        ),
+        (
+            session_title,
+            {
+                "font": font(bold=True, size=12, color="000000"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+            },
+        ),
+    ]
  
     start_row = 5
     display_course_titles = []
@@ -4330,113 +4310,69 @@ def process_bn_single_file(
         if c in ordered_codes:
             display_course_titles.append(course_map[t]["original_name"])
  
-    ws.append([""] * 3 + display_course_titles + [""] * 7) # Updated for new columns
- 
-    for i, cell in enumerate(
-        ws[start_row][3 : 3 + len(display_course_titles)], start=3
-    ):
-        cell.alignment = Alignment(
-            horizontal="center", vertical="center", text_rotation=45
-        )
-        cell.font = Font(bold=True, size=9)
- 
-    ws.row_dimensions[start_row].height = 18
- 
     cu_list = [filtered_credit_units.get(c, "") for c in ordered_codes]
-    ws.append([""] * 3 + cu_list + [""] * 7) # Updated for new columns
- 
-    for cell in ws[start_row + 1][3 : 3 + len(cu_list)]:
-        cell.alignment = Alignment(
-            horizontal="center", vertical="center", text_rotation=135
-        )
-        cell.font = Font(bold=True, size=9)
-        cell.fill = PatternFill(
-            start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"
-        )
- 
     headers = out_cols
-    ws.append(headers)
- 
-    for cell in ws[start_row + 2]:
-        cell.font = Font(bold=True, size=10, color="FFFFFF")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.fill = PatternFill(
-            start_color="4A90E2", end_color="4A90E2", fill_type="solid"
-        )
-        cell.border = Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        )
- 
-    for _, r in mastersheet.iterrows():
-        rowvals = [r[col] for col in headers]
-        ws.append(rowvals)
- 
-    # Freeze the column headers
-    ws.freeze_panes = ws.cell(row=start_row + 3, column=1)
- 
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
- 
-    for row in ws.iter_rows(
-        min_row=start_row + 3, max_row=ws.max_row, min_col=1, max_col=ws.max_column
-    ):
-        for cell in row:
-            cell.border = thin_border
  
     # Colorize course columns - SPECIAL COLOR FOR UPGRADED SCORES
-    upgraded_fill = PatternFill(
-        start_color="E6FFCC", end_color="E6FFCC", fill_type="solid"
-    )
-    passed_fill = PatternFill(
-        start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"
-    )
-    failed_fill = PatternFill(
-        start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"
-    )
+    score_styles = {
+        "upgraded": {"fill": solid_fill("E6FFCC"), "font": font(color="006600", bold=True)},
+        "passed": {"fill": solid_fill("C6EFCE"), "font": font(color="006100")},
+        "failed": {"fill": solid_fill("FFFFFF"), "font": font(color="FF0000", bold=True)},
+    }
  
-    for idx, code in enumerate(ordered_codes, start=4):
-        col_letter = get_column_letter(idx)
-        for r_idx in range(start_row + 3, ws.max_row + 1):
-            cell = ws.cell(row=r_idx, column=idx)
-            try:
-                val = float(cell.value) if cell.value not in (None, "") else 0
-                if (
-                    upgrade_min_threshold is not None
-                    and upgrade_min_threshold <= val <= 49
-                ):
-                    # This score was upgraded - use special color
-                    cell.fill = upgraded_fill
-                    cell.font = Font(color="006600", bold=True)
-                elif val >= pass_threshold:
-                    cell.fill = passed_fill
-                    cell.font = Font(color="006100")
-                else:
-                    cell.fill = failed_fill
-                    cell.font = Font(color="FF0000", bold=True)
-            except Exception:
-                continue
+    def score_class(value):
+        try:
+            val = float(value) if value not in (None, "") else 0
+            if (
+                upgrade_min_threshold is not None
+                and upgrade_min_threshold <= val <= 49
+            ):
+                # This score was upgraded - use special color
+                return "upgraded"
+            return "passed" if val >= pass_threshold else "failed"
+        except Exception:
+            return None
  
-    # Apply specific column alignments
+    # Colour classes come from the DataFrame rows being written
+    score_classes = [
+        [score_class(value) for value in mastersheet[code].tolist()]
+        for code in ordered_codes
+    ]
+ 
+    # Apply specific column alignments; every student-row cell is bordered
     left_align_columns = ["CU Passed", "CU Failed", "TCPE", "GPA", "AVERAGE"]
-    for col_idx, col_name in enumerate(headers, start=1):
-        if col_name in left_align_columns:
-            col_letter = get_column_letter(col_idx)
-            for row_idx in range(start_row + 3, ws.max_row + 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.alignment = Alignment(horizontal="left", vertical="center")
+    data_styles = []
+    for col_name in headers:
+        styles = {"border": THIN_BORDER}
+        # Apply text wrapping and left alignment to FAILED COURSES; centre REMARKS
+        if col_name == "FAILED COURSES":
+            styles["alignment"] = alignment(horizontal="left", vertical="center", wrap_text=True)
+        elif col_name == "REMARKS":
+            styles["alignment"] = alignment(horizontal="center", vertical="center")
+        elif col_name in left_align_columns:
+            styles["alignment"] = alignment(horizontal="left", vertical="center")
         # Center align S/N column
         elif col_name == "S/N":
-            col_letter = get_column_letter(col_idx)
-            for row_idx in range(start_row + 3, ws.max_row + 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
+            styles["alignment"] = alignment(horizontal="center", vertical="center")
+        data_styles.append(styles)
+    score_cell_styles = [
+        with_classes(data_styles[3 + pos], score_styles) for pos in range(len(ordered_codes))
+    ]
+ 
+    # Color code remarks - UPDATED WITH RESIT ONLY
+    remarks_col_idx = headers.index("REMARKS") + 1
+    remarks_cell_styles = with_classes(
+        data_styles[remarks_col_idx - 1],
+        {
+            "Passed": {"fill": solid_fill("C6EFCE"), "font": font(color="006100", bold=True)},
+            # UPDATED: Now includes both former Resit and Probation, orange for all resit cases
+            "Resit": {"fill": solid_fill("FFA500"), "font": font(color="FFFFFF", bold=True)},
+            "Withdrawn": {"fill": solid_fill("FFC7CE"), "font": font(color="9C0006", bold=True)},
+        },
+    )
+    remarks_values = [str(v) if v else "" for v in mastersheet["REMARKS"].tolist()]
+    # The writer may run again at a later save; keep the rows as written now
+    sheet_rows = mastersheet[headers]
  
     # Calculate optimal column widths
     longest_name_len = (
@@ -4466,56 +4402,26 @@ def process_bn_single_file(
     failed_courses_col_width = min(max(longest_failed_len + 4, 40), 80)
     remarks_col_width = min(max(longest_remark_len + 4, 15), 30)
  
-    # Apply text wrapping and left alignment to FAILED COURSES and REMARKS columns
-    failed_courses_col_idx = headers.index("FAILED COURSES") + 1
-    remarks_col_idx = headers.index("REMARKS") + 1
- 
-    for row_idx in range(start_row + 3, ws.max_row + 1):
-        # FAILED COURSES column
-        cell = ws.cell(row=row_idx, column=failed_courses_col_idx)
-        cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-     
-        # REMARKS column
-        cell = ws.cell(row=row_idx, column=remarks_col_idx)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-     
-        # Color code remarks - UPDATED WITH RESIT ONLY
-        remarks_value = str(cell.value) if cell.value else ""
-        if remarks_value == "Passed":
-            cell.fill = PatternFill(
-                start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"
-            )
-            cell.font = Font(color="006100", bold=True)
-        elif remarks_value == "Resit":  # UPDATED: Now includes both former Resit and Probation
-            cell.fill = PatternFill(
-                start_color="FFA500", end_color="FFA500", fill_type="solid"  # UPDATED: Changed color to orange for all resit cases
-            )
-            cell.font = Font(color="FFFFFF", bold=True)
-        elif remarks_value == "Withdrawn":
-            cell.fill = PatternFill(
-                start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"
-            )
-            cell.font = Font(color="9C0006", bold=True)
- 
-    for col_idx in range(1, ws.max_column + 1):
+    column_widths = {}
+    for col_idx in range(1, len(headers) + 1):
         column_letter = get_column_letter(col_idx)
         if column_letter == "A": # S/N
-            ws.column_dimensions[column_letter].width = 6
+            column_widths[col_idx] = 6
         elif column_letter == "B" or headers[col_idx - 1] in [
             "EXAMS NUMBER",
             "EXAM NO",
         ]:
-            ws.column_dimensions[column_letter].width = 18
+            column_widths[col_idx] = 18
         elif headers[col_idx - 1] == "NAME":
-            ws.column_dimensions[column_letter].width = name_col_width
+            column_widths[col_idx] = name_col_width
         elif 4 <= col_idx < 4 + len(ordered_codes): # course columns
-            ws.column_dimensions[column_letter].width = 8
+            column_widths[col_idx] = 8
         elif headers[col_idx - 1] in ["FAILED COURSES"]:
-            ws.column_dimensions[column_letter].width = failed_courses_col_width
+            column_widths[col_idx] = failed_courses_col_width
         elif headers[col_idx - 1] in ["REMARKS"]:
-            ws.column_dimensions[column_letter].width = remarks_col_width
+            column_widths[col_idx] = remarks_col_width
         else:
-            ws.column_dimensions[column_letter].width = 12
+            column_widths[col_idx] = 12
  
     # Fails per course row
     fails_per_course = (
@@ -4527,18 +4433,6 @@ def process_bn_single_file(
         + fails_per_course
         + [""] * (len(headers) - 3 - len(ordered_codes))
     )
-    ws.append(footer_vals)
- 
-    for cell in ws[ws.max_row]:
-        if 4 <= cell.column < 4 + len(ordered_codes):
-            cell.fill = PatternFill(
-                start_color="F0E68C", end_color="F0E68C", fill_type="solid"
-            )
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-        elif cell.column == 3:
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
  
     # COMPREHENSIVE SUMMARY BLOCK - ENFORCED RULE
     total_students = len(mastersheet)
@@ -4563,30 +4457,24 @@ def process_bn_single_file(
     )
  
     # Add withdrawn student tracking to summary - UPDATED WITH ENFORCED RULE
-    ws.append([])
-    ws.append(["SUMMARY"])
-    ws.append(
-        [f"A total of {total_students} students registered and sat for the Examination"]
-    )
-    ws.append(
+    summary_rows = [
+        [],
+        ["SUMMARY"],
+        [f"A total of {total_students} students registered and sat for the Examination"],
         [
             f"A total of {passed_all} students passed in all courses registered and are to proceed to the next semester"
-        ]
-    )
-    ws.append(
+        ],
         [
             f"A total of {resit_rule_students} students who passed ≥45% of credit units failed various courses, and are to resit these courses in the next session."  # UPDATED: Combined both resit cases
-        ]
-    )
-    ws.append(
+        ],
         [
             f"A total of {withdrawn_rule_students} students who passed less than 45% of their registered credit units have been advised to withdraw"
-        ]
-    )
+        ],
+    ]
  
     # Add upgrade notice in summary section
     if upgrade_min_threshold is not None:
-        ws.append(
+        summary_rows.append(
             [
                 f"✅ Upgraded all scores between {upgrade_min_threshold}–49 to 50 as per management decision ({upgraded_scores_count} scores upgraded)"
             ]
@@ -4594,73 +4482,108 @@ def process_bn_single_file(
  
     # Add removed withdrawn students info
     if removed_students:
-        ws.append(
+        summary_rows.append(
             [
                 f"NOTE: {len(removed_students)} previously withdrawn students were removed from this semester's results as they should not be processed."
             ]
         )
  
-    ws.append(
+    summary_rows.append(
         [
             "The above decisions are in line with the provisions of the General Information Section of the NMCN/NBTE Examinations Regulations (Pg 4) adopted by the College."
         ]
     )
  
-    ws.append([])
-    ws.append(
-        [
-            "________________________",
-            "",
-            "",
-            "________________________",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
-    )
-    ws.append(
-        [
-            "Mrs. Abini Hauwa",
-            "",
-            "",
-            "Dr. Kigbu Job Yaro",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
-    )
-    ws.append(
-        [
-            "Head of Exams",
-            "",
-            "",
-            "HOD Nursing",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
-    )
+    summary_rows.append([])
+    summary_rows.append(["________________________", "", "", "________________________"] + [""] * 9)
+    summary_rows.append(["Mrs. Abini Hauwa", "", "", "Dr. Kigbu Job Yaro"] + [""] * 9)
+    summary_rows.append(["Head of Exams", "", "", "HOD Nursing"] + [""] * 9)
  
-    wb.save(out_xlsx)
-    logger.info(f"✅ Mastersheet saved: {out_xlsx}")
+    def write_sheet(sink):
+        sink.set_widths(column_widths)
+        # Freeze the rows above the column headings
+        sink.freeze(start_row + 3)
+        if logo_path_norm and os.path.exists(logo_path_norm):
+            try:
+                img = XLImage(logo_path_norm)
+                img.width, img.height = 110, 80
+                sink.add_image(img, "A1")
+            except Exception as e:
+                logger.warning(f"⚠ Could not place logo: {e}")
+        for value, style in top_rows:
+            sink.merge(f"C{sink.next_row}:{last_letter}{sink.next_row}")
+            sink.append([None, None, value], [None, None, style])
+ 
+        # The heading rows sit one row below start_row: start_row itself is a
+        # spacer whose blank course cells carry the rotated title style
+        sink.set_height(start_row, 18)
+        sink.append(
+            [None] * (3 + len(display_course_titles)),
+            [None] * 3
+            + [{
+                "alignment": alignment(horizontal="center", vertical="center", text_rotation=45),
+                "font": font(bold=True, size=9),
+            }] * len(display_course_titles),
+        )
+        # Course titles, with the grey credit-unit style
+        sink.append(
+            [""] * 3 + display_course_titles + [""] * 7, # Updated for new columns
+            [None] * 3
+            + [{
+                "alignment": alignment(horizontal="center", vertical="center", text_rotation=135),
+                "font": font(bold=True, size=9),
+                "fill": solid_fill("D3D3D3"),
+            }] * len(cu_list),
+        )
+        # Credit units, in the blue heading style
+        header_style = {
+            "font": font(bold=True, size=10, color="FFFFFF"),
+            "alignment": alignment(horizontal="center", vertical="center"),
+            "fill": solid_fill("4A90E2"),
+            "border": THIN_BORDER,
+        }
+        sink.append(
+            [""] * 3 + cu_list + [""] * 7, # Updated for new columns
+            [header_style] * len(headers),
+        )
+        # Column headings, bordered like the student rows
+        sink.append(headers, data_styles)
+ 
+        for i, rowvals in enumerate(sheet_rows.itertuples(index=False, name=None)):
+            styles = list(data_styles)
+            for pos, classes in enumerate(score_classes):
+                if classes[i] is not None:
+                    styles[3 + pos] = score_cell_styles[pos][classes[i]]
+            if remarks_values[i] in remarks_cell_styles:
+                styles[remarks_col_idx - 1] = remarks_cell_styles[remarks_values[i]]
+            sink.append(rowvals, styles)
+ 
+        label_style = {"font": font(bold=True), "alignment": alignment(horizontal="center")}
+        sink.append(
+            footer_vals,
+            [None, None, label_style]
+            + [{**label_style, "fill": solid_fill("F0E68C")}] * len(ordered_codes),
+        )
+        for row_values in summary_rows:
+            sink.append(row_values)
+ 
+    MASTERSHEET_SESSION.write_sheet(out_xlsx, sem, write_sheet)
+    logger.info(f"✅ Mastersheet sheet written: {sem} → {out_xlsx}")
+    log_event(
+        logger,
+        "semester_processed",
+        f"📊 {sem}: {len(mastersheet)} students, {len(carryover_students)} carryover",
+        program="BN",
+        set=set_name,
+        semester=sem,
+        file=fname,
+        students=len(mastersheet),
+        remarks=mastersheet["REMARKS"].value_counts().to_dict(),
+        carryover=len(carryover_students),
+        upgraded_scores=upgraded_scores_count,
+    )
+    SEMESTER_RESULTS.record(out_xlsx, sem, mastersheet, SEMESTER_RESULT_COLUMNS)
+    record_semester_history(output_dir, sem, mastersheet)
  
     # Generate individual student PDF
     safe_sem = re.sub(r"[^\w\-]", "_", sem)
@@ -4668,9 +4591,9 @@ def process_bn_single_file(
         output_subdir, "mastersheet_students_{}_{}.pdf".format(ts, safe_sem)
     )
  
-    logger.info("📊 FINAL CHECK before PDF generation:")
-    logger.info(f" Previous CGPAs loaded: {len(previous_gpas) if previous_gpas else 0}")
-    logger.info(
+    logger.debug("📊 FINAL CHECK before PDF generation:")
+    logger.debug(f" Previous CGPAs loaded: {len(previous_gpas) if previous_gpas else 0}")
+    logger.debug(
         f" CGPA data available for: {len(cgpa_data) if cgpa_data else 0} students"
     )
  
@@ -4706,6 +4629,7 @@ def main():
         # Initialize
         initialize_student_tracker()
         initialize_carryover_tracker()
+        SEMESTER_RESULTS.clear()
        
         logger.info(
             "Starting BN Examination Results Processing with Enhanced Features..."
@@ -4817,6 +4741,10 @@ def main():
                
                 # Process selected semesters in the correct order
                 semester_processed = 0
+                # Semesters are scored in order (each one's CGPA needs the
+                # last); raw workbooks are parsed and PDFs rendered in workers
+                pipeline = StagePipeline()
+                semester_stages = []
                 for semester_key in semesters_to_process:
                     if semester_key not in BN_SEMESTER_ORDER:
                         logger.warning(f"⚠️ Skipping unknown semester: {semester_key}")
@@ -4835,8 +4763,10 @@ def main():
                             continue
                    
                     if semester_files_exist:
-                        logger.info(f"\n🎯 Processing BN {semester_key} in {bn_set}...")
-                        result = process_bn_semester_files(
+                        logger.info(f"\n🎯 Queued BN {semester_key} in {bn_set}")
+                        stage = pipeline.add(
+                            f"process:{semester_key}",
+                            process_bn_semester_files,
                             semester_key,
                             raw_files,
                             raw_dir,
@@ -4849,14 +4779,31 @@ def main():
                             semester_course_titles,
                             DEFAULT_LOGO_PATH,
                             bn_set,
+                            # Ordering only: a failed prefetch must not drop the semester,
+                            # which then reads its raw workbook in-process
+                            after=[
+                                *queue_bn_semester_prefetch(pipeline, semester_key, raw_files, raw_dir),
+                                *semester_stages[-1:],
+                            ],
                         )
-                        if result and result.get("success", False):
-                            semester_processed += result.get("files_processed", 0)
+                        semester_stages.append(stage)
                     else:
                         logger.warning(
                             f"⚠️ No files found for BN {semester_key} in {bn_set}, skipping..."
                         )
+                restore_withdrawals_from_history(
+                    clean_dir, [stage.split(":", 1)[1] for stage in semester_stages]
+                )
+                with deferred_rendering(pipeline):
+                    pipeline.run()
+                forget_raw_sheets()
+                for stage in semester_stages:
+                    result = pipeline.results.get(stage)
+                    if result and result.get("success", False):
+                        semester_processed += result.get("files_processed", 0)
                
+                # Write the set's mastersheet before zipping
+                MASTERSHEET_SESSION.close()
                 # Create ZIP of BN results ONLY if files were processed
                 if semester_processed > 0:
                     try:
@@ -4881,21 +4828,14 @@ def main():
            
             # Print BN-specific summaries
             logger.info("\n📊 BN STUDENT TRACKING SUMMARY:")
-            logger.info(f"Total unique BN students tracked: {len(STUDENT_TRACKER)}")
-            logger.info(f"Total BN withdrawn students: {len(WITHDRAWN_STUDENTS)}")
-            if CARRYOVER_STUDENTS:
+            logger.info(f"Total unique BN students tracked: {len(STUDENTS)}")
+            logger.info(f"Total BN withdrawn students: {len(STUDENTS.withdrawals)}")
+            if STUDENTS.carryover:
                 logger.info("\n📋 BN CARRYOVER STUDENT SUMMARY:")
-                logger.info(f"Total BN carryover students: {len(CARRYOVER_STUDENTS)}")
+                logger.info(f"Total BN carryover students: {STUDENTS.carryover_count()}")
            
             # Analyze student progression
-            sem_counts = {}
-            for student_data in STUDENT_TRACKER.values():
-                sem_count = len(student_data["semesters_present"])
-                if sem_count not in sem_counts:
-                    sem_counts[sem_count] = 0
-                sem_counts[sem_count] += 1
-           
-            for sem_count, student_count in sorted(sem_counts.items()):
+            for sem_count, student_count in STUDENTS.semester_counts().items():
                 logger.info(
                     f"Students present in {sem_count} semester(s): {student_count}"
                 )
@@ -4924,9 +4864,9 @@ def main():
     finally:
         # Cleanup
         logger.info("\n📊 Final Summary:")
-        logger.info(f" Students tracked: {len(STUDENT_TRACKER)}")
-        logger.info(f" Carryover students: {len(CARRYOVER_STUDENTS)}")
-        logger.info(f" Withdrawn students: {len(WITHDRAWN_STUDENTS)}")
+        logger.info(f" Students tracked: {len(STUDENTS)}")
+        logger.info(f" Carryover students: {STUDENTS.carryover_count()}")
+        logger.info(f" Withdrawn students: {len(STUDENTS.withdrawals)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -11,7 +11,7 @@ ENHANCED: Proper cumulative CGPA calculation across all semesters.
 
 from openpyxl.cell import MergedCell
 from openpyxl.drawing.image import Image as XLImage
-from openpyxl import load_workbook, Workbook
+from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 import os
@@ -26,8 +26,67 @@ import glob
 import tempfile
 import shutil
 import json
+import logging
 import subprocess
-import numpy as np
+# PDF generation
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import (
+    Table,
+    TableStyle,
+    Paragraph,
+    Spacer,
+    Image,
+)
+from reportlab.lib.units import inch
+
+from course_catalogue import load_catalogue
+from course_matcher import get_course_matcher
+from input_cache import ParsedInputCache, cache_enabled, course_workbooks_sha256
+from input_manifest import InputManifest, optional_file_sha256
+from pdf_shards import build_student_pdf, deferred_rendering
+from report_template import (
+    CENTER_ALIGN_STYLE,
+    HEADER_STYLE,
+    LEFT_ALIGN_STYLE,
+    MAIN_HEADER_STYLE,
+    REMARKS_STYLE,
+    SAMPLE_STYLES,
+    SIGNATURE_STYLE,
+    SUBTITLE_STYLE,
+    TITLE_STYLE,
+    Letterhead,
+)
+from run_log import configure_logging, log_event
+from score_engine import (
+    classify_by_passed_share,
+    compute_course_scores,
+    derive_semester_results,
+    is_not_registered,
+    not_reg_mask,
+    reorder_not_reg_cache,
+)
+from semester_results import SemesterResultStore
+from sheet_merge import merge_score_sheets, registrations, report_summary
+from sheet_styles import (
+    MEDIUM_BORDER,
+    THIN_BORDER,
+    alignment,
+    font,
+    solid_fill,
+    text_width,
+    with_classes,
+)
+from stage_pipeline import StagePipeline, queue_raw_prefetch
+from student_history import StudentHistory
+from student_registry import StudentRegistry
+from workbook_io import RAW_SHEETS, WorkbookSession, forget_raw_sheets, load_raw_sheets
+
+# ----------------------------
+# Logging Configuration
+# ----------------------------
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # ----------------------------
 # Configuration
@@ -51,10 +110,10 @@ def get_base_directory():
     base_dir_env = os.getenv("BASE_DIR")
     if base_dir_env:
         if os.path.exists(base_dir_env):
-            print(f"✅ Using BASE_DIR from environment: {base_dir_env}")
+            logger.info(f"✅ Using BASE_DIR from environment: {base_dir_env}")
             return base_dir_env
         else:
-            print(
+            logger.warning(
                 f"⚠️ BASE_DIR from environment doesn't exist: {base_dir_env}, trying alternatives..."
             )
     # Check if we're running on Railway
@@ -63,7 +122,7 @@ def get_base_directory():
         railway_base = "/app/EXAMS_INTERNAL"
         os.makedirs(railway_base, exist_ok=True)
         os.makedirs(os.path.join(railway_base, "ND", "ND-COURSES"), exist_ok=True)
-        print(f"✅ Using Railway base directory: {railway_base}")
+        logger.info(f"✅ Using Railway base directory: {railway_base}")
         return railway_base
     # Local development fallbacks - check multiple possible locations
     local_paths = [
@@ -79,11 +138,11 @@ def get_base_directory():
     ]
     for local_path in local_paths:
         if os.path.exists(local_path):
-            print(f"✅ Using local base directory: {local_path}")
+            logger.info(f"✅ Using local base directory: {local_path}")
             return local_path
     # Final fallback - create in current working directory
     fallback_path = os.path.join(os.getcwd(), "EXAMS_INTERNAL")
-    print(f"⚠️ No existing directory found, creating fallback: {fallback_path}")
+    logger.warning(f"⚠️ No existing directory found, creating fallback: {fallback_path}")
     os.makedirs(fallback_path, exist_ok=True)
     os.makedirs(os.path.join(fallback_path, "ND", "ND-COURSES"), exist_ok=True)
     return fallback_path
@@ -92,13 +151,18 @@ BASE_DIR = get_base_directory()
 # UPDATED: ND directories now under ND folder
 ND_BASE_DIR = os.path.join(BASE_DIR, "ND")
 ND_COURSES_DIR = os.path.join(ND_BASE_DIR, "ND-COURSES")
+# Bump when the raw-sheet reading/matching/merging below changes, so stale
+# entries in the parsed-input cache are not reused
+ND_INPUT_CACHE_VERSION = 1
+# Course-catalogue cache namespace; bump when build_course_catalogue changes
+ND_CATALOGUE_NAMESPACE = "nd-regular-v1"
 # Ensure directories exist
 os.makedirs(BASE_DIR, exist_ok=True)
 os.makedirs(ND_BASE_DIR, exist_ok=True)
 os.makedirs(ND_COURSES_DIR, exist_ok=True)
-print(f"📁 Base directory: {BASE_DIR}")
-print(f"📁 ND base directory: {ND_BASE_DIR}")
-print(f"📁 ND courses directory: {ND_COURSES_DIR}")
+logger.info(f"📁 Base directory: {BASE_DIR}")
+logger.info(f"📁 ND base directory: {ND_BASE_DIR}")
+logger.info(f"📁 ND courses directory: {ND_COURSES_DIR}")
 
 # Global variables for threshold upgrade
 THRESHOLD_UPGRADED = False
@@ -106,12 +170,6 @@ ORIGINAL_THRESHOLD = 50.0
 UPGRADE_MIN = None
 UPGRADE_MAX = 49
 
-# Global carryover tracker
-CARRYOVER_STUDENTS = {}
-
-# Global inactive students tracker (kept for internal tracking but not displayed)
-INACTIVE_STUDENTS = {}
-
 def is_web_mode():
     """Check if running in web mode (file upload)"""
     return os.getenv("WEB_MODE") == "true"
@@ -170,15 +228,15 @@ def get_form_parameters():
     # FIX: Convert selected semesters to UPPERCASE to match course data
     selected_semesters = [sem.upper() for sem in selected_semesters]
     
-    print(f"🎯 FORM PARAMETERS:")
-    print(f" Selected Set: {selected_set}")
-    print(f" Processing Mode: {processing_mode}")
-    print(f" Selected Semesters: {selected_semesters}")
-    print(f" Pass Threshold: {pass_threshold}")
-    print(f" Generate PDF: {generate_pdf}")
-    print(f" Track Withdrawn: {track_withdrawn}")
-    print(f" Process Carryover: {process_carryover}")
-    print(f" Carryover File Path: {carryover_file_path}")
+    logger.info(f"🎯 FORM PARAMETERS:")
+    logger.info(f" Selected Set: {selected_set}")
+    logger.info(f" Processing Mode: {processing_mode}")
+    logger.info(f" Selected Semesters: {selected_semesters}")
+    logger.info(f" Pass Threshold: {pass_threshold}")
+    logger.info(f" Generate PDF: {generate_pdf}")
+    logger.info(f" Track Withdrawn: {track_withdrawn}")
+    logger.info(f" Process Carryover: {process_carryover}")
+    logger.info(f" Carryover File Path: {carryover_file_path}")
     
     return {
         "selected_set": selected_set,
@@ -222,10 +280,10 @@ def get_logo_path():
     
     for path in possible_paths:
         if os.path.exists(path):
-            print(f"✅ Found logo at: {path}")
+            logger.info(f"✅ Found logo at: {path}")
             return path
     
-    print("⚠️ Logo not found, PDF generation will proceed without logo")
+    logger.warning("⚠️ Logo not found, PDF generation will proceed without logo")
     return None
 
 DEFAULT_LOGO_PATH = get_logo_path()
@@ -239,9 +297,13 @@ SEMESTER_ORDER = [
     "ND-SECOND-YEAR-SECOND-SEMESTER",
 ]
 
-# Global student tracker
-STUDENT_TRACKER = {}
-WITHDRAWN_STUDENTS = {}
+# Global student tracker: presence, withdrawals, carryover and inactive
+# students (the inactive ones are kept for internal tracking, not displayed)
+STUDENTS = StudentRegistry(SEMESTER_ORDER)
+
+# What each semester's last result was built from; unchanged semesters reuse
+# their PDF from the last result ZIP instead of rendering it again
+INPUT_MANIFEST = InputManifest(SEMESTER_ORDER)
 
 # ----------------------------
 # NEW: Inactive Student Detection Functions - FIXED VERSION
@@ -249,8 +311,7 @@ WITHDRAWN_STUDENTS = {}
 
 def initialize_inactive_students_tracker():
     """Initialize the global inactive students tracker."""
-    global INACTIVE_STUDENTS
-    INACTIVE_STUDENTS = {}
+    STUDENTS.inactive = {}
 
 def identify_inactive_students():
     """
@@ -258,106 +319,37 @@ def identify_inactive_students():
     These students appear in earlier semesters but are missing from later ones, yet have status in CGPA summary.
     FIXED: Properly track names and all missing semesters
     """
-    global INACTIVE_STUDENTS, STUDENT_TRACKER, WITHDRAWN_STUDENTS
-    
-    print(f"\n🔍 IDENTIFYING INACTIVE STUDENTS (Not Withdrawn but Missing from Subsequent Semesters)")
-    print("=" * 80)
+    logger.info(f"\n🔍 IDENTIFYING INACTIVE STUDENTS (Not Withdrawn but Missing from Subsequent Semesters)")
+    logger.info("=" * 80)
     
-    inactive_students = {}
-    
-    # Track all semesters we've processed
-    all_processed_semesters = set()
-    for student_data in STUDENT_TRACKER.values():
-        all_processed_semesters.update(student_data["semesters_present"])
-    
-    # Sort semesters in processing order
-    processed_semesters_ordered = [sem for sem in SEMESTER_ORDER if sem in all_processed_semesters]
-    
-    if len(processed_semesters_ordered) < 2:
-        print("ℹ️ Need at least 2 semesters to identify inactive students")
+    inactive_students = STUDENTS.find_inactive()
+    if inactive_students is None:
+        logger.info("ℹ️ Need at least 2 semesters to identify inactive students")
         return {}
     
-    print(f"📊 Processed semesters in order: {processed_semesters_ordered}")
-    
-    for exam_no, student_data in STUDENT_TRACKER.items():
-        # Skip withdrawn students
-        if exam_no in WITHDRAWN_STUDENTS:
-            continue
-            
-        semesters_present = student_data["semesters_present"]
-        first_semester = student_data["first_seen"]
-        last_semester = student_data["last_seen"]
-        
-        # Check if student is missing any semesters between first and last appearance
-        first_index = processed_semesters_ordered.index(first_semester)
-        last_index = processed_semesters_ordered.index(last_semester)
-        
-        expected_semesters = processed_semesters_ordered[first_index:last_index + 1]
-        missing_semesters = [sem for sem in expected_semesters if sem not in semesters_present]
-        
-        if missing_semesters:
-            # FIX 1: Ensure name is properly captured
-            student_name = student_data.get("name", "Unknown")
-            if student_name == "Unknown" and "name" in student_data:
-                student_name = student_data["name"]
-                
-            inactive_students[exam_no] = {
-                "name": student_name,
-                "first_semester": first_semester,
-                "last_semester": last_semester,
-                "semesters_present": semesters_present,
-                "missing_semesters": missing_semesters,  # FIX 2: Store all missing semesters
-                "status": student_data.get("status", "Active"),
-                "current_gpa": student_data.get("current_gpa", "N/A"),
-                "cgpa_status": student_data.get("cgpa_status", "N/A"),
-                "identified_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            print(f"⚠️ INACTIVE: {exam_no} - {student_name} - Present in {len(semesters_present)} semesters, missing {len(missing_semesters)}: {missing_semesters}")
+    processed_semesters_ordered = STUDENTS.semesters(STUDENTS.processed)
+    logger.info(f"📊 Processed semesters in order: {processed_semesters_ordered}")
     
-    # Also check for students who have CGPA status but are missing from recent semesters
-    for exam_no, student_data in STUDENT_TRACKER.items():
-        if exam_no in inactive_students or exam_no in WITHDRAWN_STUDENTS:
-            continue
-            
-        # Check if student has CGPA data but is missing from the most recent semester
-        if student_data.get("has_cgpa_data", False):
-            most_recent_semester = processed_semesters_ordered[-1]
-            if most_recent_semester not in student_data["semesters_present"]:
-                # FIX 3: Check if student already in inactive list and append missing semester
-                if exam_no in inactive_students:
-                    # Add to existing missing semesters if not already there
-                    if most_recent_semester not in inactive_students[exam_no]["missing_semesters"]:
-                        inactive_students[exam_no]["missing_semesters"].append(most_recent_semester)
-                else:
-                    # Create new entry
-                    student_name = student_data.get("name", "Unknown")
-                    if student_name == "Unknown" and "name" in student_data:
-                        student_name = student_data["name"]
-                        
-                    inactive_students[exam_no] = {
-                        "name": student_name,
-                        "first_semester": student_data["first_seen"],
-                        "last_semester": student_data["last_seen"],
-                        "semesters_present": student_data["semesters_present"],
-                        "missing_semesters": [most_recent_semester],
-                        "status": student_data.get("status", "Active"),
-                        "current_gpa": student_data.get("current_gpa", "N/A"),
-                        "cgpa_status": student_data.get("cgpa_status", "Active in CGPA"),
-                        "identified_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                print(f"🎓 CGPA ACTIVE BUT MISSING: {exam_no} - {student_name} - Has CGPA but missing from {most_recent_semester}")
+    most_recent_semester = processed_semesters_ordered[-1]
+    for sid, missing in inactive_students.items():
+        exam_no = STUDENTS.exam_numbers[sid]
+        student_data = STUDENTS.records[sid]
+        if missing >> student_data.last_seen:
+            # Missing after their last appearance: has CGPA data but is
+            # missing from the most recent semester
+            logger.debug(f"🎓 CGPA ACTIVE BUT MISSING: {exam_no} - {student_data.name} - Has CGPA but missing from {most_recent_semester}")
+        else:
+            missing_semesters = STUDENTS.semesters(missing)
+            logger.debug(f"⚠️ INACTIVE: {exam_no} - {student_data.name} - Present in {student_data.present.bit_count()} semesters, missing {len(missing_semesters)}: {missing_semesters}")
     
-    INACTIVE_STUDENTS = inactive_students
-    print(f"\n📊 INACTIVE STUDENTS SUMMARY:")
-    print(f" Total inactive students identified: {len(INACTIVE_STUDENTS)}")
+    logger.info(f"\n📊 INACTIVE STUDENTS SUMMARY:")
+    logger.info(f" Total inactive students identified: {len(inactive_students)}")
     
     # Breakdown by type
-    cgpa_active_count = sum(1 for s in inactive_students.values() if s.get("cgpa_status") == "Active in CGPA")
-    regular_inactive_count = len(inactive_students) - cgpa_active_count
+    regular_inactive_count, cgpa_active_count = STUDENTS.inactive_counts()
     
-    print(f" - Regular inactive (missing intermediate semesters): {regular_inactive_count}")
-    print(f" - CGPA active but missing from recent semester: {cgpa_active_count}")
+    logger.info(f" - Regular inactive (missing intermediate semesters): {regular_inactive_count}")
+    logger.info(f" - CGPA active but missing from recent semester: {cgpa_active_count}")
     
     return inactive_students
 
@@ -377,22 +369,9 @@ def abbreviate_semester_name(semester_name):
 
 def detect_not_registered_content(cell_value):
     """Detect if a cell contains NOT REG or similar content indicating non-registration."""
-    if pd.isna(cell_value) or cell_value == "":
-        return False
-    
-    cell_str = str(cell_value).strip().upper()
-    not_reg_patterns = [
-        "NOT REG", "NOT REGISTERED", "NOT-REG", "NOT_REG",
-        "NOT REGISTERED FOR COURSE", "NO REG", "NOT ENROLLED",
-        "NOT TAKING", "NOT OFFERED", "NOT ATTEMPTED"
-    ]
-    
-    for pattern in not_reg_patterns:
-        if pattern in cell_str:
-            return True
-    return False
+    return is_not_registered(cell_value)
 
-def process_not_registered_scores(df, course_columns):
+def process_not_registered_scores(df, course_columns, not_reg_cache=None):
     """
     Process NOT REG content in the dataframe.
     Returns: (processed_df, not_reg_counts_per_course)
@@ -401,20 +380,19 @@ def process_not_registered_scores(df, course_columns):
     
     for course in course_columns:
         if course in df.columns:
-            # Convert column to object type first to allow mixed types
-            if df[course].dtype != 'object':
-                df[course] = df[course].astype('object')
-                
-            for idx in df.index:
-                cell_value = df.at[idx, course]
-                if detect_not_registered_content(cell_value):
-                    # Replace NOT REG content with a special marker
-                    df.at[idx, course] = "NOT REG"
-                    not_reg_counts[course] += 1
+            mask = not_reg_mask(df[course], not_reg_cache)
+            count = int(mask.sum())
+            if count:
+                # Convert column to object type first to allow mixed types
+                if df[course].dtype != 'object':
+                    df[course] = df[course].astype('object')
+                # Replace NOT REG content with a special marker
+                df.loc[mask, course] = "NOT REG"
+                not_reg_counts[course] = count
                     
     return df, not_reg_counts
 
-def calculate_course_statistics(mastersheet, ordered_codes, pass_threshold):
+def calculate_course_statistics(mastersheet, ordered_codes, pass_threshold, not_reg_cache=None):
     """
     Calculate course statistics excluding NOT REG students.
     Returns: (fails_per_course, not_reg_per_course, registered_students_per_course)
@@ -425,22 +403,22 @@ def calculate_course_statistics(mastersheet, ordered_codes, pass_threshold):
     
     for code in ordered_codes:
         if code in mastersheet.columns:
+            column = mastersheet[code]
+            not_reg = not_reg_mask(column, not_reg_cache)
+            
             # Count registered students (those with actual scores, not "NOT REG")
-            registered_mask = mastersheet[code].apply(
-                lambda x: not detect_not_registered_content(x) and pd.notna(x) and x != ""
-            )
+            registered_mask = ~not_reg & column.notna() & (column != "")
             registered_students = registered_mask.sum()
             registered_students_per_course[code] = registered_students
             
             # Count NOT REG students
-            not_reg_mask = mastersheet[code].apply(detect_not_registered_content)
-            not_reg_count = not_reg_mask.sum()
+            not_reg_count = not_reg.sum()
             not_reg_per_course[code] = not_reg_count
             
             # Count failures only among registered students
             if registered_students > 0:
                 # Convert to numeric, excluding NOT REG students
-                scores = pd.to_numeric(mastersheet[code][registered_mask], errors='coerce')
+                scores = pd.to_numeric(column[registered_mask], errors='coerce')
                 fail_count = (scores < pass_threshold).sum()
                 fails_per_course[code] = int(fail_count)
             else:
@@ -483,7 +461,7 @@ def transform_transposed_data(df, sheet_type):
     Input: Each student appears multiple times with different courses
     Output: Each student appears once with all courses as columns
     """
-    print(f"🔄 Transforming {sheet_type} sheet from transposed to wide format...")
+    logger.info(f"🔄 Transforming {sheet_type} sheet from transposed to wide format...")
     
     # Find the registration and name columns
     reg_col = find_column_by_names(
@@ -492,7 +470,7 @@ def transform_transposed_data(df, sheet_type):
     name_col = find_column_by_names(df, ["NAME", "Full Name", "Candidate Name"])
     
     if not reg_col:
-        print("❌ Could not find registration column for transformation")
+        logger.error("❌ Could not find registration column for transformation")
         return df
     # Get all course columns (columns that contain course codes)
     course_columns = [
@@ -501,7 +479,7 @@ def transform_transposed_data(df, sheet_type):
         if col not in [reg_col, name_col] and col not in ["", None]
     ]
     
-    print(f"📊 Found {len(course_columns)} course columns: {course_columns}")
+    logger.debug(f"📊 Found {len(course_columns)} course columns: {course_columns}")
     # Create a new dataframe to store transformed data
     transformed_data = []
     student_dict = {}
@@ -530,12 +508,12 @@ def transform_transposed_data(df, sheet_type):
     # Create new DataFrame
     if transformed_data:
         transformed_df = pd.DataFrame(transformed_data)
-        print(
+        logger.info(
             f"✅ Transformed data: {len(transformed_df)} students, {len(transformed_df.columns)} columns"
         )
         return transformed_df
     else:
-        print("❌ No data after transformation")
+        logger.error("❌ No data after transformation")
         return df
 
 def detect_data_format(df, sheet_type):
@@ -554,10 +532,10 @@ def detect_data_format(df, sheet_type):
     
     # If any student appears more than one, it's likely transposed format
     if max_occurrences > 1:
-        print(f"📊 Data format detection for {sheet_type}:")
-        print(f" Total students: {len(student_counts)}")
-        print(f" Max occurrences per student: {max_occurrences}")
-        print(f" Students with multiple entries: {(student_counts > 1).sum()}")
+        logger.debug(f"📊 Data format detection for {sheet_type}:")
+        logger.debug(f" Total students: {len(student_counts)}")
+        logger.debug(f" Max occurrences per student: {max_occurrences}")
+        logger.debug(f" Students with multiple entries: {(student_counts > 1).sum()}")
         return True
     
     return False
@@ -597,73 +575,22 @@ def normalize_course_name(name):
     
     return normalized.strip()
 
+# Titles sharing one of these words with a header get a +2 word-match bonus
+ND_COURSE_KEY_WORDS = ("foundation", "nursing", "emergency", "care", "communication", "anatomy", "physiology")
+
+def get_nd_course_matcher(course_map):
+    """Indexed, memoized matcher for one semester's course map (see course_matcher)."""
+    return get_course_matcher(
+        course_map, normalize_course_name, ND_COURSE_KEY_WORDS, match_codes=True
+    )
+
 def find_best_course_match(column_name, course_map):
     """Find the best matching course using enhanced matching algorithm.
 
     UPDATED: First try matching as code (handles headers like 'NUR221' or 'NUR221_CA').
+    Matching runs through the semester's cached CourseMatcher.
     """
-    if not isinstance(column_name, str):
-        return None
-    normalized_column = normalize_course_name(column_name)
-    
-    # NEW: Extract potential code (strip suffix like '_ca' if present)
-    if ' ' in normalized_column:
-        potential_code = normalized_column.split(' ')[0]
-    elif '_' in normalized_column:
-        potential_code = normalized_column.split('_')[0]
-    else:
-        potential_code = normalized_column
-        
-    potential_code = re.sub(r"[^a-z0-9]", "", potential_code) # Clean to alphanumeric
-   
-    # NEW: Create reverse map for code lookup (case-insensitive)
-    code_to_info = {course_info["code"].lower(): course_info for course_info in course_map.values()}
-   
-    # NEW: Check if potential_code matches a known course code
-    if potential_code in code_to_info:
-        return code_to_info[potential_code]
-   
-    # Existing: exact match on normalized title
-    if normalized_column in course_map:
-        return course_map[normalized_column]
-   
-    # Existing: partial/contained matches
-    for course_norm, course_info in course_map.items():
-        if course_norm in normalized_column or normalized_column in course_norm:
-            return course_info
-   
-    # Existing: word-based matching
-    column_words = set(normalized_column.split())
-    best_match = None
-    best_score = 0
-    
-    for course_norm, course_info in course_map.items():
-        course_words = set(course_norm.split())
-        common_words = column_words.intersection(course_words)
-        if common_words:
-            score = len(common_words)
-            key_words = ["foundation", "nursing", "emergency", "care", "communication", "anatomy", "physiology"]
-            for word in key_words:
-                if word in column_words and word in course_words:
-                    score += 2
-            if score > best_score:
-                best_score = score
-                best_match = course_info
-                
-    if best_match and best_score >= 2:
-        return best_match
-   
-    # Existing: fuzzy matching fallback
-    best_match = None
-    best_ratio = 0
-    
-    for course_norm, course_info in course_map.items():
-        ratio = difflib.SequenceMatcher(None, normalized_column, course_norm).ratio()
-        if ratio > best_ratio and ratio > 0.6:
-            best_ratio = ratio
-            best_match = course_info
-            
-    return best_match
+    return get_nd_course_matcher(course_map).match(column_name)
 
 # ----------------------------
 # Carryover Management Functions - UPDATED: No enhanced formatting
@@ -671,8 +598,7 @@ def find_best_course_match(column_name, course_map):
 
 def initialize_carryover_tracker():
     """Initialize the global carryover tracker."""
-    global CARRYOVER_STUDENTS
-    CARRYOVER_STUDENTS = {}
+    STUDENTS.carryover = {}
 
 def identify_carryover_students(
     mastersheet_df, semester_key, set_name, pass_threshold=50.0
@@ -743,10 +669,9 @@ def identify_carryover_students(
                 }
                 carryover_students.append(carryover_data)
                 # Update global tracker
-                student_key = f"{exam_no}_{semester_key}"
-                CARRYOVER_STUDENTS[student_key] = carryover_data
+                STUDENTS.mark_carryover(exam_no, semester_key)
                 
-    print(
+    logger.info(
         f"📊 Identified {len(carryover_students)} carryover students ({len([s for s in carryover_students if s['probation_status']])} on probation)"
     )
     return carryover_students
@@ -757,7 +682,7 @@ def save_carryover_records(carryover_students, output_dir, set_name, semester_ke
     UPDATED: SIMPLE Excel structure WITHOUT enhanced formatting
     """
     if not carryover_students:
-        print("ℹ️ No carryover students to save")
+        logger.info("ℹ️ No carryover students to save")
         return None
     # Create carryover subdirectory in clean results
     carryover_dir = os.path.join(output_dir, "CARRYOVER_RECORDS")
@@ -789,7 +714,7 @@ def save_carryover_records(carryover_students, output_dir, set_name, semester_ke
     if records_data:
         df = pd.DataFrame(records_data)
         df.to_excel(excel_file, index=False)
-        print(f"✅ Carryover records saved: {excel_file}")
+        logger.info(f"✅ Carryover records saved: {excel_file}")
         
         # UPDATED: NO enhanced formatting - keep it simple for regular processing
         try:
@@ -817,15 +742,15 @@ def save_carryover_records(carryover_students, output_dir, set_name, semester_ke
                 ws.column_dimensions[column_letter].width = adjusted_width
                 
             wb.save(excel_file)
-            print("✅ Added basic formatting to carryover Excel file")
+            logger.info("✅ Added basic formatting to carryover Excel file")
         except Exception as e:
-            print(f"⚠️ Could not add basic formatting to carryover file: {e}")
+            logger.warning(f"⚠️ Could not add basic formatting to carryover file: {e}")
     # Save as JSON for easy processing
     json_file = os.path.join(carryover_dir, f"{filename}.json")
     with open(json_file, "w") as f:
         json.dump(carryover_students, f, indent=2)
         
-    print(f"📁 Regular carryover records saved in: {carryover_dir}")
+    logger.info(f"📁 Regular carryover records saved in: {carryover_dir}")
     return carryover_dir
 
 def check_existing_carryover_files(raw_dir, set_name, semester_key):
@@ -845,7 +770,7 @@ def check_existing_carryover_files(raw_dir, set_name, semester_key):
         ):
             existing_files.append(os.path.join(carryover_dir, file))
             
-    print(
+    logger.info(
         f"🔍 Found {len(existing_files)} existing carryover files for {set_name}/{semester_key}"
     )
     return existing_files
@@ -859,6 +784,110 @@ def check_existing_carryover_files(raw_dir, set_name, semester_key):
 # Global storage for cumulative CGPA data - SINGLE SOURCE OF TRUTH
 CUMULATIVE_CGPA_DATA = {}  # Format: {exam_no: {"gpas": [], "credits": [], "total_grade_points": 0, "total_credits": 0}}
 
+# Per-run copy of each saved semester sheet's GPA/credit columns, so previous
+# and cumulative CGPA lookups do not re-read mastersheet_{ts}.xlsx
+SEMESTER_RESULTS = SemesterResultStore()
+SEMESTER_RESULT_COLUMNS = [
+    "EXAM NUMBER", "NAME", "GPA", "CU Passed", "CU Failed", "Total Registered CU", "REMARKS",
+]
+
+# The run's mastersheet workbooks stay open here and are saved once per set,
+# not once per sheet
+MASTERSHEET_SESSION = WorkbookSession()
+
+# Every saved semester also goes to the set's student_history.sqlite, so a run
+# that only processes later semesters finds earlier CGPAs and withdrawals
+# without the previous runs' workbooks
+HISTORY_COLUMNS = {
+    "exam_number": "EXAM NUMBER",
+    "name": "NAME",
+    "gpa": "GPA",
+    "cu_passed": "CU Passed",
+    "cu_failed": "CU Failed",
+    "total_cu": "Total Registered CU",
+    "remarks": "REMARKS",
+    "failed_courses": "FAILED COURSES",
+}
+
+def record_semester_history(output_dir, semester_key, mastersheet):
+    """Store a saved semester sheet in the set's student history."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return
+    try:
+        count = history.record_semester(semester_key, mastersheet, HISTORY_COLUMNS)
+        logger.info(f"📚 Stored {count} {semester_key} results in student history")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store {semester_key} in student history: {e}")
+
+def record_carryover_history(output_dir, semester_key, carryover_students):
+    """Store a semester's carryover list (even an empty one) in the student history."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return
+    try:
+        history.record_carryover(semester_key, carryover_students)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store {semester_key} carryover in student history: {e}")
+
+def stored_semester_results(mastersheet_path, semester_key):
+    """
+    A semester sheet's rows (EXAM NUMBER, NAME, GPA, REMARKS, ...) from this
+    run's SEMESTER_RESULTS, else from the set's student history, or None.
+    """
+    stored = SEMESTER_RESULTS.get(mastersheet_path, semester_key)
+    if stored is not None:
+        return stored
+    history = StudentHistory.for_path(mastersheet_path)
+    if history is None:
+        return None
+    try:
+        return history.semester_results(semester_key, HISTORY_COLUMNS)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read {semester_key} from student history: {e}")
+        return None
+
+def load_history_gpas(output_dir, semester_key):
+    """{exam number: GPA} of a stored semester (one indexed query), or {}."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return {}
+    try:
+        return history.gpas(semester_key)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read {semester_key} GPAs from student history: {e}")
+        return {}
+
+def load_history_cumulative(output_dir, semester_keys):
+    """
+    {exam number: (grade points, credit units)} over ``semester_keys`` from the
+    student history's SQL aggregate, or None unless it holds every one of them.
+    """
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return None
+    try:
+        if not set(semester_keys) <= history.semesters():
+            return None
+        return history.cumulative_points(semester_keys)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read cumulative CGPAs from student history: {e}")
+        return None
+
+def stored_history_semesters(output_dir):
+    """Semesters the set's student history holds results for."""
+    history = StudentHistory.for_path(output_dir)
+    if history is None:
+        return set()
+    try:
+        return history.semesters()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read student history: {e}")
+        return set()
+
+# ND 4.0 scale as (minimum score, grade point) bands - see get_grade_point
+ND_GRADE_BANDS = ((70, 4.0), (60, 3.0), (50, 2.0), (45, 1.0))
+
 def get_grade_point(score):
     """Convert score to grade point for GPA calculation - ND 4.0 SCALE."""
     try:
@@ -966,10 +995,10 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
     FIXED: Uses the single source of truth for CGPA calculations
     """
     try:
-        print("📊 Creating CGPA Summary Sheet using SINGLE SOURCE OF TRUTH...")
+        logger.info("📊 Creating CGPA Summary Sheet using SINGLE SOURCE OF TRUTH...")
         
         # Load the mastersheet workbook
-        wb = load_workbook(mastersheet_path)
+        wb = MASTERSHEET_SESSION.open(mastersheet_path)
         
         # Collect CGPA data from all semesters - USE SINGLE SOURCE OF TRUTH
         cgpa_data = {}
@@ -1001,106 +1030,16 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
         for sheet_name in wb.sheetnames:
             if sheet_name in SEMESTER_ORDER:
                 try:
-                    print(f"🔍 Processing sheet: {sheet_name}")
-                    
-                    # DYNAMIC APPROACH: Try multiple header rows to find the actual data
-                    best_header_row = None
-                    best_gpa_col = None
-                    best_exam_col = None
-                    best_name_col = None
-                    best_remarks_col = None
-                    best_df = None
-                    
-                    # Try header rows from 0 to 20 (covering all possible positions)
-                    for header_row in range(0, 21):
-                        try:
-                            df = pd.read_excel(mastersheet_path, sheet_name=sheet_name, header=header_row)
-                            
-                            # Skip if dataframe is empty or has very few columns
-                            if df.empty or len(df.columns) < 3:
-                                continue
-                                
-                            # Look for exam number column
-                            exam_col = find_exam_number_column(df)
-                            if not exam_col:
-                                continue
-                                
-                            # Look for GPA column with multiple possible patterns
-                            gpa_col = None
-                            for col in df.columns:
-                                col_str = str(col).upper().strip()
-                                # More flexible GPA column detection
-                                if any(pattern in col_str for pattern in ["GPA", "GRADE POINT", "POINT"]):
-                                    gpa_col = col
-                                    break
-                            
-                            if not gpa_col:
-                                continue
-                            
-                            # Look for name column
-                            name_col = None
-                            for col in df.columns:
-                                col_str = str(col).upper().strip()
-                                if "NAME" in col_str and "COURSE" not in col_str:
-                                    name_col = col
-                                    break
-                            
-                            # Look for remarks column
-                            remarks_col = None
-                            for col in df.columns:
-                                col_str = str(col).upper().strip()
-                                if "REMARK" in col_str:
-                                    remarks_col = col
-                                    break
-                            
-                            # Validate that we have actual data in these columns
-                            valid_students = 0
-                            sample_gpas = []
-                            
-                            for idx, row in df.iterrows():
-                                exam_no = str(row[exam_col]).strip()
-                                gpa_val = row[gpa_col]
-                                
-                                # Check for valid exam number and GPA
-                                if (exam_no and exam_no != "nan" and exam_no != "" and 
-                                    not exam_no.lower().startswith(("exam", "reg", "registration")) and
-                                    len(exam_no) >= 5):  # Reasonable exam number length
-                                    
-                                    if pd.notna(gpa_val) and str(gpa_val).strip() != "":
-                                        try:
-                                            gpa_float = float(gpa_val)
-                                            if 0 <= gpa_float <= 5.0:  # Valid GPA range
-                                                valid_students += 1
-                                                sample_gpas.append((exam_no, gpa_float))
-                                                if valid_students >= 5:  # Found enough valid data
-                                                    break
-                                        except (ValueError, TypeError):
-                                            continue
-                            
-                            if valid_students >= 3:  # Require at least 3 valid students
-                                best_header_row = header_row
-                                best_gpa_col = gpa_col
-                                best_exam_col = exam_col
-                                best_name_col = name_col
-                                best_remarks_col = remarks_col
-                                best_df = df
-                                print(f"✅ Found valid data at header row {header_row}: {valid_students} students with GPA")
-                                break
-                                    
-                        except Exception as e:
-                            # Continue to next header row if this one fails
-                            continue
+                    logger.debug(f"🔍 Processing sheet: {sheet_name}")
                     
-                    # Process the data if we found a valid configuration
-                    if best_header_row is not None and best_df is not None:
-                        df = best_df
-                        exam_col = best_exam_col
-                        gpa_col = best_gpa_col
-                        name_col = best_name_col
-                        remarks_col = best_remarks_col
-                        
-                        print(f"📊 Processing {sheet_name} with header row {best_header_row}")
-                        print(f"📝 Using columns - Exam: '{exam_col}', GPA: '{gpa_col}', Name: '{name_col}'")
+                    # The run's SEMESTER_RESULTS (or the student history)
+                    # has the sheet's rows, so nothing is read back from disk
+                    df = stored_semester_results(mastersheet_path, sheet_name)
+                    if df is not None:
+                        exam_col = "EXAM NUMBER"
+                        gpa_col = "GPA"
+                        name_col = "NAME"
+                        remarks_col = "REMARKS"
                         
                         students_found = 0
                         for idx, row in df.iterrows():
@@ -1138,10 +1077,11 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
                                             semesters_with_data.add(sheet_name)
                                             
                                             # Update student tracker with CGPA data
-                                            if exam_no in STUDENT_TRACKER:
-                                                STUDENT_TRACKER[exam_no]["has_cgpa_data"] = True
-                                                STUDENT_TRACKER[exam_no]["current_gpa"] = gpa_float
-                                                STUDENT_TRACKER[exam_no]["cgpa_status"] = "Active in CGPA"
+                                            student_record = STUDENTS.get(exam_no)
+                                            if student_record is not None:
+                                                student_record.has_cgpa_data = True
+                                                student_record.current_gpa = gpa_float
+                                                student_record.cgpa_status = "Active in CGPA"
                                     except (ValueError, TypeError):
                                         continue
                                 
@@ -1154,17 +1094,17 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
                                         abbrev_semester = semester_abbreviation_map.get(sheet_name, sheet_name)
                                         cgpa_data[exam_no]["probation_semesters"].append(abbrev_semester)
                         
-                        print(f"📊 Extracted GPA data for {students_found} students in {sheet_name}")
+                        logger.info(f"📊 Extracted GPA data for {students_found} students in {sheet_name}")
                         
                     else:
-                        print(f"❌ Could not find valid GPA data in {sheet_name} after trying all header rows")
+                        logger.error(f"❌ No stored results for {sheet_name}")
                         
                 except Exception as e:
-                    print(f"⚠️ Warning: Could not process sheet {sheet_name}: {e}")
+                    logger.warning(f"⚠️ Warning: Could not process sheet {sheet_name}: {e}")
                     continue
         
-        print(f"📊 Total students with CGPA data: {len(cgpa_data)}")
-        print(f"📊 Semesters with data: {semesters_with_data}")
+        logger.info(f"📊 Total students with CGPA data: {len(cgpa_data)}")
+        logger.info(f"📊 Semesters with data: {semesters_with_data}")
         
         # Create CGPA summary dataframe with probation tracking
         summary_data = []
@@ -1264,14 +1204,14 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
             # FIX 2: Add proper serial numbering after sorting
             summary_df.insert(0, "S/N", range(1, len(summary_df) + 1))
             
-            print(f"✅ Successfully created CGPA summary with {len(summary_df)} students")
+            logger.info(f"✅ Successfully created CGPA summary with {len(summary_df)} students")
             # Show sample of the summary data
-            print("📋 Sample of CGPA summary data:")
+            logger.debug("📋 Sample of CGPA summary data:")
             for i in range(min(5, len(summary_df))):
                 student = summary_df.iloc[i]
-                print(f"  {i+1}. {student['S/N']}. {student['EXAM NUMBER']}: CGPA={student.get('CUMULATIVE CGPA', 'N/A')}, Award={student.get('CLASS OF AWARD', 'N/A')}, Semesters={sum(1 for sem in SEMESTER_ORDER if pd.notna(student.get(semester_abbreviation_map.get(sem, sem))))}")
+                logger.debug(f"  {i+1}. {student['S/N']}. {student['EXAM NUMBER']}: CGPA={student.get('CUMULATIVE CGPA', 'N/A')}, Award={student.get('CLASS OF AWARD', 'N/A')}, Semesters={sum(1 for sem in SEMESTER_ORDER if pd.notna(student.get(semester_abbreviation_map.get(sem, sem))))}")
         else:
-            print("⚠️ No CGPA data found for any students")
+            logger.warning("⚠️ No CGPA data found for any students")
             # Create empty dataframe with correct columns
             headers = (
                 ["S/N", "EXAM NUMBER", "NAME", "PROBATION HISTORY"]
@@ -1280,11 +1220,6 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
             )
             summary_df = pd.DataFrame(columns=headers)
         
-        # Add the summary sheet to the workbook
-        if "CGPA_SUMMARY" in wb.sheetnames:
-            del wb["CGPA_SUMMARY"]
-        ws = wb.create_sheet("CGPA_SUMMARY")
-        
         # Define headers for column calculation
         headers = (
             ["S/N", "EXAM NUMBER", "NAME", "PROBATION HISTORY"]
@@ -1293,145 +1228,31 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
         )
         num_columns = len(headers)
         end_col_letter = get_column_letter(num_columns)
-        
-        # ADD PROFESSIONAL HEADER WITH SCHOOL NAME - FIXED: Use exact requested format
-        ws.merge_cells(f"A1:{end_col_letter}1")
-        title_cell = ws["A1"]
-        title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA"
-        title_cell.font = Font(bold=True, size=16, color="FFFFFF")
-        title_cell.alignment = Alignment(horizontal="center", vertical="center")
-        title_cell.fill = PatternFill(
-            start_color="1E90FF", end_color="1E90FF", fill_type="solid"
-        )
-        
-        ws.merge_cells(f"A2:{end_col_letter}2")
-        subtitle_cell = ws["A2"]
-        subtitle_cell.value = "DEPARTMENT OF NURSING"
-        subtitle_cell.font = Font(bold=True, size=14, color="000000")
-        subtitle_cell.alignment = Alignment(horizontal="center", vertical="center")
-        subtitle_cell.fill = PatternFill(
-            start_color="E6E6FA", end_color="E6E6FA", fill_type="solid"
-        )
-        
-        # ADD DYNAMIC TITLE ROW - FIXED: Use exact requested format
-        ws.merge_cells(f"A3:{end_col_letter}3")
-        exam_title_cell = ws["A3"]
-        exam_title_cell.value = "NDII CGPA SUMMARY REPORT"
-        exam_title_cell.font = Font(bold=True, size=12, color="000000")
-        exam_title_cell.alignment = Alignment(horizontal="center", vertical="center")
-        exam_title_cell.fill = PatternFill(
-            start_color="FFFFE0", end_color="FFFFE0", fill_type="solid"
-        )
-        
-        ws.merge_cells(f"A4:{end_col_letter}4")
-        date_cell = ws["A4"]
-        date_cell.value = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        date_cell.font = Font(italic=True, size=10)
-        date_cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Add empty row for spacing
-        ws.row_dimensions[5].height = 10
-        
-        # Write header starting from row 6
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=6, column=col_idx, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="4A90E2", end_color="4A90E2", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center")
-            cell.border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
-        
-        # Write data starting from row 7
-        if not summary_df.empty:
-            for row_idx, row_data in enumerate(summary_df.to_dict("records"), 7):
-                for col_idx, header in enumerate(headers, 1):
-                    value = row_data.get(header, "")
-                    if pd.isna(value):
-                        value = ""
-                    cell = ws.cell(row=row_idx, column=col_idx, value=value)
-                    
-                    # Apply basic styling to data cells
-                    cell.border = Border(
-                        left=Side(style="thin"),
-                        right=Side(style="thin"),
-                        top=Side(style="thin"),
-                        bottom=Side(style="thin"),
-                    )
-                    
-                    # Alternate row coloring
-                    if row_idx % 2 == 0:
-                        cell.fill = PatternFill(start_color="F0F8FF", end_color="F0F8FF", fill_type="solid")
-                    else:
-                        cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                    
-                    # FIX 1: LEFT ALIGN NAME AND PROBATION HISTORY COLUMNS
-                    if col_idx == 1:  # S/N - center
-                        cell.alignment = Alignment(horizontal="center", vertical="center")
-                    elif col_idx == 2:  # EXAM NUMBER - center
-                        cell.alignment = Alignment(horizontal="center", vertical="center")
-                    elif col_idx in [3, 4]:  # NAME and PROBATION HISTORY - LEFT ALIGNED with wrap text
-                        cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                    else:  # All other columns (numeric) - center
-                        cell.alignment = Alignment(horizontal="center", vertical="center")
-                        
-                    # Apply subtle color coding for CLASS OF AWARD column
-                    if header == "CLASS OF AWARD" and value:
-                        if value == "Distinction":
-                            cell.fill = PatternFill(start_color="E8F5E8", end_color="E8F5E8", fill_type="solid")  # Very light green
-                        elif value == "Upper Credit":
-                            cell.fill = PatternFill(start_color="E8F4FD", end_color="E8F4FD", fill_type="solid")  # Very light blue
-                        elif value == "Lower Credit":
-                            cell.fill = PatternFill(start_color="FFF9E6", end_color="FFF9E6", fill_type="solid")  # Very light yellow
-                        elif value == "Pass":
-                            cell.fill = PatternFill(start_color="F0F0F0", end_color="F0F0F0", fill_type="solid")  # Very light gray
-                        elif value == "Fail":
-                            cell.fill = PatternFill(start_color="FDE8E8", end_color="FDE8E8", fill_type="solid")  # Very light red
-                        elif value == "INACTIVE":  # FIX 1: Add color for INACTIVE
-                            cell.fill = PatternFill(start_color="FFF0F0", end_color="FFF0F0", fill_type="solid")  # Very light red/pink
-                        elif value == "WITHDRAWN":  # FIX 1: Add color for WITHDRAWN
-                            cell.fill = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")  # Very light gray
-            
-            print(f"✅ Written {len(summary_df)} students to CGPA summary sheet")
-        else:
-            print("⚠️ No data to write to CGPA summary sheet")
-            ws.cell(row=7, column=1, value="No CGPA data available")
-        
-        # FIX 1: FREEZE PANES AT ROW 7 (so rows 1-6 are frozen)
-        ws.freeze_panes = "A7"
-        print("✅ Frozen headings (rows 1-6)")
+        generated_on = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        # The rows as written: blanks for missing values
+        summary_rows = summary_df.reindex(columns=headers).astype(object)
+        summary_rows = summary_rows.where(summary_rows.notna(), "")
         
         # FIX 2: AUTO-FIT COLUMN WIDTHS FOR ALL COLUMNS WITH BETTER LOGIC
-        print("📏 Auto-fitting column widths to fit content...")
+        logger.debug("📏 Auto-fitting column widths to fit content...")
         
         # Define minimum and maximum widths for better control
         min_width = 8
         max_width = 35
         
         # Enhanced auto-fit: Calculate maximum content length for each column
+        column_widths = {}
         for col_idx, header in enumerate(headers, 1):
             column_letter = get_column_letter(col_idx)
-            max_length = 0
-            
             # Check header length first
-            header_length = len(str(header))
-            max_length = max(max_length, header_length)
+            max_length = len(str(header))
             
             # Check data content lengths
-            for row_idx in range(7, ws.max_row + 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                if cell.value:
-                    try:
-                        cell_length = len(str(cell.value))
-                        # For text columns, allow more width
-                        if header in ["NAME", "PROBATION HISTORY"]:
-                            cell_length = min(cell_length, 50)  # Cap very long text
-                        max_length = max(max_length, cell_length)
-                    except:
-                        pass
+            cell_length = text_width(v for v in summary_rows[header].tolist() if v)
+            # For text columns, allow more width
+            if header in ["NAME", "PROBATION HISTORY"]:
+                cell_length = min(cell_length, 50)  # Cap very long text
+            max_length = max(max_length, cell_length)
             
             # Add padding and apply limits
             adjusted_width = min(max_length + 3, max_width)  # Increased padding to 3
@@ -1455,65 +1276,154 @@ def create_cgpa_summary_sheet(mastersheet_path, timestamp):
             elif header == "CLASS OF AWARD":
                 adjusted_width = min(max(adjusted_width, 12), 20)
             
-            ws.column_dimensions[column_letter].width = adjusted_width
-            print(f"   📐 Column {column_letter} ({header}): width {adjusted_width}")
-        
-        # Adjust row heights for better visibility
-        for row in range(6, ws.max_row + 1):
-            if row == 6:  # Header row
-                ws.row_dimensions[row].height = 25
-            else:
-                ws.row_dimensions[row].height = 20
+            column_widths[col_idx] = adjusted_width
+            logger.debug(f"   📐 Column {column_letter} ({header}): width {adjusted_width}")
         
         # Add summary statistics if we have data
-        if not summary_df.empty:
-            stats_row = len(summary_df) + 8
-            stats_cell = ws.cell(row=stats_row, column=1, value="SUMMARY STATISTICS")
-            stats_cell.font = Font(bold=True, size=12)
-            stats_cell.fill = PatternFill(start_color="E6E6FA", end_color="E6E6FA", fill_type="solid")
+        stats_data = []
+        if not summary_df.empty and "CUMULATIVE CGPA" in summary_df.columns:
+            # FIX 1: Count INACTIVE and WITHDRAWN students
+            inactive_count = (summary_df['CLASS OF AWARD'] == 'INACTIVE').sum()
+            withdrawn_count = (summary_df['CLASS OF AWARD'] == 'WITHDRAWN').sum()
             
-            if "CUMULATIVE CGPA" in summary_df.columns:
-                # FIX 1: Count INACTIVE and WITHDRAWN students
-                inactive_count = (summary_df['CLASS OF AWARD'] == 'INACTIVE').sum()
-                withdrawn_count = (summary_df['CLASS OF AWARD'] == 'WITHDRAWN').sum()
-                
-                stats_data = [
-                    f"Total Students: {len(summary_df)}",
-                    f"Average Cumulative CGPA: {summary_df['CUMULATIVE CGPA'].mean():.2f}",
-                    f"Highest Cumulative CGPA: {summary_df['CUMULATIVE CGPA'].max():.2f}",
-                    f"Lowest Cumulative CGPA: {summary_df['CUMULATIVE CGPA'].min():.2f}",
-                    f"Withdrawn Students: {withdrawn_count}",
-                    f"INACTIVE Students (less than 4 semesters): {inactive_count}",
-                    f"Students with Probation History: {(summary_df['PROBATION HISTORY'] != 'None').sum()}",
-                ]
-                
-                # Add award distribution
-                if "CLASS OF AWARD" in summary_df.columns:
-                    award_counts = summary_df['CLASS OF AWARD'].value_counts()
-                    stats_data.append("Award Distribution:")
-                    for award, count in award_counts.items():
-                        stats_data.append(f"  - {award}: {count} students")
-                
-                for i, stat in enumerate(stats_data, start=stats_row + 1):
-                    cell = ws.cell(row=i, column=1, value=stat)
+            stats_data = [
+                f"Total Students: {len(summary_df)}",
+                f"Average Cumulative CGPA: {summary_df['CUMULATIVE CGPA'].mean():.2f}",
+                f"Highest Cumulative CGPA: {summary_df['CUMULATIVE CGPA'].max():.2f}",
+                f"Lowest Cumulative CGPA: {summary_df['CUMULATIVE CGPA'].min():.2f}",
+                f"Withdrawn Students: {withdrawn_count}",
+                f"INACTIVE Students (less than 4 semesters): {inactive_count}",
+                f"Students with Probation History: {(summary_df['PROBATION HISTORY'] != 'None').sum()}",
+            ]
+            
+            # Add award distribution
+            if "CLASS OF AWARD" in summary_df.columns:
+                award_counts = summary_df['CLASS OF AWARD'].value_counts()
+                stats_data.append("Award Distribution:")
+                for award, count in award_counts.items():
+                    stats_data.append(f"  - {award}: {count} students")
+        
+        # Per-column style of the data rows; rows alternate their fill
+        centered = alignment(horizontal="center", vertical="center")
+        data_styles = []
+        for col_idx in range(1, num_columns + 1):
+            # FIX 1: LEFT ALIGN NAME AND PROBATION HISTORY COLUMNS
+            if col_idx in [3, 4]:  # NAME and PROBATION HISTORY - LEFT ALIGNED with wrap text
+                cell_alignment = alignment(horizontal="left", vertical="center", wrap_text=True)
+            else:  # S/N, EXAM NUMBER and the numeric columns - center
+                cell_alignment = centered
+            data_styles.append({"border": THIN_BORDER, "alignment": cell_alignment})
+        row_fills = {0: solid_fill("F0F8FF"), 1: solid_fill("FFFFFF")}
+        # Apply subtle color coding for CLASS OF AWARD column
+        award_fills = {
+            "Distinction": solid_fill("E8F5E8"),  # Very light green
+            "Upper Credit": solid_fill("E8F4FD"),  # Very light blue
+            "Lower Credit": solid_fill("FFF9E6"),  # Very light yellow
+            "Pass": solid_fill("F0F0F0"),  # Very light gray
+            "Fail": solid_fill("FDE8E8"),  # Very light red
+            "INACTIVE": solid_fill("FFF0F0"),  # FIX 1: Very light red/pink
+            "WITHDRAWN": solid_fill("F5F5F5"),  # FIX 1: Very light gray
+        }
+        award_col = headers.index("CLASS OF AWARD")
+        striped_styles = {
+            parity: [{**styles, "fill": fill} for styles in data_styles]
+            for parity, fill in row_fills.items()
+        }
+        award_styles = {
+            award: {**data_styles[award_col], "fill": fill} for award, fill in award_fills.items()
+        }
+
+        def write_sheet(sink):
+            sink.set_widths(column_widths)
+            # FIX 1: FREEZE PANES AT ROW 7 (so rows 1-6 are frozen)
+            sink.freeze(7)
+            # ADD PROFESSIONAL HEADER WITH SCHOOL NAME - FIXED: Use exact requested format
+            for row in (1, 2, 3, 4):
+                sink.merge(f"A{row}:{end_col_letter}{row}")
+            sink.append(
+                ["FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA"],
+                [{
+                    "font": font(bold=True, size=16, color="FFFFFF"),
+                    "alignment": centered,
+                    "fill": solid_fill("1E90FF"),
+                }],
+            )
+            sink.append(
+                ["DEPARTMENT OF NURSING"],
+                [{
+                    "font": font(bold=True, size=14, color="000000"),
+                    "alignment": centered,
+                    "fill": solid_fill("E6E6FA"),
+                }],
+            )
+            # ADD DYNAMIC TITLE ROW - FIXED: Use exact requested format
+            sink.append(
+                ["NDII CGPA SUMMARY REPORT"],
+                [{
+                    "font": font(bold=True, size=12, color="000000"),
+                    "alignment": centered,
+                    "fill": solid_fill("FFFFE0"),
+                }],
+            )
+            sink.append([generated_on], [{"font": font(italic=True, size=10), "alignment": centered}])
+            # Add empty row for spacing
+            sink.set_height(5, 10)
+            sink.skip()
+            # Write header starting from row 6; adjust row heights for better visibility
+            sink.set_height(6, 25)
+            header_style = {
+                "font": font(bold=True, color="FFFFFF"),
+                "fill": solid_fill("4A90E2"),
+                "alignment": alignment(horizontal="center"),
+                "border": THIN_BORDER,
+            }
+            sink.append(headers, [header_style] * num_columns)
+            # Write data starting from row 7
+            if not summary_df.empty:
+                for values in summary_rows.itertuples(index=False, name=None):
+                    sink.set_height(sink.next_row, 20)
+                    # Alternate row coloring
+                    styles = striped_styles[sink.next_row % 2]
+                    award = values[award_col]
+                    if award and award in award_styles:
+                        styles = list(styles)
+                        styles[award_col] = award_styles[award]
+                    sink.append(values, styles)
+            else:
+                sink.set_height(7, 20)
+                sink.append(["No CGPA data available"])
+            if not summary_df.empty:
+                sink.skip()
+                sink.append(
+                    ["SUMMARY STATISTICS"],
+                    [{"font": font(bold=True, size=12), "fill": solid_fill("E6E6FA")}],
+                )
+                for stat in stats_data:
                     if stat.startswith("Award Distribution:"):
-                        cell.font = Font(bold=True)
+                        sink.append([stat], [{"font": font(bold=True)}])
                     elif stat.startswith("  -"):
-                        cell.font = Font(italic=True)
-        
-        # Save the workbook
-        wb.save(mastersheet_path)
-        print("✅ CGPA Summary sheet created successfully with:")
-        print("   - Frozen headings (rows 1-6)")
-        print("   - Proper serial numbering")
-        print("   - Auto-fit column widths")
-        print("   - NAME and PROBATION HISTORY left aligned")
-        print("   - Abbreviated probation history (Y1S1, Y1S2, Y2S1, Y2S2)")
-        print("   - SINGLE SOURCE OF TRUTH for CGPA calculations")
+                        sink.append([stat], [{"font": font(italic=True)}])
+                    else:
+                        sink.append([stat])
+
+        # Add the summary sheet to the workbook
+        MASTERSHEET_SESSION.write_sheet(mastersheet_path, "CGPA_SUMMARY", write_sheet)
+        if not summary_df.empty:
+            logger.info(f"✅ Written {len(summary_df)} students to CGPA summary sheet")
+        else:
+            logger.warning("⚠️ No data to write to CGPA summary sheet")
+        logger.debug("✅ Frozen headings (rows 1-6)")
+        logger.debug("✅ CGPA Summary sheet created successfully with:")
+        logger.debug("   - Frozen headings (rows 1-6)")
+        logger.debug("   - Proper serial numbering")
+        logger.debug("   - Auto-fit column widths")
+        logger.debug("   - NAME and PROBATION HISTORY left aligned")
+        logger.debug("   - Abbreviated probation history (Y1S1, Y1S2, Y2S1, Y2S2)")
+        logger.debug("   - SINGLE SOURCE OF TRUTH for CGPA calculations")
         return summary_df
         
     except Exception as e:
-        print(f"❌ Error creating CGPA summary sheet: {e}")
+        logger.error(f"❌ Error creating CGPA summary sheet: {e}")
         import traceback
         traceback.print_exc()
         return None
@@ -1526,8 +1436,8 @@ def create_analysis_sheet(mastersheet_path, timestamp):
     UPDATED: REMOVED INACTIVE STUDENTS column as requested
     """
     try:
-        print("📈 Creating Analysis Sheet...")
-        wb = load_workbook(mastersheet_path)
+        logger.info("📈 Creating Analysis Sheet...")
+        wb = MASTERSHEET_SESSION.open(mastersheet_path)
         
         # Collect data from all semesters
         analysis_data = {
@@ -1552,137 +1462,17 @@ def create_analysis_sheet(mastersheet_path, timestamp):
                 continue
                 
             try:
-                print(f"\n🔍 Processing sheet: {sheet_name}")
-                
-                # ========================================
-                # DYNAMIC HEADER ROW DETECTION
-                # ========================================
-                best_header_row = None
-                best_df = None
-                
-                # Try different header rows (0 to 20)
-                for header_row in range(0, 21):
-                    try:
-                        df = pd.read_excel(
-                            mastersheet_path, 
-                            sheet_name=sheet_name, 
-                            header=header_row,
-                            dtype=str
-                        )
-                        
-                        if df.empty or len(df.columns) < 3:
-                            continue
-                        
-                        # Check if we have the required columns
-                        columns_upper = [str(col).upper().strip() for col in df.columns]
-                        
-                        # Look for exam number column
-                        exam_col_found = any(
-                            keyword in col_upper 
-                            for col_upper in columns_upper 
-                            for keyword in ["EXAM", "REG", "MATRIC", "STUDENT"]
-                        )
-                        
-                        # Look for remarks column
-                        remarks_col_found = any(
-                            "REMARK" in col_upper 
-                            for col_upper in columns_upper
-                        )
-                        
-                        # Look for GPA column
-                        gpa_col_found = any(
-                            "GPA" in col_upper or "GRADE POINT" in col_upper
-                            for col_upper in columns_upper
-                        )
-                        
-                        if not (exam_col_found and remarks_col_found and gpa_col_found):
-                            continue
-                        
-                        # Validate we have actual student data
-                        exam_col = None
-                        for col in df.columns:
-                            col_str = str(col).upper().strip()
-                            if any(keyword in col_str for keyword in ["EXAM", "REG", "MATRIC"]):
-                                exam_col = col
-                                break
-                        
-                        if not exam_col:
-                            continue
-                        
-                        # Count valid exam numbers
-                        valid_count = 0
-                        for idx, row in df.iterrows():
-                            exam_no = str(row[exam_col]).strip()
-                            # Check if it looks like a real exam number
-                            if (exam_no and 
-                                exam_no != "nan" and 
-                                exam_no != "" and
-                                not exam_no.upper().startswith(("EXAM", "REG", "REGISTRATION", "STUDENT")) and
-                                len(exam_no) >= 5):
-                                valid_count += 1
-                                if valid_count >= 3:  # Need at least 3 valid students
-                                    break
-                        
-                        if valid_count >= 3:
-                            best_header_row = header_row
-                            best_df = df
-                            print(f"✅ Found valid header at row {header_row} with {valid_count}+ students")
-                            break
-                            
-                    except Exception as e:
-                        continue
-                
-                if best_header_row is None or best_df is None:
-                    print(f"❌ Could not find valid data structure in {sheet_name}")
-                    continue
-                
-                df = best_df
-                print(f"📊 Using header row {best_header_row}")
-                
-                # ========================================
-                # DYNAMIC COLUMN DETECTION
-                # ========================================
-                
-                # Find EXAM NUMBER column
-                exam_col = None
-                for col in df.columns:
-                    col_upper = str(col).upper().strip()
-                    if any(keyword in col_upper for keyword in [
-                        "EXAM NUMBER", "EXAM NO", "REG NO", "REG. NO", 
-                        "REGISTRATION", "MATRIC", "STUDENT ID"
-                    ]):
-                        exam_col = col
-                        print(f"✅ Found EXAM column: '{col}'")
-                        break
-                
-                # Find REMARKS column
-                remarks_col = None
-                for col in df.columns:
-                    col_upper = str(col).upper().strip()
-                    if "REMARK" in col_upper:
-                        remarks_col = col
-                        print(f"✅ Found REMARKS column: '{col}'")
-                        break
+                logger.debug(f"\n🔍 Processing sheet: {sheet_name}")
                 
-                # Find GPA column
-                gpa_col = None
-                for col in df.columns:
-                    col_upper = str(col).upper().strip()
-                    if "GPA" in col_upper or "GRADE POINT" in col_upper:
-                        gpa_col = col
-                        print(f"✅ Found GPA column: '{col}'")
-                        break
-                
-                # Validate we found all required columns
-                if not exam_col:
-                    print(f"❌ Could not find EXAM NUMBER column in {sheet_name}")
-                    continue
-                if not remarks_col:
-                    print(f"❌ Could not find REMARKS column in {sheet_name}")
-                    continue
-                if not gpa_col:
-                    print(f"❌ Could not find GPA column in {sheet_name}")
+                # The run's SEMESTER_RESULTS (or the student history) has
+                # the sheet's rows, so nothing is read back from disk
+                df = stored_semester_results(mastersheet_path, sheet_name)
+                if df is None:
+                    logger.error(f"❌ No stored results for {sheet_name}")
                     continue
+                exam_col = "EXAM NUMBER"
+                remarks_col = "REMARKS"
+                gpa_col = "GPA"
                 
                 # ========================================
                 # COUNT STUDENTS BY STATUS
@@ -1751,14 +1541,14 @@ def create_analysis_sheet(mastersheet_path, timestamp):
                 pass_rate = round((passed_all / total_students * 100), 2) if total_students > 0 else 0.0
                 
                 # Log results
-                print(f"📊 {sheet_name} Statistics:")
-                print(f"   Total Students: {total_students}")
-                print(f"   Passed: {passed_all}")
-                print(f"   Resit: {resit_count}")
-                print(f"   Probation: {probation_count}")
-                print(f"   Withdrawn: {withdrawn_count}")
-                print(f"   Average GPA: {avg_gpa}")
-                print(f"   Pass Rate: {pass_rate}%")
+                logger.info(f"📊 {sheet_name} Statistics:")
+                logger.info(f"   Total Students: {total_students}")
+                logger.info(f"   Passed: {passed_all}")
+                logger.info(f"   Resit: {resit_count}")
+                logger.info(f"   Probation: {probation_count}")
+                logger.info(f"   Withdrawn: {withdrawn_count}")
+                logger.info(f"   Average GPA: {avg_gpa}")
+                logger.info(f"   Pass Rate: {pass_rate}%")
                 
                 # Add to analysis data
                 short_semester = semester_short_names.get(sheet_name, sheet_name)
@@ -1772,7 +1562,7 @@ def create_analysis_sheet(mastersheet_path, timestamp):
                 analysis_data["pass_rate"].append(pass_rate)
                 
             except Exception as e:
-                print(f"⚠️ Error processing sheet {sheet_name}: {e}")
+                logger.warning(f"⚠️ Error processing sheet {sheet_name}: {e}")
                 import traceback
                 traceback.print_exc()
                 continue
@@ -1781,7 +1571,7 @@ def create_analysis_sheet(mastersheet_path, timestamp):
         # ========================================
         
         if not analysis_data["semester"]:
-            print("❌ No analysis data collected from any semester")
+            logger.error("❌ No analysis data collected from any semester")
             # Create empty dataframe
             analysis_df = pd.DataFrame({
                 "SEMESTER": [],
@@ -1821,7 +1611,7 @@ def create_analysis_sheet(mastersheet_path, timestamp):
             }
             analysis_df = pd.concat([analysis_df, pd.DataFrame([overall_stats])], ignore_index=True)
             
-            print(f"\n✅ Analysis data collected for {len(analysis_data['semester'])} semesters")
+            logger.info(f"\n✅ Analysis data collected for {len(analysis_data['semester'])} semesters")
         # Add serial number AFTER creating the dataframe
         analysis_df.insert(0, "S/N", range(1, len(analysis_df) + 1))
         # ========================================
@@ -1946,12 +1736,12 @@ def create_analysis_sheet(mastersheet_path, timestamp):
             note_cell = ws.cell(row=note_row, column=1, value=note)
             note_cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
             note_cell.font = Font(size=10, italic=True)
-        wb.save(mastersheet_path)
-        print("✅ Analysis sheet created successfully with proper serial numbering and professional formatting")
+        MASTERSHEET_SESSION.mark_dirty(mastersheet_path)
+        logger.info("✅ Analysis sheet created successfully with proper serial numbering and professional formatting")
         return analysis_df
         
     except Exception as e:
-        print(f"❌ Error creating analysis sheet: {e}")
+        logger.error(f"❌ Error creating analysis sheet: {e}")
         import traceback
         traceback.print_exc()
         return None
@@ -2003,13 +1793,13 @@ def determine_student_status(row, total_cu, pass_threshold):
                 determine_student_status.count = 0
             determine_student_status.count += 1
             if determine_student_status.count <= 10:
-                print(f"\n Student {exam_no}:")
-                print(
+                logger.debug(f"\n Student {exam_no}:")
+                logger.debug(
                     f" CU Passed: {cu_passed} ({passed_percentage:.1f}%), CU Failed: {cu_failed}"
                 )
-                print(f" GPA: {gpa:.2f}")
-                print(f" → Status: {status}")
-                print(f" → Reason: {reason}")
+                logger.debug(f" GPA: {gpa:.2f}")
+                logger.debug(f" → Status: {status}")
+                logger.debug(f" → Reason: {reason}")
                 
     return status
 
@@ -2022,19 +1812,19 @@ def validate_probation_withdrawal_logic(mastersheet, total_cu):
     Validate that probation and withdrawal statuses are correctly assigned.
     Specifically check edge cases around the 45% threshold.
     """
-    print("\n" + "=" * 70)
-    print("🔍 VALIDATING PROBATION/WITHDRAWAL LOGIC - ENFORCED RULE")
-    print("=" * 70)
+    logger.info("\n" + "=" * 70)
+    logger.info("🔍 VALIDATING PROBATION/WITHDRAWAL LOGIC - ENFORCED RULE")
+    logger.info("=" * 70)
     
     # Check students who passed < 45% (should be Withdrawn regardless of GPA)
     low_pass_students = mastersheet[
         (mastersheet["CU Passed"] / total_cu < 0.45)
         & (mastersheet["CU Failed"] > 0) # Exclude students with no failures
     ]
-    print(f"\n📊 Students with <45% credits passed:")
-    print(f" Total: {len(low_pass_students)}")
+    logger.info(f"\n📊 Students with <45% credits passed:")
+    logger.info(f" Total: {len(low_pass_students)}")
     if len(low_pass_students) > 0:
-        print(f"\n Should ALL be 'Withdrawn' (regardless of GPA):")
+        logger.info(f"\n Should ALL be 'Withdrawn' (regardless of GPA):")
         for idx, row in low_pass_students.head(10).iterrows():
             exam_no = row["EXAM NUMBER"]
             gpa = row["GPA"]
@@ -2043,7 +1833,7 @@ def validate_probation_withdrawal_logic(mastersheet, total_cu):
             passed_pct = cu_passed / total_cu * 100
             status = row["REMARKS"]
             correct = "✅" if status == "Withdrawn" else f"❌ (got {status})"
-            print(
+            logger.debug(
                 f" {exam_no}: GPA={gpa:.2f}, Passed={passed_pct:.1f}%, Failed={cu_failed}, Status={status} {correct}"
             )
     # Check students who passed ≥ 45% with GPA >= 2.00 (should be Resit)
@@ -2052,10 +1842,10 @@ def validate_probation_withdrawal_logic(mastersheet, total_cu):
         & (mastersheet["GPA"] >= 2.00)
         & (mastersheet["CU Failed"] > 0) # Must have some failures
     ]
-    print(f"\n📊 Students with ≥45% credits passed AND GPA ≥ 2.00:")
-    print(f" Total: {len(high_gpa_adequate_pass)}")
+    logger.info(f"\n📊 Students with ≥45% credits passed AND GPA ≥ 2.00:")
+    logger.info(f" Total: {len(high_gpa_adequate_pass)}")
     if len(high_gpa_adequate_pass) > 0:
-        print(f"\n Should ALL be 'Resit':")
+        logger.info(f"\n Should ALL be 'Resit':")
         for idx, row in high_gpa_adequate_pass.head(10).iterrows():
             exam_no = row["EXAM NUMBER"]
             gpa = row["GPA"]
@@ -2063,7 +1853,7 @@ def validate_probation_withdrawal_logic(mastersheet, total_cu):
             passed_pct = cu_passed / total_cu * 100
             status = row["REMARKS"]
             correct = "✅" if status == "Resit" else f"❌ (got {status})"
-            print(
+            logger.debug(
                 f" {exam_no}: GPA={gpa:.2f}, Passed={passed_pct:.1f}%, Status={status} {correct}"
             )
     # Check students who passed ≥ 45% with GPA < 2.00 (should be Probation)
@@ -2072,10 +1862,10 @@ def validate_probation_withdrawal_logic(mastersheet, total_cu):
         & (mastersheet["GPA"] < 2.00)
         & (mastersheet["CU Failed"] > 0) # Must have some failures
     ]
-    print(f"\n📊 Students with ≥45% credits passed AND GPA < 2.00:")
-    print(f" Total: {len(low_gpa_adequate_pass)}")
+    logger.info(f"\n📊 Students with ≥45% credits passed AND GPA < 2.00:")
+    logger.info(f" Total: {len(low_gpa_adequate_pass)}")
     if len(low_gpa_adequate_pass) > 0:
-        print(f"\n Should ALL be 'Probation':")
+        logger.info(f"\n Should ALL be 'Probation':")
         for idx, row in low_gpa_adequate_pass.head(10).iterrows():
             exam_no = row["EXAM NUMBER"]
             gpa = row["GPA"]
@@ -2083,18 +1873,18 @@ def validate_probation_withdrawal_logic(mastersheet, total_cu):
             passed_pct = cu_passed / total_cu * 100
             status = row["REMARKS"]
             correct = "✅" if status == "Probation" else f"❌ (got {status})"
-            print(
+            logger.debug(
                 f" {exam_no}: GPA={gpa:.2f}, Passed={passed_pct:.1f}%, Status={status} {correct}"
             )
     # Status distribution
-    print(f"\n📊 Overall Status Distribution:")
+    logger.info(f"\n📊 Overall Status Distribution:")
     status_counts = mastersheet["REMARKS"].value_counts()
     for status in ["Passed", "Resit", "Probation", "Withdrawn"]:
         count = status_counts.get(status, 0)
         pct = (count / len(mastersheet) * 100) if len(mastersheet) > 0 else 0
-        print(f" {status:12s}: {count:3d} ({pct:5.1f}%)")
+        logger.info(f" {status:12s}: {count:3d} ({pct:5.1f}%)")
         
-    print("=" * 70)
+    logger.info("=" * 70)
 
 # ----------------------------
 # Upgrade Rule Functions - FIXED: Added detailed logging
@@ -2134,7 +1924,7 @@ def get_upgrade_threshold_from_user(semester_key, set_name):
         except Exception as e:
             print(f"❌ Error: {e}. Please try again.")
 
-def apply_upgrade_rule(mastersheet, ordered_codes, min_threshold):
+def apply_upgrade_rule(mastersheet, ordered_codes, min_threshold, not_reg_cache=None):
     """
     Apply upgrade rule to mastersheet scores.
     Returns: (updated_mastersheet, upgraded_count)
@@ -2146,14 +1936,15 @@ def apply_upgrade_rule(mastersheet, ordered_codes, min_threshold):
     upgraded_students = set()
     upgrade_details = []  # Track details for verification
     
-    print(f"🔄 Applying upgrade rule: {min_threshold}–49 → 50")
+    logger.info(f"🔄 Applying upgrade rule: {min_threshold}–49 → 50")
     
     for code in ordered_codes:
+        not_reg = not_reg_mask(mastersheet[code], not_reg_cache)
         for idx in mastersheet.index:
             score = mastersheet.at[idx, code]
             
             # Skip NOT REG
-            if detect_not_registered_content(score):
+            if not_reg.at[idx]:
                 continue
                 
             try:
@@ -2175,22 +1966,22 @@ def apply_upgrade_rule(mastersheet, ordered_codes, min_threshold):
                     
                     # Log first 10 upgrades for verification
                     if upgraded_count <= 10:
-                        print(f"🔼 {exam_no} - {code}: {original_score} → 50")
+                        logger.debug(f"🔼 {exam_no} - {code}: {original_score} → 50")
             except (ValueError, TypeError):
                 continue
                     
     if upgraded_count > 0:
-        print(f"✅ Upgraded {upgraded_count} scores from {min_threshold}–49 to 50")
-        print(f"📊 Affected {len(upgraded_students)} students")
+        logger.info(f"✅ Upgraded {upgraded_count} scores from {min_threshold}–49 to 50")
+        logger.info(f"📊 Affected {len(upgraded_students)} students")
         
         # Show sample of upgrades for verification
         if upgrade_details:
-            print("\n📋 Sample upgrades:")
+            logger.debug("\n📋 Sample upgrades:")
             for detail in upgrade_details[:5]:
-                print(f"   {detail['exam_no']} - {detail['course']}: {detail['original']} → {detail['upgraded']}")
+                logger.debug(f"   {detail['exam_no']} - {detail['course']}: {detail['original']} → {detail['upgraded']}")
     else:
-        print(f"ℹ️ No scores found in range {min_threshold}–49 to upgrade")
-        print("🔍 Checking for scores in the upgrade range...")
+        logger.info(f"ℹ️ No scores found in range {min_threshold}–49 to upgrade")
+        logger.debug("🔍 Checking for scores in the upgrade range...")
         
         # Debug: Check what scores exist
         for code in ordered_codes:
@@ -2203,7 +1994,7 @@ def apply_upgrade_rule(mastersheet, ordered_codes, min_threshold):
                 except:
                     continue
             if scores_in_range:
-                print(f"   {code}: Found {len(scores_in_range)} scores in 40-49 range: {sorted(set(scores_in_range))}")
+                logger.debug(f"   {code}: Found {len(scores_in_range)} scores in 40-49 range: {sorted(set(scores_in_range))}")
         
     return mastersheet, upgraded_count
 
@@ -2237,10 +2028,10 @@ def create_zip_folder(source_dir, zip_path):
                     # Create relative path for ZIP
                     arcname = os.path.relpath(file_path, source_dir)
                     zipf.write(file_path, arcname)
-        print(f"✅ Successfully created ZIP: {zip_path}")
+        logger.info(f"✅ Successfully created ZIP: {zip_path}")
         return True
     except Exception as e:
-        print(f"❌ Failed to create ZIP: {e}")
+        logger.error(f"❌ Failed to create ZIP: {e}")
         return False
 
 def normalize_for_matching(s):
@@ -2260,9 +2051,7 @@ def normalize_for_matching(s):
 
 def initialize_student_tracker():
     """Initialize the global student tracker."""
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-    STUDENT_TRACKER = {}
-    WITHDRAWN_STUDENTS = {}
+    STUDENTS.clear()
 
 def update_student_tracker(
     semester_key, exam_numbers, withdrawn_students=None, probation_students=None, exam_number_to_name_map=None
@@ -2271,140 +2060,83 @@ def update_student_tracker(
     Update the student tracker with current semester's students.
     UPDATED: Tracks probation status separately and FIXED name tracking
     """
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-    
-    print(f"📊 Updating student tracker for {semester_key}")
-    print(f"📝 Current students in this semester: {len(exam_numbers)}")
+    logger.info(f"📊 Updating student tracker for {semester_key}")
+    logger.debug(f"📝 Current students in this semester: {len(exam_numbers)}")
     
     # Track withdrawn students
-    if withdrawn_students:
-        for exam_no in withdrawn_students:
-            if exam_no not in WITHDRAWN_STUDENTS:
-                WITHDRAWN_STUDENTS[exam_no] = {
-                    "withdrawn_semester": semester_key,
-                    "withdrawn_date": datetime.now().strftime(TIMESTAMP_FMT),
-                    "reappeared_semesters": [],
-                }
-                print(f"🚫 Marked as withdrawn: {exam_no} in {semester_key}")
-    # Track probation students
-    probation_count = 0
-    
-    # FIX 1: Use the exam_number_to_name_map to get proper names
-    for exam_no in exam_numbers:
-        # Get the name from the mapping if available
-        student_name = "Unknown"
-        if exam_number_to_name_map and exam_no in exam_number_to_name_map:
-            student_name = exam_number_to_name_map[exam_no]
-        
-        if exam_no not in STUDENT_TRACKER:
-            STUDENT_TRACKER[exam_no] = {
-                "first_seen": semester_key,
-                "last_seen": semester_key,
-                "semesters_present": [semester_key],
-                "status": "Active",
-                "withdrawn": False,
-                "withdrawn_semester": None,
-                "probation_history": [],
-                "current_probation": False,
-                "has_cgpa_data": False,
-                "current_gpa": 0.0,
-                "cgpa_status": "Not in CGPA",
-                "name": student_name,  # FIX 1: Store the name properly
-            }
-        else:
-            STUDENT_TRACKER[exam_no]["last_seen"] = semester_key
-            if semester_key not in STUDENT_TRACKER[exam_no]["semesters_present"]:
-                STUDENT_TRACKER[exam_no]["semesters_present"].append(semester_key)
-            
-            # FIX 1: Update the name if we have a new one
-            if exam_number_to_name_map and exam_no in exam_number_to_name_map:
-                STUDENT_TRACKER[exam_no]["name"] = exam_number_to_name_map[exam_no]
-            
-            # Check if student was previously withdrawn and has reappeared
-            if STUDENT_TRACKER[exam_no]["withdrawn"]:
-                print(f"⚠️ PREVIOUSLY WITHDRAWN STUDENT REAPPEARED: {exam_no}")
-                if exam_no in WITHDRAWN_STUDENTS:
-                    if (
-                        semester_key
-                        not in WITHDRAWN_STUDENTS[exam_no]["reappeared_semesters"]
-                    ):
-                        WITHDRAWN_STUDENTS[exam_no]["reappeared_semesters"].append(
-                            semester_key
-                        )
-        # Update probation status if this student is on probation
-        if probation_students and exam_no in probation_students:
-            if semester_key not in STUDENT_TRACKER[exam_no]["probation_history"]:
-                STUDENT_TRACKER[exam_no]["probation_history"].append(semester_key)
-            STUDENT_TRACKER[exam_no]["current_probation"] = True
-            probation_count += 1
-    print(f"📈 Total unique students tracked: {len(STUDENT_TRACKER)}")
-    print(f"🚫 Total withdrawn students: {len(WITHDRAWN_STUDENTS)}")
-    print(f"⚠️ Total probation students: {probation_count}")
+    for exam_no in withdrawn_students or ():
+        withdrawn_date = datetime.now().strftime(TIMESTAMP_FMT)
+        if STUDENTS.withdraw(exam_no, semester_key, withdrawn_date, mark_record=False):
+            logger.debug(f"🚫 Marked as withdrawn: {exam_no} in {semester_key}")
+    # Track presence, names (FIX 1) and probation students
+    reappeared, probation_count = STUDENTS.record_semester(
+        semester_key, exam_numbers, exam_number_to_name_map, probation_students
+    )
+    for exam_no in reappeared:
+        logger.warning(f"⚠️ PREVIOUSLY WITHDRAWN STUDENT REAPPEARED: {exam_no}")
+    logger.info(f"📈 Total unique students tracked: {len(STUDENTS)}")
+    logger.info(f"🚫 Total withdrawn students: {len(STUDENTS.withdrawals)}")
+    logger.info(f"⚠️ Total probation students: {probation_count}")
 
 def mark_student_withdrawn(exam_no, semester_key):
     """Mark a student as withdrawn in a specific semester."""
-    global STUDENT_TRACKER, WITHDRAWN_STUDENTS
-    if exam_no in STUDENT_TRACKER:
-        STUDENT_TRACKER[exam_no]["withdrawn"] = True
-        STUDENT_TRACKER[exam_no]["withdrawn_semester"] = semester_key
-        STUDENT_TRACKER[exam_no]["status"] = "Withdrawn"
-        
-    if exam_no not in WITHDRAWN_STUDENTS:
-        WITHDRAWN_STUDENTS[exam_no] = {
-            "withdrawn_semester": semester_key,
-            "withdrawn_date": datetime.now().strftime(TIMESTAMP_FMT),
-            "reappeared_semesters": [],
-        }
+    STUDENTS.withdraw(exam_no, semester_key, datetime.now().strftime(TIMESTAMP_FMT))
 
 def is_student_withdrawn(exam_no):
     """Check if a student has been withdrawn in any previous semester."""
-    return exam_no in WITHDRAWN_STUDENTS
+    return STUDENTS.is_withdrawn(exam_no)
 
 def get_withdrawal_history(exam_no):
     """Get withdrawal history for a student."""
-    if exam_no in WITHDRAWN_STUDENTS:
-        return WITHDRAWN_STUDENTS[exam_no]
-    return None
+    return STUDENTS.withdrawal(exam_no)
 
 def filter_out_withdrawn_students(mastersheet, semester_key):
     """
     Filter out students who were withdrawn in previous semesters.
     Returns filtered mastersheet and list of removed students.
     """
-    removed_students = []
-    filtered_mastersheet = mastersheet.copy()
-    
     exam_col = find_exam_number_column(mastersheet)
     if not exam_col:
-        print("❌ Could not find exam number column for filtering withdrawn students")
+        logger.error("❌ Could not find exam number column for filtering withdrawn students")
         return mastersheet, []
         
-    for idx, row in mastersheet.iterrows():
-        exam_no = str(row[exam_col]).strip()
-        if is_student_withdrawn(exam_no):
-            withdrawal_history = get_withdrawal_history(exam_no)
-            # Only remove if student was withdrawn in a PREVIOUS semester
-            if (
-                withdrawal_history
-                and withdrawal_history["withdrawn_semester"] != semester_key
-            ):
-                removed_students.append(exam_no)
-                filtered_mastersheet = filtered_mastersheet[
-                    filtered_mastersheet[exam_col].astype(str) != exam_no
-                ]
+    # Only remove students who were withdrawn in a PREVIOUS semester
+    exam_numbers = mastersheet[exam_col].astype(str)
+    stripped = exam_numbers.str.strip()
+    removed_students = stripped[stripped.isin(STUDENTS.withdrawn_before(semester_key))].tolist()
+    filtered_mastersheet = mastersheet[~exam_numbers.isin(removed_students)].copy()
                 
     if removed_students:
-        print(
+        logger.info(
             f"🚫 Removed {len(removed_students)} previously withdrawn students from {semester_key}:"
         )
         for exam_no in removed_students:
             withdrawal_history = get_withdrawal_history(exam_no)
-            print(
-                f" - {exam_no} (withdrawn in {withdrawal_history['withdrawn_semester']})"
+            logger.debug(
+                f" - {exam_no} (withdrawn in {withdrawal_history.withdrawn_semester})"
             )
             
     return filtered_mastersheet, removed_students
 
+def restore_withdrawals_from_history(clean_dir, semester_keys):
+    """
+    Track students withdrawn in stored semesters that come before every
+    semester in ``semester_keys`` (those this run does not re-process).
+    """
+    positions = [SEMESTER_ORDER.index(k) for k in semester_keys if k in SEMESTER_ORDER]
+    history = StudentHistory.for_path(clean_dir)
+    if not positions or history is None:
+        return
+    try:
+        withdrawals = history.withdrawals(SEMESTER_ORDER[: min(positions)])
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read withdrawals from student history: {e}")
+        return
+    for exam_no, semester_key, recorded_at in withdrawals:
+        STUDENTS.withdraw(exam_no, semester_key, recorded_at, mark_record=False)
+    if withdrawals:
+        logger.info(f"📚 Restored {len(withdrawals)} earlier withdrawals from student history")
+
 # ----------------------------
 # Set Selection Functions
 # ----------------------------
@@ -2414,7 +2146,7 @@ def get_available_sets(base_dir):
     # UPDATED: Look in the ND subdirectory
     nd_dir = os.path.join(base_dir, "ND")
     if not os.path.exists(nd_dir):
-        print(f"❌ ND directory not found: {nd_dir}")
+        logger.error(f"❌ ND directory not found: {nd_dir}")
         return []
         
     sets = []
@@ -2500,20 +2232,35 @@ def load_course_data():
        semester_lookup, semester_course_titles)
     """
     course_file = os.path.join(ND_COURSES_DIR, "course-code-creditUnit.xlsx")
-    print(f"Loading course data from: {course_file}")
+    logger.info(f"Loading course data from: {course_file}")
     if not os.path.exists(course_file):
         raise FileNotFoundError(f"Course file not found: {course_file}")
-    xl = pd.ExcelFile(course_file)
-    semester_course_maps = {}
+    (
+        semester_course_maps,
+        semester_credit_units,
+        semester_lookup,
+        semester_course_titles,
+    ) = load_catalogue(course_file, ND_CATALOGUE_NAMESPACE, build_course_catalogue)
+    logger.info(f"Loaded course sheets: {list(semester_course_maps.keys())}")
+    return (
+        semester_course_maps,
+        semester_credit_units,
+        semester_lookup,
+        semester_course_titles,
+    )
+
+
+def build_course_catalogue(course_sheets):
+    """Build the load_course_data maps from the course workbook's sheets."""
+    semester_course_maps = {}
     semester_credit_units = {}
     semester_lookup = {}
     semester_course_titles = {} # code -> title mapping
-    for sheet in xl.sheet_names:
-        df = pd.read_excel(course_file, sheet_name=sheet, engine="openpyxl", header=0)
+    for sheet, df in course_sheets.items():
         df.columns = [str(c).strip() for c in df.columns]
         expected = ["COURSE CODE", "COURSE TITLE", "CU"]
         if not all(col in df.columns for col in expected):
-            print(
+            logger.warning(
                 f"Warning: sheet '{sheet}' missing expected columns {expected} — skipped"
             )
             continue
@@ -2526,7 +2273,7 @@ def load_course_data():
         )
         dfx = dfx[valid_mask]
         if dfx.empty:
-            print(
+            logger.warning(
                 f"Warning: sheet '{sheet}' has no valid rows after cleaning — skipped"
             )
             continue
@@ -2558,8 +2305,6 @@ def load_course_data():
         semester_lookup[norm_space] = sheet
     if not semester_course_maps:
         raise ValueError("No course data loaded from course workbook")
-        
-    print(f"Loaded course sheets: {list(semester_course_maps.keys())}")
     return (
         semester_course_maps,
         semester_credit_units,
@@ -2640,7 +2385,7 @@ def detect_semester_from_filename(filename):
         )
     else:
         # Default fallback
-        print(
+        logger.warning(
             f"⚠️ Could not detect semester from filename: {filename}, defaulting to ND-FIRST-YEAR-FIRST-SEMESTER"
         )
         return "ND-FIRST-YEAR-FIRST-SEMESTER", 1, 1, "YEAR ONE", "FIRST SEMESTER", "NDI"
@@ -2720,14 +2465,14 @@ def find_exam_number_column(df):
         col_upper = str(col).upper().strip()
         for pattern in primary_patterns:
             if pattern == col_upper:
-                print(f"✅ Found exact exam number column: '{col}'")
+                logger.debug(f"✅ Found exact exam number column: '{col}'")
                 return col
     # Second pass: partial matches for primary patterns
     for col in df.columns:
         col_upper = str(col).upper().strip()
         for pattern in primary_patterns:
             if pattern in col_upper:
-                print(f"✅ Found partial match exam number column: '{col}'")
+                logger.debug(f"✅ Found partial match exam number column: '{col}'")
                 return col
     # Third pass: check for columns that might contain exam numbers by sampling data
     for col in df.columns:
@@ -2748,16 +2493,16 @@ def find_exam_number_column(df):
                         exam_number_like += 1
                 # If most samples look like exam numbers, use this column
                 if exam_number_like / total_samples >= 0.7:
-                    print(f"✅ Detected exam number pattern in column: '{col}'")
+                    logger.debug(f"✅ Detected exam number pattern in column: '{col}'")
                     return col
     # Final fallback: try common column positions
     common_positions = [0, 1] # Often first or second column
     for pos in common_positions:
         if pos < len(df.columns):
             col = df.columns[pos]
-            print(f"⚠️ Using fallback exam number column (position {pos}): '{col}'")
+            logger.warning(f"⚠️ Using fallback exam number column (position {pos}): '{col}'")
             return col
-    print("❌ Could not find exam number column")
+    logger.error("❌ Could not find exam number column")
     return None
 
 # ----------------------------
@@ -2789,103 +2534,133 @@ def load_previous_cgpas_from_processed_files(output_dir, current_semester_key, t
     previous_semester_key = semester_to_previous_map.get(current_semester_key)
     
     if not previous_semester_key:
-        print(f"📊 First semester ({current_semester_key}) - no previous CGPA available")
+        logger.info(f"📊 First semester ({current_semester_key}) - no previous CGPA available")
         return previous_cgpas
     
-    print(f"\n🔍 LOADING PREVIOUS CGPA for: {current_semester_key}")
-    print(f"📚 Looking for previous semester data from: {previous_semester_key}")
+    logger.info(f"\n🔍 LOADING PREVIOUS CGPA for: {current_semester_key}")
+    logger.info(f"📚 Looking for previous semester data from: {previous_semester_key}")
+    
+    # Every saved semester - this run's included - is in the set's student
+    # history, which answers with one indexed query
+    history_gpas = load_history_gpas(output_dir, previous_semester_key)
+    if history_gpas:
+        for exam_no, gpa_float in history_gpas.items():
+            # Convert from 5.0 scale to 4.0 scale if needed
+            if gpa_float > 4.0:
+                gpa_float = (gpa_float / 5.0) * 4.0
+            if 0 <= gpa_float <= 4.0:
+                previous_cgpas[exam_no] = round(gpa_float, 2)
+        logger.info(
+            f"⚡ Loaded previous CGPAs for {len(previous_cgpas)} students of "
+            f"{previous_semester_key} from the student history"
+        )
+        return previous_cgpas
     
     # Look for the mastersheet file
     mastersheet_path = os.path.join(output_dir, f"mastersheet_{timestamp}.xlsx")
-    print(f"🔍 Checking for mastersheet: {mastersheet_path}")
-    
-    if not os.path.exists(mastersheet_path):
-        print(f"❌ Mastersheet not found: {mastersheet_path}")
-        return previous_cgpas
     
-    print(f"✅ Found mastersheet: {mastersheet_path}")
+    # Without the history, semesters saved earlier in this run are served
+    # from memory and only older ones from the workbook
+    stored_results = SEMESTER_RESULTS.get(mastersheet_path, previous_semester_key)
+    stored_from = "in-memory"
+    if stored_results is not None:
+        logger.info(f"⚡ Using {stored_from} results of {previous_semester_key} (no workbook re-read)")
+    else:
+        logger.info(f"🔍 Checking for mastersheet: {mastersheet_path}")
+        
+        if not os.path.exists(mastersheet_path):
+            logger.error(f"❌ Mastersheet not found: {mastersheet_path}")
+            return previous_cgpas
+        
+        logger.info(f"✅ Found mastersheet: {mastersheet_path}")
     
     try:
-        # Read the Excel file to check sheets
-        excel_file = pd.ExcelFile(mastersheet_path)
-        print(f"📋 Available sheets: {excel_file.sheet_names}")
+        if stored_results is not None:
+            best_header_row = stored_from
+            best_df = stored_results
+            best_exam_col = "EXAM NUMBER"
+            best_gpa_col = "GPA"
+        else:
+            # Read the Excel file to check sheets
+            excel_file = pd.ExcelFile(mastersheet_path)
+            logger.debug(f"📋 Available sheets: {excel_file.sheet_names}")
         
-        if previous_semester_key not in excel_file.sheet_names:
-            print(f"❌ Previous semester sheet '{previous_semester_key}' not found in mastersheet")
-            print(f"📋 Available semester sheets: {[s for s in excel_file.sheet_names if s in SEMESTER_ORDER]}")
-            return previous_cgpas
+            if previous_semester_key not in excel_file.sheet_names:
+                logger.error(f"❌ Previous semester sheet '{previous_semester_key}' not found in mastersheet")
+                logger.debug(f"📋 Available semester sheets: {[s for s in excel_file.sheet_names if s in SEMESTER_ORDER]}")
+                return previous_cgpas
         
-        print(f"✅ Found previous semester sheet: {previous_semester_key}")
+            logger.info(f"✅ Found previous semester sheet: {previous_semester_key}")
         
-        # Try multiple header rows to find the actual data (5-10 rows as requested)
-        best_header_row = None
-        best_df = None
-        best_exam_col = None
-        best_gpa_col = None
+            # Try multiple header rows to find the actual data (5-10 rows as requested)
+            best_header_row = None
+            best_df = None
+            best_exam_col = None
+            best_gpa_col = None
         
-        for header_row in range(5, 11):  # Try rows 5-10 as requested
-            try:
-                df = pd.read_excel(mastersheet_path, sheet_name=previous_semester_key, header=header_row)
+            for header_row in range(5, 11):  # Try rows 5-10 as requested
+                try:
+                    df = pd.read_excel(mastersheet_path, sheet_name=previous_semester_key, header=header_row)
                 
-                if df.empty or len(df.columns) < 3:
-                    continue
+                    if df.empty or len(df.columns) < 3:
+                        continue
                 
-                # Find exam number column
-                exam_col = None
-                for col in df.columns:
-                    col_str = str(col).upper().strip()
-                    if any(keyword in col_str for keyword in ["EXAM", "REG", "NUMBER", "NO"]):
-                        exam_col = col
-                        break
+                    # Find exam number column
+                    exam_col = None
+                    for col in df.columns:
+                        col_str = str(col).upper().strip()
+                        if any(keyword in col_str for keyword in ["EXAM", "REG", "NUMBER", "NO"]):
+                            exam_col = col
+                            break
                 
-                if not exam_col:
-                    continue
+                    if not exam_col:
+                        continue
                 
-                # Find GPA column
-                gpa_col = None
-                for col in df.columns:
-                    col_str = str(col).upper().strip()
-                    if any(pattern in col_str for pattern in ["GPA", "GRADE POINT", "POINT"]):
-                        gpa_col = col
-                        break
+                    # Find GPA column
+                    gpa_col = None
+                    for col in df.columns:
+                        col_str = str(col).upper().strip()
+                        if any(pattern in col_str for pattern in ["GPA", "GRADE POINT", "POINT"]):
+                            gpa_col = col
+                            break
                 
-                if not gpa_col:
-                    continue
+                    if not gpa_col:
+                        continue
                 
-                # Validate we have actual student data
-                valid_students = 0
-                for idx, row in df.iterrows():
-                    exam_no = str(row[exam_col]).strip()
+                    # Validate we have actual student data
+                    valid_students = 0
+                    for idx, row in df.iterrows():
+                        exam_no = str(row[exam_col]).strip()
                     
-                    # Skip invalid exam numbers
-                    if (not exam_no or exam_no == "nan" or exam_no == "" or
-                        any(keyword in exam_no.upper() for keyword in ["EXAM", "REG", "REGISTRATION", "STUDENT", "MATRIC", "NUMBER"]) or
-                        len(exam_no) < 5):
-                        continue
+                        # Skip invalid exam numbers
+                        if (not exam_no or exam_no == "nan" or exam_no == "" or
+                            any(keyword in exam_no.upper() for keyword in ["EXAM", "REG", "REGISTRATION", "STUDENT", "MATRIC", "NUMBER"]) or
+                            len(exam_no) < 5):
+                            continue
                     
-                    # Check if GPA exists
-                    if pd.notna(row[gpa_col]) and str(row[gpa_col]).strip() != "":
-                        valid_students += 1
-                        if valid_students >= 3:  # Found enough valid data
-                            break
+                        # Check if GPA exists
+                        if pd.notna(row[gpa_col]) and str(row[gpa_col]).strip() != "":
+                            valid_students += 1
+                            if valid_students >= 3:  # Found enough valid data
+                                break
                 
-                if valid_students >= 3:
-                    best_header_row = header_row
-                    best_df = df
-                    best_exam_col = exam_col
-                    best_gpa_col = gpa_col
-                    print(f"✅ Found valid data at header row {header_row} with {valid_students}+ students")
-                    break
+                    if valid_students >= 3:
+                        best_header_row = header_row
+                        best_df = df
+                        best_exam_col = exam_col
+                        best_gpa_col = gpa_col
+                        logger.debug(f"✅ Found valid data at header row {header_row} with {valid_students}+ students")
+                        break
                     
-            except Exception as e:
-                continue
+                except Exception as e:
+                    continue
         
         if best_header_row is None or best_df is None:
-            print(f"❌ Could not find valid data structure in {previous_semester_key}")
+            logger.error(f"❌ Could not find valid data structure in {previous_semester_key}")
             return previous_cgpas
         
-        print(f"📊 Processing {previous_semester_key} with header row {best_header_row}")
-        print(f"📝 Using columns - Exam: '{best_exam_col}', GPA: '{best_gpa_col}'")
+        logger.info(f"📊 Processing {previous_semester_key} with header row {best_header_row}")
+        logger.info(f"📝 Using columns - Exam: '{best_exam_col}', GPA: '{best_gpa_col}'")
         
         # Load the data
         cgpas_loaded = 0
@@ -2919,25 +2694,25 @@ def load_previous_cgpas_from_processed_files(output_dir, current_semester_key, t
                         cgpas_loaded += 1
                         
                         if cgpas_loaded <= 3:  # Show first 3 for debugging
-                            print(f"📝 Loaded previous CGPA: {exam_no} → {gpa_float:.2f}")
+                            logger.debug(f"📝 Loaded previous CGPA: {exam_no} → {gpa_float:.2f}")
                 except (ValueError, TypeError):
                     continue
         
-        print(f"✅ Loaded previous CGPAs for {cgpas_loaded} students from {previous_semester_key}")
+        logger.info(f"✅ Loaded previous CGPAs for {cgpas_loaded} students from {previous_semester_key}")
         
         if cgpas_loaded > 0:
             # Show summary
             sample_items = list(previous_cgpas.items())[:5]
-            print(f"📊 Sample loaded CGPAs: {sample_items}")
+            logger.debug(f"📊 Sample loaded CGPAs: {sample_items}")
         else:
-            print(f"⚠️ No valid previous CGPA data found in {previous_semester_key}")
+            logger.warning(f"⚠️ No valid previous CGPA data found in {previous_semester_key}")
             
     except Exception as e:
-        print(f"⚠️ Could not read previous semester sheet: {str(e)}")
+        logger.warning(f"⚠️ Could not read previous semester sheet: {str(e)}")
         import traceback
         traceback.print_exc()
     
-    print(f"📊 FINAL: Loaded {len(previous_cgpas)} previous CGPAs from {previous_semester_key}")
+    logger.info(f"📊 FINAL: Loaded {len(previous_cgpas)} previous CGPAs from {previous_semester_key}")
     return previous_cgpas
 
 def get_cumulative_cgpa(current_gpa, previous_cgpa, current_credits, previous_credits):
@@ -2960,7 +2735,7 @@ def load_all_previous_cgpas_for_cumulative(output_dir, current_semester_key, tim
     Load ALL previous CGPAs from all completed semesters for Cumulative CGPA calculation.
     Returns dict: {exam_number: {'gpas': [gpa1, gpa2, ...], 'credits': [credits1, credits2, ...]}}
     """
-    print(f"\n🔍 LOADING ALL PREVIOUS CGPAs for Cumulative CGPA calculation: {current_semester_key}")
+    logger.info(f"\n🔍 LOADING ALL PREVIOUS CGPAs for Cumulative CGPA calculation: {current_semester_key}")
     
     current_year, current_semester_num, _, _, _ = get_semester_display_info(current_semester_key)
     
@@ -2968,7 +2743,7 @@ def load_all_previous_cgpas_for_cumulative(output_dir, current_semester_key, tim
     semesters_to_load = []
     if current_semester_num == 1 and current_year == 1:
         # First semester - no previous data
-        print("📊 First semester of first year - no previous CGPA data")
+        logger.info("📊 First semester of first year - no previous CGPA data")
         return {}
     elif current_semester_num == 2 and current_year == 1:
         # Second semester of first year - load first semester
@@ -2987,20 +2762,36 @@ def load_all_previous_cgpas_for_cumulative(output_dir, current_semester_key, tim
             "ND-SECOND-YEAR-FIRST-SEMESTER",
         ]
     
-    print(f"📚 Semesters to load for Cumulative CGPA: {semesters_to_load}")
+    logger.info(f"📚 Semesters to load for Cumulative CGPA: {semesters_to_load}")
+    
+    # The student history sums GPA x registered credit units per student in
+    # SQL; each student gets one entry holding the combined GPA and credits
+    history_points = load_history_cumulative(output_dir, semesters_to_load)
+    if history_points is not None:
+        logger.info(f"⚡ Loaded cumulative data for {len(history_points)} students from the student history")
+        return {
+            exam_no: {"gpas": [points / units], "credits": [units]}
+            for exam_no, (points, units) in history_points.items()
+        }
     
     all_student_data = {}
     mastersheet_path = os.path.join(output_dir, f"mastersheet_{timestamp}.xlsx")
     
-    if not os.path.exists(mastersheet_path):
-        print(f"❌ Mastersheet not found: {mastersheet_path}")
+    # The workbook may still be unsaved in the session; its sheets are in
+    # SEMESTER_RESULTS, and earlier runs' semesters in the student history
+    if not MASTERSHEET_SESSION.exists(mastersheet_path) and not (
+        stored_history_semesters(output_dir) & set(semesters_to_load)
+    ):
+        logger.error(f"❌ Mastersheet not found: {mastersheet_path}")
         return {}
     
     for semester in semesters_to_load:
-        print(f"📖 Loading data from: {semester}")
+        logger.debug(f"📖 Loading data from: {semester}")
         
-        # Use the refactored function to load from the actual semester sheet
-        semester_cgpas = load_previous_cgpas_from_processed_files(output_dir, semester, timestamp)
+        # load_previous_cgpas_from_processed_files reads the semester before
+        # the one it is given, so ask with the semester that follows
+        following = SEMESTER_ORDER[SEMESTER_ORDER.index(semester) + 1]
+        semester_cgpas = load_previous_cgpas_from_processed_files(output_dir, following, timestamp)
         
         # Convert format for cumulative calculation
         for exam_no, gpa in semester_cgpas.items():
@@ -3014,12 +2805,12 @@ def load_all_previous_cgpas_for_cumulative(output_dir, current_semester_key, tim
             else:
                 all_student_data[exam_no]["credits"].append(30)  # Estimated other semester credits
     
-    print(f"📊 Loaded cumulative data for {len(all_student_data)} students")
+    logger.info(f"📊 Loaded cumulative data for {len(all_student_data)} students")
     
     # Debug: Show sample data
     if all_student_data:
         sample_exam = list(all_student_data.keys())[0]
-        print(f"📋 Sample cumulative data for {sample_exam}: {all_student_data[sample_exam]}")
+        logger.debug(f"📋 Sample cumulative data for {sample_exam}: {all_student_data[sample_exam]}")
     
     return all_student_data
 
@@ -3144,7 +2935,6 @@ def get_custom_semester_selection():
 # ----------------------------
 # PDF Generation - Individual Student Report (FIXED: Proper GPA vs CGPA terminology)
 # UPDATED: Now includes both previous CGPA and current CGPA
-# FIXED: Added proper error handling for missing reportlab installation
 # UPDATED: Dynamic date based on current processing date
 # FIXED: Uses SINGLE SOURCE OF TRUTH for CGPA calculations
 # ----------------------------
@@ -3167,157 +2957,105 @@ def generate_individual_student_pdf(
     """
     FIXED VERSION: Header line breaks and column widths corrected.
     """
-    try:
-        # Try to import reportlab modules
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib import colors
-        from reportlab.platypus import (
-            SimpleDocTemplate,
-            Table,
-            TableStyle,
-            Paragraph,
-            Spacer,
-            PageBreak,
-            Image,
-        )
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-    except ImportError as e:
-        print(f"❌ ERROR: ReportLab is not installed. Cannot generate PDF.")
-        print(f"💡 Please install it with: pip install reportlab")
-        print(f"⚠️ Skipping PDF generation, but Excel processing will continue")
-        return None
-    
     # Validate inputs
     if mastersheet_df is None or mastersheet_df.empty:
-        print("⚠️ No student data to generate PDF")
+        logger.warning("⚠️ No student data to generate PDF")
         return None
         
     if ordered_codes is None:
         ordered_codes = []
-        print("⚠️ No course codes provided for PDF generation")
+        logger.warning("⚠️ No course codes provided for PDF generation")
     
-    doc = SimpleDocTemplate(
-        out_pdf_path,
+    doc_kwargs = dict(
         pagesize=A4,
         rightMargin=40,
         leftMargin=40,
         topMargin=20,
         bottomMargin=20,
     )
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    header_style = ParagraphStyle(
-        "CustomHeader",
-        parent=styles["Normal"],
-        fontSize=10,
-        alignment=TA_CENTER,
-        spaceAfter=2,
-    )
-    main_header_style = ParagraphStyle(
-        "MainHeader",
-        parent=styles["Normal"],
-        fontSize=16,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=6,
-        textColor=colors.HexColor("#800080"),
-    )
-    title_style = ParagraphStyle(
-        "CustomTitle",
-        parent=styles["Normal"],
-        fontSize=12,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=4,
-    )
-    subtitle_style = ParagraphStyle(
-        "SubtitleStyle",
-        parent=styles["Normal"],
-        fontSize=10,
-        alignment=TA_CENTER,
-        spaceAfter=10,
-        textColor=colors.red,
-    )
-    left_align_style = ParagraphStyle(
-        "LeftAlign",
-        parent=styles["Normal"],
-        fontSize=9,
-        alignment=TA_LEFT,
-        leftIndent=4,
-    )
-    center_align_style = ParagraphStyle(
-        "CenterAlign", parent=styles["Normal"], fontSize=9, alignment=TA_CENTER
-    )
-    remarks_style = ParagraphStyle(
-        "RemarksStyle", parent=styles["Normal"], fontSize=8, alignment=TA_LEFT
-    )
-    elems = []
+    # Styles are built once, at import, in report_template
+    styles = SAMPLE_STYLES
+    header_style = HEADER_STYLE
+    main_header_style = MAIN_HEADER_STYLE
+    title_style = TITLE_STYLE
+    subtitle_style = SUBTITLE_STYLE
+    left_align_style = LEFT_ALIGN_STYLE
+    center_align_style = CENTER_ALIGN_STYLE
+    remarks_style = REMARKS_STYLE
+
+    # Static top of every page: laid out once, drawn from a shared PDF form
+    letterhead_elems = []
+    # Logo and header
+    logo_img = None
+    if logo_path and os.path.exists(logo_path):
+        try:
+            logo_img = Image(logo_path, width=0.8 * inch, height=0.8 * inch)
+        except Exception as e:
+            logger.warning(f"Warning: Could not load logo: {e}")
     
-    for idx, r in mastersheet_df.iterrows():
-        # Logo and header
-        logo_img = None
-        if logo_path and os.path.exists(logo_path):
-            try:
-                logo_img = Image(logo_path, width=0.8 * inch, height=0.8 * inch)
-            except Exception as e:
-                print(f"Warning: Could not load logo: {e}")
-        
-        # ============================================================
-        # 🔧 FIX #1: HEADER WITH PROPER LINE BREAK
-        # ============================================================
-        # Header table with logo and title (with line break)
-        if logo_img:
-            header_data = [
-                [
-                    logo_img,
-                    Paragraph(
-                        "FCT COLLEGE OF NURSING SCIENCES<br/><br/>GWAGWALADA, FCT-ABUJA",  # ✅ Added <br/> for line break
-                        main_header_style
-                    ),
-                ]
-            ]
-            header_table = Table(header_data, colWidths=[1.0 * inch, 5.0 * inch])
-            header_table.setStyle(
-                TableStyle(
-                    [
-                        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                        ("ALIGN", (0, 0), (0, 0), "LEFT"),
-                        ("ALIGN", (1, 0), (1, 0), "CENTER"),
-                    ]
-                )
-            )
-            elems.append(header_table)
-        else:
-            elems.append(
+    # ============================================================
+    # 🔧 FIX #1: HEADER WITH PROPER LINE BREAK
+    # ============================================================
+    # Header table with logo and title (with line break)
+    if logo_img:
+        header_data = [
+            [
+                logo_img,
                 Paragraph(
                     "FCT COLLEGE OF NURSING SCIENCES<br/><br/>GWAGWALADA, FCT-ABUJA",  # ✅ Added <br/> for line break
                     main_header_style
-                )
+                ),
+            ]
+        ]
+        header_table = Table(header_data, colWidths=[1.0 * inch, 5.0 * inch])
+        header_table.setStyle(
+            TableStyle(
+                [
+                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                    ("ALIGN", (0, 0), (0, 0), "LEFT"),
+                    ("ALIGN", (1, 0), (1, 0), "CENTER"),
+                ]
             )
+        )
+        letterhead_elems.append(header_table)
+    else:
+        letterhead_elems.append(
+            Paragraph(
+                "FCT COLLEGE OF NURSING SCIENCES<br/><br/>GWAGWALADA, FCT-ABUJA",  # ✅ Added <br/> for line break
+                main_header_style
+            )
+        )
+    
+    # Address and contact info
+    letterhead_elems.append(Paragraph("P.O.Box 507, Gwagwalada-Abuja, Nigeria", header_style))
+    letterhead_elems.append(Paragraph("<b>DEPARTMENT OF NURSING</b>", header_style))
+    letterhead_elems.append(Paragraph("info@fctcns.edu.ng", header_style))
+    letterhead_elems.append(Spacer(1, 8))
+    
+    # Dynamic title based on semester
+    year, semester_num, level_display, semester_display, set_code = get_semester_display_info(semester_key)
+    
+    # Get current date
+    current_date = datetime.now().strftime("%B %d, %Y")
+    if "SECOND-YEAR-SECOND-SEMESTER" in semester_key:
+        exam_title = f"NATIONAL DIPLOMA YEAR TWO SECOND SEMESTER EXAMINATIONS RESULT <br/><br/> {current_date}"
+    else:
+        exam_title = f"NATIONAL DIPLOMA {level_display} {semester_display} EXAMINATIONS RESULT — {current_date}"
+    
+    letterhead_elems.append(Paragraph(exam_title, title_style))
+    letterhead_elems.append(Paragraph("<br/><br/>(THIS IS NOT A TRANSCRIPT)", subtitle_style))
+    letterhead_elems.append(Spacer(1, 8))
+    letterhead = Letterhead(letterhead_elems)
+
+    # One (exam number, flowables) entry per student; pdf_shards lays them out
+    student_pages = []
+    
+    for idx, r in mastersheet_df.iterrows():
+        elems = [letterhead]
         
-        # Address and contact info
-        elems.append(Paragraph("P.O.Box 507, Gwagwalada-Abuja, Nigeria", header_style))
-        elems.append(Paragraph("<b>DEPARTMENT OF NURSING</b>", header_style))
-        elems.append(Paragraph("info@fctcns.edu.ng", header_style))
-        elems.append(Spacer(1, 8))
-        
-        # Dynamic title based on semester
+        # The withdrawn-student remark below reassigns set_code, so refresh per student
         year, semester_num, level_display, semester_display, set_code = get_semester_display_info(semester_key)
         
-        # Get current date
-        current_date = datetime.now().strftime("%B %d, %Y")
-        if "SECOND-YEAR-SECOND-SEMESTER" in semester_key:
-            exam_title = f"NATIONAL DIPLOMA YEAR TWO SECOND SEMESTER EXAMINATIONS RESULT <br/><br/> {current_date}"
-        else:
-            exam_title = f"NATIONAL DIPLOMA {level_display} {semester_display} EXAMINATIONS RESULT — {current_date}"
-        
-        elems.append(Paragraph(exam_title, title_style))
-        elems.append(Paragraph("<br/><br/>(THIS IS NOT A TRANSCRIPT)", subtitle_style))
-        elems.append(Spacer(1, 8))
-        
         # Student particulars
         exam_no = str(r.get("EXAM NUMBER", r.get("REG. No", "")))
         student_name = str(r.get("NAME", ""))
@@ -3571,7 +3309,7 @@ def generate_individual_student_pdf(
         
         # Build remarks
         final_remarks_lines = []
-        if previously_withdrawn and withdrawal_history["withdrawn_semester"] == semester_key:
+        if previously_withdrawn and withdrawal_history.withdrawn_semester == semester_key:
             if failed_courses_formatted:
                 final_remarks_lines.append(f"Failed: {failed_courses_formatted[0]}")
                 if len(failed_courses_formatted) > 1:
@@ -3580,7 +3318,7 @@ def generate_individual_student_pdf(
             else:
                 final_remarks_lines.append("Advised to Withdraw")
         elif previously_withdrawn:
-            withdrawn_semester = withdrawal_history["withdrawn_semester"]
+            withdrawn_semester = withdrawal_history.withdrawn_semester
             year, sem_num, level, sem_display, set_code = get_semester_display_info(withdrawn_semester)
             final_remarks_lines.append(f"STUDENT WAS WITHDRAWN FROM {level} - {sem_display}")
         else:
@@ -3674,8 +3412,8 @@ def generate_individual_student_pdf(
             ["", ""],
             ["____________________", "____________________"],
             [
-                Paragraph("<b>Head of Exams</b>", ParagraphStyle("SigStyle", parent=styles["Normal"], fontSize=10, alignment=TA_CENTER)),
-                Paragraph("<b>HOD Nursing</b>", ParagraphStyle("SigStyle", parent=styles["Normal"], fontSize=10, alignment=TA_CENTER)),
+                Paragraph("<b>Head of Exams</b>", SIGNATURE_STYLE),
+                Paragraph("<b>HOD Nursing</b>", SIGNATURE_STYLE),
             ],
         ]
         sig_table = Table(sig_data, colWidths=[3.0 * inch, 3.0 * inch])
@@ -3687,16 +3425,17 @@ def generate_individual_student_pdf(
         )
         elems.append(sig_table)
         
-        # Page break
-        if idx < len(mastersheet_df) - 1:
-            elems.append(PageBreak())
+        student_pages.append((exam_no, elems))
     
     try:
-        doc.build(elems)
-        print(f"✅ Individual student PDF written: {out_pdf_path}")
+        if INPUT_MANIFEST.restore(semester_key, out_pdf_path):
+            logger.info(f"♻️ Reused unchanged {semester_key} PDF from the last result: {out_pdf_path}")
+            return True
+        build_student_pdf(student_pages, out_pdf_path, doc_kwargs)
+        logger.info(f"✅ Individual student PDF written: {out_pdf_path}")
         return True
     except Exception as e:
-        print(f"❌ Failed to generate PDF: {e}")
+        logger.error(f"❌ Failed to generate PDF: {e}")
         import traceback
         traceback.print_exc()
         return False
@@ -3706,6 +3445,19 @@ def generate_individual_student_pdf(
 # FIXED: Uses SINGLE SOURCE OF TRUTH for CGPA calculations
 # ----------------------------
 
+def nd_input_cache(path, semester_key):
+    """Parsed-input cache and entry key for one ND raw file."""
+    input_cache = ParsedInputCache.for_raw_file(path)
+    input_cache_key = input_cache.key(
+        path,
+        "ND",
+        ND_INPUT_CACHE_VERSION,
+        semester_key,
+        course_workbooks_sha256(ND_COURSES_DIR),
+    )
+    return input_cache, input_cache_key
+
+
 def process_single_file(
     path,
     output_dir,
@@ -3734,78 +3486,99 @@ def process_single_file(
     FIXED: Uses SINGLE SOURCE OF TRUTH for CGPA calculations
     """
     fname = os.path.basename(path)
-    print(f"🔍 Processing file: {fname} for semester: {semester_key}")
+    logger.info(f"🔍 Processing file: {fname} for semester: {semester_key}")
     
-    try:
-        xl = pd.ExcelFile(path)
-        print(f"✅ Successfully opened Excel file: {fname}")
-        print(f"📋 Sheets found: {xl.sheet_names}")
-    except Exception as e:
-        print(f"❌ Error opening excel {path}: {e}")
-        return None
-    expected_sheets = ["CA", "OBJ", "EXAM"]
-    dfs = {}
-    for s in expected_sheets:
-        if s in xl.sheet_names:
-            try:
-                # Try reading with different parameters to handle various Excel formats
-                dfs[s] = pd.read_excel(path, sheet_name=s, dtype=str, header=0)
-                print(f"✅ Loaded sheet {s} with shape: {dfs[s].shape}")
-                print(f"📊 Sheet {s} columns: {dfs[s].columns.tolist()}")
+    # Reuse the merged CA/OBJ/EXAM frame from an earlier run with identical inputs
+    input_cache = None
+    input_cache_key = None
+    merged = None
+    if cache_enabled():
+        try:
+            input_cache, input_cache_key = nd_input_cache(path, semester_key)
+            merged = input_cache.load(input_cache_key)
+        except OSError as e:
+            logger.warning(f"⚠️ Parsed-input cache unavailable: {e}")
+            input_cache = None
+    from_input_cache = merged is not None
+    if from_input_cache:
+        logger.info(f"⚡ Loaded merged CA/OBJ/EXAM data for {fname} from parsed-input cache")
+    else:
+        expected_sheets = ["CA", "OBJ", "EXAM"]
+        try:
+            # Open the workbook once and parse every CA/OBJ/EXAM sheet from it
+            # (already parsed when the pipeline prefetched it)
+            raw = load_raw_sheets(path, expected_sheets, dtype=str, header=0, fallback=True)
+            logger.info(f"✅ Successfully opened Excel file: {fname}")
+            logger.debug(f"📋 Sheets found: {raw.sheet_names}")
+        except Exception as e:
+            logger.error(f"❌ Error opening excel {path}: {e}")
+            return None
+        dfs = {}
+        for s in expected_sheets:
+            if s in raw.sheet_names:
+                try:
+                    if s in raw.errors:
+                        # Raised here so the alternative-load reporting below still runs
+                        raise raw.errors[s][0]
+                    dfs[s] = raw.frames[s]
+                    logger.debug(f"✅ Loaded sheet {s} with shape: {dfs[s].shape}")
+                    logger.debug(f"📊 Sheet {s} columns: {dfs[s].columns.tolist()}")
                 
-                # NEW: Check if data is in transposed format and transform if needed
-                if detect_data_format(dfs[s], s):
-                    print(
-                        f"🔄 Data in {s} sheet is in transposed format, transforming..."
-                    )
-                    dfs[s] = transform_transposed_data(dfs[s], s)
-                    print(f"✅ Transformed {s} sheet to wide format")
-                    print(f"📊 Transformed shape: {dfs[s].shape}")
-                    print(f"📋 Transformed columns: {dfs[s].columns.tolist()}")
+                    # NEW: Check if data is in transposed format and transform if needed
+                    if detect_data_format(dfs[s], s):
+                        logger.debug(
+                            f"🔄 Data in {s} sheet is in transposed format, transforming..."
+                        )
+                        dfs[s] = transform_transposed_data(dfs[s], s)
+                        logger.debug(f"✅ Transformed {s} sheet to wide format")
+                        logger.debug(f"📊 Transformed shape: {dfs[s].shape}")
+                        logger.debug(f"📋 Transformed columns: {dfs[s].columns.tolist()}")
                     
-                # Debug: Show first few rows of data
-                if not dfs[s].empty:
-                    print(f"🔍 First 3 rows of {s} sheet:")
-                    for i in range(min(3, len(dfs[s]))):
-                        row_data = {}
-                        for col in dfs[s].columns[:5]: # Show first 5 columns
-                            row_data[col] = dfs[s].iloc[i][col]
-                        print(f" Row {i}: {row_data}")
-                else:
-                    print(f"⚠️ Sheet {s} is empty!")
-            except Exception as e:
-                print(f"❌ Error reading sheet {s}: {e}")
-                # Try alternative reading method
-                try:
-                    dfs[s] = pd.read_excel(path, sheet_name=s, header=0)
-                    print(f"✅ Alternative load successful for sheet {s}")
-                except Exception as e2:
-                    print(f"❌ Alternative load also failed for sheet {s}: {e2}")
-                    dfs[s] = pd.DataFrame()
-        else:
-            print(f"⚠️ Sheet {s} not found in {fname}")
-            dfs[s] = pd.DataFrame()
-    if not dfs:
-        print("❌ No CA/OBJ/EXAM sheets detected — skipping file.")
-        return None
+                    # Debug: Show first few rows of data
+                    if not dfs[s].empty:
+                        logger.debug(f"🔍 First 3 rows of {s} sheet:")
+                        for i in range(min(3, len(dfs[s]))):
+                            row_data = {}
+                            for col in dfs[s].columns[:5]: # Show first 5 columns
+                                row_data[col] = dfs[s].iloc[i][col]
+                            logger.debug(f" Row {i}: {row_data}")
+                    else:
+                        logger.warning(f"⚠️ Sheet {s} is empty!")
+                except Exception as e:
+                    logger.error(f"❌ Error reading sheet {s}: {e}")
+                    # Alternative reading method (parsed from the same open workbook)
+                    if s in raw.frames:
+                        dfs[s] = raw.frames[s]
+                        logger.info(f"✅ Alternative load successful for sheet {s}")
+                    else:
+                        e2 = raw.errors.get(s, [e])[-1]
+                        logger.error(f"❌ Alternative load also failed for sheet {s}: {e2}")
+                        dfs[s] = pd.DataFrame()
+            else:
+                logger.warning(f"⚠️ Sheet {s} not found in {fname}")
+                dfs[s] = pd.DataFrame()
+        if not dfs:
+            logger.error("❌ No CA/OBJ/EXAM sheets detected — skipping file.")
+            return None
     # Use the provided semester key
     sem = semester_key
     year, semester_num, level_display, semester_display, set_code = (
         get_semester_display_info(sem)
     )
-    print(f"📁 Processing: {level_display} - {semester_display} - Set: {set_code}")
-    print(f"📊 Using course sheet: {sem}")
-    print(f"📊 Previous CGPAs provided: {len(previous_cgpas)} students")
-    print(
+    logger.info(f"📁 Processing: {level_display} - {semester_display} - Set: {set_code}")
+    logger.info(f"📊 Using course sheet: {sem}")
+    logger.info(f"📊 Previous CGPAs provided: {len(previous_cgpas)} students")
+    logger.info(
         f"📊 Cumulative CGPA data available for: {len(cumulative_cgpa_data) if cumulative_cgpa_data else 0} students"
     )
     # Check if semester exists in course maps
     if sem not in semester_course_maps:
-        print(
+        logger.error(
             f"❌ Semester '{sem}' not found in course data. Available semesters: {list(semester_course_maps.keys())}"
         )
         return None
     course_map = semester_course_maps[sem]
+    course_matcher = get_nd_course_matcher(course_map)
     credit_units = semester_credit_units[sem]
     course_titles = semester_course_titles[sem]
     ordered_titles = list(course_map.keys())
@@ -3813,134 +3586,68 @@ def process_single_file(
     ordered_codes = [c for c in ordered_codes if credit_units.get(c, 0) > 0]
     filtered_credit_units = {c: credit_units[c] for c in ordered_codes}
     total_cu = sum(filtered_credit_units.values())
-    print(f"📚 Course codes to process: {ordered_codes}")
-    print(f"📊 Total credit units: {total_cu}")
-    reg_no_cols = {
-        s: find_column_by_names(
-            df,
-            [
-                "REG. No",
-                "Reg No",
-                "Registration Number",
-                "Mat No",
-                "EXAM NUMBER",
-                "Student ID",
-            ],
-        )
-        for s, df in dfs.items()
-    }
-    name_cols = {
-        s: find_column_by_names(df, ["NAME", "Full Name", "Candidate Name"])
-        for s, df in dfs.items()
-    }
-    print(f"🔍 Registration columns found: {reg_no_cols}")
-    print(f"🔍 Name columns found: {name_cols}")
-    merged = None
-    for s, df in dfs.items():
-        if df.empty:
-            print(f"⚠️ Skipping empty sheet: {s}")
-            continue
-            
-        df = df.copy()
-        regcol = reg_no_cols.get(s)
-        namecol = name_cols.get(s)
-        if not regcol:
-            regcol = df.columns[0] if len(df.columns) > 0 else None
-        if not namecol and len(df.columns) > 1:
-            namecol = df.columns[1]
-        if regcol is None:
-            print(f"❌ Skipping sheet {s}: no reg column found")
-            continue
-            
-        print(
-            f"📝 Processing sheet {s} with reg column: {regcol}, name column: {namecol}"
+    logger.info(f"📚 Course codes to process: {ordered_codes}")
+    logger.info(f"📊 Total credit units: {total_cu}")
+    if not from_input_cache:
+        reg_no_cols = {
+            s: find_column_by_names(
+                df,
+                [
+                    "REG. No",
+                    "Reg No",
+                    "Registration Number",
+                    "Mat No",
+                    "EXAM NUMBER",
+                    "Student ID",
+                ],
+            )
+            for s, df in dfs.items()
+        }
+        name_cols = {
+            s: find_column_by_names(df, ["NAME", "Full Name", "Candidate Name"])
+            for s, df in dfs.items()
+        }
+        logger.debug(f"🔍 Registration columns found: {reg_no_cols}")
+        logger.debug(f"🔍 Name columns found: {name_cols}")
+        # One categorical-keyed alignment of the sheets; course columns become
+        # (code, component) pairs
+        merged, merge_report = merge_score_sheets(
+            dfs,
+            reg_no_cols,
+            name_cols,
+            lambda col: (course_matcher.match(col) or {}).get("code"),
         )
-        df["REG. No"] = df[regcol].astype(str).str.strip()
-        if namecol:
-            df["NAME"] = df[namecol].astype(str).str.strip()
-        else:
-            df["NAME"] = pd.NA
-        to_drop = [c for c in [regcol, namecol] if c and c not in ["REG. No", "NAME"]]
-        df.drop(columns=to_drop, errors="ignore", inplace=True)
-        # Debug: Show available columns for matching
-        print(f"🔍 Available columns in {s} sheet: {df.columns.tolist()}")
-        # ENHANCED COURSE MATCHING - Use the new matching algorithm
-        for col in [c for c in df.columns if c not in ["REG. No", "NAME"]]:
-            # Skip empty or whitespace-only columns
-            if not col or str(col).strip() == '':
-                print(f"⚠️ Skipping empty/whitespace column")
-                df.drop(columns=[col], inplace=True)
-                continue
-                
-            matched_course = find_best_course_match(col, course_map)
-            if matched_course:
-                matched_code = matched_course["code"]
-                newcol = f"{matched_code}_{s.upper()}"
-                
-                # Prevent duplicate column names
-                if newcol in df.columns:
-                    print(f"⚠️ Column '{newcol}' already exists, skipping duplicate match for '{col}'")
-                    df.drop(columns=[col], inplace=True)
-                    continue
-                    
-                df.rename(columns={col: newcol}, inplace=True)
-                print(
-                    f"✅ Matched column '{col}' to course code '{matched_code}' (original: {matched_course['original_name']})"
-                )
-            else:
-                print(f"❌ No match found for column: '{col}'")
-        cur_cols = ["REG. No", "NAME"] + [
-            c for c in df.columns if c.endswith(f"_{s.upper()}")
-        ]
-        cur = df[cur_cols].copy()
-        # Debug: Show data before merging
-        print(f"📊 Data in {s} sheet - Shape: {cur.shape}")
-        if not cur.empty:
-            print(f"🔍 First 3 rows of {s} data:")
-            for i in range(min(2, len(cur))):
-                print(
-                    f" Row {i}: REG. No='{cur.iloc[i]['REG. No']}', NAME='{cur.iloc[i]['NAME']}'"
-                )
-        if merged is None:
-            merged = cur
-            print(f"✅ Initialized merged dataframe with {s} sheet")
-        else:
-            print(f"🔗 Merging {s} sheet with existing data")
-            before_merge = len(merged)
-            merged = merged.merge(cur, on="REG. No", how="outer", suffixes=("", "_dup"))
-            after_merge = len(merged)
-            print(f"📊 Merge result: {before_merge} -> {after_merge} rows")
-            if "NAME_dup" in merged.columns:
-                merged["NAME"] = merged["NAME"].combine_first(merged["NAME_dup"])
-                merged.drop(columns=["NAME_dup"], inplace=True)
+        merge_issues = report_summary(merge_report)
+        if merge_issues:
+            logger.warning(f"⚠️ {fname}: {merge_issues}")
     if merged is None or merged.empty:
-        print("❌ No data merged from sheets — skipping file.")
+        logger.error("❌ No data merged from sheets — skipping file.")
         return None
-    print(f"✅ Final merged dataframe shape: {merged.shape}")
-    print(f"📋 Final merged columns: {merged.columns.tolist()}")
+    logger.debug(f"✅ Final merged dataframe shape: {merged.shape}")
+    logger.debug(f"📋 Final merged columns: {merged.columns.tolist()}")
+    if input_cache is not None and not from_input_cache:
+        input_cache.store(input_cache_key, merged)
     # NEW: NOT REG DETECTION AND HANDLING
-    print("🔍 Checking for NOT REGISTERED candidates...")
-    course_columns_to_check = []
-    for code in ordered_codes:
-        for sheet_type in ["CA", "OBJ", "EXAM"]:
-            course_columns_to_check.extend([
-                f"{code}_{sheet_type}"
-            ])
-    # Process NOT REG content
-    merged, not_reg_counts = process_not_registered_scores(merged, course_columns_to_check)
+    logger.info("🔍 Checking for NOT REGISTERED candidates...")
+    course_columns_to_check = [
+        (code, sheet_type) for code in ordered_codes for sheet_type in ["CA", "OBJ", "EXAM"]
+    ]
+    # Process NOT REG content - component masks are cached and reused for scoring
+    component_not_reg_cache = {}
+    merged, not_reg_counts = process_not_registered_scores(
+        merged, course_columns_to_check, component_not_reg_cache
+    )
     # Print NOT REG summary
     total_not_reg = sum(not_reg_counts.values())
     if total_not_reg > 0:
-        print(f"📊 Found {total_not_reg} NOT REGISTERED entries across courses:")
-        for course, count in not_reg_counts.items():
+        logger.info(f"📊 Found {total_not_reg} NOT REGISTERED entries across courses:")
+        for (code, sheet_type), count in not_reg_counts.items():
             if count > 0:
-                print(f"   - {course}: {count} NOT REG entries")
+                logger.debug(f"   - {code} {sheet_type}: {count} NOT REG entries")
     # CRITICAL FIX: Check if we have actual score data before proceeding
     has_score_data = False
-    score_columns = [
-        col for col in merged.columns if any(code in col for code in ordered_codes)
-    ]
-    print(f"🔍 Checking score columns: {score_columns}")
+    score_columns = [col for col in merged.columns if col[0] in ordered_codes]
+    logger.debug(f"🔍 Checking score columns: {score_columns}")
     
     for col in score_columns:
         if col in merged.columns:
@@ -3959,78 +3666,37 @@ def process_single_file(
                     non_zero_count = int((numeric_values > 0).sum())
                     if non_zero_count > 0:
                         has_score_data = True
-                        print(
+                        logger.debug(
                             f"✅ Found score data in column {col}: {non_zero_count} non-zero values"
                         )
                         break
             except Exception as e:
-                print(f"⚠️ Error checking column {col}: {e}")
+                logger.warning(f"⚠️ Error checking column {col}: {e}")
     if not has_score_data:
-        print(f"❌ CRITICAL: No valid score data found in file {fname}!")
-        print(f"🔍 Sample of merged data:")
-        print(merged.head(3))
+        logger.error(f"❌ CRITICAL: No valid score data found in file {fname}!")
+        logger.debug(f"🔍 Sample of merged data:")
+        logger.debug(merged.head(3))
         return None
-    mastersheet = merged[["REG. No", "NAME"]].copy()
+    mastersheet = registrations(merged)
     mastersheet.rename(columns={"REG. No": "EXAM NUMBER"}, inplace=True)
-    print("🎯 Calculating scores for each course...")
+    logger.info("🎯 Calculating scores for each course...")
     
-    # FIX: Ensure course columns can handle mixed data types before NOT REG assignment
     for code in ordered_codes:
-        if code in mastersheet.columns and mastersheet[code].dtype != 'object':
-            mastersheet[code] = mastersheet[code].astype('object')
-    
+        logger.debug(f"📊 Processing course {code}:")
+        for sheet_type in ["CA", "OBJ", "EXAM"]:
+            logger.debug(f" {sheet_type} column exists: {(code, sheet_type) in merged.columns}")
+    # Columnar scoring - any NOT REG component marks the whole course as NOT REG
+    course_scores = compute_course_scores(
+        merged,
+        ordered_codes,
+        mask_not_reg=True,
+        not_reg_cache=component_not_reg_cache,
+    )
     for code in ordered_codes:
-        ca_col = f"{code}_CA"
-        obj_col = f"{code}_OBJ"
-        exam_col = f"{code}_EXAM"
-        print(f"📊 Processing course {code}:")
-        print(f" CA column: {ca_col} - exists: {ca_col in merged.columns}")
-        print(f" OBJ column: {obj_col} - exists: {obj_col in merged.columns}")
-        print(f" EXAM column: {exam_col} - exists: {exam_col in merged.columns}")
-        # NEW: NOT REG handling in score calculation
-        mastersheet[code] = 0  # Default to 0
-        
-        for idx in merged.index:
-            exam_no = str(merged.at[idx, "REG. No"]).strip()
-            
-            # Check if any component has NOT REG
-            ca_has_not_reg = ca_col in merged.columns and detect_not_registered_content(merged.at[idx, ca_col])
-            obj_has_not_reg = obj_col in merged.columns and detect_not_registered_content(merged.at[idx, obj_col])
-            exam_has_not_reg = exam_col in merged.columns and detect_not_registered_content(merged.at[idx, exam_col])
-            
-            # If ANY component has NOT REG, mark the entire course as NOT REG
-            if ca_has_not_reg or obj_has_not_reg or exam_has_not_reg:
-                # Convert column to object type first to allow mixed types
-                if mastersheet[code].dtype != 'object':
-                    mastersheet[code] = mastersheet[code].astype('object')
-                mastersheet.at[idx, code] = "NOT REG"
-                continue
-                
-            # Normal score calculation for registered students
-            ca_series = (
-                pd.to_numeric(merged.at[idx, ca_col], errors="coerce")
-                if ca_col in merged.columns and pd.notna(merged.at[idx, ca_col])
-                else 0
-            )
-            obj_series = (
-                pd.to_numeric(merged.at[idx, obj_col], errors="coerce") 
-                if obj_col in merged.columns and pd.notna(merged.at[idx, obj_col])
-                else 0
-            )
-            exam_series = (
-                pd.to_numeric(merged.at[idx, exam_col], errors="coerce")
-                if exam_col in merged.columns and pd.notna(merged.at[idx, exam_col])
-                else 0
-            )
-            # Handle NaN values from coercion
-            ca_norm = (float(ca_series) / 20) * 100 if not pd.isna(ca_series) else 0
-            obj_norm = (float(obj_series) / 20) * 100 if not pd.isna(obj_series) else 0
-            exam_norm = (float(exam_series) / 80) * 100 if not pd.isna(exam_series) else 0
-            ca_norm = min(ca_norm, 100)
-            obj_norm = min(obj_norm, 100) 
-            exam_norm = min(exam_norm, 100)
-            total = (ca_norm * 0.2) + (((obj_norm + exam_norm) / 2) * 0.8)
-            mastersheet.at[idx, code] = round(total, 0)
+        mastersheet[code] = course_scores[code].values
+    # Single NOT REG pass over the course columns, reused by every later stage
+    not_reg_cache = {}
+    not_reg_mask(mastersheet[ordered_codes], not_reg_cache)
     # NEW: APPLY FLEXIBLE UPGRADE RULE - Ask user for threshold per semester
     # Only ask in interactive mode
     if should_use_interactive_mode():
@@ -4041,87 +3707,38 @@ def process_single_file(
         # In non-interactive mode, use the provided threshold or None
         upgraded_scores_count = 0
         if upgrade_min_threshold is not None:
-            print(
+            logger.info(
                 f"🔄 Applying upgrade upgrade from parameters: {upgrade_min_threshold}–49 → 50"
             )
             
     if upgrade_min_threshold is not None:
         mastersheet, upgraded_scores_count = apply_upgrade_rule(
-            mastersheet, ordered_codes, upgrade_min_threshold
+            mastersheet, ordered_codes, upgrade_min_threshold, not_reg_cache
         )
     for c in ordered_codes:
         if c not in mastersheet.columns:
             mastersheet[c] = 0
-    # UPDATED: Compute FAILED COURSES with corrected logic (excluding NOT REG)
-    def compute_failed_courses(row):
-        """Compute list of failed courses (excluding NOT REG courses)."""
-        fails = []
-        for c in ordered_codes:
-            score = row.get(c)
-            # Skip NOT REG courses when counting failures
-            if detect_not_registered_content(score):
-                continue
-            try:
-                if float(score or 0) < pass_threshold:
-                    fails.append(c)
-            except (ValueError, TypeError):
-                continue
-        return ", ".join(sorted(fails)) if fails else ""
-
-    mastersheet["FAILED COURSES"] = mastersheet.apply(compute_failed_courses, axis=1)
-    # NEW: Calculate TCPE, TCUP, TCUF with NOT REG handling
-    def calc_tcpe_tcup_tcuf(row):
-        tcpe = 0.0
-        tcup = 0
-        tcuf = 0
-        total_registered_cu = 0
-        
-        for code in ordered_codes:
-            score = row.get(code)
-            
-            # Skip NOT REG courses
-            if detect_not_registered_content(score):
-                continue
-                
-            try:
-                score_val = float(score) if pd.notna(score) and score != "" else 0
-                cu = filtered_credit_units.get(code, 0)
-                gp = get_grade_point(score_val)
-                tcpe += gp * cu
-                total_registered_cu += cu
-                
-                if score_val >= pass_threshold:
-                    tcup += cu
-                else:
-                    tcuf += cu
-            except (ValueError, TypeError):
-                continue
-                
-        return tcpe, tcup, tcuf, total_registered_cu
-
-    results = mastersheet.apply(calc_tcpe_tcup_tcuf, axis=1, result_type="expand")
-    mastersheet["TCPE"] = results[0].round(1)
-    mastersheet["CU Passed"] = results[1]
-    mastersheet["CU Failed"] = results[2]
-    mastersheet["Total Registered CU"] = results[3]  # Add this column
-    # NEW: Calculate GPA with NOT REG handling
-    def calculate_gpa(row):
-        tcpe = row["TCPE"]
-        total_registered_cu = row["Total Registered CU"]
-        return round((tcpe / total_registered_cu), 2) if total_registered_cu > 0 else 0.0
-
-    mastersheet["GPA"] = mastersheet.apply(calculate_gpa, axis=1)
+    score_not_reg = not_reg_mask(mastersheet[ordered_codes], not_reg_cache)
+    # Derive FAILED COURSES, TCPE, CU Passed/Failed, registered CU, GPA and
+    # AVERAGE in one columnar pass (NOT REG courses are excluded throughout)
+    semester_results = derive_semester_results(
+        mastersheet[ordered_codes],
+        [filtered_credit_units.get(code, 0) for code in ordered_codes],
+        ND_GRADE_BANDS,
+        pass_threshold,
+        not_reg=score_not_reg,
+    )
+    for col in ["FAILED COURSES", "TCPE", "CU Passed", "CU Failed", "Total Registered CU", "GPA"]:
+        mastersheet[col] = semester_results[col]
     
     # ========================================================================
     # CRITICAL FIX: ADDED PREVIOUS CGPA AND CURRENT CGPA CALCULATION TO EXCEL
     # Uses SINGLE SOURCE OF TRUTH for consistency
     # ========================================================================
-    print("🎯 Calculating CGPA values for Excel mastersheet...")
+    logger.info("🎯 Calculating CGPA values for Excel mastersheet...")
     
-    def calculate_previous_cgpa(row):
+    def calculate_previous_cgpa(exam_no):
         """Calculate Previous CGPA from single source of truth (excluding current semester)."""
-        exam_no = str(row["EXAM NUMBER"]).strip()
-        
         if exam_no in CUMULATIVE_CGPA_DATA:
             student_data = CUMULATIVE_CGPA_DATA[exam_no]
             # Check if we have any previous data (excluding current semester)
@@ -4146,62 +3763,55 @@ def process_single_file(
         
         return "N/A"
     
-    def calculate_current_cgpa(row):
+    def calculate_current_cgpa(exam_no, current_gpa, current_credits):
         """Calculate Current CGPA using SINGLE SOURCE OF TRUTH."""
-        exam_no = str(row["EXAM NUMBER"]).strip()
-        current_gpa = row["GPA"]
-        current_credits = row["Total Registered CU"]
-        
         # Update the single source of truth
         current_cgpa = update_cumulative_cgpa_data(exam_no, current_gpa, current_credits, semester_key)
         
-        print(f"📊 {exam_no}: Current CGPA calculated = {current_cgpa:.2f} (from single source)")
+        # Called once per student: let logging format the line only when DEBUG is on
+        logger.debug("📊 %s: Current CGPA calculated = %.2f (from single source)", exam_no, current_cgpa)
         return current_cgpa
     
-    # Apply CGPA calculations
-    print("🔍 Calculating Previous CGPA values...")
-    mastersheet["PREVIOUS CGPA"] = mastersheet.apply(calculate_previous_cgpa, axis=1)
+    # The CGPA folds are per-student dictionary updates, so walk plain lists
+    # rather than building a row Series for every student
+    cgpa_exam_numbers = mastersheet["EXAM NUMBER"].astype(str).str.strip().tolist()
+    logger.info("🔍 Calculating Previous CGPA values...")
+    mastersheet["PREVIOUS CGPA"] = [
+        calculate_previous_cgpa(exam_no) for exam_no in cgpa_exam_numbers
+    ]
     
-    print("🔍 Calculating Current CGPA values...")
-    mastersheet["CURRENT CGPA"] = mastersheet.apply(calculate_current_cgpa, axis=1)
+    logger.info("🔍 Calculating Current CGPA values...")
+    mastersheet["CURRENT CGPA"] = [
+        calculate_current_cgpa(exam_no, gpa, credits)
+        for exam_no, gpa, credits in zip(
+            cgpa_exam_numbers,
+            mastersheet["GPA"].tolist(),
+            mastersheet["Total Registered CU"].tolist(),
+        )
+    ]
     
-    print(f"✅ CGPA calculations completed. Sample values:")
+    logger.debug(f"✅ CGPA calculations completed. Sample values:")
     for idx in range(min(3, len(mastersheet))):
         exam_no = mastersheet.iloc[idx]["EXAM NUMBER"]
         current_gpa = mastersheet.iloc[idx]["GPA"]
         prev_cgpa = mastersheet.iloc[idx]["PREVIOUS CGPA"]
         curr_cgpa = mastersheet.iloc[idx]["CURRENT CGPA"]
-        print(f"  {exam_no}: GPA={current_gpa:.2f}, Prev CGPA={prev_cgpa}, Curr CGPA={curr_cgpa:.2f}")
+        logger.debug(f"  {exam_no}: GPA={current_gpa:.2f}, Prev CGPA={prev_cgpa}, Curr CGPA={curr_cgpa:.2f}")
     
-    # ========================================================================
-    # FIX: Replace the problematic AVERAGE calculation with safe mean function
-    # ========================================================================
-    def safe_mean(row, ordered_codes):
-        """Calculate average excluding NOT REG values and handling mixed types."""
-        numeric_values = []
-        for code in ordered_codes:
-            value = row[code]
-            if not detect_not_registered_content(value):
-                try:
-                    numeric_values.append(float(value))
-                except (ValueError, TypeError):
-                    continue
-        return np.mean(numeric_values) if numeric_values else 0
-
-    mastersheet["AVERAGE"] = mastersheet.apply(
-        lambda row: safe_mean(row, ordered_codes), axis=1
-    ).round(0)
+    mastersheet["AVERAGE"] = semester_results["AVERAGE"]
     # ENFORCED: Compute REMARKS with ENFORCED rule logic
-    print(
+    logger.info(
         "\n🎯 Determining student statuses with ENFORCED probation/withdrawal rule..."
     )
     determine_student_status.debug_students = [
         "FCTCONS/ND24/109"
     ] # Add specific students to debug
     determine_student_status.count = 0
-    mastersheet["REMARKS"] = mastersheet.apply(
-        lambda row: determine_student_status(row, total_cu, pass_threshold), axis=1
-    )
+    mastersheet["REMARKS"] = classify_by_passed_share(semester_results, total_cu)
+    # Row-wise rule evaluation only for the students being debugged
+    debug_rows = mastersheet["EXAM NUMBER"].isin(determine_student_status.debug_students)
+    for _, row in mastersheet[debug_rows].iterrows():
+        determine_student_status(row, total_cu, pass_threshold)
     # Validate the probation/withdrawal logic
     validate_probation_withdrawal_logic(mastersheet, total_cu)
     # FILTER OUT PREVIOUSLY WITHDRAWN STUDENTS
@@ -4215,7 +3825,7 @@ def process_single_file(
             exam_no = str(row["EXAM NUMBER"]).strip()
             withdrawn_students.append(exam_no)
             mark_student_withdrawn(exam_no, semester_key)
-            print(f"🚫 Student {exam_no} marked as withdrawn in {semester_key}")
+            logger.debug(f"🚫 Student {exam_no} marked as withdrawn in {semester_key}")
     # UPDATED: Identify probation students for tracking
     probation_students = []
     for idx, row in mastersheet.iterrows():
@@ -4233,21 +3843,22 @@ def process_single_file(
     carryover_students = identify_carryover_students(
         mastersheet, semester_key, set_name, pass_threshold
     )
+    record_carryover_history(output_dir, semester_key, carryover_students)
     if carryover_students:
         carryover_dir = save_carryover_records(
             carryover_students, output_dir, set_name, semester_key
         )
-        print(
+        logger.info(
             f"✅ Saved {len(carryover_students)} carryover records to: {carryover_dir}"
         )
         # ADD: Log the carryover record file path for debugging
         carryover_file = os.path.join(
             carryover_dir, f"co_student_{set_name}_{semester_key}_*.json"
         )
-        print(f"📁 Carryover file pattern: {carryover_file}")
+        logger.info(f"📁 Carryover file pattern: {carryover_file}")
         # Print carryover summary
         total_failed_courses = sum(len(s["failed_courses"]) for s in carryover_students)
-        print(
+        logger.info(
             f"📊 Carryover Summary: {total_failed_courses} failed courses across all students"
         )
         # Show most frequently failed courses
@@ -4262,19 +3873,20 @@ def process_single_file(
             top_failed = sorted(
                 course_fail_count.items(), key=lambda x: x[1], reverse=True
             )[:5]
-            print(f"📚 Most failed courses: {top_failed}")
+            logger.info(f"📚 Most failed courses: {top_failed}")
     else:
-        print("✅ No carryover students identified")
+        logger.info("✅ No carryover students identified")
     # NEW: Sorting by REMARKS with custom order and secondary by GPA descending
     def status_key(s):
         return {"Passed": 0, "Resit": 1, "Probation": 2, "Withdrawn": 3}.get(s, 4)
 
     mastersheet["status_key"] = mastersheet["REMARKS"].apply(status_key)
-    mastersheet = (
-        mastersheet.sort_values(by=["status_key", "GPA"], ascending=[True, False])
-        .drop(columns=["status_key"])
-        .reset_index(drop=True)
-    )
+    mastersheet = mastersheet.sort_values(
+        by=["status_key", "GPA"], ascending=[True, False]
+    ).drop(columns=["status_key"])
+    # Keep the cached NOT REG masks aligned with the sorted, renumbered rows
+    reorder_not_reg_cache(not_reg_cache, mastersheet.index)
+    mastersheet = mastersheet.reset_index(drop=True)
     if "S/N" not in mastersheet.columns:
         mastersheet.insert(0, "S/N", range(1, len(mastersheet) + 1))
     else:
@@ -4307,62 +3919,10 @@ def process_single_file(
     mastersheet = mastersheet[out_cols]
     # FIXED: Create proper output directory structure - all files go directly to the set output directory
     out_xlsx = os.path.join(output_dir, f"mastersheet_{ts}.xlsx")
-    if not os.path.exists(out_xlsx):
-        wb = Workbook()
-        if wb.active:
-            wb.remove(wb.active)
-    else:
-        wb = load_workbook(out_xlsx)
-    if sem not in wb.sheetnames:
-        ws = wb.create_sheet(title=sem)
-    else:
-        ws = wb[sem]
-    try:
-        ws.delete_rows(1, ws.max_row)
-        ws.delete_cols(1, ws.max_column)
-    except Exception:
-        pass
-    ws.insert_rows(1, 2)
     logo_path_norm = os.path.normpath(logo_path) if logo_path else None
-    if logo_path_norm and os.path.exists(logo_path_norm):
-        try:
-            img = XLImage(logo_path_norm)
-            img.width, img.height = 110, 110
-            ws.add_image(img, "A1")
-        except Exception as e:
-            print(f"⚠ Could not place logo: {e}")
     # =========================================================================
     # APPLIED FIX: UPDATED HEADER SECTION WITH SPACING AND ROW HEIGHT FIXES
     # =========================================================================
-    # UPDATED HEADER: Dynamic title based on semester being processed
-    ws.merge_cells("C1:Q1")
-    title_cell = ws["C1"]
-    title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA"
-    title_cell.font = Font(bold=True, size=16, color="FFFFFF")
-    title_cell.alignment = Alignment(horizontal="center", vertical="center")
-    title_cell.fill = PatternFill(
-        start_color="1E90FF", end_color="1E90FF", fill_type="solid"
-    )
-    border = Border(
-        left=Side(style="medium"),
-        right=Side(style="medium"),
-        top=Side(style="medium"),
-        bottom=Side(style="medium"),
-    )
-    title_cell.border = border
-    # UPDATED: Use new header format with DEPARTMENT OF NURSING
-    ws.merge_cells("C2:Q2")
-    dept_cell = ws["C2"]
-    dept_cell.value = "DEPARTMENT OF NURSING"
-    dept_cell.font = Font(bold=True, size=14, color="000000")
-    dept_cell.alignment = Alignment(horizontal="center", vertical="center")
-    dept_cell.fill = PatternFill(
-        start_color="E6E6FA", end_color="E6E6FA", fill_type="solid"
-    )
-    # UPDATED: Dynamic title based on semester being processed
-    ws.merge_cells("C3:Q3")
-    subtitle_cell = ws["C3"]
-    
     # Create dynamic title based on semester
     # FIXED: Use current date dynamically
     current_date = datetime.now().strftime("%B %d, %Y")
@@ -4373,33 +3933,29 @@ def process_single_file(
         # Dynamic title for other semesters
         year, semester_num, level_display, semester_display, set_code = get_semester_display_info(semester_key)
         exam_title = f"NATIONAL DIPLOMA {level_display} {semester_display} EXAMINATIONS RESULT — {current_date}"
-    
-    subtitle_cell.value = exam_title
-    subtitle_cell.font = Font(bold=True, size=12, color="000000")
-    subtitle_cell.alignment = Alignment(horizontal="center", vertical="center")
-    # ADDED: Create space between header and course titles by adding empty rows
-    ws.append([])  # Empty row 4 - creates space
-    ws.append([])  # Empty row 5 - creates more space
+    # Rows above the course titles: school, department, exam title, two spacer
+    # rows (creates space), then the upgrade notice if any and one more spacer
+    top_rows = [
+        [None, None, "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA, FCT-ABUJA"],
+        [None, None, "DEPARTMENT OF NURSING"],
+        [None, None, exam_title],
+        [],
+        [],
+    ]
     # FIX 5: Add visual indicator in header for upgraded scores
     start_row = 6  # CHANGED: Now starting at row 6 due to added empty rows
+    upgrade_notice_row = None
     if upgrade_min_threshold is not None:
-        # Add upgrade notice row
-        ws.append(
-            ["", "", f"UPGRADED SCORES: {upgrade_min_threshold}–49 → 50"]
-            + [""] * len(ordered_codes)
+        # Add upgrade notice row (D and E are merged into the notice)
+        top_rows.append(
+            ["", "", f"UPGRADED SCORES: {upgrade_min_threshold}–49 → 50", None, None]
+            + [""] * (len(ordered_codes) - 2)
             + [""] * 6
         )
-        # Merge cells for the notice
-        ws.merge_cells(f"C{start_row}:E{start_row}")
-        notice_cell = ws.cell(row=start_row, column=3)
-        notice_cell.font = Font(bold=True, size=10, color="FFFFFF")
-        notice_cell.fill = PatternFill(
-            start_color="FF6B35", end_color="FF6B35", fill_type="solid"
-        )  # Orange background
-        notice_cell.alignment = Alignment(horizontal="center", vertical="center")
+        upgrade_notice_row = start_row
         start_row += 1  # Increment start_row for subsequent rows
     # ADDED: Additional space after upgrade notice (if present) or after header (if no upgrade)
-    ws.append([])  # Empty row for spacing
+    top_rows.append([])
     start_row += 1  # Adjust start_row for the empty row we just added
     # FIX 1: EXPAND ROW HEIGHT FOR COURSE TITLES (ROW 8)
     display_course_titles = []
@@ -4409,81 +3965,32 @@ def process_single_file(
             display_course_titles.append(course_info["original_name"])
     # Calculate the maximum title length to determine appropriate row height
     max_title_length = max([len(title) for title in display_course_titles]) if display_course_titles else 0
-    print(f"📏 Longest course title length: {max_title_length} characters")
+    logger.debug(f"📏 Longest course title length: {max_title_length} characters")
     
     # Set appropriate row height based on title length - FIXED ROW HEIGHT
     course_title_row_height = 60  # Increased height to accommodate wrapped text
-    ws.row_dimensions[start_row].height = course_title_row_height
-    ws.append([""] * 3 + display_course_titles + [""] * 6)
-    
-    # Apply text wrapping and rotation to course titles
-    for i, cell in enumerate(
-        ws[start_row][3 : 3 + len(display_course_titles)], start=3
-    ):
-        cell.alignment = Alignment(
-            horizontal="center", 
-            vertical="center", 
-            text_rotation=45,
-            wrap_text=True  # ADDED: Enable text wrapping
-        )
-        cell.font = Font(bold=True, size=9)
-    
     # FIX 2: AUTO-FIT COLUMN WIDTHS FOR ALL COLUMNS
     cu_list = [filtered_credit_units.get(c, "") for c in ordered_codes]
-    ws.append([""] * 3 + cu_list + [""] * 6)
-    for cell in ws[start_row + 1][3 : 3 + len(cu_list)]:
-        cell.alignment = Alignment(
-            horizontal="center", vertical="center", text_rotation=135
-        )
-        cell.font = Font(bold=True, size=9)
-        cell.fill = PatternFill(
-            start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"
-        )
     headers = out_cols
-    ws.append(headers)
-    for cell in ws[start_row + 2]:
-        cell.font = Font(bold=True, size=10, color="FFFFFF")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.fill = PatternFill(
-            start_color="4A90E2", end_color="4A90E2", fill_type="solid"
-        )
-        cell.border = Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        )
-    for _, r in mastersheet.iterrows():
-        rowvals = [r[col] for col in headers]
-        ws.append(rowvals)
+    top_rows.append([""] * 3 + display_course_titles + [""] * 6)
+    top_rows.append([""] * 3 + cu_list + [""] * 6)
+    top_rows.append(headers)
     # =========================================================================
     # APPLIED FIX: UPDATED FREEZE PANES TO ACCOUNT FOR NEW ROW POSITIONS
     # =========================================================================
     # Adjust freeze panes based on new structure
     freeze_row = start_row + 4  # CHANGED: Added +1 to account for extra spacing
-    ws.freeze_panes = ws.cell(row=freeze_row, column=1)
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-    for row in ws.iter_rows(
-        min_row=start_row + 3, max_row=ws.max_row, min_col=1, max_col=ws.max_column
-    ):
-        for cell in row:
-            cell.border = thin_border
     # FIX 3: Fix the Excel colorization to properly identify upgraded scores
-    not_reg_fill = PatternFill(start_color="F0F0F0", end_color="F0F0F0", fill_type="solid")  # Light gray for NOT REG
-    upgraded_fill = PatternFill(
-        start_color="E6FFCC", end_color="E6FFCC", fill_type="solid"
-    ) # Light green for upgraded scores
-    passed_fill = PatternFill(
-        start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"
-    ) # Normal green for passed
-    failed_fill = PatternFill(
-        start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"
-    ) # White for failed
+    score_styles = {
+        # Light gray for NOT REG
+        "not_reg": {"fill": solid_fill("F0F0F0"), "font": font(color="666666", italic=True)},
+        # Light green for upgraded scores
+        "upgraded": {"fill": solid_fill("E6FFCC"), "font": font(color="006600", bold=True)},
+        # Normal green for passed
+        "passed": {"fill": solid_fill("C6EFCE"), "font": font(color="006100")},
+        # White for failed
+        "failed": {"fill": solid_fill("FFFFFF"), "font": font(color="FF0000", bold=True)},
+    }
     # CRITICAL FIX: Track which scores were upgraded by comparing against original merged data
     upgraded_scores_tracker = {}
     if upgrade_min_threshold is not None:
@@ -4497,45 +4004,35 @@ def process_single_file(
                     if exam_no not in upgraded_scores_tracker:
                         upgraded_scores_tracker[exam_no] = set()
                     upgraded_scores_tracker[exam_no].add(code)
-    for idx, code in enumerate(ordered_codes, start=4):
-        col_letter = get_column_letter(idx)
-        for r_idx in range(start_row + 3, ws.max_row + 1):
-            cell = ws.cell(row=r_idx, column=idx)
-            cell_value = cell.value
-            
-            # Get exam number for this row
-            exam_no_cell = ws.cell(row=r_idx, column=2)  # EXAM NUMBER is column B (index 2)
-            exam_no = str(exam_no_cell.value).strip() if exam_no_cell.value else ""
-            
-            # Check for NOT REG content
-            if detect_not_registered_content(cell_value):
-                cell.fill = not_reg_fill
-                cell.font = Font(color="666666", italic=True)
-                continue
-                
-            try:
-                val = float(cell_value) if cell_value not in (None, "") else 0
-                
-                # CRITICAL FIX: Check if this score was upgraded
-                is_upgraded = (
-                    upgrade_min_threshold is not None 
-                    and exam_no in upgraded_scores_tracker 
-                    and code in upgraded_scores_tracker.get(exam_no, set())
-                    and val == 50
-                )
-                
-                if is_upgraded:
-                    # This score was upgraded - use special color
-                    cell.fill = upgraded_fill
-                    cell.font = Font(color="006600", bold=True)
-                elif val >= pass_threshold:
-                    cell.fill = passed_fill
-                    cell.font = Font(color="006100")
-                else:
-                    cell.fill = failed_fill
-                    cell.font = Font(color="FF0000", bold=True)
-            except (ValueError, TypeError):
-                continue
+    score_not_reg = not_reg_mask(mastersheet[ordered_codes], not_reg_cache)
+    # Colour classes come from the DataFrame rows being written
+    exam_numbers = [str(x).strip() if x else "" for x in mastersheet["EXAM NUMBER"]]
+
+    def score_class(value, not_reg, exam_no, code):
+        if not_reg:
+            return "not_reg"
+        try:
+            val = float(value) if value not in (None, "") else 0
+        except (ValueError, TypeError):
+            return None
+        # CRITICAL FIX: Check if this score was upgraded
+        if (
+            upgrade_min_threshold is not None
+            and code in upgraded_scores_tracker.get(exam_no, ())
+            and val == 50
+        ):
+            return "upgraded"
+        return "passed" if val >= pass_threshold else "failed"
+
+    score_classes = [
+        [
+            score_class(value, not_reg, exam_no, code)
+            for value, not_reg, exam_no in zip(
+                mastersheet[code].tolist(), score_not_reg[code].tolist(), exam_numbers
+            )
+        ]
+        for code in ordered_codes
+    ]
     # Apply specific column alignments
     left_align_columns = [
         "CU Passed",
@@ -4549,55 +4046,38 @@ def process_single_file(
         "FAILED COURSES",
         "REMARKS",
     ]
-    for col_idx, col_name in enumerate(headers, start=1):
-        if col_name in left_align_columns:
-            col_letter = get_column_letter(col_idx)
-            for row_idx in range(start_row + 3, ws.max_row + 1): # Start from data rows
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.alignment = Alignment(horizontal="left", vertical="center")
+    # Every student-row cell is bordered; columns add their alignment
+    data_styles = []
+    for col_name in headers:
+        styles = {"border": THIN_BORDER}
+        # NEW: Wrap text for FAILED COURSES and REMARKS
+        if col_name in ("FAILED COURSES", "REMARKS"):
+            styles["alignment"] = alignment(horizontal="left", vertical="center", wrap_text=True)
+        elif col_name in left_align_columns:
+            styles["alignment"] = alignment(horizontal="left", vertical="center")
         # Center align S/N column
         elif col_name == "S/N":
-            col_letter = get_column_letter(col_idx)
-            for row_idx in range(start_row + 3, ws.max_row + 1): # Start from data rows
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-    # NEW: Wrap text for FAILED COURSES and REMARKS
-    failed_col_idx = (
-        headers.index("FAILED COURSES") + 1 if "FAILED COURSES" in headers else None
-    )
-    remarks_col_idx = headers.index("REMARKS") + 1 if "REMARKS" in headers else None
-    for row_idx in range(start_row + 3, ws.max_row + 1):
-        for col in [failed_col_idx, remarks_col_idx]:
-            if col:
-                cell = ws.cell(row=row_idx, column=col)
-                cell.alignment = Alignment(
-                    horizontal="left", vertical="center", wrap_text=True
-                )
+            styles["alignment"] = alignment(horizontal="center", vertical="center")
+        data_styles.append(styles)
+    score_cell_styles = [
+        with_classes(data_styles[3 + pos], score_styles) for pos in range(len(ordered_codes))
+    ]
     # UPDATED: Color coding for REMARKS column - ADDED PROBATION COLOR
-    passed_remarks_fill = PatternFill(
-        start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"
-    ) # green
-    resit_fill = PatternFill(
-        start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"
-    ) # yellow
-    probation_fill = PatternFill(
-        start_color="FFA500", end_color="FFA500", fill_type="solid"
-    ) # orange for probation
-    withdrawn_fill = PatternFill(
-        start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"
-    ) # red
-    for r_idx in range(start_row + 3, ws.max_row + 1):
-        cell = ws.cell(row=r_idx, column=remarks_col_idx)
-        if cell.value == "Passed":
-            cell.fill = passed_remarks_fill
-        elif cell.value == "Resit":
-            cell.fill = resit_fill
-        elif cell.value == "Probation": # NEW: Color for probation
-            cell.fill = probation_fill
-        elif cell.value == "Withdrawn":
-            cell.fill = withdrawn_fill
+    remarks_col_idx = headers.index("REMARKS") + 1
+    remarks_cell_styles = with_classes(
+        data_styles[remarks_col_idx - 1],
+        {
+            "Passed": {"fill": solid_fill("C6EFCE")},  # green
+            "Resit": {"fill": solid_fill("FFEB9C")},  # yellow
+            "Probation": {"fill": solid_fill("FFA500")},  # NEW: orange for probation
+            "Withdrawn": {"fill": solid_fill("FFC7CE")},  # red
+        },
+    )
+    remarks_values = mastersheet["REMARKS"].tolist()
+    # The writer may run again at a later save; keep the rows as written now
+    sheet_rows = mastersheet[headers]
     # FIX 2: AUTO-FIT COLUMN WIDTHS FOR ALL COLUMNS PROFESSIONALLY
-    print("🔄 Auto-fitting column widths for professional appearance...")
+    logger.debug("🔄 Auto-fitting column widths for professional appearance...")
     
     # Calculate optimal column widths with special handling for all columns
     longest_name_len = (
@@ -4619,67 +4099,48 @@ def process_single_file(
     curr_cgpa_width = min(max(max([len(str(x)) for x in mastersheet["CURRENT CGPA"].fillna("")]) + 2, 12), 15)
     
     # Apply column widths with professional auto-fitting
-    for col_idx, col in enumerate(ws.columns, start=1):
+    column_widths = {}
+    for col_idx, col_name in enumerate(headers, start=1):
         column_letter = get_column_letter(col_idx)
-        max_length = 0
-        
-        # Calculate maximum content length for this column
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
+        # Maximum content length for this column, header rows (empty cells
+        # count as "None") and student rows alike
+        max_length = max(
+            text_width(row[col_idx - 1] if col_idx <= len(row) else None for row in top_rows),
+            text_width(mastersheet[col_name].tolist()),
+        )
         
         # Apply professional width constraints based on column type
         if col_idx == 1: # S/N
-            ws.column_dimensions[column_letter].width = 6
-        elif column_letter == "B" or headers[col_idx - 1] in ["EXAM NUMBER", "EXAM NO"]:
-            ws.column_dimensions[column_letter].width = min(max(max_length + 2, 15), 20)
-        elif headers[col_idx - 1] == "NAME":
-            ws.column_dimensions[column_letter].width = name_col_width
+            column_widths[col_idx] = 6
+        elif column_letter == "B" or col_name in ["EXAM NUMBER", "EXAM NO"]:
+            column_widths[col_idx] = min(max(max_length + 2, 15), 20)
+        elif col_name == "NAME":
+            column_widths[col_idx] = name_col_width
         elif 4 <= col_idx < 4 + len(ordered_codes): # course columns
-            ws.column_dimensions[column_letter].width = min(max(max_length + 2, 8), 12)
-        elif headers[col_idx - 1] == "FAILED COURSES":
-            ws.column_dimensions[column_letter].width = failed_col_width
-        elif headers[col_idx - 1] == "REMARKS":
-            ws.column_dimensions[column_letter].width = remarks_col_width
-        elif headers[col_idx - 1] == "PREVIOUS CGPA":
-            ws.column_dimensions[column_letter].width = prev_cgpa_width
-        elif headers[col_idx - 1] == "CURRENT CGPA":
-            ws.column_dimensions[column_letter].width = curr_cgpa_width
-        elif headers[col_idx - 1] in ["CU Passed", "CU Failed", "Total Registered CU", "TCPE", "GPA", "AVERAGE"]:
-            ws.column_dimensions[column_letter].width = min(max(max_length + 2, 10), 15)
+            column_widths[col_idx] = min(max(max_length + 2, 8), 12)
+        elif col_name == "FAILED COURSES":
+            column_widths[col_idx] = failed_col_width
+        elif col_name == "REMARKS":
+            column_widths[col_idx] = remarks_col_width
+        elif col_name == "PREVIOUS CGPA":
+            column_widths[col_idx] = prev_cgpa_width
+        elif col_name == "CURRENT CGPA":
+            column_widths[col_idx] = curr_cgpa_width
+        elif col_name in ["CU Passed", "CU Failed", "Total Registered CU", "TCPE", "GPA", "AVERAGE"]:
+            column_widths[col_idx] = min(max(max_length + 2, 10), 15)
         else:
             # Default auto-fit for other columns
-            ws.column_dimensions[column_letter].width = min(max(max_length + 2, 8), 20)
+            column_widths[col_idx] = min(max(max_length + 2, 8), 20)
     # NEW: Enhanced course statistics with NOT REG information
     fails_per_course, not_reg_per_course, registered_per_course = calculate_course_statistics(
-        mastersheet, ordered_codes, pass_threshold
+        mastersheet, ordered_codes, pass_threshold, not_reg_cache
     )
     # Add footer with enhanced statistics
-    footer_vals1 = [""] * 2 + ["FAILS PER COURSE:"] + [fails_per_course.get(c, 0) for c in ordered_codes] + [""] * (len(headers) - 3 - len(ordered_codes))
-    ws.append(footer_vals1)
-    footer_vals2 = [""] * 2 + ["NOT REG PER COURSE:"] + [not_reg_per_course.get(c, 0) for c in ordered_codes] + [""] * (len(headers) - 3 - len(ordered_codes))
-    ws.append(footer_vals2)
-    footer_vals3 = [""] * 2 + ["REGISTERED STUDENTS:"] + [registered_per_course.get(c, 0) for c in ordered_codes] + [""] * (len(headers) - 3 - len(ordered_codes))
-    ws.append(footer_vals3)
-    # Style the footer rows
-    for row_num in [ws.max_row - 2, ws.max_row - 1, ws.max_row]:
-        for cell in ws[row_num]:
-            if 4 <= cell.column < 4 + len(ordered_codes):
-                if row_num == ws.max_row - 2:  # Fails row
-                    cell.fill = PatternFill(start_color="F0E68C", end_color="F0E68C", fill_type="solid")  # Light yellow
-                elif row_num == ws.max_row - 1:  # NOT REG row  
-                    cell.fill = PatternFill(start_color="E6E6FA", end_color="E6E6FA", fill_type="solid")  # Light purple
-                else:  # Registered students row
-                    cell.fill = PatternFill(start_color="E6FFCC", end_color="E6FFCC", fill_type="solid")  # Light green
-                    
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="center")
-            elif cell.column == 3:
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="center")
+    footer_rows = [
+        ("FAILS PER COURSE:", fails_per_course, "F0E68C"),  # Light yellow
+        ("NOT REG PER COURSE:", not_reg_per_course, "E6E6FA"),  # Light purple
+        ("REGISTERED STUDENTS:", registered_per_course, "E6FFCC"),  # Light green
+    ]
     # UPDATED: COMPREHENSIVE SUMMARY BLOCK - ENFORCED RULE WITH NOT REG INFORMATION
     total_students = len(mastersheet)
     passed_all = len(mastersheet[mastersheet["REMARKS"] == "Passed"])
@@ -4719,37 +4180,36 @@ def process_single_file(
                 total_not_reg_students = max(total_not_reg_students, not_reg_count)  # Approximate count
                 not_reg_courses_count[code] = not_reg_count
     # Add summary rows
-    ws.append([])
-    ws.append(["SUMMARY"])
+    summary_rows = [[], ["SUMMARY"]]
     # FIX 4: Ensure upgrade summary is displayed properly
     # Add upgrade notice FIRST if applicable
     if upgrade_min_threshold is not None and upgraded_scores_count > 0:
-        ws.append(
+        summary_rows.append(
             [
                 f"✅ MANAGEMENT DECISION: All scores between {upgrade_min_threshold}–49 were upgraded to 50 ({upgraded_scores_count} scores upgraded)"
             ]
         )
-        ws.append([])  # Add blank line for separation
+        summary_rows.append([])  # Add blank line for separation
     # Then add other summary items
-    ws.append(
+    summary_rows.append(
         [f"A total of {total_students} students registered and sat for the Examination"]
     )
-    ws.append(
+    summary_rows.append(
         [
             f"A total of {passed_all} students passed in all courses registered and are to proceed to the next semester"
         ]
     )
-    ws.append(
+    summary_rows.append(
         [
             f"A total of {resit_rule_students} students with Grade Point Average (GPA) of 2.00 and above who passed ≥45% of credit units failed various courses, and are to resit these courses in the next session."
         ]
     )
-    ws.append(
+    summary_rows.append(
         [
             f"A total of {probation_rule_students} students with Grade Point Average (GPA) below 2.00 who passed ≥45% of credit units failed various courses, and are placed on Probation, to resit these courses in the next session."
         ]
     )
-    ws.append(
+    summary_rows.append(
         [
             f"A total of {withdrawn_rule_students} students who passed less than 45% of their registered credit units have been advised to withdraw"
         ]
@@ -4757,90 +4217,145 @@ def process_single_file(
     
     # NEW: Add NOT REG information to summary
     if total_not_reg_students > 0:
-        ws.append([
+        summary_rows.append([
             f"A total of {total_not_reg_students} candidates did not register for certain courses and were excluded from assessment in those courses."
         ])
-        ws.append([
+        summary_rows.append([
             "NOT REGISTERED candidates are not included in pass/fail statistics for the courses they did not register for."
         ])
         
         # Show courses with NOT REG candidates
         if not_reg_courses_count:
             not_reg_courses_str = ", ".join([f"{code}({count})" for code, count in not_reg_courses_count.items()])
-            ws.append([
+            summary_rows.append([
                 f"Courses with NOT REGISTERED candidates: {not_reg_courses_str}"
             ])
             
     if removed_students:
-        ws.append(
+        summary_rows.append(
             [
                 f"NOTE: {len(removed_students)} previously withdrawn students were removed from this semester's results as they should not be processed."
             ]
         )
-    ws.append(
+    summary_rows.append(
         [
             "The above decisions are in line with the provisions of the General Information Section of the NMCN/NBTE Examinations Regulations (Pg 4) adopted by the College."
         ]
     )
-    ws.append([])
-    ws.append(
-        [
-            "________________________",
-            "",
-            "",
-            "________________________",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
-    )
-    ws.append(
-        [
-            "Mrs. Abini Hauwa",
-            "",
-            "",
-            "Dr. Kigbu Job Yaro",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
-    )
-    ws.append(
-        [
-            "Head of Exams",
-            "",
-            "",
-            "HOD Nursing",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-            "",
-        ]
+    summary_rows.append([])
+    summary_rows.append(["________________________", "", "", "________________________"] + [""] * 10)
+    summary_rows.append(["Mrs. Abini Hauwa", "", "", "Dr. Kigbu Job Yaro"] + [""] * 10)
+    summary_rows.append(["Head of Exams", "", "", "HOD Nursing"] + [""] * 10)
+
+    def write_sheet(sink):
+        sink.set_widths(column_widths)
+        sink.freeze(freeze_row)
+        if logo_path_norm and os.path.exists(logo_path_norm):
+            try:
+                img = XLImage(logo_path_norm)
+                img.width, img.height = 110, 110
+                sink.add_image(img, "A1")
+            except Exception as e:
+                logger.warning(f"⚠ Could not place logo: {e}")
+        # UPDATED HEADER: Dynamic title based on semester being processed
+        for row in (1, 2, 3):
+            sink.merge(f"C{row}:Q{row}")
+        top_styles = {
+            1: {
+                "font": font(bold=True, size=16, color="FFFFFF"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+                "fill": solid_fill("1E90FF"),
+                "border": MEDIUM_BORDER,
+            },
+            # UPDATED: Use new header format with DEPARTMENT OF NURSING
+            2: {
+                "font": font(bold=True, size=14, color="000000"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+                "fill": solid_fill("E6E6FA"),
+            },
+            3: {
+                "font": font(bold=True, size=12, color="000000"),
+                "alignment": alignment(horizontal="center", vertical="center"),
+            },
+        }
+        if upgrade_notice_row is not None:
+            # Merge cells for the notice
+            sink.merge(f"C{upgrade_notice_row}:E{upgrade_notice_row}")
+            top_styles[upgrade_notice_row] = {
+                "font": font(bold=True, size=10, color="FFFFFF"),
+                "fill": solid_fill("FF6B35"),  # Orange background
+                "alignment": alignment(horizontal="center", vertical="center"),
+            }
+        for row_values in top_rows[: start_row - 1]:
+            style = top_styles.get(sink.next_row)
+            sink.append(row_values, [None, None, style] if style else None)
+        # Apply text wrapping and rotation to course titles
+        sink.set_height(start_row, course_title_row_height)
+        title_style = {
+            "alignment": alignment(
+                horizontal="center",
+                vertical="center",
+                text_rotation=45,
+                wrap_text=True,  # ADDED: Enable text wrapping
+            ),
+            "font": font(bold=True, size=9),
+        }
+        sink.append(
+            top_rows[start_row - 1],
+            [None] * 3 + [title_style] * len(display_course_titles),
+        )
+        cu_style = {
+            "alignment": alignment(horizontal="center", vertical="center", text_rotation=135),
+            "font": font(bold=True, size=9),
+            "fill": solid_fill("D3D3D3"),
+        }
+        sink.append(top_rows[start_row], [None] * 3 + [cu_style] * len(cu_list))
+        header_style = {
+            "font": font(bold=True, size=10, color="FFFFFF"),
+            "alignment": alignment(horizontal="center", vertical="center"),
+            "fill": solid_fill("4A90E2"),
+            "border": THIN_BORDER,
+        }
+        sink.append(headers, [header_style] * len(headers))
+        for i, rowvals in enumerate(sheet_rows.itertuples(index=False, name=None)):
+            styles = list(data_styles)
+            for pos, classes in enumerate(score_classes):
+                if classes[i] is not None:
+                    styles[3 + pos] = score_cell_styles[pos][classes[i]]
+            if remarks_values[i] in remarks_cell_styles:
+                styles[remarks_col_idx - 1] = remarks_cell_styles[remarks_values[i]]
+            sink.append(rowvals, styles)
+        # Style the footer rows
+        label_style = {"font": font(bold=True), "alignment": alignment(horizontal="center")}
+        for label, counts, color in footer_rows:
+            count_style = {**label_style, "fill": solid_fill(color)}
+            sink.append(
+                [""] * 2 + [label] + [counts.get(c, 0) for c in ordered_codes]
+                + [""] * (len(headers) - 3 - len(ordered_codes)),
+                [None, None, label_style] + [count_style] * len(ordered_codes),
+            )
+        for row_values in summary_rows:
+            sink.append(row_values)
+
+    MASTERSHEET_SESSION.write_sheet(out_xlsx, sem, write_sheet)
+    logger.info(f"✅ Mastersheet sheet written: {sem} → {out_xlsx}")
+    log_event(
+        logger,
+        "semester_processed",
+        f"📊 {sem}: {len(mastersheet)} students, {len(carryover_students)} carryover",
+        program="ND",
+        set=set_name,
+        semester=sem,
+        file=fname,
+        students=len(mastersheet),
+        remarks=mastersheet["REMARKS"].value_counts().to_dict(),
+        carryover=len(carryover_students),
+        upgraded_scores=upgraded_scores_count,
     )
-    wb.save(out_xlsx)
-    print(f"✅ Mastersheet saved: {out_xlsx}")
-    print(f"📊 CGPA columns added to Excel: PREVIOUS CGPA and CURRENT CGPA")
-    print(f"📊 SINGLE SOURCE OF TRUTH updated for {len(CUMULATIVE_CGPA_DATA)} students")
+    SEMESTER_RESULTS.record(out_xlsx, sem, mastersheet, SEMESTER_RESULT_COLUMNS)
+    record_semester_history(output_dir, sem, mastersheet)
+    logger.info(f"📊 CGPA columns added to Excel: PREVIOUS CGPA and CURRENT CGPA")
+    logger.info(f"📊 SINGLE SOURCE OF TRUTH updated for {len(CUMULATIVE_CGPA_DATA)} students")
     
     # Generate individual student PDF with previous CGPAs and Cumulative CGPA
     safe_sem = re.sub(r"[^\w\-]", "_", sem)
@@ -4848,14 +4363,14 @@ def process_single_file(
         output_dir, f"mastersheet_students_{ts}_{safe_sem}.pdf"
     )
     
-    print(f"📊 FINAL CHECK before PDF generation:")
-    print(f" Previous CGPAs loaded: {len(previous_cgpas)}")
-    print(
+    logger.debug(f"📊 FINAL CHECK before PDF generation:")
+    logger.debug(f" Previous CGPAs loaded: {len(previous_cgpas)}")
+    logger.debug(
         f" Cumulative CGPA data available for: {len(cumulative_cgpa_data) if cumulative_cgpa_data else 0} students"
     )
     if previous_cgpas:
         sample = list(previous_cgpas.items())[:3]
-        print(f" Sample CGPAs: {sample}")
+        logger.debug(f" Sample CGPAs: {sample}")
     try:
         # FIX: Check if ordered_codes is valid before passing to PDF generation
         if ordered_codes and len(ordered_codes) > 0:
@@ -4876,17 +4391,45 @@ def process_single_file(
                 upgrade_min_threshold=upgrade_min_threshold,
             ) # PASS THE UPGRADE THRESHOLD TO PDF
             if pdf_success:
-                print(f"✅ PDF generated successfully for {sem}")
+                logger.info(f"✅ PDF generated successfully for {sem}")
             else:
-                print(f"⚠️ PDF generation failed for {sem}")
+                logger.warning(f"⚠️ PDF generation failed for {sem}")
         else:
-            print(f"⚠️ No course codes found for {sem}, skipping PDF generation")
+            logger.warning(f"⚠️ No course codes found for {sem}, skipping PDF generation")
     except Exception as e:
-        print(f"❌ Failed to generate student PDF for {sem}: {e}")
+        logger.error(f"❌ Failed to generate student PDF for {sem}: {e}")
         import traceback
         traceback.print_exc()
     return mastersheet
 
+def semester_raw_files(semester_key, raw_files):
+    """The files in ``raw_files`` that belong to ``semester_key``."""
+    normalized_key = semester_key.replace("ND-", "").upper()
+    return [f for f in raw_files if normalized_key in f.upper().replace("ND-", "")]
+
+
+def queue_semester_prefetch(pipeline, semester_key, raw_files, raw_dir):
+    """
+    Parse a semester's raw workbooks in the pipeline's workers ahead of
+    process_single_file. Files with a parsed-input cache entry are skipped.
+    Returns the parse stage names.
+    """
+    paths = []
+    for rf in semester_raw_files(semester_key, raw_files):
+        raw_path = os.path.join(raw_dir, rf)
+        if cache_enabled():
+            try:
+                input_cache, input_cache_key = nd_input_cache(raw_path, semester_key)
+                if input_cache.contains(input_cache_key):
+                    continue
+            except OSError:
+                pass
+        paths.append(raw_path)
+    return queue_raw_prefetch(
+        pipeline, paths, RAW_SHEETS, dtype=str, header=0, fallback=True
+    )
+
+
 def process_semester_files(
     semester_key,
     raw_files,
@@ -4906,34 +4449,31 @@ def process_semester_files(
     """
     Process all files for a specific semester with carryover integration.
     """
-    print(f"\n{'='*60}")
-    print(f"PROCESSING SEMESTER: {semester_key}")
-    print(f"{'='*60}")
+    logger.info(f"\n{'='*60}")
+    logger.info(f"PROCESSING SEMESTER: {semester_key}")
+    logger.info(f"{'='*60}")
     
     # Filter files for this semester
-    normalized_key = semester_key.replace("ND-", "").upper()
-    semester_files = [
-        f for f in raw_files if normalized_key in f.upper().replace("ND-", "")
-    ]
+    semester_files = semester_raw_files(semester_key, raw_files)
     
     if not semester_files:
-        print(f"⚠️ No files found for semester {semester_key}")
-        print(f"🔍 Available files: {raw_files}")
+        logger.warning(f"⚠️ No files found for semester {semester_key}")
+        logger.debug(f"🔍 Available files: {raw_files}")
         return None
         
-    print(f"📁 Found {len(semester_files)} files for {semester_key}: {semester_files}")
+    logger.info(f"📁 Found {len(semester_files)} files for {semester_key}: {semester_files}")
     # Check for existing carryover files
     existing_carryover_files = check_existing_carryover_files(
         raw_dir, set_name, semester_key
     )
     if existing_carryover_files:
-        print(f"📋 Found existing carryover files: {existing_carryover_files}")
-        print("ℹ️ Carryover processing will be available after regular processing")
+        logger.info(f"📋 Found existing carryover files: {existing_carryover_files}")
+        logger.info("ℹ️ Carryover processing will be available after regular processing")
     # Process each file for this semester
     mastersheet_result = None
     for rf in semester_files:
         raw_path = os.path.join(raw_dir, rf)
-        print(f"\n📄 Processing: {rf}")
+        logger.info(f"\n📄 Processing: {rf}")
         try:
             # Load previous CGPAs for this specific semester
             current_previous_cgpas = (
@@ -4965,12 +4505,12 @@ def process_semester_files(
                 upgrade_min_threshold,
             )
             if result is not None:
-                print(f"✅ Successfully processed {rf}")
+                logger.info(f"✅ Successfully processed {rf}")
                 mastersheet_result = result
             else:
-                print(f"❌ Failed to process {rf}")
+                logger.error(f"❌ Failed to process {rf}")
         except Exception as e:
-            print(f"❌ Error processing {rf}: {e}")
+            logger.error(f"❌ Error processing {rf}: {e}")
             import traceback
             traceback.print_exc()
     # ADD: Verify carryover records were created
@@ -4982,10 +4522,10 @@ def process_semester_files(
             )
         )
         if json_files:
-            print(f"✅ Carryover records created: {len(json_files)} file(s)")
-            print(f"📝 Latest: {sorted(json_files)[-1]}")
+            logger.info(f"✅ Carryover records created: {len(json_files)} file(s)")
+            logger.info(f"📝 Latest: {sorted(json_files)[-1]}")
         else:
-            print(f"⚠️ No carryover records found for {semester_key}")
+            logger.warning(f"⚠️ No carryover records found for {semester_key}")
             
     return mastersheet_result
 
@@ -4994,7 +4534,7 @@ def process_semester_files(
 # ----------------------------
 
 def main():
-    print("Starting ND Examination Results Processing with Data Transformation and NOT REG handling...")
+    logger.info("Starting ND Examination Results Processing with Data Transformation and NOT REG handling...")
     ts = datetime.now().strftime(TIMESTAMP_FMT)
     
     # Initialize trackers
@@ -5005,14 +4545,15 @@ def main():
     # Initialize SINGLE SOURCE OF TRUTH for CGPA
     global CUMULATIVE_CGPA_DATA
     CUMULATIVE_CGPA_DATA = {}
+    SEMESTER_RESULTS.clear()
     
     # Check if running in web mode
     if is_web_mode():
         uploaded_file_path = get_uploaded_file_path()
         if uploaded_file_path and os.path.exists(uploaded_file_path):
-            print("🔧 Running in WEB MODE with uploaded file")
+            logger.info("🔧 Running in WEB MODE with uploaded file")
             # This would need to be adapted for your specific uploaded file processing
-            print(
+            logger.warning(
                 "⚠️ Uploaded file processing for individual files not fully implemented in this version"
             )
             return
@@ -5023,10 +4564,10 @@ def main():
     global DEFAULT_PASS_THRESHOLD
     DEFAULT_PASS_THRESHOLD = params["pass_threshold"]
     base_dir_norm = normalize_path(BASE_DIR)
-    print(f"Using base directory: {base_dir_norm}")
+    logger.info(f"Using base directory: {base_dir_norm}")
     # Check if we should use interactive or non-interactive mode
     if should_use_interactive_mode():
-        print("🔧 Running in INTERACTIVE mode (CLI)")
+        logger.info("🔧 Running in INTERACTIVE mode (CLI)")
         try:
             (
                 semester_course_maps,
@@ -5035,23 +4576,23 @@ def main():
                 semester_course_titles,
             ) = load_course_data()
         except Exception as e:
-            print(f"❌ Could not load course data: {e}")
+            logger.error(f"❌ Could not load course data: {e}")
             return
         # Get available sets and let user choose
         available_sets = get_available_sets(base_dir_norm)
         if not available_sets:
-            print(f"No ND-* directories found in {base_dir_norm}. Nothing to process.")
-            print(f"Available directories: {os.listdir(base_dir_norm)}")
+            logger.info(f"No ND-* directories found in {base_dir_norm}. Nothing to process.")
+            logger.info(f"Available directories: {os.listdir(base_dir_norm)}")
             return
-        print(f"📚 Found {len(available_sets)} available sets: {available_sets}")
+        logger.info(f"📚 Found {len(available_sets)} available sets: {available_sets}")
         
         # Let user choose which set(s) to process
         sets_to_process = get_user_set_choice(available_sets)
-        print(f"\n🎯 PROCESSING SELECTED SETS: {sets_to_process}")
+        logger.info(f"\n🎯 PROCESSING SELECTED SETS: {sets_to_process}")
         for nd_set in sets_to_process:
-            print(f"\n{'='*60}")
-            print(f"PROCESSING SET: {nd_set}")
-            print(f"{'='*60}")
+            logger.info(f"\n{'='*60}")
+            logger.info(f"PROCESSING SET: {nd_set}")
+            logger.info(f"{'='*60}")
             
             # Generate a single timestamp for this set processing
             ts = datetime.now().strftime(TIMESTAMP_FMT)
@@ -5069,7 +4610,7 @@ def main():
             os.makedirs(clean_dir, exist_ok=True)
             # Check if raw directory exists and has files
             if not os.path.exists(raw_dir):
-                print(f"⚠️ RAW_RESULTS directory not found: {raw_dir}")
+                logger.warning(f"⚠️ RAW_RESULTS directory not found: {raw_dir}")
                 continue
                 
             raw_files = [
@@ -5078,23 +4619,26 @@ def main():
                 if f.lower().endswith((".xlsx", ".xls")) and not f.startswith("~$")
             ]
             if not raw_files:
-                print(f"⚠️ No raw files in {raw_dir}; skipping {nd_set}")
-                print(f" Available files: {os.listdir(raw_dir)}")
+                logger.warning(f"⚠️ No raw files in {raw_dir}; skipping {nd_set}")
+                logger.debug(f" Available files: {os.listdir(raw_dir)}")
                 continue
-            print(f"📁 Found {len(raw_files)} raw files in {nd_set}: {raw_files}")
+            logger.info(f"📁 Found {len(raw_files)} raw files in {nd_set}: {raw_files}")
             # Create a single timestamped folder for this set
             set_output_dir = os.path.join(clean_dir, f"{nd_set}_RESULT-{ts}")
             os.makedirs(set_output_dir, exist_ok=True)
-            print(f"📁 Created set output directory: {set_output_dir}")
+            logger.info(f"📁 Created set output directory: {set_output_dir}")
             # Get user choice for which semesters to process
             semesters_to_process = get_user_semester_choice()
-            print(
+            logger.info(
                 f"\n🎯 PROCESSING SELECTED SEMESTERS for {nd_set}: {[get_semester_display_info(sem)[3] for sem in semesters_to_process]}"
             )
-            # Process selected semesters in the correct order
+            # Semesters are scored in order (each one's CGPA needs the last);
+            # raw workbooks are parsed and PDFs rendered in worker processes
+            pipeline = StagePipeline()
+            previous_stage = None
             for semester_key in semesters_to_process:
                 if semester_key not in SEMESTER_ORDER:
-                    print(f"⚠️ Skipping unknown semester: {semester_key}")
+                    logger.warning(f"⚠️ Skipping unknown semester: {semester_key}")
                     continue
                     
                 # Check if there are files for this semester
@@ -5106,8 +4650,10 @@ def main():
                         break
                         
                 if semester_files_exist:
-                    print(f"\n🎯 Processing {semester_key} in {nd_set}...")
-                    process_semester_files(
+                    logger.info(f"\n🎯 Queued {semester_key} in {nd_set}")
+                    previous_stage = pipeline.add(
+                        f"process:{semester_key}",
+                        process_semester_files,
                         semester_key,
                         raw_files,
                         raw_dir,
@@ -5120,96 +4666,99 @@ def main():
                         semester_course_titles,
                         DEFAULT_LOGO_PATH,
                         nd_set,
+                        # Ordering only: a failed prefetch must not drop the semester,
+                        # which then reads its raw workbook in-process
+                        after=[
+                            *queue_semester_prefetch(pipeline, semester_key, raw_files, raw_dir),
+                            *([previous_stage] if previous_stage else []),
+                        ],
                     )
                 else:
-                    print(
+                    logger.warning(
                         f"⚠️ No files found for {semester_key} in {nd_set}, skipping..."
                     )
+            restore_withdrawals_from_history(
+                clean_dir,
+                [k for k in semesters_to_process if f"process:{k}" in pipeline.stages],
+            )
+            with deferred_rendering(pipeline):
+                pipeline.run()
+            forget_raw_sheets()
             # Create CGPA_SUMMARY and ANALYSIS worksheets
             mastersheet_path = os.path.join(set_output_dir, f"mastersheet_{ts}.xlsx")
-            if os.path.exists(mastersheet_path):
-                print(f"📊 Creating CGPA_SUMMARY and ANALYSIS worksheets...")
+            if MASTERSHEET_SESSION.exists(mastersheet_path):
+                logger.info(f"📊 Creating CGPA_SUMMARY and ANALYSIS worksheets...")
                 
                 # FIX 2: Identify inactive students FIRST before creating sheets
-                print(f"🔍 Identifying inactive students...")
+                logger.info(f"🔍 Identifying inactive students...")
                 identify_inactive_students()
                 
                 # THEN create the sheets that depend on this data
                 create_cgpa_summary_sheet(mastersheet_path, ts)
-                create_analysis_sheet(mastersheet_path, ts)  # Now INACTIVE_STUDENTS will be populated
+                create_analysis_sheet(mastersheet_path, ts)  # Now STUDENTS.inactive will be populated
                 
-                print(f"✅ Successfully added all worksheets (CGPA_SUMMARY, ANALYSIS)")
+                logger.info(f"✅ Successfully added all worksheets (CGPA_SUMMARY, ANALYSIS)")
+            MASTERSHEET_SESSION.close(mastersheet_path)
             # Create ZIP of the entire set results
             try:
                 zip_path = os.path.join(clean_dir, f"{nd_set}_RESULT-{ts}.zip")
                 zip_success = create_zip_folder(set_output_dir, zip_path)
                 if zip_success:
-                    print(f"✅ ZIP file created: {zip_path}")
+                    logger.info(f"✅ ZIP file created: {zip_path}")
                     # Verify file size
                     if os.path.exists(zip_path):
                         zip_size = os.path.getsize(zip_path)
                         zip_size_mb = zip_size / (1024 * 1024)
-                        print(f"📦 ZIP file size: {zip_size_mb:.2f} MB")
+                        logger.info(f"📦 ZIP file size: {zip_size_mb:.2f} MB")
                 else:
-                    print(f"❌ Failed to create ZIP file for {nd_set}")
+                    logger.error(f"❌ Failed to create ZIP file for {nd_set}")
             except Exception as e:
-                print(f"⚠️ Failed to create ZIP for {nd_set}: {e}")
+                logger.warning(f"⚠️ Failed to create ZIP for {nd_set}: {e}")
         # Print student tracking summary
-        print(f"\n📊 STUDENT TRACKING SUMMARY:")
-        print(f"Total unique students tracked: {len(STUDENT_TRACKER)}")
-        print(f"Total withdrawn students: {len(WITHDRAWN_STUDENTS)}")
-        print(f"Total inactive students: {len(INACTIVE_STUDENTS)}")
+        logger.info(f"\n📊 STUDENT TRACKING SUMMARY:")
+        logger.info(f"Total unique students tracked: {len(STUDENTS)}")
+        logger.info(f"Total withdrawn students: {len(STUDENTS.withdrawals)}")
+        logger.info(f"Total inactive students: {len(STUDENTS.inactive)}")
         
         # Print carryover summary
-        if CARRYOVER_STUDENTS:
-            print(f"\n📋 CARRYOVER STUDENT SUMMARY:")
-            print(f"Total carryover students: {len(CARRYOVER_STUDENTS)}")
+        if STUDENTS.carryover:
+            logger.info(f"\n📋 CARRYOVER STUDENT SUMMARY:")
+            logger.info(f"Total carryover students: {STUDENTS.carryover_count()}")
             # Count by semester
-            semester_counts = {}
-            for student_key, data in CARRYOVER_STUDENTS.items():
-                semester = data["semester"]
-                semester_counts[semester] = semester_counts.get(semester, 0) + 1
-            for semester, count in semester_counts.items():
-                print(f" {semester}: {count} students")
+            for semester, count in STUDENTS.carryover_counts().items():
+                logger.info(f" {semester}: {count} students")
         # Print inactive students summary
-        if INACTIVE_STUDENTS:
-            print(f"\n📋 INACTIVE STUDENTS SUMMARY:")
-            cgpa_active_count = sum(1 for s in INACTIVE_STUDENTS.values() if s.get("cgpa_status") == "Active in CGPA")
-            regular_inactive_count = len(INACTIVE_STUDENTS) - cgpa_active_count
-            print(f" Regular inactive (missing intermediate semesters): {regular_inactive_count}")
-            print(f" CGPA active but missing from recent semester: {cgpa_active_count}")
+        if STUDENTS.inactive:
+            logger.info(f"\n📋 INACTIVE STUDENTS SUMMARY:")
+            regular_inactive_count, cgpa_active_count = STUDENTS.inactive_counts()
+            logger.info(f" Regular inactive (missing intermediate semesters): {regular_inactive_count}")
+            logger.info(f" CGPA active but missing from recent semester: {cgpa_active_count}")
             
             # Show sample of inactive students
-            print(f" Sample inactive students:")
-            for i, (exam_no, data) in enumerate(list(INACTIVE_STUDENTS.items())[:5]):
-                print(f"  {i+1}. {exam_no}: {data['name']} - Present in {len(data['semesters_present'])} semesters, missing {len(data['missing_semesters'])}: {', '.join(data['missing_semesters'])}")
+            logger.debug(f" Sample inactive students:")
+            for i, (sid, missing) in enumerate(list(STUDENTS.inactive.items())[:5]):
+                data = STUDENTS.records[sid]
+                missing_semesters = STUDENTS.semesters(missing)
+                logger.debug(f"  {i+1}. {STUDENTS.exam_numbers[sid]}: {data.name} - Present in {data.present.bit_count()} semesters, missing {len(missing_semesters)}: {', '.join(missing_semesters)}")
         # Print withdrawn students who reappeared
-        reappeared_count = 0
-        for exam_no, data in WITHDRAWN_STUDENTS.items():
-            if data["reappeared_semesters"]:
-                reappeared_count += 1
-                print(
-                    f"🚨 {exam_no}: Withdrawn in {data['withdrawn_semester']}, reappeared in {data['reappeared_semesters']}"
-                )
-        if reappeared_count > 0:
-            print(
-                f"🚨 ALERT: {reappeared_count} previously withdrawn students have reappeared in later semesters!"
+        reappeared = STUDENTS.reappeared()
+        for exam_no, data in reappeared:
+            logger.warning(
+                f"🚨 {exam_no}: Withdrawn in {data.withdrawn_semester}, reappeared in {data.reappeared_semesters}"
+            )
+        if reappeared:
+            logger.warning(
+                f"🚨 ALERT: {len(reappeared)} previously withdrawn students have reappeared in later semesters!"
             )
         # Analyze student progression
-        sem_counts = {}
-        for student_data in STUDENT_TRACKER.values():
-            sem_count = len(student_data["semesters_present"])
-            if sem_count not in sem_counts:
-                sem_counts[sem_count] = 0
-            sem_counts[sem_count] += 1
-        for sem_count, student_count in sorted(sem_counts.items()):
-            print(f"Students present in {sem_count} semester(s): {student_count}")
-        print("\n✅ ND Examination Results Processing completed successfully.")
+        for sem_count, student_count in STUDENTS.semester_counts().items():
+            logger.info(f"Students present in {sem_count} semester(s): {student_count}")
+        logger.info("\n✅ ND Examination Results Processing completed successfully.")
     else:
-        print("🔧 Running in NON-INTERACTIVE mode (Web)")
+        logger.info("🔧 Running in NON-INTERACTIVE mode (Web)")
         # NEW: Check if this is carryover processing mode
         if params.get("process_carryover", False):
-            print(
+            logger.info(
                 "🎯 Detected CARRYOVER processing mode - redirecting to integrated_carryover_processor.py"
             )
             # Set environment variables for the carryover processor
@@ -5225,33 +4774,33 @@ def main():
                 os.path.dirname(__file__), "integrated_carryover_processor.py"
             )
             if not os.path.exists(carryover_script_path):
-                print(
+                logger.error(
                     f"❌ Carryover processor script not found: {carryover_script_path}"
                 )
                 return False
                 
-            print(f"🚀 Running carryover processor: {carryover_script_path}")
+            logger.info(f"🚀 Running carryover processor: {carryover_script_path}")
             # Run the carryover processor
             result = subprocess.run(
                 [sys.executable, carryover_script_path], capture_output=True, text=True
             )
             # Print the output and return
-            print(result.stdout)
+            logger.info(result.stdout)
             if result.stderr:
-                print(result.stderr)
+                logger.info(result.stderr)
             return result.returncode == 0
         else:
             # Regular processing mode
             success = process_in_non_interactive_mode(params, base_dir_norm)
             if success:
-                print("✅ ND Examination Results Processing completed successfully")
+                logger.info("✅ ND Examination Results Processing completed successfully")
             else:
-                print("❌ ND Examination Results Processing failed")
+                logger.error("❌ ND Examination Results Processing failed")
         return
 
 def process_in_non_interactive_mode(params, base_dir_norm):
     """Process exams in non-interactive mode for web interface."""
-    print("🔧 Running in NON-INTERACTIVE mode (web interface)")
+    logger.info("🔧 Running in NON-INTERACTIVE mode (web interface)")
     
     # Use parameters from environment variables
     selected_set = params["selected_set"]
@@ -5259,31 +4808,31 @@ def process_in_non_interactive_mode(params, base_dir_norm):
     
     # FIX: Normalize semester names to uppercase for consistent matching
     selected_semesters = [sem.upper() for sem in selected_semesters]
-    print(f"🎯 Processing semesters (normalized): {selected_semesters}")
+    logger.info(f"🎯 Processing semesters (normalized): {selected_semesters}")
     
     # Get upgrade threshold from environment variable if provided
     upgrade_min_threshold = get_upgrade_threshold_from_env()
     # Get available sets
     available_sets = get_available_sets(base_dir_norm)
     if not available_sets:
-        print("❌ No ND sets found")
+        logger.error("❌ No ND sets found")
         return False
         
     # Remove ND-COURSES from available sets if present
     available_sets = [s for s in available_sets if s != "ND-COURSES"]
     if not available_sets:
-        print("❌ No valid ND sets found (only ND-COURSES present)")
+        logger.error("❌ No valid ND sets found (only ND-COURSES present)")
         return False
     # Determine which sets to process
     if selected_set == "all":
         sets_to_process = available_sets
-        print(f"🎯 Processing ALL sets: {sets_to_process}")
+        logger.info(f"🎯 Processing ALL sets: {sets_to_process}")
     else:
         if selected_set in available_sets:
             sets_to_process = [selected_set]
-            print(f"🎯 Processing selected set: {selected_set}")
+            logger.info(f"🎯 Processing selected set: {selected_set}")
         else:
-            print(f"⚠️ Selected set '{selected_set}' not found, processing all sets")
+            logger.warning(f"⚠️ Selected set '{selected_set}' not found, processing all sets")
             sets_to_process = available_sets
     # Load course data once
     try:
@@ -5293,11 +4842,11 @@ def process_in_non_interactive_mode(params, base_dir_norm):
             semester_lookup,
             semester_course_titles,
         ) = load_course_data()
-        print(
+        logger.info(
             f"✅ Loaded course data for semesters: {list(semester_course_maps.keys())}"
         )
     except Exception as e:
-        print(f"❌ Could not load course data: {e}")
+        logger.error(f"❌ Could not load course data: {e}")
         return False
     # Initialize carryover tracker
     initialize_carryover_tracker()
@@ -5305,13 +4854,14 @@ def process_in_non_interactive_mode(params, base_dir_norm):
     # Initialize SINGLE SOURCE OF TRUTH for CGPA
     global CUMULATIVE_CGPA_DATA
     CUMULATIVE_CGPA_DATA = {}
+    SEMESTER_RESULTS.clear()
     
     # Process each set and semester
     total_processed = 0
     for nd_set in sets_to_process:
-        print(f"\n{'='*60}")
-        print(f"PROCESSING SET: {nd_set}")
-        print(f"{'='*60}")
+        logger.info(f"\n{'='*60}")
+        logger.info(f"PROCESSING SET: {nd_set}")
+        logger.info(f"{'='*60}")
         
         # Generate a single timestamp for this set processing
         ts = datetime.now().strftime(TIMESTAMP_FMT)
@@ -5328,7 +4878,7 @@ def process_in_non_interactive_mode(params, base_dir_norm):
         os.makedirs(raw_dir, exist_ok=True)
         os.makedirs(clean_dir, exist_ok=True)
         if not os.path.exists(raw_dir):
-            print(f"⚠️ RAW_RESULTS directory not found: {raw_dir}")
+            logger.warning(f"⚠️ RAW_RESULTS directory not found: {raw_dir}")
             continue
             
         raw_files = [
@@ -5337,19 +4887,32 @@ def process_in_non_interactive_mode(params, base_dir_norm):
             if f.lower().endswith((".xlsx", ".xls")) and not f.startswith("~$")
         ]
         if not raw_files:
-            print(f"⚠️ No raw files in {raw_dir}; skipping {nd_set}")
+            logger.warning(f"⚠️ No raw files in {raw_dir}; skipping {nd_set}")
             continue
             
-        print(f"📁 Found {len(raw_files)} raw files in {nd_set}: {raw_files}")
+        logger.info(f"📁 Found {len(raw_files)} raw files in {nd_set}: {raw_files}")
         # Create a single timestamped folder for this set
         set_output_dir = os.path.join(clean_dir, f"{nd_set}_RESULT-{ts}")
         os.makedirs(set_output_dir, exist_ok=True)
-        print(f"📁 Created set output directory: {set_output_dir}")
+        logger.info(f"📁 Created set output directory: {set_output_dir}")
+        # Semesters whose inputs match the last run reuse that run's PDFs
+        INPUT_MANIFEST.open(os.path.dirname(clean_dir))
+        manifest_settings = {
+            "set": nd_set,
+            "pass_threshold": params["pass_threshold"],
+            "upgrade_min_threshold": upgrade_min_threshold,
+            "courses": course_workbooks_sha256(ND_COURSES_DIR),
+            "logo": optional_file_sha256(DEFAULT_LOGO_PATH),
+        }
         # Process selected semesters - FIXED: Use normalized (uppercase) semester names
+        # Semesters are scored in order (each one's CGPA needs the last);
+        # raw workbooks are parsed and PDFs rendered in worker processes
+        pipeline = StagePipeline()
+        semester_stages = []
         for semester_key in selected_semesters:
             # FIX: Check if semester exists in course data (case-sensitive)
             if semester_key not in semester_course_maps:
-                print(
+                logger.warning(
                     f"⚠️ Semester '{semester_key}' not found in course data. Available: {list(semester_course_maps.keys())}"
                 )
                 continue
@@ -5364,50 +4927,69 @@ def process_in_non_interactive_mode(params, base_dir_norm):
                     break
                     
             if semester_files_exist:
-                print(f"\n🎯 Processing {semester_key} in {nd_set}...")
-                try:
-                    # Process the semester with the upgrade threshold
-                    result = process_semester_files(
-                        semester_key,
-                        raw_files,
-                        raw_dir,
-                        set_output_dir,
-                        ts,
-                        params["pass_threshold"],
-                        semester_course_maps,
-                        semester_credit_units,
-                        semester_lookup,
-                        semester_course_titles,
-                        DEFAULT_LOGO_PATH,
-                        nd_set,
-                        previous_cgpas=None,
-                        upgrade_min_threshold=upgrade_min_threshold,
-                    )
-                    if result is not None:
-                        print(f"✅ Successfully processed {semester_key}")
-                        total_processed += 1
-                    else:
-                        print(f"❌ Failed to process {semester_key}")
-                except Exception as e:
-                    print(f"❌ Error processing {semester_key}: {e}")
-                    import traceback
-                    traceback.print_exc()
+                logger.info(f"\n🎯 Queued {semester_key} in {nd_set}")
+                # Process the semester with the upgrade threshold
+                stage = pipeline.add(
+                    f"process:{semester_key}",
+                    process_semester_files,
+                    semester_key,
+                    raw_files,
+                    raw_dir,
+                    set_output_dir,
+                    ts,
+                    params["pass_threshold"],
+                    semester_course_maps,
+                    semester_credit_units,
+                    semester_lookup,
+                    semester_course_titles,
+                    DEFAULT_LOGO_PATH,
+                    nd_set,
+                    previous_cgpas=None,
+                    upgrade_min_threshold=upgrade_min_threshold,
+                    # Ordering only: a failed prefetch must not drop the semester,
+                    # which then reads its raw workbook in-process
+                    after=[
+                        *queue_semester_prefetch(pipeline, semester_key, raw_files, raw_dir),
+                        *([semester_stages[-1][1]] if semester_stages else []),
+                    ],
+                )
+                semester_stages.append((semester_key, stage))
+                INPUT_MANIFEST.note(
+                    semester_key,
+                    [os.path.join(raw_dir, rf) for rf in semester_raw_files(semester_key, raw_files)],
+                    manifest_settings,
+                )
+                if INPUT_MANIFEST.unchanged(semester_key):
+                    logger.info(f"♻️ {semester_key} inputs unchanged since the last run; its PDF will be reused")
+            else:
+                logger.warning(f"⚠️ No files found for {semester_key} in {nd_set}, skipping...")
+        restore_withdrawals_from_history(clean_dir, [key for key, _ in semester_stages])
+        with deferred_rendering(pipeline):
+            pipeline.run()
+        forget_raw_sheets()
+        for semester_key, stage in semester_stages:
+            if pipeline.results.get(stage) is not None:
+                logger.info(f"✅ Successfully processed {semester_key}")
+                total_processed += 1
+            elif stage in pipeline.errors:
+                logger.error(f"❌ Error processing {semester_key}: {pipeline.errors[stage]}")
             else:
-                print(f"⚠️ No files found for {semester_key} in {nd_set}, skipping...")
+                logger.error(f"❌ Failed to process {semester_key}")
         # Create CGPA_SUMMARY and ANALYSIS worksheets
         mastersheet_path = os.path.join(set_output_dir, f"mastersheet_{ts}.xlsx")
-        if os.path.exists(mastersheet_path):
-            print(f"📊 Creating CGPA_SUMMARY and ANALYSIS worksheets...")
+        if MASTERSHEET_SESSION.exists(mastersheet_path):
+            logger.info(f"📊 Creating CGPA_SUMMARY and ANALYSIS worksheets...")
             
             # FIX 2: Identify inactive students FIRST before creating sheets
-            print(f"🔍 Identifying inactive students...")
+            logger.info(f"🔍 Identifying inactive students...")
             identify_inactive_students()
             
             # THEN create the sheets that depend on this data
             create_cgpa_summary_sheet(mastersheet_path, ts)
-            create_analysis_sheet(mastersheet_path, ts)  # Now INACTIVE_STUDENTS will be populated
+            create_analysis_sheet(mastersheet_path, ts)  # Now STUDENTS.inactive will be populated
             
-            print(f"✅ Successfully added all worksheets")
+            logger.info(f"✅ Successfully added all worksheets")
+        MASTERSHEET_SESSION.close(mastersheet_path)
         # Create ZIP of the entire set results
         try:
             zip_path = os.path.join(clean_dir, f"{nd_set}_RESULT-{ts}.zip")
@@ -5416,48 +4998,70 @@ def process_in_non_interactive_mode(params, base_dir_norm):
                 # Verify the ZIP file was created and has content
                 if os.path.exists(zip_path):
                     zip_size = os.path.getsize(zip_path)
-                    print(f"✅ ZIP file created: {zip_path} ({zip_size} bytes)")
+                    logger.info(f"✅ ZIP file created: {zip_path} ({zip_size} bytes)")
                     # Convert bytes to MB for readability
                     zip_size_mb = zip_size / (1024 * 1024)
-                    print(f"📦 ZIP file size: {zip_size_mb:.2f} MB")
+                    logger.info(f"📦 ZIP file size: {zip_size_mb:.2f} MB")
+                    recorded = INPUT_MANIFEST.commit(zip_path, set_output_dir)
+                    if recorded:
+                        logger.info(f"📝 Input manifest updated for {len(recorded)} semester(s)")
+                    log_event(
+                        logger,
+                        "set_processed",
+                        f"📦 {nd_set} results zipped: {zip_path}",
+                        program="ND",
+                        set=nd_set,
+                        semesters=[
+                            key
+                            for key, stage in semester_stages
+                            if pipeline.results.get(stage) is not None
+                        ],
+                        zip=zip_path,
+                        zip_bytes=zip_size,
+                    )
                 else:
-                    print(f"❌ ZIP file was not created: {zip_path}")
+                    logger.error(f"❌ ZIP file was not created: {zip_path}")
             else:
-                print(f"❌ Failed to create ZIP file for {nd_set}")
+                logger.error(f"❌ Failed to create ZIP file for {nd_set}")
         except Exception as e:
-            print(f"⚠️ Failed to create ZIP for {nd_set}: {e}")
+            logger.warning(f"⚠️ Failed to create ZIP for {nd_set}: {e}")
             import traceback
             traceback.print_exc()
-    print(f"\n📊 PROCESSING SUMMARY: {total_processed} semester(s) processed")
+    log_event(
+        logger,
+        "run_finished",
+        f"\n📊 PROCESSING SUMMARY: {total_processed} semester(s) processed",
+        program="ND",
+        semesters=total_processed,
+        students=len(STUDENTS),
+        withdrawn=len(STUDENTS.withdrawals),
+        carryover=STUDENTS.carryover_count(),
+        inactive=len(STUDENTS.inactive),
+    )
     
     # Print carryover summary
-    if CARRYOVER_STUDENTS:
-        print(f"\n📋 CARRYOVER SUMMARY:")
-        print(f" Total carryover students: {len(CARRYOVER_STUDENTS)}")
+    if STUDENTS.carryover:
+        logger.info(f"\n📋 CARRYOVER SUMMARY:")
+        logger.info(f" Total carryover students: {STUDENTS.carryover_count()}")
         # Count by semester
-        semester_counts = {}
-        for student_key, data in CARRYOVER_STUDENTS.items():
-            semester = data["semester"]
-            semester_counts[semester] = semester_counts.get(semester, 0) + 1
-        for semester, count in semester_counts.items():
-            print(f" {semester}: {count} students")
+        for semester, count in STUDENTS.carryover_counts().items():
+            logger.info(f" {semester}: {count} students")
             
     # Print inactive students summary
-    if INACTIVE_STUDENTS:
-        print(f"\n📋 INACTIVE STUDENTS SUMMARY:")
-        print(f" Total inactive students: {len(INACTIVE_STUDENTS)}")
-        cgpa_active_count = sum(1 for s in INACTIVE_STUDENTS.values() if s.get("cgpa_status") == "Active in CGPA")
-        regular_inactive_count = len(INACTIVE_STUDENTS) - cgpa_active_count
-        print(f" - Regular inactive (missing intermediate semesters): {regular_inactive_count}")
-        print(f" - CGPA active but missing from recent semester: {cgpa_active_count}")
+    if STUDENTS.inactive:
+        logger.info(f"\n📋 INACTIVE STUDENTS SUMMARY:")
+        logger.info(f" Total inactive students: {len(STUDENTS.inactive)}")
+        regular_inactive_count, cgpa_active_count = STUDENTS.inactive_counts()
+        logger.info(f" - Regular inactive (missing intermediate semesters): {regular_inactive_count}")
+        logger.info(f" - CGPA active but missing from recent semester: {cgpa_active_count}")
             
     return total_processed > 0
 
 if __name__ == "__main__":
     try:
         main()
-        print("✅ ND Examination Results Processing completed successfully")
+        logger.info("✅ ND Examination Results Processing completed successfully")
     except Exception as e:
-        print(f"❌ Error during processing: {e}")
+        logger.error(f"❌ Error during processing: {e}")
         import traceback
         traceback.print_exc()
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+header_locator.py
+
+Single-pass header detection for mastersheet sheets, shared by the ND, BN
+and BM carryover processors.
+
+A mastersheet sheet has title rows above its column headings, so the
+carryover processors found the heading row by probing: ND re-read a semester
+sheet with pd.read_excel(header=n) for n = 0..14 until the columns held
+"EXAM NUMBER", and BN/BM parsed the whole sheet with header=None only to scan
+it before parsing it again with the row they found. sheet_head streams just
+the first rows of the sheet once through openpyxl's read-only reader,
+locate_header picks the heading row from them, and read_below_header parses
+the sheet a single time with that row as the header.
+
+Row numbers are 0-based sheet rows, blank rows included, which is what
+pd.read_excel's ``header`` argument counts.
+"""
+
+from collections import namedtuple
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.worksheet.worksheet import Worksheet
+
+# Rows scanned for the headings; the processors put them on row 6
+HEADER_SCAN_ROWS = 30
+
+# row:   0-based sheet row of the headings (pd.read_excel's header=)
+# cells: the heading row's cell values
+HeaderLocation = namedtuple("HeaderLocation", ["row", "cells"])
+
+
+def _rows(ws, nrows):
+    if isinstance(ws, ReadOnlyWorksheet):
+        # Read-only sheets trust the stored <dimension>, which some writers get wrong
+        ws.reset_dimensions()
+    else:
+        # Normal sheets create the cells they are asked for; stay inside the sheet
+        nrows = min(nrows, ws.max_row)
+    return [list(row) for row in ws.iter_rows(max_row=nrows, values_only=True)]
+
+
+def sheet_head(source, sheet_name=None, nrows=HEADER_SCAN_ROWS):
+    """
+    Values of the first ``nrows`` rows of a sheet, one list per row.
+
+    ``source`` is a workbook path, an open pd.ExcelFile of an .xlsx file
+    (its read-only openpyxl book is reused) or an openpyxl worksheet, which
+    needs no ``sheet_name``. Rows further down are not parsed.
+    """
+    if isinstance(source, (Worksheet, ReadOnlyWorksheet)):
+        return _rows(source, nrows)
+    if isinstance(source, pd.ExcelFile):
+        return _rows(source.book[sheet_name], nrows)
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        return _rows(wb[sheet_name], nrows)
+    finally:
+        wb.close()
+
+
+def cell_texts(cells, ncols=None):
+    """Upper-cased, stripped text of a row's non-empty cells."""
+    if ncols is not None:
+        cells = cells[:ncols]
+    texts = []
+    for value in cells:
+        if value is None:
+            continue
+        text = str(value).strip().upper()
+        if text:
+            texts.append(text)
+    return texts
+
+
+def has_keyword(*keywords):
+    """Row test: some cell contains one of ``keywords`` (upper case)."""
+    return lambda texts: any(keyword in text for text in texts for keyword in keywords)
+
+
+def locate_header(rows, match, ncols=None):
+    """
+    The first of ``rows`` whose cell texts satisfy ``match``, as a
+    HeaderLocation, or None. ``ncols`` limits the test to the leading columns.
+    """
+    for idx, cells in enumerate(rows):
+        if match(cell_texts(cells, ncols)):
+            return HeaderLocation(idx, cells)
+    return None
+
+
+def read_below_header(source, sheet_name, location, **read_kwargs):
+    """Parse the sheet once, taking the located row as its header."""
+    return pd.read_excel(source, sheet_name=sheet_name, header=location.row, **read_kwargs)
+
+
+def header_columns(cells, base=1):
+    """{stripped heading: column number} for the non-empty cells of a heading row."""
+    headers = {}
+    for col_idx, value in enumerate(cells, start=base):
+        if value:
+            headers[str(value).strip()] = col_idx
+    return headers
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+input_cache.py
+
+On-disk cache of parsed raw result files for the ND, BN and BM processors.
+
+Reading a raw CBT workbook, matching its headers to course codes and merging
+the CA/OBJ/EXAM sheets is the slowest part of re-running a semester. The
+merged frame is stored under the set directory, keyed by the SHA-256 of the
+raw file plus the hash of the course workbook(s), so a re-run with only a
+different threshold loads it straight back. Entries are pickled DataFrames;
+the directory is capped in size and evicted least-recently-used first.
+
+Set PARSED_INPUT_CACHE=0 to bypass the cache and PARSED_INPUT_CACHE_MB to
+change the size cap (default 200 MB per set).
+"""
+
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+from env_flags import env_flag
+
+CACHE_DIRNAME = ".parsed_input_cache"
+# 2: merge_score_sheets frames ((course, component) columns, registration index)
+CACHE_FORMAT = 2
+DEFAULT_MAX_MB = 200
+
+# (absolute path, mtime_ns, size) -> sha256 hex, so a file is hashed once per run
+_FILE_HASHES = {}
+
+
+def cache_enabled():
+    """The cache is on unless PARSED_INPUT_CACHE is set to a false value."""
+    return env_flag("PARSED_INPUT_CACHE", True)
+
+
+def file_sha256(path):
+    """SHA-256 of a file's content, memoized on (path, mtime, size)."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _FILE_HASHES.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _FILE_HASHES[memo_key] = digest
+    return digest
+
+
+def course_workbooks_sha256(courses_dir):
+    """Combined hash of every course workbook in ``courses_dir``."""
+    sha = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(courses_dir, "*.xlsx"))):
+        name = os.path.basename(path)
+        if name.startswith("~$"):
+            continue  # Excel lock file
+        sha.update(name.encode("utf-8"))
+        sha.update(file_sha256(path).encode("ascii"))
+    return sha.hexdigest()
+
+
+class ParsedInputCache:
+    """Size-capped, LRU directory of merged raw-result frames."""
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        if max_bytes is None:
+            try:
+                max_mb = float(os.getenv("PARSED_INPUT_CACHE_MB", DEFAULT_MAX_MB))
+            except ValueError:
+                max_mb = DEFAULT_MAX_MB
+            max_bytes = int(max_mb * 1024 * 1024)
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def for_raw_file(cls, raw_path):
+        """Cache living in the set directory that holds ``raw_path``'s RAW_RESULTS folder."""
+        set_dir = os.path.dirname(os.path.dirname(os.path.abspath(raw_path)))
+        return cls(os.path.join(set_dir, CACHE_DIRNAME))
+
+    def key(self, raw_path, *parts):
+        """Cache key from the raw file content plus any other inputs (hashes, versions)."""
+        sha = hashlib.sha256()
+        sha.update(f"format={CACHE_FORMAT}".encode("utf-8"))
+        sha.update(file_sha256(raw_path).encode("ascii"))
+        for part in parts:
+            sha.update(b"\0")
+            sha.update(str(part).encode("utf-8"))
+        return sha.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def contains(self, key):
+        """True when an entry for ``key`` is on disk (it may still fail to load)."""
+        return os.path.exists(self._entry_path(key))
+
+    def load(self, key):
+        """Return the cached frame for ``key`` or None on a miss or unreadable entry."""
+        entry = self._entry_path(key)
+        if not os.path.exists(entry):
+            return None
+        try:
+            frame = pd.read_pickle(entry)
+        except Exception:
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(entry)  # mark as most recently used
+        except OSError:
+            pass
+        return frame
+
+    def store(self, key, frame):
+        """Write ``frame`` under ``key`` and evict old entries. Returns True on success."""
+        entry = self._entry_path(key)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            frame.to_pickle(tmp)
+            os.replace(tmp, entry)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.pkl")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+input_manifest.py
+
+Per-set record of what each semester's last result was built from, so the
+ND, BN and BM processors only re-render semesters whose inputs changed.
+
+Auto mode re-runs every semester that has raw files. Parsing is already
+served from the parsed-input cache, but every semester's student PDF - most
+of a run's time - was rendered again even when only the latest upload had
+changed. input_manifest.json in the set directory records for each semester
+a fingerprint of its raw files (SHA-256), the thresholds, the course
+workbooks, the logo and the scripts themselves, chained with the fingerprint
+of the semester before it (a semester's CGPA columns depend on it), and the
+result ZIP member its PDF went to.
+
+A semester whose fingerprint still matches is scored as usual - that is
+cheap from the parsed-input cache, and the later semesters' CGPAs and the
+CGPA_SUMMARY/ANALYSIS sheets are built from its scores and tracker state -
+but its PDF is copied out of the last result ZIP instead of being rendered.
+A change to one semester re-renders that semester and every one after it.
+
+Set INCREMENTAL_PROCESSING=0 to render every semester.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import zipfile
+from datetime import datetime
+
+from env_flags import env_flag
+from input_cache import file_sha256
+
+MANIFEST_FILENAME = "input_manifest.json"
+MANIFEST_VERSION = 1
+
+_CODE_VERSION = None
+
+
+def incremental_enabled():
+    """Reuse is on unless INCREMENTAL_PROCESSING is set to a false value."""
+    return env_flag("INCREMENTAL_PROCESSING", True)
+
+
+def code_version():
+    """Combined hash of the scripts, so any code change invalidates every entry."""
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        sha = hashlib.sha256()
+        scripts_dir = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(scripts_dir, "*.py"))):
+            sha.update(os.path.basename(path).encode("utf-8"))
+            sha.update(file_sha256(path).encode("ascii"))
+        _CODE_VERSION = sha.hexdigest()
+    return _CODE_VERSION
+
+
+def optional_file_sha256(path):
+    """file_sha256 of ``path``, or "" when it is unset or missing (e.g. no logo)."""
+    if not path or not os.path.exists(path):
+        return ""
+    return file_sha256(path)
+
+
+class InputManifest:
+    """One set's semester fingerprints and the outputs they produced."""
+
+    def __init__(self, semester_order=()):
+        self.semester_order = list(semester_order)
+        self.close()
+
+    def close(self):
+        """Forget the current set; every call is a no-op until the next open()."""
+        self.path = None
+        self.set_dir = None
+        self.entries = {}
+        self._fingerprints = {}
+        self._outputs = {}
+
+    def open(self, set_dir):
+        """Load ``set_dir``'s manifest (a missing or unreadable one is empty)."""
+        self.close()
+        if not incremental_enabled():
+            return
+        self.set_dir = os.path.abspath(set_dir)
+        self.path = os.path.join(self.set_dir, MANIFEST_FILENAME)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("semesters", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    # ----------------------------
+    # Fingerprints
+    # ----------------------------
+
+    def note(self, semester_key, raw_paths, settings):
+        """
+        Fingerprint ``semester_key`` from its raw files and ``settings`` (a
+        JSON-able dict), chained with the nearest earlier semester's
+        fingerprint from this run or, failing that, the manifest. Semesters
+        must be noted in processing order. Returns the fingerprint or None.
+        """
+        if self.path is None:
+            return None
+        own = hashlib.sha256(
+            json.dumps(
+                {
+                    "semester": semester_key,
+                    "files": {os.path.basename(p): file_sha256(p) for p in raw_paths},
+                    "settings": settings,
+                    "code": code_version(),
+                },
+                sort_keys=True,
+                default=str,
+            ).encode("utf-8")
+        )
+        own.update(self._previous_fingerprint(semester_key).encode("ascii"))
+        fingerprint = own.hexdigest()
+        self._fingerprints[semester_key] = fingerprint
+        return fingerprint
+
+    def _previous_fingerprint(self, semester_key):
+        if semester_key not in self.semester_order:
+            return ""
+        earlier = self.semester_order[: self.semester_order.index(semester_key)]
+        for key in reversed(earlier):
+            if key in self._fingerprints:
+                return self._fingerprints[key]
+            if key in self.entries:
+                return self.entries[key].get("fingerprint", "")
+        return ""
+
+    def _source(self, semester_key):
+        """(ZIP path, member) holding the semester's unchanged output, or None."""
+        entry = self.entries.get(semester_key)
+        fingerprint = self._fingerprints.get(semester_key)
+        if not entry or fingerprint is None or entry.get("fingerprint") != fingerprint:
+            return None
+        zip_path = os.path.join(self.set_dir, entry.get("zip", ""))
+        member = entry.get("member")
+        if not member or not os.path.isfile(zip_path):
+            return None
+        return zip_path, member
+
+    def unchanged(self, semester_key):
+        """True when ``semester_key``'s stored output can be reused."""
+        return self._source(semester_key) is not None
+
+    # ----------------------------
+    # Outputs
+    # ----------------------------
+
+    def restore(self, semester_key, out_path):
+        """
+        Note ``out_path`` as the semester's output and, when the semester is
+        unchanged, copy the stored output there. Returns True when copied;
+        the caller then skips rendering it.
+        """
+        if self.path is None or semester_key not in self._fingerprints:
+            return False
+        self._outputs[semester_key] = os.path.abspath(out_path)
+        source = self._source(semester_key)
+        if source is None:
+            return False
+        zip_path, member = source
+        tmp = f"{out_path}.{os.getpid()}.tmp"
+        try:
+            with zipfile.ZipFile(zip_path) as zf, zf.open(member) as src:
+                with open(tmp, "wb") as dst:
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+            os.replace(tmp, out_path)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    def commit(self, zip_path, result_dir):
+        """
+        Record this run's outputs that made it into ``zip_path`` (zipped from
+        ``result_dir``) and save the manifest. Returns the semesters recorded.
+        """
+        if self.path is None or not self._outputs:
+            return []
+        try:
+            with zipfile.ZipFile(zip_path) as zf:
+                members = set(zf.namelist())
+        except (OSError, zipfile.BadZipFile):
+            return []
+        result_dir = os.path.abspath(result_dir)
+        zip_rel = os.path.relpath(os.path.abspath(zip_path), self.set_dir)
+        recorded_at = datetime.now().isoformat(timespec="seconds")
+        recorded = []
+        for semester_key, out_path in self._outputs.items():
+            member = os.path.relpath(out_path, result_dir).replace(os.sep, "/")
+            if member not in members:
+                continue
+            self.entries[semester_key] = {
+                "fingerprint": self._fingerprints[semester_key],
+                "zip": zip_rel.replace(os.sep, "/"),
+                "member": member,
+                "recorded_at": recorded_at,
+            }
+            recorded.append(semester_key)
+        self._outputs = {}
+        if recorded:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(
+                        {"version": MANIFEST_VERSION, "semesters": self.entries},
+                        f,
+                        indent=2,
+                        sort_keys=True,
+                    )
+                os.replace(tmp, self.path)
+            except OSError:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return []
+        return recorded
@@ -16,10 +16,31 @@ import traceback
 import shutil
 import zipfile
 import tempfile
-from openpyxl import load_workbook, Workbook
+from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 
+from carryover_engine import (
+    CarryoverColors,
+    ProgramProfile,
+    calculate_cgpa as engine_cgpa,
+    carryover_courses,
+    collect_semester_records,
+    generate_carryover_mastersheet as engine_carryover_mastersheet,
+    grade_point,
+    load_previous_gpas as engine_previous_gpas,
+)
+from course_catalogue import load_catalogue
+from header_locator import (
+    has_keyword,
+    header_columns,
+    locate_header,
+    read_below_header,
+    sheet_head,
+)
+from student_block import read_student_block, summarise_scores, write_student_block
+from zip_patch import extract_member, find_member, is_mastersheet, patch_zip, write_tree
+
 
 # ----------------------------
 # Configuration and Constants
@@ -47,6 +68,8 @@ BASE_DIR = get_base_directory()
 TIMESTAMP_FMT = "%d-%m-%Y_%H%M%S"
 DEFAULT_PASS_THRESHOLD = 50.0
 DEFAULT_LOGO_PATH = os.path.join(os.path.dirname(__file__), "logo.png")
+# Course-catalogue cache namespace; bump when the course data builder changes
+ND_CATALOGUE_NAMESPACE = "nd-carryover-v1"
 
 # Add these constants at the top with other configuration
 SEMESTER_ORDER = [
@@ -477,22 +500,54 @@ def get_semester_display_info(semester_key):
         return 1, 1, "YEAR ONE", "FIRST SEMESTER", "NDI", "Semester 1"
 
 
+# (minimum score, grade point) from the top band down; lower scores (E/F) get 0
+GRADE_BANDS = (
+    (70, 4.0),  # A: 70-100
+    (60, 3.0),  # B: 60-69
+    (50, 2.0),  # C: 50-59
+    (45, 1.0),  # D: 45-49
+)
+
+
+ND_PROFILE = ProgramProfile(
+    code="ND",
+    program_name="NATIONAL DIPLOMA",
+    semester_keys=tuple(SEMESTER_ORDER),
+    grade_bands=GRADE_BANDS,
+    probation=True,
+    output_label="",
+    colors=CarryoverColors(
+        heading="366092",
+        courses=(
+            "E6F3FF",
+            "FFF0E6",
+            "E6FFE6",
+            "FFF6E6",
+            "F0E6FF",
+            "E6FFFF",
+            "FFE6F2",
+            "F5F5DC",
+            "E6F7FF",
+            "FFF5E6",
+        ),
+        failed="FFB6C1",
+        passed="90EE90",
+    ),
+    signatories=(
+        ("",),
+        ("",),
+        ("", ""),
+        ("________________________", "________________________"),
+        ("Mrs. Abini Hauwa", "Mrs. Olukemi Ogunleye"),
+        ("Head of Exams", "Chairman, ND Program C'tee"),
+    ),
+    previous_gpa_field="GPA_Semester_{number}",
+)
+
+
 def get_grade_point(score):
     """Determine grade point based on score - UPDATED TO 4.0 SCALE (A=4, B=3, C=2, D=1, E=0)"""
-    try:
-        score = float(score)
-        if score >= 70:    # A: 70-100
-            return 4.0
-        elif score >= 60:  # B: 60-69
-            return 3.0
-        elif score >= 50:  # C: 50-59
-            return 2.0
-        elif score >= 45:  # D: 45-49
-            return 1.0
-        else:              # E/F: 0-44
-            return 0.0
-    except (ValueError, TypeError):
-        return 0.0
+    return grade_point(score, GRADE_BANDS)
 
 
 def get_previous_semester(semester_key):
@@ -522,22 +577,6 @@ def get_previous_semesters_for_display(current_semester_key):
     return semester_mapping.get(current_standard, [])
 
 
-def generate_remarks(resit_courses):
-    """Generate remarks for resit performance."""
-    passed_count = sum(
-        1
-        for course_data in resit_courses.values()
-        if course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD
-    )
-    total_count = len(resit_courses)
-    if passed_count == total_count:
-        return "All courses passed in resit"
-    elif passed_count > 0:
-        return f"{passed_count}/{total_count} courses passed in resit"
-    else:
-        return "No improvement in resit"
-
-
 def extract_class_from_set_name(set_name):
     """Extract class name from set_name (e.g., 'ND-2024' from 'ND-2024')"""
     # set_name is already in format like "ND-2024"
@@ -590,172 +629,12 @@ def load_nd_course_data():
 def _load_course_data_from_file(course_file):
     """Generic function to load course data from Excel file - FIXED VERSION."""
     try:
-        xl = pd.ExcelFile(course_file)
-        semester_course_titles = {}
-        semester_credit_units = {}
-        course_code_to_title = {}
-        course_code_to_unit = {}
-
-        print(f"📖 Available sheets: {xl.sheet_names}")  # FIXED: sheet_names instead of sheetnames
-
-        for sheet in xl.sheet_names:  # FIXED: sheet_names instead of sheetnames
-            sheet_standard = standardize_semester_key(sheet)
-            print(f"📖 Reading sheet: {sheet} (standardized: {sheet_standard})")
-            try:
-                df = pd.read_excel(
-                    course_file, sheet_name=sheet, engine="openpyxl", header=0
-                )
-
-                # Convert columns to string and clean
-                df.columns = [str(c).strip().upper() for c in df.columns]
-
-                # Look for course code, title, and credit unit columns with flexible matching
-                code_col = None
-                title_col = None
-                unit_col = None
-
-                for col in df.columns:
-                    col_clean = str(col).upper()
-                    if any(
-                        keyword in col_clean
-                        for keyword in ["COURSE CODE", "CODE", "COURSECODE"]
-                    ):
-                        code_col = col
-                    elif any(
-                        keyword in col_clean
-                        for keyword in ["COURSE TITLE", "TITLE", "COURSENAME"]
-                    ):
-                        title_col = col
-                    elif any(
-                        keyword in col_clean
-                        for keyword in ["CU", "CREDIT", "UNIT", "CREDIT UNIT"]
-                    ):
-                        unit_col = col
-
-                print(
-                    f"🔍 Detected columns - Code: {code_col}, Title: {title_col}, Unit: {unit_col}"
-                )
-
-                if not all([code_col, title_col, unit_col]):
-                    print(
-                        f"⚠️ Sheet '{sheet}' missing required columns - found: code={code_col}, title={title_col}, unit={unit_col}"
-                    )
-                    # Try to use first three columns as fallback
-                    if len(df.columns) >= 3:
-                        code_col, title_col, unit_col = (
-                            df.columns[0],
-                            df.columns[1],
-                            df.columns[2],
-                        )
-                        print(
-                            f"🔄 Using fallback columns: {code_col}, {title_col}, {unit_col}"
-                        )
-                    else:
-                        print(
-                            f"❌ Sheet '{sheet}' doesn't have enough columns - skipped"
-                        )
-                        continue
-
-                # Clean the data
-                df_clean = df.dropna(subset=[code_col]).copy()
-                if df_clean.empty:
-                    print(f"⚠️ Sheet '{sheet}' has no data after cleaning - skipped")
-                    continue
-
-                # Convert credit units to numeric, handling errors
-                df_clean[unit_col] = pd.to_numeric(df_clean[unit_col], errors="coerce")
-                df_clean = df_clean.dropna(subset=[unit_col])
-
-                # FIXED: Remove rows with "TOTAL" in course code
-                df_clean = df_clean[
-                    ~df_clean[code_col]
-                    .astype(str)
-                    .str.contains("TOTAL", case=False, na=False)
-                ]
-
-                if df_clean.empty:
-                    print(f"⚠️ Sheet '{sheet}' has no valid rows after cleaning - skipped")
-                    continue
-
-                codes = df_clean[code_col].astype(str).str.strip().tolist()
-                titles = df_clean[title_col].astype(str).str.strip().tolist()
-                units = df_clean[unit_col].astype(float).tolist()
-                print(f"📋 Found {len(codes)} courses in {sheet}:")
-                for i, (code, title, unit) in enumerate(
-                    zip(codes[:5], titles[:5], units[:5])
-                ):
-                    print(f" - '{code}': '{title}' (CU: {unit})")
-                # Create mapping dictionaries with ENHANCED normalization strategies
-                sheet_titles = {}
-                sheet_units = {}
-
-                for code, title, unit in zip(codes, titles, units):
-                    if not code or code.upper() in ["NAN", "NONE", ""]:
-                        continue
-
-                    # ENHANCED: Create comprehensive normalization variants for robust matching
-                    variants = [
-                        # Basic variants
-                        code.upper().strip(),
-                        code.strip(),
-                        code.upper(),
-                        code.lower(),
-                        code.title(),
-                        # Space removal variants
-                        code.upper().replace(" ", ""),
-                        code.replace(" ", ""),
-                        re.sub(r"\s+", "", code.upper()),
-                        re.sub(r"\s+", "", code),
-                        # Special character handling
-                        re.sub(r"[^a-zA-Z0-9]", "", code.upper()),
-                        re.sub(r"[^a-zA-Z0-9]", "", code),
-                        # Common formatting issues
-                        code.upper().replace("-", ""),
-                        code.upper().replace("_", ""),
-                        code.replace("-", "").replace("_", ""),
-                        code.upper().replace("-", "").replace("_", "").replace(" ", ""),
-                        # WITH common prefixes (for matching with prefix)
-                        f"NUR{code.upper()}",
-                        f"NUR{code.upper().replace(' ', '')}",
-                        f"NUR{re.sub(r'[^a-zA-Z0-9]', '', code.upper())}",
-                        f"NSC{code.upper()}",
-                        f"NSC{code.upper().replace(' ', '')}",
-                        f"NSC{re.sub(r'[^a-zA-Z0-9]', '', code.upper())}",
-                        # WITHOUT common prefixes (for matching without prefix)
-                        code.upper().replace("NUR", "").strip(),
-                        code.upper().replace("NSC", "").strip(),
-                        re.sub(r"^(NUR|NSC)", "", code.upper()).strip(),
-                        re.sub(r"^(NUR|NSC)", "", code.upper())
-                        .replace(" ", "")
-                        .strip(),
-                        # Number-focused variants (for codes like "101", "201")
-                        re.sub(r"[^0-9]", "", code),
-                        # Common variations with dots
-                        code.upper().replace(".", ""),
-                        code.replace(".", ""),
-                    ]
-
-                    # Remove duplicates while preserving order
-                    variants = list(
-                        dict.fromkeys(
-                            [v for v in variants if v and v not in ["NAN", "NONE", ""]]
-                        )
-                    )
-
-                    # Add all variants to mappings
-                    for variant in variants:
-                        sheet_titles[variant] = title
-                        sheet_units[variant] = unit
-                        course_code_to_title[variant] = title
-                        course_code_to_unit[variant] = unit
-
-                semester_course_titles[sheet_standard] = sheet_titles
-                semester_credit_units[sheet_standard] = sheet_units
-
-            except Exception as e:
-                print(f"❌ Error processing sheet '{sheet}': {e}")
-                traceback.print_exc()
-                continue
+        (
+            semester_course_titles,
+            semester_credit_units,
+            course_code_to_title,
+            course_code_to_unit,
+        ) = load_catalogue(course_file, ND_CATALOGUE_NAMESPACE, _build_course_catalogue)
 
         print(
             f"✅ Loaded course data for sheets: {list(semester_course_titles.keys())}"
@@ -782,6 +661,178 @@ def _load_course_data_from_file(course_file):
         return {}, {}, {}, {}
 
 
+def _build_course_catalogue(course_sheets):
+    """Build the course lookups from the course workbook's sheets."""
+    semester_course_titles = {}
+    semester_credit_units = {}
+    course_code_to_title = {}
+    course_code_to_unit = {}
+
+    print(f"📖 Available sheets: {list(course_sheets)}")
+
+    for sheet, df in course_sheets.items():
+        sheet_standard = standardize_semester_key(sheet)
+        print(f"📖 Reading sheet: {sheet} (standardized: {sheet_standard})")
+        try:
+            # Convert columns to string and clean
+            df.columns = [str(c).strip().upper() for c in df.columns]
+
+            # Look for course code, title, and credit unit columns with flexible matching
+            code_col = None
+            title_col = None
+            unit_col = None
+
+            for col in df.columns:
+                col_clean = str(col).upper()
+                if any(
+                    keyword in col_clean
+                    for keyword in ["COURSE CODE", "CODE", "COURSECODE"]
+                ):
+                    code_col = col
+                elif any(
+                    keyword in col_clean
+                    for keyword in ["COURSE TITLE", "TITLE", "COURSENAME"]
+                ):
+                    title_col = col
+                elif any(
+                    keyword in col_clean
+                    for keyword in ["CU", "CREDIT", "UNIT", "CREDIT UNIT"]
+                ):
+                    unit_col = col
+
+            print(
+                f"🔍 Detected columns - Code: {code_col}, Title: {title_col}, Unit: {unit_col}"
+            )
+
+            if not all([code_col, title_col, unit_col]):
+                print(
+                    f"⚠️ Sheet '{sheet}' missing required columns - found: code={code_col}, title={title_col}, unit={unit_col}"
+                )
+                # Try to use first three columns as fallback
+                if len(df.columns) >= 3:
+                    code_col, title_col, unit_col = (
+                        df.columns[0],
+                        df.columns[1],
+                        df.columns[2],
+                    )
+                    print(
+                        f"🔄 Using fallback columns: {code_col}, {title_col}, {unit_col}"
+                    )
+                else:
+                    print(
+                        f"❌ Sheet '{sheet}' doesn't have enough columns - skipped"
+                    )
+                    continue
+
+            # Clean the data
+            df_clean = df.dropna(subset=[code_col]).copy()
+            if df_clean.empty:
+                print(f"⚠️ Sheet '{sheet}' has no data after cleaning - skipped")
+                continue
+
+            # Convert credit units to numeric, handling errors
+            df_clean[unit_col] = pd.to_numeric(df_clean[unit_col], errors="coerce")
+            df_clean = df_clean.dropna(subset=[unit_col])
+
+            # FIXED: Remove rows with "TOTAL" in course code
+            df_clean = df_clean[
+                ~df_clean[code_col]
+                .astype(str)
+                .str.contains("TOTAL", case=False, na=False)
+            ]
+
+            if df_clean.empty:
+                print(f"⚠️ Sheet '{sheet}' has no valid rows after cleaning - skipped")
+                continue
+
+            codes = df_clean[code_col].astype(str).str.strip().tolist()
+            titles = df_clean[title_col].astype(str).str.strip().tolist()
+            units = df_clean[unit_col].astype(float).tolist()
+            print(f"📋 Found {len(codes)} courses in {sheet}:")
+            for i, (code, title, unit) in enumerate(
+                zip(codes[:5], titles[:5], units[:5])
+            ):
+                print(f" - '{code}': '{title}' (CU: {unit})")
+            # Create mapping dictionaries with ENHANCED normalization strategies
+            sheet_titles = {}
+            sheet_units = {}
+
+            for code, title, unit in zip(codes, titles, units):
+                if not code or code.upper() in ["NAN", "NONE", ""]:
+                    continue
+
+                # ENHANCED: Create comprehensive normalization variants for robust matching
+                variants = [
+                    # Basic variants
+                    code.upper().strip(),
+                    code.strip(),
+                    code.upper(),
+                    code.lower(),
+                    code.title(),
+                    # Space removal variants
+                    code.upper().replace(" ", ""),
+                    code.replace(" ", ""),
+                    re.sub(r"\s+", "", code.upper()),
+                    re.sub(r"\s+", "", code),
+                    # Special character handling
+                    re.sub(r"[^a-zA-Z0-9]", "", code.upper()),
+                    re.sub(r"[^a-zA-Z0-9]", "", code),
+                    # Common formatting issues
+                    code.upper().replace("-", ""),
+                    code.upper().replace("_", ""),
+                    code.replace("-", "").replace("_", ""),
+                    code.upper().replace("-", "").replace("_", "").replace(" ", ""),
+                    # WITH common prefixes (for matching with prefix)
+                    f"NUR{code.upper()}",
+                    f"NUR{code.upper().replace(' ', '')}",
+                    f"NUR{re.sub(r'[^a-zA-Z0-9]', '', code.upper())}",
+                    f"NSC{code.upper()}",
+                    f"NSC{code.upper().replace(' ', '')}",
+                    f"NSC{re.sub(r'[^a-zA-Z0-9]', '', code.upper())}",
+                    # WITHOUT common prefixes (for matching without prefix)
+                    code.upper().replace("NUR", "").strip(),
+                    code.upper().replace("NSC", "").strip(),
+                    re.sub(r"^(NUR|NSC)", "", code.upper()).strip(),
+                    re.sub(r"^(NUR|NSC)", "", code.upper())
+                    .replace(" ", "")
+                    .strip(),
+                    # Number-focused variants (for codes like "101", "201")
+                    re.sub(r"[^0-9]", "", code),
+                    # Common variations with dots
+                    code.upper().replace(".", ""),
+                    code.replace(".", ""),
+                ]
+
+                # Remove duplicates while preserving order
+                variants = list(
+                    dict.fromkeys(
+                        [v for v in variants if v and v not in ["NAN", "NONE", ""]]
+                    )
+                )
+
+                # Add all variants to mappings
+                for variant in variants:
+                    sheet_titles[variant] = title
+                    sheet_units[variant] = unit
+                    course_code_to_title[variant] = title
+                    course_code_to_unit[variant] = unit
+
+            semester_course_titles[sheet_standard] = sheet_titles
+            semester_credit_units[sheet_standard] = sheet_units
+
+        except Exception as e:
+            print(f"❌ Error processing sheet '{sheet}': {e}")
+            traceback.print_exc()
+            continue
+
+    return (
+        semester_course_titles,
+        semester_credit_units,
+        course_code_to_title,
+        course_code_to_unit,
+    )
+
+
 def find_alternative_course_files():
     """Look for alternative course files for ND."""
     base_dirs = [
@@ -1018,29 +1069,24 @@ def extract_mastersheet_from_zip(zip_path, semester_key):
             all_files = zip_ref.namelist()
             print(f"📁 Files in ZIP: {all_files}")
 
-            mastersheet_files = [
-                f
-                for f in all_files
-                if "mastersheet" in f.lower() and f.endswith(".xlsx")
-            ]
+            mastersheet_name = next(
+                (f for f in all_files if is_mastersheet(f)), None
+            )
 
-            if not mastersheet_files:
+            if not mastersheet_name:
                 print(f"❌ No mastersheet found in ZIP")
                 return None, None
 
-            mastersheet_name = mastersheet_files[0]
             print(f"✅ Found mastersheet: {mastersheet_name}")
 
-            temp_dir = tempfile.mkdtemp()
-            temp_mastersheet_path = os.path.join(
-                temp_dir, f"mastersheet_{semester_key}.xlsx"
-            )
-
-            with open(temp_mastersheet_path, "wb") as f:
-                f.write(zip_ref.read(mastersheet_name))
+        temp_dir = tempfile.mkdtemp()
+        temp_mastersheet_path = os.path.join(
+            temp_dir, f"mastersheet_{semester_key}.xlsx"
+        )
+        extract_member(zip_path, mastersheet_name, temp_mastersheet_path)
 
-            print(f"✅ Extracted mastersheet to: {temp_mastersheet_path}")
-            return temp_mastersheet_path, temp_dir
+        print(f"✅ Extracted mastersheet to: {temp_mastersheet_path}")
+        return temp_mastersheet_path, temp_dir
 
     except Exception as e:
         print(f"❌ Error extracting mastersheet from ZIP: {e}")
@@ -1223,12 +1269,7 @@ def get_matching_sheet(xl, target_key):
 def create_carryover_zip(source_dir, zip_path):
     """Create ZIP file of carryover results."""
     try:
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(source_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, source_dir)
-                    zipf.write(file_path, arcname)
+        write_tree(source_dir, zip_path)
         print(f"✅ ZIP file created: {zip_path}")
         return True
     except Exception as e:
@@ -1239,129 +1280,29 @@ def create_carryover_zip(source_dir, zip_path):
 # ----------------------------
 # GPA/CGPA Management - FIXED VERSION
 # ----------------------------
-def load_previous_gpas_enhanced(mastersheet_path, current_semester_key):
-    """Enhanced function to load previous GPA data with better sheet detection."""
-    all_student_data = {}
-    current_standard = standardize_semester_key(current_semester_key)
-    
-    # ND semesters ONLY
-    all_semesters = {
-        "ND-FIRST-YEAR-FIRST-SEMESTER": [],
-        "ND-FIRST-YEAR-SECOND-SEMESTER": ["ND-FIRST-YEAR-FIRST-SEMESTER"],
-        "ND-SECOND-YEAR-FIRST-SEMESTER": [
-            "ND-FIRST-YEAR-FIRST-SEMESTER",
-            "ND-FIRST-YEAR-SECOND-SEMESTER",
-        ],
-        "ND-SECOND-YEAR-SECOND-SEMESTER": [
-            "ND-FIRST-YEAR-FIRST-SEMESTER",
-            "ND-FIRST-YEAR-SECOND-SEMESTER",
-            "ND-SECOND-YEAR-FIRST-SEMESTER",
-        ],
-    }
-    
-    semesters_to_load = all_semesters.get(current_standard, [])
-    print(f"📊 Loading previous ND GPAs for {current_standard}: {semesters_to_load}")
-    
-    if not os.path.exists(mastersheet_path):
-        print(f"❌ ND Mastersheet not found: {mastersheet_path}")
-        return {}
-    
-    try:
-        xl = pd.ExcelFile(mastersheet_path)
-        print(f"📖 Available sheets in ND mastersheet: {xl.sheet_names}")
-    except Exception as e:
-        print(f"❌ Error opening ND mastersheet: {e}")
-        return {}
-    
-    for semester in semesters_to_load:
-        try:
-            sheet_name = get_matching_sheet(xl, semester)
-            if not sheet_name:
-                print(f"⚠️ Skipping ND semester {semester} - no matching sheet found")
-                continue
-
-            print(f"📖 Reading ND sheet '{sheet_name}' for semester {semester}")
-            
-            # Try multiple header rows to find the right structure
-            df = None
-            header_row_found = None
-            
-            for header_row in range(0, 10):  # Try first 10 rows
-                try:
-                    temp_df = pd.read_excel(mastersheet_path, sheet_name=sheet_name, header=header_row)
-                    
-                    # Check if this row has EXAM NUMBER and GPA columns
-                    has_exam_col = any('EXAM NUMBER' in str(col).upper() for col in temp_df.columns)
-                    has_gpa_col = any('GPA' in str(col).upper() and 'CGPA' not in str(col).upper() for col in temp_df.columns)
-                    
-                    if has_exam_col and has_gpa_col:
-                        df = temp_df
-                        header_row_found = header_row
-                        print(f"✅ Found valid headers at row {header_row_found}")
-                        break
-                except Exception as e:
-                    continue
-            
-            if df is None or df.empty:
-                print(f"⚠️ Could not find valid data structure in sheet '{sheet_name}'")
-                continue
-
-            exam_col = find_exam_number_column(df)
-            gpa_col = None
-            credit_col = None
-
-            # Find GPA and credit columns
-            for col in df.columns:
-                col_str = str(col).upper()
-                if "GPA" in col_str and "CGPA" not in col_str:
-                    gpa_col = col
-                if "TCPE" in col_str or "TOTAL CREDIT" in col_str or "TOTAL UNIT" in col_str:
-                    credit_col = col
-
-            print(f"🔍 Columns found - Exam: {exam_col}, GPA: {gpa_col}, Credits: {credit_col}")
-
-            if exam_col and gpa_col:
-                student_count = 0
-                for idx, row in df.iterrows():
-                    try:
-                        exam_no = str(row[exam_col]).strip().upper()
-                        if pd.isna(exam_no) or exam_no in ["", "NAN", "NONE", "SUMMARY"]:
-                            continue
-
-                        gpa_value = row[gpa_col]
-                        if pd.isna(gpa_value):
-                            continue
-
-                        credits = 30  # Default
-                        if credit_col and credit_col in row and pd.notna(row[credit_col]):
-                            try:
-                                credits = int(float(row[credit_col]))
-                            except (ValueError, TypeError):
-                                credits = 30
-
-                        if exam_no not in all_student_data:
-                            all_student_data[exam_no] = {"gpas": [], "credits": []}
-
-                        all_student_data[exam_no]["gpas"].append(float(gpa_value))
-                        all_student_data[exam_no]["credits"].append(credits)
-                        student_count += 1
-
-                        if student_count <= 3:  # Print first 3 for verification
-                            print(f"📊 Loaded ND GPA for {exam_no}: {gpa_value} with {credits} credits")
+def _read_gpa_sheet(xl, sheet_name):
+    """Parse a previous semester's sheet below its EXAM NUMBER and GPA headings."""
+    location = locate_header(
+        sheet_head(xl, sheet_name, nrows=10),
+        lambda texts: any("EXAM NUMBER" in text for text in texts)
+        and any("GPA" in text and "CGPA" not in text for text in texts),
+    )
+    if location is None:
+        return None, None
+    df = read_below_header(xl, sheet_name, location)
+    print(f"✅ Found valid headers at row {location.row}")
+    return df, find_exam_number_column(df)
 
-                    except (ValueError, TypeError) as e:
-                        continue
-                
-                print(f"✅ Loaded {student_count} student records from {sheet_name}")
-            else:
-                print(f"⚠️ Missing required columns in ND {sheet_name}: exam_col={exam_col}, gpa_col={gpa_col}")
 
-        except Exception as e:
-            print(f"⚠️ Could not load data from ND {semester}: {e}")
-            continue
-    
-    print(f"📊 Loaded cumulative ND data for {len(all_student_data)} students")
-    return all_student_data
+def load_previous_gpas_enhanced(mastersheet_path, current_semester_key):
+    """Enhanced function to load previous GPA data with better sheet detection."""
+    return engine_previous_gpas(
+        ND_PROFILE,
+        mastersheet_path,
+        standardize_semester_key(current_semester_key),
+        get_matching_sheet,
+        _read_gpa_sheet,
+    )
 
 
 def load_previous_gpas(mastersheet_path, current_semester_key):
@@ -1372,32 +1313,7 @@ def load_previous_gpas(mastersheet_path, current_semester_key):
 
 def calculate_cgpa(student_data, current_gpa, current_credits):
     """Calculate Cumulative GPA for ND - UPDATED FOR 4.0 SCALE"""
-    if not student_data or not student_data.get("gpas"):
-        print(f"⚠️ No previous ND GPA data, using current GPA: {current_gpa}")
-        return current_gpa
-    
-    total_grade_points = 0.0
-    total_credits = 0
-    print(f"🔢 Calculating ND CGPA from {len(student_data['gpas'])} previous semesters (4.0 scale)")
-    
-    for prev_gpa, prev_credits in zip(student_data["gpas"], student_data["credits"]):
-        total_grade_points += prev_gpa * prev_credits
-        total_credits += prev_credits
-        print(
-            f" - GPA: {prev_gpa}, Credits: {prev_credits}, Running Total: {total_grade_points}/{total_credits}"
-        )
-    
-    total_grade_points += current_gpa * current_credits
-    total_credits += current_credits
-    print(f"📊 Final ND calculation: {total_grade_points} / {total_credits}")
-    
-    if total_credits > 0:
-        cgpa = round(total_grade_points / total_credits, 2)
-        print(f"✅ Calculated ND CGPA (4.0 scale): {cgpa}")
-        return cgpa
-    else:
-        print(f"⚠️ No ND credits, returning current GPA: {current_gpa}")
-        return current_gpa
+    return engine_cgpa(ND_PROFILE, student_data, current_gpa, current_credits)
 
 
 # ----------------------------
@@ -1405,27 +1321,25 @@ def calculate_cgpa(student_data, current_gpa, current_credits):
 # ----------------------------
 def find_sheet_structure(ws):
     """FIXED: Find the header row and build headers dictionary"""
-    header_row = None
-    headers = {}
-
-    # Look for header row (contains 'EXAM NUMBER')
-    for row_idx in range(1, 30):  # Check first 30 rows
-        for col_idx in range(1, ws.max_column + 1):
-            cell_value = ws.cell(row=row_idx, column=col_idx).value
-            if cell_value and "EXAM NUMBER" in str(cell_value).upper():
-                header_row = row_idx
-                # Build headers dictionary
-                for col in range(1, ws.max_column + 1):
-                    header_val = ws.cell(row=header_row, column=col).value
-                    if header_val:
-                        headers[str(header_val).strip()] = col
-                print(f"✅ Found header row at: {header_row}")
-                return header_row, headers
+    # Check first 29 rows in one pass over the sheet's cells
+    location = locate_header(sheet_head(ws, nrows=29), has_keyword("EXAM NUMBER"))
+    if location is not None:
+        header_row = location.row + 1
+        print(f"✅ Found header row at: {header_row}")
+        return header_row, header_columns(location.cells)
 
     print(f"❌ Could not find header row")
     return None, {}
 
 
+def _sheet_containing(sheet_names, semester_key):
+    """First sheet whose name contains the semester key."""
+    for sheet in sheet_names:
+        if semester_key.upper() in sheet.upper():
+            return sheet
+    return None
+
+
 def apply_student_sorting(ws, header_row, headers_dict):
     """Apply sorting to students - compatibility function for ANALYSIS sheet"""
     # This is just an alias for the main sorting function
@@ -1433,7 +1347,12 @@ def apply_student_sorting(ws, header_row, headers_dict):
 
 
 def apply_student_sorting_with_serial_numbers(ws, header_row, headers_dict):
-    """Apply sorting to students with PROPER serial numbers - FIXED VERSION"""
+    """Apply sorting to students with PROPER serial numbers - FIXED VERSION
+
+    The student rows are read once, sorted in memory and written back in one
+    pass; values and number formats move with the student, while each
+    worksheet row is restyled for its new place.
+    """
     from openpyxl.styles import Font, PatternFill
 
     exam_col = headers_dict.get("EXAM NUMBER")
@@ -1445,93 +1364,62 @@ def apply_student_sorting_with_serial_numbers(ws, header_row, headers_dict):
         return
 
     # Collect all student rows
-    student_rows = []
-    for row in range(header_row + 1, ws.max_row + 1):
-        exam_no = ws.cell(row, exam_col).value
-        if not exam_no or "SUMMARY" in str(exam_no).upper():
-            break
-
-        # Get basic row data (values only, not styles)
-        row_data = []
-        for col in range(1, ws.max_column + 1):
-            cell = ws.cell(row, col)
-            row_data.append({"value": cell.value, "number_format": cell.number_format})
-
-        remarks = ws.cell(row, remarks_col).value or ""
-        remarks_upper = str(remarks).upper()
-
-        # Assign priority for sorting
-        if "WITHDRAW" in remarks_upper:
-            priority = 3  # Withdrawn - last
-        elif (
-            "RESIT" in remarks_upper
-            or "CARRYOVER" in remarks_upper
-            or "PROBATION" in remarks_upper
-        ):
-            priority = 2  # Carryover - middle
-        else:
-            priority = 1  # Passed - first
+    block = read_student_block(ws, header_row, exam_col)
+    values = block.values
 
-        student_rows.append(
-            {
-                "row_num": row,
-                "priority": priority,
-                "gpa": ws.cell(row, gpa_col).value or 0,
-                "row_data": row_data,
-                "remarks": remarks_upper,
-                "exam_no": exam_no,  # Store exam number for secondary sorting
-            }
-        )
+    # Assign priority for sorting
+    remarks = values[remarks_col].fillna("").astype(str).str.upper()
+    priority = pd.Series(1, index=values.index)  # Passed - first
+    priority[remarks.str.contains("RESIT|CARRYOVER|PROBATION")] = 2  # Carryover - middle
+    priority[remarks.str.contains("WITHDRAW")] = 3  # Withdrawn - last
+    gpa = values[gpa_col].where(values[gpa_col].astype(bool), 0).astype(float)
 
     # Sort by priority (Passed first, then Carryover, then Withdrawn)
     # Within each group, sort by GPA (descending), then by exam number
-    student_rows.sort(
-        key=lambda x: (x["priority"], -float(x["gpa"] if x["gpa"] else 0), x["exam_no"])
+    order = (
+        pd.DataFrame({"priority": priority, "gpa": -gpa, "exam_no": values[exam_col]})
+        .sort_values(["priority", "gpa", "exam_no"], kind="stable")
+        .index
     )
-
-    # Write sorted data back to worksheet
-    for idx, student in enumerate(student_rows):
-        target_row = header_row + 1 + idx
-        row_data = student["row_data"]
-
-        for col_idx, cell_data in enumerate(row_data, 1):
-            cell = ws.cell(target_row, col_idx)
-            cell.value = cell_data["value"]
-
-            # Apply number format if present
-            if cell_data.get("number_format"):
-                cell.number_format = cell_data["number_format"]
-
-            # CRITICAL FIX: Update serial numbers to be consecutive
-            if col_idx == serial_col:  # Serial number column
-                cell.value = idx + 1
-
-            # Re-apply styling based on content and student status
-            if student["priority"] == 3:  # Withdrawn
-                cell.fill = PatternFill(
-                    start_color="FFE6E6", end_color="FFE6E6", fill_type="solid"
-                )
-                if "WITHDRAW" in student["remarks"]:
-                    cell.font = Font(bold=True, color="FF0000")
+    sorted_values = values.loc[order].reset_index(drop=True)
+    sorted_values[serial_col] = range(1, len(order) + 1)
+    sorted_formats = block.formats.loc[order].reset_index(drop=True)
+    sorted_priority = priority.loc[order].to_numpy()
+    sorted_remarks = remarks.loc[order].to_numpy()
+
+    withdrawn_fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
+    stripe_fill = PatternFill(start_color="F8F8F8", end_color="F8F8F8", fill_type="solid")
+    withdrawn_font = Font(bold=True, color="FF0000")
+    high_gpa_font = Font(bold=True, color="006400")  # Dark green for high GPA
+    low_gpa_font = Font(bold=True, color="FF0000")  # Red for low GPA
+
+    def style_row(idx, cells):
+        # Re-apply styling based on content and student status
+        for cell in cells.values():
+            if sorted_priority[idx] == 3:  # Withdrawn
+                cell.fill = withdrawn_fill
+                if "WITHDRAW" in sorted_remarks[idx]:
+                    cell.font = withdrawn_font
             elif idx % 2 == 0:  # Alternate row coloring
-                cell.fill = PatternFill(
-                    start_color="F8F8F8", end_color="F8F8F8", fill_type="solid"
-                )
+                cell.fill = stripe_fill
 
-            # Apply GPA styling for GPA column
-            if col_idx == headers_dict.get("GPA"):
-                try:
-                    gpa_val = float(cell.value) if cell.value else 0
-                    if gpa_val >= 3.5:
-                        cell.font = Font(
-                            bold=True, color="006400"
-                        )  # Dark green for high GPA
-                    elif gpa_val < 2.0:
-                        cell.font = Font(bold=True, color="FF0000")  # Red for low GPA
-                except (ValueError, TypeError):
-                    pass
+        # Apply GPA styling for GPA column
+        cell = cells.get(gpa_col)
+        if cell is not None:
+            try:
+                gpa_val = float(cell.value) if cell.value else 0
+                if gpa_val >= 3.5:
+                    cell.font = high_gpa_font
+                elif gpa_val < 2.0:
+                    cell.font = low_gpa_font
+            except (ValueError, TypeError):
+                pass
+
+    # Write sorted data back to worksheet
+    target_rows = range(header_row + 1, header_row + 1 + len(order))
+    write_student_block(ws, target_rows, sorted_values, sorted_formats, style_row=style_row)
     print(
-        f" ✅ Applied student sorting with proper serial numbers (1 to {len(student_rows)})"
+        f" ✅ Applied student sorting with proper serial numbers (1 to {len(order)})"
     )
 
 
@@ -1908,14 +1796,6 @@ def update_cgpa_summary_sheet_fixed(wb, semester_key, header_row, set_name):
     # STEP 3: COLLECT AND POPULATE DATA WITH PROPER WITHDRAWN TRACKING
     # ===================================================================
 
-    # Collect data from all semesters using SINGLE workbook session
-    semester_keys = [
-        "ND-FIRST-YEAR-FIRST-SEMESTER",
-        "ND-FIRST-YEAR-SECOND-SEMESTER",
-        "ND-SECOND-YEAR-FIRST-SEMESTER",
-        "ND-SECOND-YEAR-SECOND-SEMESTER",
-    ]
-    
     # Map full semester names to abbreviated headings
     semester_abbreviation_map = {
         "ND-FIRST-YEAR-FIRST-SEMESTER": "Y1S1",
@@ -1924,109 +1804,14 @@ def update_cgpa_summary_sheet_fixed(wb, semester_key, header_row, set_name):
         "ND-SECOND-YEAR-SECOND-SEMESTER": "Y2S2"
     }
     
-    semester_data = {}
-
-    # Track ALL historically withdrawn students across ALL semesters - CRITICAL FIX
-    all_withdrawn_students = set()
-
-    # FIRST PASS: Identify ALL historically withdrawn students from ALL semesters
-    print(f" 🔍 FIRST PASS: Identifying ALL historically withdrawn students...")
-    for key in semester_keys:
-        sheet_name = None
-        for sheet in wb.sheetnames:
-            if key.upper() in sheet.upper():
-                sheet_name = sheet
-                break
-
-        if sheet_name and sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            header_row_found, headers_dict = find_sheet_structure(ws)
-            if not header_row_found:
-                continue
-
-            exam_col = headers_dict.get("EXAM NUMBER")
-            remarks_col = headers_dict.get("REMARKS")
-
-            if not all([exam_col, remarks_col]):
-                continue
-
-            # Collect withdrawn students from this semester
-            for row in range(header_row_found + 1, ws.max_row + 1):
-                exam_no = ws.cell(row, exam_col).value
-                if not exam_no or "SUMMARY" in str(exam_no).upper():
-                    break
-
-                exam_no_clean = str(exam_no).strip().upper()
-                remarks = ws.cell(row, remarks_col).value or ""
-                remarks_upper = str(remarks).upper()
-
-                # CRITICAL FIX: Track ALL students who were EVER withdrawn
-                if "WITHDRAW" in remarks_upper:
-                    all_withdrawn_students.add(exam_no_clean)
-                    print(
-                        f" 📝 Found historically withdrawn: {exam_no_clean} in {sheet_name}"
-                    )
-
-    print(
-        f" ✅ Identified {len(all_withdrawn_students)} historically withdrawn students"
+    # One read of each semester sheet gives both the historically withdrawn
+    # students and the semester data; withdrawn status persists across semesters
+    semester_data, all_withdrawn_students = collect_semester_records(
+        ND_PROFILE, wb, _sheet_containing, find_sheet_structure
     )
-
-    # SECOND PASS: Collect semester data with PERSISTENT withdrawn status and probation tracking
-    for key in semester_keys:
-        sheet_name = None
-        for sheet in wb.sheetnames:
-            if key.upper() in sheet.upper():
-                sheet_name = sheet
-                break
-
-        if sheet_name and sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            header_row_found, headers_dict = find_sheet_structure(ws)
-            if not header_row_found:
-                continue
-
-            exam_col = headers_dict.get("EXAM NUMBER")
-            name_col = headers_dict.get("NAME")
-            gpa_col = headers_dict.get("GPA")
-            credits_col = headers_dict.get("TCPE")
-            remarks_col = headers_dict.get("REMARKS")
-
-            if not all([exam_col, name_col, gpa_col]):
-                continue
-
-            data = {}
-            for row in range(header_row_found + 1, ws.max_row + 1):
-                exam_no_cell = ws.cell(row, exam_col).value
-                if not exam_no_cell or "SUMMARY" in str(exam_no_cell).upper():
-                    break
-
-                exam_no = str(exam_no_cell).strip().upper()
-                name = ws.cell(row, name_col).value
-                gpa_val = ws.cell(row, gpa_col).value
-                credits_val = ws.cell(row, credits_col).value if credits_col else 0
-                remarks = ws.cell(row, remarks_col).value if remarks_col else ""
-
-                # CRITICAL FIX: Check if student is historically withdrawn (PERSISTENT STATUS)
-                is_withdrawn = exam_no in all_withdrawn_students
-                
-                # Track probation status
-                is_probation = "PROBATION" in str(remarks).upper()
-
-                try:
-                    gpa = float(gpa_val) if gpa_val else 0
-                    credits = float(credits_val) if credits_val else 0
-                    data[exam_no] = {
-                        "name": name,
-                        "gpa": gpa,
-                        "credits": credits,
-                        "remarks": remarks,
-                        "withdrawn": is_withdrawn,
-                        "probation": is_probation,
-                    }
-                except (ValueError, TypeError):
-                    continue
-
-            semester_data[key] = data
+    for data in semester_data.values():
+        for record in data.values():
+            record["probation"] = "PROBATION" in str(record["remarks"]).upper()
 
     # Collect unique students
     all_exam_no = set()
@@ -2961,7 +2746,12 @@ def identify_withdrawn_students(ws, headers, header_row):
 
 
 def recalculate_all_student_records(ws, headers, header_row, course_columns, course_units_dict):
-    """Recalculate all student records with current scores."""
+    """Recalculate all student records with current scores.
+
+    The student rows are read once, every student's summary columns are
+    recomputed together (student_block.summarise_scores) and the results
+    are written back in one pass.
+    """
     exam_col = None
     for header, col_idx in headers.items():
         if "EXAM NUMBER" in header.upper():
@@ -2980,91 +2770,23 @@ def recalculate_all_student_records(ws, headers, header_row, course_columns, cou
                 summary_columns[key] = col_idx
                 break
     
-    for row_idx in range(header_row + 1, ws.max_row + 1):
-        try:
-            exam_no_cell = ws.cell(row=row_idx, column=exam_col)
-            exam_no = str(exam_no_cell.value).strip().upper() if exam_no_cell.value else None
-            
-            if not exam_no or exam_no in ["", "NAN", "NONE"]:
-                continue
-            
-            if "SUMMARY" in str(exam_no).upper():
-                break
-            
-            # Recalculate using current scores
-            failed_courses = []
-            cu_passed = 0
-            cu_failed = 0
-            total_credits = 0
-            total_grade_points = 0.0
-            total_score = 0.0
-            valid_courses = 0
-            
-            for course_code, course_col in course_columns.items():
-                score_cell = ws.cell(row=row_idx, column=course_col)
-                score_value = score_cell.value
-                
-                if score_value is not None and score_value != "":
-                    try:
-                        score = float(score_value)
-                        total_score += score
-                        valid_courses += 1
-                        
-                        credit_unit = find_credit_unit_simple(course_code, course_units_dict)
-                        total_credits += credit_unit
-                        
-                        grade_point = get_grade_point(score)
-                        total_grade_points += grade_point * credit_unit
-                        
-                        if score >= DEFAULT_PASS_THRESHOLD:
-                            cu_passed += credit_unit
-                        else:
-                            cu_failed += credit_unit
-                            failed_courses.append(course_code)
-                    except (ValueError, TypeError):
-                        continue
-            
-            # Calculate metrics
-            gpa = round(total_grade_points / total_credits, 2) if total_credits > 0 else 0.0
-            average = round(total_score / valid_courses, 2) if valid_courses > 0 else 0.0
-            
-            # Determine remarks
-            passed_percent = cu_passed / total_credits if total_credits > 0 else 0
-            if passed_percent < 0.45:
-                remarks = "WITHDRAW"
-            elif cu_failed == 0:
-                remarks = "PASSED"
-            else:
-                if gpa >= 2.0:
-                    remarks = "RESIT"
-                else:
-                    remarks = "PROBATION"
-            
-            # Update summary columns
-            if "FAILED COURSES" in summary_columns:
-                ws.cell(row=row_idx, column=summary_columns["FAILED COURSES"]).value = ", ".join(failed_courses) if failed_courses else "NONE"
-            
-            if "REMARKS" in summary_columns:
-                ws.cell(row=row_idx, column=summary_columns["REMARKS"]).value = remarks
-            
-            if "CU Passed" in summary_columns:
-                ws.cell(row=row_idx, column=summary_columns["CU Passed"]).value = cu_passed
-            
-            if "CU Failed" in summary_columns:
-                ws.cell(row=row_idx, column=summary_columns["CU Failed"]).value = cu_failed
-            
-            if "TCPE" in summary_columns:
-                ws.cell(row=row_idx, column=summary_columns["TCPE"]).value = total_credits
-            
-            if "GPA" in summary_columns:
-                ws.cell(row=row_idx, column=summary_columns["GPA"]).value = gpa
-            
-            if "AVERAGE" in summary_columns:
-                ws.cell(row=row_idx, column=summary_columns["AVERAGE"]).value = average
-            
-        except Exception as e:
-            print(f"⚠️ Error recalculating row {row_idx}: {e}")
-            continue
+    block = read_student_block(ws, header_row, exam_col, stop_at_blank=False)
+    if not block.rows:
+        return
+    
+    scores = block.values[list(course_columns.values())]
+    scores.columns = list(course_columns)
+    units = [find_credit_unit_simple(code, course_units_dict) for code in course_columns]
+    summary = summarise_scores(scores, units, GRADE_BANDS, DEFAULT_PASS_THRESHOLD)
+    
+    # Update summary columns
+    written = [key for key in summary.columns if key in summary_columns]
+    if not written:
+        return
+    updated = summary[written]
+    updated.columns = [summary_columns[key] for key in written]
+    write_student_block(ws, block.rows, updated)
+    print(f"✅ Recalculated {len(block.rows)} student records")
 
 
 def find_credit_unit_simple(course_code, units_dict):
@@ -4293,59 +4015,25 @@ def update_mastersheet_with_cumulative_updates_carryover(
         updated_zip_name = f"UPDATED_{next_version}_{os.path.basename(original_zip_path)}"
         updated_zip_path = os.path.join(clean_dir, updated_zip_name)
         
-        # Create updated ZIP
-        temp_extract_dir = tempfile.mkdtemp()
+        # Create updated ZIP: only the mastersheet is rewritten, every other
+        # member is copied from the original as it is
         try:
-            # Extract original ZIP
-            with zipfile.ZipFile(original_zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_extract_dir)
-            
-            # Replace mastersheet in extracted files
-            mastersheet_found = False
-            for root, dirs, files in os.walk(temp_extract_dir):
-                for file in files:
-                    if "mastersheet" in file.lower() and file.endswith(".xlsx"):
-                        old_mastersheet_path = os.path.join(root, file)
-                        shutil.copy2(mastersheet_path, old_mastersheet_path)
-                        mastersheet_found = True
-                        print(f"✅ Replaced mastersheet in: {old_mastersheet_path}")
-                        break
-                if mastersheet_found:
-                    break
+            replacements = {}
+            mastersheet_member = find_member(original_zip_path)
+            if mastersheet_member:
+                replacements[mastersheet_member] = mastersheet_path
+                print(f"✅ Replacing mastersheet: {mastersheet_member}")
             
-            # Create new ZIP
-            with zipfile.ZipFile(updated_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(temp_extract_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, temp_extract_dir)
-                        zipf.write(file_path, arcname)
-            
-            # Verify new ZIP
-            if os.path.exists(updated_zip_path) and os.path.getsize(updated_zip_path) > 0:
-                print(f"✅ SUCCESS: Created {updated_zip_name}")
-                print(f"📦 File size: {os.path.getsize(updated_zip_path)} bytes")
-                
-                # Test ZIP integrity
-                try:
-                    with zipfile.ZipFile(updated_zip_path, 'r') as test_zip:
-                        test_zip.testzip()
-                    print(f"✅ ZIP integrity verified")
-                except Exception as e:
-                    print(f"⚠️ ZIP integrity check warning: {e}")
-                
-                return True
-            else:
-                print(f"❌ Failed to create updated ZIP")
-                return False
+            copied, written = patch_zip(original_zip_path, replacements, updated_zip_path)
+            print(f"✅ SUCCESS: Created {updated_zip_name}")
+            print(f"📦 File size: {os.path.getsize(updated_zip_path)} bytes")
+            print(f"📦 {copied} files copied unchanged, {written} rewritten")
+            return True
                 
         except Exception as e:
             print(f"❌ Error during ZIP creation: {e}")
             traceback.print_exc()
             return False
-        finally:
-            if os.path.exists(temp_extract_dir):
-                shutil.rmtree(temp_extract_dir)
         
     except Exception as e:
         print(f"❌ Error in cumulative update: {e}")
@@ -4413,32 +4101,15 @@ def process_carryover_core(resit_file_path, mastersheet_path, semester_key, set_
         print(f"❌ No matching sheet found for {semester_key}")
         return []
     
-    # CRITICAL FIX: Find the header row in mastersheet (it's NOT at row 0)
-    mastersheet_df = None
-    mastersheet_header_idx = None
-    
-    for header_row in range(0, 15):  # Try first 15 rows
-        try:
-            temp_df = pd.read_excel(mastersheet_path, sheet_name=sheet_name, header=header_row)
-            
-            # Check if this row has EXAM NUMBER column
-            has_exam_col = any('EXAM NUMBER' in str(col).upper() for col in temp_df.columns)
-            
-            if has_exam_col:
-                mastersheet_df = temp_df
-                mastersheet_header_idx = header_row
-                print(f"✅ Found mastersheet headers at row {header_row}")
-                print(f"📊 Mastersheet columns at row {header_row}: {list(mastersheet_df.columns)}")
-                break
-            else:
-                print(f"❌ Row {header_row} doesn't have EXAM NUMBER, columns: {[str(col).upper() for col in temp_df.columns]}")
-        except Exception as e:
-            print(f"⚠️ Error reading row {header_row}: {e}")
-            continue
-    
-    if mastersheet_df is None:
+    # CRITICAL FIX: Find the header row in mastersheet (it's NOT at row 0).
+    # Only the first rows are scanned; the sheet itself is parsed once.
+    location = locate_header(sheet_head(xl, sheet_name), has_keyword("EXAM NUMBER"))
+    if location is None:
         print("❌ Could not find valid headers in mastersheet")
         return []
+    mastersheet_df = read_below_header(xl, sheet_name, location)
+    print(f"✅ Found mastersheet headers at row {location.row}")
+    print(f"📊 Mastersheet columns at row {location.row}: {list(mastersheet_df.columns)}")
     
     # Detect mastersheet headers from the found dataframe
     mastersheet_headers = {
@@ -4495,25 +4166,23 @@ def process_carryover_core(resit_file_path, mastersheet_path, semester_key, set_
     cgpa_data = load_previous_gpas_enhanced(mastersheet_path, semester_key)
     print(f"✅ Loaded previous GPA data for {len(cgpa_data)} students")
     
+    # Mastersheet rows by exam number, indexed once for all resit rows
+    student_rows = {}
+    exam_numbers = mastersheet_df[mastersheet_exam_col].astype(str).str.strip().str.upper()
+    for pos, value in enumerate(exam_numbers):
+        student_rows.setdefault(value, pos)
+    
     for idx, resit_row in resit_df.iterrows():
         exam_no = str(resit_row[resit_exam_col]).strip().upper()
         if not exam_no or exam_no in ["NAN", "NONE", ""]:
             continue
         
         # Find student in mastersheet
-        student_mask = (
-            mastersheet_df[mastersheet_exam_col]
-            .astype(str)
-            .str.strip()
-            .str.upper()
-            == exam_no
-        )
-        
-        if not student_mask.any():
+        if exam_no not in student_rows:
             print(f"⚠️ Student {exam_no} not found in mastersheet")
             continue
         
-        student_data = mastersheet_df[student_mask].iloc[0]
+        student_data = mastersheet_df.iloc[student_rows[exam_no]]
         student_name = "Unknown"
         
         if resit_headers['name_col'] and resit_headers['name_col'] in resit_row:
@@ -4670,15 +4339,17 @@ def generate_carryover_outputs(carryover_data, output_dir, semester_key, set_nam
     
     # Create ZIP with all carryover files
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add all files from the carryover output directory
-            for root, dirs, files in os.walk(output_dir):
-                for file in files:
-                    if file.startswith("CARRYOVER_") or "CARRYOVER_RECORDS" in root or "INDIVIDUAL_REPORTS" in root:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, output_dir)
-                        zipf.write(file_path, arcname)
-                        print(f"✅ Added to ZIP: {arcname}")
+        def is_carryover_output(arcname):
+            root = os.path.join(output_dir, os.path.dirname(arcname))
+            return (
+                os.path.basename(arcname).startswith("CARRYOVER_")
+                or "CARRYOVER_RECORDS" in root
+                or "INDIVIDUAL_REPORTS" in root
+            )
+        
+        # Add all carryover files from the carryover output directory
+        for arcname in write_tree(output_dir, zip_path, select=is_carryover_output):
+            print(f"✅ Added to ZIP: {arcname}")
         
         print(f"✅ Carryover ZIP created successfully: {zip_path}")
         return zip_path
@@ -5009,369 +4680,40 @@ def copy_json_to_centralized_location(json_filepath, set_name, semester_key):
         return None
 
 
-def generate_carryover_mastersheet(
-    carryover_data,
-    output_dir,
-    semester_key,
-    set_name,
-    timestamp,
-    cgpa_data,
-    course_titles,
-    course_units,
-    course_code_to_title,
-    course_code_to_unit,
-):
-    """Generate CARRYOVER_mastersheet - FIXED VERSION WITH PREVIOUS GPA DISPLAY."""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "ND_CARRYOVER_RESULTS"
-    program_name = "NATIONAL DIPLOMA"
-    program_abbr = "ND"
-    if os.path.exists(DEFAULT_LOGO_PATH):
-        try:
-            from openpyxl.drawing.image import Image
-
-            img = Image(DEFAULT_LOGO_PATH)
-            img.width = 80
-            img.height = 80
-            ws.add_image(img, "A1")
-        except Exception as e:
-            print(f"⚠️ Could not add logo: {e}")
-    current_year = 2025
-    next_year = 2026
-    year, sem_num, level, sem_display, set_code, current_semester_name = (
-        get_semester_display_info(semester_key)
-    )
-    all_courses = set()
-    for student in carryover_data:
-        all_courses.update(student["RESIT_COURSES"].keys())
-    previous_semesters = get_previous_semesters_for_display(semester_key)
-    headers = ["S/N", "EXAM NUMBER", "NAME"]
-    for prev_sem in previous_semesters:
-        headers.append(f"GPA {prev_sem}")
-    course_headers = []
-    for course in sorted(all_courses):
-        course_headers.extend([f"{course}", f"{course}_RESIT"])
-    headers.extend(course_headers)
-    headers.extend([f"GPA {current_semester_name}", "CGPA", "REMARKS"])
-    total_columns = len(headers)
-    last_column = get_column_letter(total_columns)
-    ws.merge_cells(f"A3:{last_column}3")
-    title_cell = ws["A3"]
-    title_cell.value = "FCT COLLEGE OF NURSING SCIENCES, GWAGWALADA-ABUJA"
-    title_cell.font = Font(bold=True, size=14)
-    title_cell.alignment = Alignment(horizontal="center", vertical="center")
-    ws.merge_cells(f"A4:{last_column}4")
-    subtitle_cell = ws["A4"]
-    subtitle_cell.value = f"RESIT - {current_year}/{next_year} SESSION {program_name} {level} {sem_display} EXAMINATIONS RESULT — {datetime.now().strftime('%B %d, %Y')}"
-    subtitle_cell.font = Font(bold=True, size=12)
-    subtitle_cell.alignment = Alignment(horizontal="center", vertical="center")
-    print(f"🔍 Courses found in resit data: {sorted(all_courses)}")
-    print(
-        f"📊 GPA columns for {semester_key}: Previous={previous_semesters}, Current={current_semester_name}"
+def _finish_carryover_sheet(ws, layout):
+    """ND styling of the CARRYOVER_mastersheet on top of the shared layout."""
+    heading_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    border = Border(
+        left=Side(style="thin"),
+        right=Side(style="thin"),
+        top=Side(style="thin"),
+        bottom=Side(style="thin"),
     )
-    headers = ["S/N", "EXAM NUMBER", "NAME"]
-    for prev_sem in previous_semesters:
-        headers.append(f"GPA {prev_sem}")
-    course_headers = []
-    course_title_mapping = {}
-    course_unit_mapping = {}
-    for course in sorted(all_courses):
-        course_title = find_course_title(course, course_titles, course_code_to_title)
-        course_title_mapping[course] = course_title
-
-        credit_unit = find_credit_unit(course, course_units, course_code_to_unit)
-        course_unit_mapping[course] = credit_unit
-
-        if len(course_title) > 30:
-            course_title = course_title[:27] + "..."
-        course_headers.extend([f"{course}", f"{course}_RESIT"])
-    headers.extend(course_headers)
-    headers.extend([f"GPA {current_semester_name}", "CGPA", "REMARKS"])
-    title_row = [""] * 3
-    for prev_sem in previous_semesters:
-        title_row.extend([""])
-    for course in sorted(all_courses):
-        course_title = course_title_mapping[course]
-        if len(course_title) > 30:
-            course_title = course_title[:27] + "..."
-        title_row.extend([course_title, course_title])
-    title_row.extend(["", "", ""])
-    ws.append(title_row)
-    credit_row = [""] * 3
-    for prev_sem in previous_semesters:
-        credit_row.extend([""])
-    for course in sorted(all_courses):
-        credit_unit = course_unit_mapping[course]
-        credit_row.extend([f"CU: {credit_unit}", f"CU: {credit_unit}"])
-    credit_row.extend(["", "", ""])
-    ws.append(credit_row)
-    code_row = ["S/N", "EXAM NUMBER", "NAME"]
-    for prev_sem in previous_semesters:
-        code_row.append(f"GPA {prev_sem}")
-    for course in sorted(all_courses):
-        code_row.append(f"{course}")
-        code_row.append(f"{course}_RESIT")
-    code_row.extend([f"GPA {current_semester_name}", "CGPA", "REMARKS"])
-    ws.append(code_row)
-    course_colors = [
-        "E6F3FF",
-        "FFF0E6",
-        "E6FFE6",
-        "FFF6E6",
-        "F0E6FF",
-        "E6FFFF",
-        "FFE6F2",
-        "F5F5DC",
-        "E6F7FF",
-        "FFF5E6",
-    ]
-    start_col = 4
-    if previous_semesters:
-        start_col += len(previous_semesters)
-    color_index = 0
-    for course in sorted(all_courses):
-        for row in [5, 6, 7]:
-            for offset in [0, 1]:
-                cell = ws.cell(row=row, column=start_col + offset)
-                cell.fill = PatternFill(
-                    start_color=course_colors[color_index % len(course_colors)],
-                    end_color=course_colors[color_index % len(course_colors)],
-                    fill_type="solid",
-                )
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = Border(
-                    left=Side(style="thin"),
-                    right=Side(style="thin"),
-                    top=Side(style="thin"),
-                    bottom=Side(style="thin"),
-                )
-
-        for offset in [0, 1]:
-            cell = ws.cell(row=5, column=start_col + offset)
-            cell.alignment = Alignment(
-                text_rotation=90, horizontal="center", vertical="center"
-            )
-            cell.font = Font(bold=True, size=9)
-
-        color_index += 1
-        start_col += 2
+    gpa_columns = range(4, 4 + layout.previous)
+    final_columns = range(layout.ncols - 2, layout.ncols + 1)
     for row in [5, 6, 7]:
-        for col in range(1, 4):
+        for col in [*gpa_columns, *final_columns]:
             cell = ws.cell(row=row, column=col)
-            cell.fill = PatternFill(
-                start_color="366092", end_color="366092", fill_type="solid"
-            )
+            cell.fill = heading_fill
             cell.font = Font(color="FFFFFF", bold=True)
             cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
-
-        gpa_col = 4
-        for prev_sem in previous_semesters:
-            cell = ws.cell(row=row, column=gpa_col)
-            cell.fill = PatternFill(
-                start_color="366092", end_color="366092", fill_type="solid"
-            )
-            cell.font = Font(color="FFFFFF", bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
-            gpa_col += 1
+            cell.border = border
 
-        for col in range(len(headers) - 2, len(headers) + 1):
+    # Previous GPAs in green (3.5 and above) or red (under 2.0)
+    for row in range(8, layout.end_row):
+        for col in gpa_columns:
             cell = ws.cell(row=row, column=col)
-            cell.fill = PatternFill(
-                start_color="366092", end_color="366092", fill_type="solid"
-            )
-            cell.font = Font(color="FFFFFF", bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
-    row_idx = 8
-    failed_counts = {course: 0 for course in all_courses}
-    start_col = 4
-    if previous_semesters:
-        start_col += len(previous_semesters)
-    # CRITICAL FIX: Proper serial numbers from 1 to n
-    serial_number = 1
-
-    for student in carryover_data:
-        exam_no = student["EXAM NUMBER"]
-
-        # Serial Number (PROPERLY SORTED from 1 to n)
-        ws.cell(row=row_idx, column=1, value=serial_number)
-        serial_number += 1
-
-        ws.cell(row=row_idx, column=2, value=student["EXAM NUMBER"])
-        ws.cell(row=row_idx, column=3, value=student["NAME"])
-
-        # CRITICAL FIX: Write previous GPAs using the stored semester GPAs
-        gpa_col = 4
-        for i, prev_sem in enumerate(previous_semesters):
-            gpa_key = f"GPA_Semester_{i+1}"
-            gpa_value = student.get(gpa_key, "")
-            ws.cell(row=row_idx, column=gpa_col, value=gpa_value)
-            
-            # Format GPA cell
-            if gpa_value:
-                try:
-                    gpa_val = float(gpa_value)
-                    if gpa_val >= 3.5:
-                        ws.cell(row=row_idx, column=gpa_col).font = Font(bold=True, color="006400")
-                    elif gpa_val < 2.0:
-                        ws.cell(row=row_idx, column=gpa_col).font = Font(bold=True, color="FF0000")
-                except (ValueError, TypeError):
-                    pass
-            
-            gpa_col += 1
-
-        course_col = gpa_col
-        color_index = 0
-        for course in sorted(all_courses):
-            for offset in [0, 1]:
-                cell = ws.cell(row=row_idx, column=course_col + offset)
-                cell.fill = PatternFill(
-                    start_color=course_colors[color_index % len(course_colors)],
-                    end_color=course_colors[color_index % len(course_colors)],
-                    fill_type="solid",
-                )
-
-            if course in student["RESIT_COURSES"]:
-                course_data = student["RESIT_COURSES"][course]
-
-                orig_cell = ws.cell(
-                    row=row_idx, column=course_col, value=course_data["original_score"]
-                )
-                if course_data["original_score"] < DEFAULT_PASS_THRESHOLD:
-                    orig_cell.fill = PatternFill(
-                        start_color="FFB6C1", end_color="FFB6C1", fill_type="solid"
-                    )
-
-                resit_cell = ws.cell(
-                    row=row_idx, column=course_col + 1, value=course_data["resit_score"]
-                )
-                if course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD:
-                    resit_cell.fill = PatternFill(
-                        start_color="90EE90", end_color="90EE90", fill_type="solid"
-                    )
-                else:
-                    resit_cell.fill = PatternFill(
-                        start_color="FFD580", end_color="FFD580", fill_type="solid"
-                    )
-                    failed_counts[course] += 1
-            else:
-                ws.cell(row=row_idx, column=course_col, value="")
-                ws.cell(row=row_idx, column=course_col + 1, value="")
-
-            color_index += 1
-            course_col += 2
-
-        ws.cell(row=row_idx, column=course_col, value=student["CURRENT_GPA"])
-        ws.cell(row=row_idx, column=course_col + 1, value=student["CURRENT_CGPA"])
-
-        remarks = generate_remarks(student["RESIT_COURSES"])
-        ws.cell(row=row_idx, column=course_col + 2, value=remarks)
+            if not cell.value:
+                continue
+            try:
+                gpa_val = float(cell.value)
+            except (ValueError, TypeError):
+                continue
+            if gpa_val >= 3.5:
+                cell.font = Font(bold=True, color="006400")
+            elif gpa_val < 2.0:
+                cell.font = Font(bold=True, color="FF0000")
 
-        row_idx += 1
-    failed_row_idx = row_idx
-    ws.cell(row=failed_row_idx, column=1, value="FAILED COUNT BY COURSE:").font = Font(
-        bold=True
-    )
-    for col in range(1, len(headers) + 1):
-        cell = ws.cell(row=failed_row_idx, column=col)
-        cell.fill = PatternFill(
-            start_color="FFFF99", end_color="FFFF99", fill_type="solid"
-        )
-    course_col = gpa_col
-    for course in sorted(all_courses):
-        count_cell = ws.cell(
-            row=failed_row_idx, column=course_col + 1, value=failed_counts[course]
-        )
-        count_cell.font = Font(bold=True)
-        count_cell.fill = PatternFill(
-            start_color="FFFF99", end_color="FFFF99", fill_type="solid"
-        )
-        course_col += 2
-    summary_start_row = failed_row_idx + 2
-    total_students = len(carryover_data)
-    passed_all = sum(
-        1
-        for student in carryover_data
-        if all(
-            course_data["resit_score"] >= DEFAULT_PASS_THRESHOLD
-            for course_data in student["RESIT_COURSES"].values()
-        )
-    )
-    carryover_count = total_students - passed_all
-    total_failed_attempts = sum(failed_counts.values())
-    summary_data = [
-        ["CARRYOVER SUMMARY"],
-        [
-            f"A total of {total_students} students registered and sat for the Carryover Examination"
-        ],
-        [f"A total of {passed_all} students passed all carryover courses"],
-        [
-            f"A total of {carryover_count} students failed one or more carryover courses and must repeat them"
-        ],
-        [f"Total failed resit attempts: {total_failed_attempts} across all courses"],
-        [
-            f"Carryover processing completed on {datetime.now().strftime('%B %d, %Y at %H:%M:%S')}"
-        ],
-        [""],
-        [""],
-        ["", ""],
-        ["________________________", "________________________"],
-        ["Mrs. Abini Hauwa", "Mrs. Olukemi Ogunleye"],
-        ["Head of Exams", "Chairman, ND Program C'tee"],
-    ]
-    for i, row_data in enumerate(summary_data):
-        row_num = summary_start_row + i
-        if len(row_data) == 1:
-            if row_data[0]:
-                ws.merge_cells(
-                    start_row=row_num, start_column=1, end_row=row_num, end_column=10
-                )
-                cell = ws.cell(row=row_num, column=1, value=row_data[0])
-                if i == 0:
-                    cell.font = Font(bold=True, size=12, underline="single")
-                else:
-                    cell.font = Font(bold=False, size=11)
-                cell.alignment = Alignment(horizontal="left", vertical="center")
-        elif len(row_data) == 2:
-            left_cell = ws.cell(row=row_num, column=1, value=row_data[0])
-            right_cell = ws.cell(row=row_num, column=4, value=row_data[1])
-
-            if i >= len(summary_data) - 3:
-                left_cell.alignment = Alignment(horizontal="left")
-                right_cell.alignment = Alignment(horizontal="left")
-                left_cell.font = Font(bold=True, size=11)
-                right_cell.font = Font(bold=True, size=11)
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-    for row in ws.iter_rows(
-        min_row=7, max_row=row_idx - 1, min_col=1, max_col=len(headers)
-    ):
-        for cell in row:
-            cell.border = thin_border
-    ws.freeze_panes = "D8"
     for row in ws.iter_rows():
         for cell in row:
             if cell.font is None or not cell.font.bold:
@@ -5407,15 +4749,15 @@ def generate_carryover_mastersheet(
             adjusted_width = 18
         elif col_idx == 3:
             adjusted_width = 35
-        elif col_idx >= 4 and col_idx <= (4 + len(previous_semesters) - 1):
+        elif col_idx >= 4 and col_idx <= (4 + layout.previous - 1):
             adjusted_width = 15
-        elif col_idx >= len(headers) - 2:
+        elif col_idx >= layout.ncols - 2:
             adjusted_width = 15
         else:
             adjusted_width = min(max(adjusted_width, 12), 25)
 
         ws.column_dimensions[column_letter].width = adjusted_width
-    for row_idx in range(8, row_idx):
+    for row_idx in range(8, layout.end_row):
         if row_idx % 2 == 0:
             for cell in ws[row_idx]:
                 if (
@@ -5426,26 +4768,47 @@ def generate_carryover_mastersheet(
                         start_color="F8F8F8", end_color="F8F8F8", fill_type="solid"
                     )
     gpa_fill = PatternFill(start_color="E6E6FA", end_color="E6E6FA", fill_type="solid")
-    if previous_semesters:
-        for row in range(8, row_idx):
-            for col in range(4, 4 + len(previous_semesters)):
-                cell = ws.cell(row=row, column=col)
-                if cell.fill.start_color.index == "00000000":
-                    cell.fill = gpa_fill
+    for row in range(8, layout.end_row):
+        for col in gpa_columns:
+            cell = ws.cell(row=row, column=col)
+            if cell.fill.start_color.index == "00000000":
+                cell.fill = gpa_fill
     final_gpa_fill = PatternFill(
         start_color="E0FFFF", end_color="E0FFFF", fill_type="solid"
     )
-    for row in range(8, row_idx):
-        for col in range(len(headers) - 2, len(headers) + 1):
+    for row in range(8, layout.end_row):
+        for col in final_columns:
             cell = ws.cell(row=row, column=col)
             if cell.fill.start_color.index == "00000000":
                 cell.fill = final_gpa_fill
-    filename = f"CARRYOVER_mastersheet_{timestamp}.xlsx"
-    filepath = os.path.join(output_dir, filename)
-    wb.save(filepath)
-    wb.close()  # ✅ CRITICAL: Properly close the workbook
-    print(f"✅ CARRYOVER mastersheet generated: {filepath}")
-    return filepath
+
+
+def generate_carryover_mastersheet(
+    carryover_data,
+    output_dir,
+    semester_key,
+    set_name,
+    timestamp,
+    cgpa_data,
+    course_titles,
+    course_units,
+    course_code_to_title,
+    course_code_to_unit,
+):
+    """Generate CARRYOVER_mastersheet - FIXED VERSION WITH PREVIOUS GPA DISPLAY."""
+    courses = carryover_courses(carryover_data)
+    return engine_carryover_mastersheet(
+        ND_PROFILE,
+        carryover_data,
+        output_dir,
+        semester_key,
+        timestamp,
+        get_semester_display_info(semester_key),
+        get_previous_semesters_for_display(semester_key),
+        {course: find_course_title(course, course_titles, course_code_to_title) for course in courses},
+        {course: find_credit_unit(course, course_units, course_code_to_unit) for course in courses},
+        finish=_finish_carryover_sheet,
+    )
 
 
 def generate_individual_reports(
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+pdf_shards.py
+
+Sharded, multi-process rendering of the per-student result PDFs.
+
+The ND, BN and BM processors lay out one page per student. Building the
+flowables is cheap; ReportLab's doc.build() (wrapping, splitting, drawing and
+compressing every page) is what takes the time, and it runs on one core.
+build_student_pdf takes the flowables grouped per student, splits the cohort
+into shards of PDF_SHARD_SIZE students, renders each shard in a
+ProcessPoolExecutor worker and stitches the shard files into the combined
+PDF with merge_pdfs. Objects that come out identical once renumbered - the
+logo image with its soft mask, the fonts - are stored once in the merged
+file, so it is about the size of a single-process build.
+
+Set PDF_WORKERS to cap the worker count (default: the CPUs available to this
+process; 1 renders in-process exactly as before) and STUDENT_PDFS=1 to also
+write one PDF per student next to the combined file. Any failure in the
+parallel path - including a merged file whose page count differs from its
+shards - is logged as a warning and falls back to a single in-process build.
+
+Inside ``with deferred_rendering(pipeline):`` the shards are queued as
+parallel stages of a stage_pipeline.StagePipeline instead, so a semester's
+PDF renders while the next semester is being scored; the merge runs as a
+main-process stage once its shards are done.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from env_flags import env_flag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_SIZE = 25
+
+# StagePipeline that build_student_pdf queues its renders on, if any
+_DEFER_TO = None
+
+
+def _env_int(name, default):
+    try:
+        return max(1, int(os.getenv(name, "")))
+    except ValueError:
+        return default
+
+
+def available_cpus():
+    """CPUs this process may run on (container limits included where visible)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def pdf_workers():
+    """Worker processes for PDF rendering: PDF_WORKERS or the available CPUs."""
+    return _env_int("PDF_WORKERS", available_cpus())
+
+
+def shard_size():
+    """Students per shard: PDF_SHARD_SIZE or DEFAULT_SHARD_SIZE."""
+    return _env_int("PDF_SHARD_SIZE", DEFAULT_SHARD_SIZE)
+
+
+def per_student_enabled():
+    """Also write one PDF per student when STUDENT_PDFS is set to a true value."""
+    return env_flag("STUDENT_PDFS")
+
+
+def _join_pages(student_pages):
+    from reportlab.platypus import PageBreak
+
+    elems = []
+    for i, (_, student_elems) in enumerate(student_pages):
+        if i:
+            elems.append(PageBreak())
+        elems.extend(student_elems)
+    return elems
+
+
+def render_pdf(out_pdf_path, student_pages, doc_kwargs):
+    """Build one PDF holding ``student_pages`` ([(label, flowables), ...]) in order."""
+    from reportlab.platypus import SimpleDocTemplate
+
+    doc = SimpleDocTemplate(out_pdf_path, **doc_kwargs)
+    doc.build(_join_pages(student_pages))
+    return out_pdf_path
+
+
+def _render_each(out_dir, student_pages, doc_kwargs):
+    """Worker job: one PDF per student, named after the student's label."""
+    written = []
+    for label, student_elems in student_pages:
+        path = os.path.join(out_dir, f"{label}.pdf")
+        render_pdf(path, [(label, student_elems)], doc_kwargs)
+        written.append(path)
+    return written
+
+
+def _safe_label(label, used):
+    base = re.sub(r"[^\w\-]", "_", str(label)).strip("_") or "student"
+    name, n = base, 2
+    while name in used:
+        name = f"{base}_{n}"
+        n += 1
+    used.add(name)
+    return name
+
+
+@contextmanager
+def deferred_rendering(pipeline):
+    """Queue build_student_pdf's rendering on ``pipeline`` while the block runs."""
+    global _DEFER_TO
+    previous, _DEFER_TO = _DEFER_TO, pipeline
+    try:
+        yield pipeline
+    finally:
+        _DEFER_TO = previous
+
+
+def build_student_pdf(
+    student_pages, out_pdf_path, doc_kwargs, workers=None, per_student_dir=None
+):
+    """
+    Render ``student_pages`` - [(label, flowables), ...], one entry per student -
+    into ``out_pdf_path``, one student per page group.
+
+    With more than one worker and more than one shard the shards are built
+    in parallel and merged; otherwise the PDF is built in-process. When
+    ``per_student_dir`` is given (or STUDENT_PDFS is on, using
+    "<combined name>_students"), each student is also written to
+    ``per_student_dir/<label>.pdf``. Returns the number of shards rendered
+    (or queued, under deferred_rendering).
+    """
+    if per_student_dir is None and per_student_enabled():
+        per_student_dir = os.path.splitext(out_pdf_path)[0] + "_students"
+
+    size = shard_size()
+    shards = [student_pages[i : i + size] for i in range(0, len(student_pages), size)]
+    workers = min(workers or pdf_workers(), max(len(shards), 1))
+
+    if per_student_dir:
+        used = set()
+        labelled = [(_safe_label(label, used), elems) for label, elems in student_pages]
+        os.makedirs(per_student_dir, exist_ok=True)
+        per_student_jobs = [labelled[i : i + size] for i in range(0, len(labelled), size)]
+    else:
+        per_student_jobs = []
+
+    if shards and _DEFER_TO is not None and _DEFER_TO.parallel:
+        try:
+            _queue_build(
+                _DEFER_TO, shards, out_pdf_path, doc_kwargs, per_student_dir, per_student_jobs
+            )
+            return len(shards)
+        except Exception:
+            logger.warning(
+                "Could not queue %s on the pipeline; building it in-process",
+                out_pdf_path,
+                exc_info=True,
+            )
+    elif workers > 1 and (len(shards) > 1 or per_student_jobs):
+        try:
+            _build_parallel(
+                shards, out_pdf_path, doc_kwargs, workers, per_student_dir, per_student_jobs
+            )
+            return len(shards)
+        except Exception:
+            # Unpicklable flowable, broken pool, unexpected shard layout:
+            # the in-process build below gives the same pages.
+            logger.warning(
+                "Parallel build of %s failed; building it in-process",
+                out_pdf_path,
+                exc_info=True,
+            )
+
+    _build_in_process(student_pages, out_pdf_path, doc_kwargs, per_student_dir, per_student_jobs)
+    return 1
+
+
+def _build_in_process(student_pages, out_pdf_path, doc_kwargs, per_student_dir, per_student_jobs):
+    # doc.build() splits and marks the flowables it lays out, so the
+    # per-student files get their own copies
+    per_student_jobs = [pickle.loads(pickle.dumps(job)) for job in per_student_jobs]
+    render_pdf(out_pdf_path, student_pages, doc_kwargs)
+    for job in per_student_jobs:
+        _render_each(per_student_dir, job, doc_kwargs)
+
+
+def _build_parallel(shards, out_pdf_path, doc_kwargs, workers, per_student_dir, per_student_jobs):
+    tmp_dir = tempfile.mkdtemp(
+        prefix=".pdf_shards_", dir=os.path.dirname(os.path.abspath(out_pdf_path))
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shard_jobs = [
+                pool.submit(
+                    render_pdf, os.path.join(tmp_dir, f"shard_{i:05d}.pdf"), shard, doc_kwargs
+                )
+                for i, shard in enumerate(shards)
+            ]
+            each_jobs = [
+                pool.submit(_render_each, per_student_dir, job, doc_kwargs)
+                for job in per_student_jobs
+            ]
+            parts = [job.result() for job in shard_jobs]
+            for job in each_jobs:
+                job.result()
+        if len(parts) == 1:
+            shutil.move(parts[0], out_pdf_path)
+        else:
+            merge_pdfs(parts, out_pdf_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _queue_build(pipeline, shards, out_pdf_path, doc_kwargs, per_student_dir, per_student_jobs):
+    # Taken now so a failed shard can still be rendered in-process later
+    snapshot = pickle.dumps((shards, per_student_jobs))
+    tmp_dir = tempfile.mkdtemp(
+        prefix=".pdf_shards_", dir=os.path.dirname(os.path.abspath(out_pdf_path))
+    )
+    stage = f"pdf:{os.path.abspath(out_pdf_path)}"
+    parts = []
+    names = []
+    try:
+        for i, shard in enumerate(shards):
+            part = os.path.join(tmp_dir, f"shard_{i:05d}.pdf")
+            parts.append(part)
+            names.append(
+                pipeline.add(f"{stage}:shard{i}", render_pdf, part, shard, doc_kwargs, parallel=True)
+            )
+        for i, job in enumerate(per_student_jobs):
+            names.append(
+                pipeline.add(
+                    f"{stage}:students{i}",
+                    _render_each,
+                    per_student_dir,
+                    job,
+                    doc_kwargs,
+                    parallel=True,
+                )
+            )
+        pipeline.add(
+            stage,
+            _finish_queued,
+            pipeline,
+            names,
+            parts,
+            tmp_dir,
+            out_pdf_path,
+            doc_kwargs,
+            per_student_dir,
+            snapshot,
+            after=names,
+        )
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _finish_queued(
+    pipeline, names, parts, tmp_dir, out_pdf_path, doc_kwargs, per_student_dir, snapshot
+):
+    """Main-process stage: merge the rendered shards, or build in-process if any failed."""
+    try:
+        if pipeline.failed(names):
+            logger.warning("Shards of %s failed; building it in-process", out_pdf_path)
+        else:
+            try:
+                if len(parts) == 1:
+                    shutil.move(parts[0], out_pdf_path)
+                else:
+                    merge_pdfs(parts, out_pdf_path)
+                return out_pdf_path
+            except Exception:
+                logger.warning(
+                    "Merging the shards of %s failed; building it in-process",
+                    out_pdf_path,
+                    exc_info=True,
+                )
+        shards, per_student_jobs = pickle.loads(snapshot)
+        # The per-student files were written by their own stages unless those failed
+        if not pipeline.failed(names):
+            per_student_jobs = []
+        _build_in_process(
+            [page for shard in shards for page in shard],
+            out_pdf_path,
+            doc_kwargs,
+            per_student_dir,
+            per_student_jobs,
+        )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return out_pdf_path
+
+
+# ----------------------------
+# Merging ReportLab output
+# ----------------------------
+# merge_pdfs is a regex-level merger, not a general PDF parser. It relies on
+# what ReportLab (4.2.2, as pinned in requirements.txt) writes: a classic
+# uncompressed xref table with a single subsection, no object streams or
+# cross-reference streams, no incremental updates, "N 0 obj" headers exactly
+# at their xref offsets, and a flat page tree under the catalog. _read_pdf
+# raises ValueError on anything else, and the merged file's page count is
+# checked against the shards, so a changed writer falls back to the
+# single-process build instead of producing a broken PDF.
+
+_REF = re.compile(rb"(\d+) 0 R")
+_OBJ_HEADER = re.compile(rb"\s*(\d+) 0 obj\s*")
+_PAGE_TYPE = re.compile(rb"/Type /Page\b(?!s)")
+
+
+def _read_pdf(path):
+    """
+    Split a ReportLab-written PDF (classic xref table, flat page tree) into
+    {object number: body bytes}, its root, info and page object numbers.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    startxref = int(data[data.rindex(b"startxref") + 9 :].split()[0])
+    xref = data[startxref:]
+    if not xref.startswith(b"xref"):
+        raise ValueError(f"{path}: unsupported cross-reference format")
+    lines = xref.split(b"\n")
+    first, count = (int(x) for x in lines[1].split())
+    offsets = {}
+    for i in range(count):
+        fields = lines[2 + i].split()
+        if fields[2] == b"n":
+            offsets[first + i] = int(fields[0])
+
+    trailer = xref[xref.index(b"trailer") :]
+    root = int(re.search(rb"/Root (\d+) 0 R", trailer).group(1))
+    info_match = re.search(rb"/Info (\d+) 0 R", trailer)
+    info = int(info_match.group(1)) if info_match else None
+
+    bounds = sorted(offsets.values()) + [startxref]
+    ends = dict(zip(bounds, bounds[1:]))
+    objects = {}
+    for num, start in offsets.items():
+        chunk = data[start : ends[start]]
+        header = _OBJ_HEADER.match(chunk)
+        if header is None or int(header.group(1)) != num:
+            raise ValueError(f"{path}: object {num} not at its xref offset")
+        body = chunk[header.end() :].rstrip()
+        if not body.endswith(b"endobj"):
+            raise ValueError(f"{path}: object {num} is not terminated")
+        objects[num] = body[: -len(b"endobj")].rstrip()
+
+    pages_ref = re.search(rb"/Pages (\d+) 0 R", objects[root]).group(1)
+    pages_root = int(pages_ref)
+    kids = re.search(rb"/Kids \[([^\]]*)\]", objects[pages_root]).group(1)
+    page_nums = [int(n) for n in _REF.findall(kids)]
+    for num in page_nums:
+        if not _PAGE_TYPE.search(objects[num]):
+            raise ValueError(f"{path}: nested page trees are not supported")
+    return objects, root, pages_root, info, page_nums
+
+
+def _split_stream(body):
+    """(dictionary part, stream part) - references only live in the former."""
+    at = body.find(b">>\nstream")
+    if at == -1:
+        return body, b""
+    return body[: at + 2], body[at + 2 :]
+
+
+def merge_pdfs(paths, out_pdf_path):
+    """
+    Concatenate the pages of ReportLab-written PDFs ``paths`` into one file.
+
+    Raises ValueError, leaving ``out_pdf_path`` untouched, if the merged file
+    does not read back with as many pages as the inputs hold together.
+    """
+    CATALOG, PAGES = 1, 2
+    out_objects = {}
+    page_refs = []
+    by_content = {}
+    next_num = 3
+    info_num = None
+
+    for path in paths:
+        objects, root, pages_root, info, page_nums = _read_pdf(path)
+        mapping = {root: CATALOG, pages_root: PAGES}
+
+        def renumber(body):
+            head, stream = _split_stream(body)
+            head = _REF.sub(lambda m: b"%d 0 R" % mapping[int(m.group(1))], head)
+            return head + stream
+
+        # Leaves first: an object is numbered once everything it refers to
+        # is, so its renumbered body is final and identical copies from
+        # other shards (the logo image together with its /SMask, the fonts)
+        # collapse to one object. Pages are never shared.
+        refs = {
+            num: {int(n) for n in _REF.findall(_split_stream(body)[0])}
+            for num, body in objects.items()
+        }
+        pages = set(page_nums)
+        unresolved = sorted(set(objects) - set(mapping))
+        while unresolved:
+            waiting = []
+            for num in unresolved:
+                if not refs[num] <= mapping.keys():
+                    waiting.append(num)
+                    continue
+                body = renumber(objects[num])
+                if num not in pages:
+                    digest = hashlib.sha256(body).digest()
+                    if digest in by_content:
+                        mapping[num] = by_content[digest]
+                        continue
+                    by_content[digest] = next_num
+                mapping[num] = next_num
+                out_objects[next_num] = body
+                next_num += 1
+            if len(waiting) == len(unresolved):
+                # Reference cycles (outline entries, say) are copied as they are
+                for num in waiting:
+                    mapping[num] = next_num
+                    next_num += 1
+                for num in waiting:
+                    out_objects[mapping[num]] = renumber(objects[num])
+                break
+            unresolved = waiting
+        page_refs.extend(mapping[n] for n in page_nums)
+        if info_num is None and info is not None:
+            info_num = mapping[info]
+
+    out_objects[CATALOG] = b"<<\n/PageMode /UseNone /Pages 2 0 R /Type /Catalog\n>>"
+    kids = b" ".join(b"%d 0 R" % n for n in page_refs)
+    out_objects[PAGES] = b"<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>" % (len(page_refs), kids)
+
+    size = max(out_objects) + 1
+    tmp = f"{out_pdf_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"%PDF-1.4\n%\x93\x8c\x8b\x9e ReportLab Generated PDF document\n")
+        offsets = {}
+        for num in range(1, size):
+            body = out_objects.get(num)
+            if body is None:
+                continue
+            offsets[num] = f.tell()
+            f.write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+        xref_at = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for num in range(1, size):
+            if num in offsets:
+                f.write(b"%010d 00000 n \n" % offsets[num])
+            else:
+                f.write(b"0000000000 65535 f \n")
+        trailer = b"/Root 1 0 R /Size %d" % size
+        if info_num is not None:
+            trailer += b" /Info %d 0 R" % info_num
+        f.write(b"trailer\n<<\n" + trailer + b"\n>>\nstartxref\n%d\n%%%%EOF\n" % xref_at)
+    try:
+        merged_pages = len(_read_pdf(tmp)[4])
+        if merged_pages != len(page_refs):
+            raise ValueError(
+                f"{out_pdf_path}: merged {merged_pages} pages, shards hold {len(page_refs)}"
+            )
+    except Exception:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, out_pdf_path)
+    return out_pdf_path
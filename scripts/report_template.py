@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+report_template.py
+
+Shared ReportLab styles and letterhead for the per-student result PDFs.
+
+The ND, BN and BM report builders used to create their ParagraphStyles on
+every call, and for every student rebuilt the logo Image, the college
+header table and the title paragraphs. Those pieces never change within a
+PDF. The styles below are built once, at import. Letterhead lays out the
+static header flowables once and draws them as a PDF Form XObject: the
+first page of a document defines the form and every later page only
+references it. Rendering work per student shrinks to the variable tables,
+and the PDF holds one copy of the header drawing instead of one per page.
+"""
+
+import copy
+import io
+import itertools
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Flowable, Frame
+
+# ----------------------------
+# Paragraph styles (shared by ND, BN and BM)
+# ----------------------------
+
+SAMPLE_STYLES = getSampleStyleSheet()
+
+HEADER_STYLE = ParagraphStyle(
+    "CustomHeader",
+    parent=SAMPLE_STYLES["Normal"],
+    fontSize=10,
+    alignment=TA_CENTER,
+    spaceAfter=2,
+)
+MAIN_HEADER_STYLE = ParagraphStyle(
+    "MainHeader",
+    parent=SAMPLE_STYLES["Normal"],
+    fontSize=16,
+    alignment=TA_CENTER,
+    fontName="Helvetica-Bold",
+    spaceAfter=6,
+    textColor=colors.HexColor("#800080"),
+)
+TITLE_STYLE = ParagraphStyle(
+    "CustomTitle",
+    parent=SAMPLE_STYLES["Normal"],
+    fontSize=12,
+    alignment=TA_CENTER,
+    fontName="Helvetica-Bold",
+    spaceAfter=4,
+)
+SUBTITLE_STYLE = ParagraphStyle(
+    "SubtitleStyle",
+    parent=SAMPLE_STYLES["Normal"],
+    fontSize=10,
+    alignment=TA_CENTER,
+    spaceAfter=10,
+    textColor=colors.red,
+)
+# Left alignment style for course code and title
+LEFT_ALIGN_STYLE = ParagraphStyle(
+    "LeftAlign",
+    parent=SAMPLE_STYLES["Normal"],
+    fontSize=9,
+    alignment=TA_LEFT,
+    leftIndent=4,
+)
+CENTER_ALIGN_STYLE = ParagraphStyle(
+    "CenterAlign", parent=SAMPLE_STYLES["Normal"], fontSize=9, alignment=TA_CENTER
+)
+# Style for remarks with smaller font
+REMARKS_STYLE = ParagraphStyle(
+    "RemarksStyle", parent=SAMPLE_STYLES["Normal"], fontSize=8, alignment=TA_LEFT
+)
+SIGNATURE_STYLE = ParagraphStyle(
+    "SigStyle", parent=SAMPLE_STYLES["Normal"], fontSize=10, alignment=TA_CENTER
+)
+
+# ----------------------------
+# Letterhead drawn from a Form XObject
+# ----------------------------
+
+_FORM_IDS = itertools.count(1)
+
+
+class Letterhead(Flowable):
+    """
+    A fixed run of flowables (logo table, college name, address, titles)
+    placed as one block. It takes exactly the space the flowables would take
+    at the top of a page, so the rest of the page lays out unchanged.
+    """
+
+    # Height of the scratch frame the block is laid out in
+    _LAYOUT_HEIGHT = 10000
+
+    def __init__(self, flowables):
+        Flowable.__init__(self)
+        self._flowables = list(flowables)
+        self.form_name = f"Letterhead{next(_FORM_IDS)}"
+        self._laid_out_width = None
+        self.height = 0
+
+    def _lay_out(self, canv, width):
+        """Draw copies of the flowables top-down from y=0; return the height used."""
+        frame = Frame(
+            0,
+            -self._LAYOUT_HEIGHT,
+            width,
+            self._LAYOUT_HEIGHT,
+            leftPadding=0,
+            bottomPadding=0,
+            rightPadding=0,
+            topPadding=0,
+        )
+        # Laying out marks and splits flowables, so always work on copies
+        for flowable in copy.deepcopy(self._flowables):
+            if not frame.add(flowable, canv):
+                raise ValueError("letterhead does not fit on a page")
+        return -frame._y
+
+    def wrap(self, availWidth, availHeight):
+        if self._laid_out_width != availWidth:
+            self.height = self._lay_out(Canvas(io.BytesIO()), availWidth)
+            self._laid_out_width = availWidth
+        self.width = availWidth
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        return []
+
+    def draw(self):
+        canv = self.canv
+        if not canv.hasForm(self.form_name):
+            canv.beginForm(
+                self.form_name,
+                lowerx=-self.width,
+                lowery=-2 * self.height,
+                upperx=2 * self.width,
+                uppery=self.height,
+            )
+            self._lay_out(canv, self.width)
+            canv.endForm()
+        canv.saveState()
+        canv.translate(0, self.height)
+        canv.doForm(self.form_name)
+        canv.restoreState()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+resit_index.py
+
+Exam-number and course-code indexes over a mastersheet, built once per sheet
+and used by the carryover processors to apply resit scores.
+
+Resit processing looked every resit student up again: BN and BM's
+find_student_in_mastersheet_fixed walked the mastersheet with iterrows up to
+three times per student (exact, partial, then prefix-stripped match), and
+each resit course was matched to a mastersheet column by scanning the
+headings or trying code variants one after another. build_student_index and
+build_course_index do that work once; a lookup is then a dictionary hit,
+and only an exam number with no exact match falls back to the partial-match
+scan.
+
+Exam numbers and course codes are compared by their key: upper-cased, with
+everything but letters and digits removed, so "FCTCONS/BN24/001" and
+"fctcons bn24 001", or "NUR 101" and "nur-101", are the same.
+"""
+
+import re
+from collections import namedtuple
+
+# Cell texts that hold no exam number
+BLANK_VALUES = frozenset(("", "NAN", "NONE"))
+
+
+def code_key(value):
+    """Upper-cased text of ``value`` with everything but letters and digits removed."""
+    return re.sub(r"[^A-Z0-9]", "", str(value).strip().upper())
+
+
+# exact:    {exam number key: position}, the first row with each key
+# keys:     (exam number key, position) pairs in row order, for partial matches
+# prefixed: {upper-cased exam number without its programme prefix: position}
+# prefix:   compiled pattern of the programme prefix
+StudentIndex = namedtuple("StudentIndex", ["exact", "keys", "prefixed", "prefix"])
+
+
+def build_student_index(exam_numbers, prefix=None):
+    """
+    Index the exam numbers of a sheet, given in row order; a row's position
+    is its place in ``exam_numbers``. Blank cells are left out. ``prefix``
+    is a regular expression for the programme prefix (such as
+    ``^(BN|NUR|NSC)``) ignored by the last-resort match.
+    """
+    prefix = re.compile(prefix) if prefix else None
+    exact = {}
+    prefixed = {}
+    for pos, value in enumerate(exam_numbers):
+        if value is None or value != value:  # missing or NaN
+            continue
+        text = str(value).strip().upper()
+        key = code_key(text)
+        if text in BLANK_VALUES or not key:
+            continue
+        exact.setdefault(key, pos)
+        if prefix is not None:
+            prefixed.setdefault(prefix.sub("", text), pos)
+    keys = sorted(((key, pos) for key, pos in exact.items()), key=lambda item: item[1])
+    return StudentIndex(exact, keys, prefixed, prefix)
+
+
+def find_student(index, exam_no):
+    """
+    Position of ``exam_no`` in the indexed sheet, or None.
+
+    Tries an exact key match, then the first row whose key contains or is
+    contained in the exam number's, then a match with the programme prefix
+    removed from both.
+    """
+    key = code_key(exam_no)
+    if not key:
+        return None
+    pos = index.exact.get(key)
+    if pos is not None:
+        return pos
+    for row_key, pos in index.keys:
+        if key in row_key or row_key in key:
+            return pos
+    if index.prefix is not None:
+        return index.prefixed.get(index.prefix.sub("", key))
+    return None
+
+
+def build_course_index(headings, variants=None):
+    """
+    {course key: column} for ``headings``, a {heading: column} mapping or an
+    iterable of headings (each its own column), in sheet order.
+
+    Every heading's own key comes first. Keys of the variants
+    ``variants(heading)`` generates (a code with or without its programme
+    prefix, say) are added after them, except where two columns would share
+    a variant, so an ambiguous code matches no column rather than the wrong
+    one.
+    """
+    if not isinstance(headings, dict):
+        headings = {heading: heading for heading in headings}
+    columns = {}
+    for heading, column in headings.items():
+        key = code_key(heading)
+        if key:
+            columns.setdefault(key, column)
+    if variants is None:
+        return columns
+
+    expanded = {}
+    for heading, column in headings.items():
+        for variant in variants(heading):
+            key = code_key(variant)
+            if key and key not in columns:
+                expanded.setdefault(key, set()).add(column)
+    for key, found in expanded.items():
+        if len(found) == 1:
+            columns[key] = found.pop()
+    return columns
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+run_log.py
+
+Log levels and a JSON progress-event stream for the ND, BN and BM
+processors.
+
+The processors used to print (ND) or log at INFO (BN, BM) a line for every
+student, matched header and sheet column, and the launcher captured the
+whole of it through subprocess.run and re-logged it line by line, so console
+I/O and the launcher's captured output grew with the cohort. Per-student and
+per-column detail is now logged at DEBUG, and progress is reported as a few
+aggregate events per semester and set through log_event.
+
+RESULT_LOG_LEVEL sets the level (DEBUG, INFO, WARNING or ERROR). With
+RESULT_EVENTS=1, as the launcher sets it, every event is also written to
+stdout as one JSON object per line and the level defaults to WARNING, so a
+web run only carries the events, warnings and errors; a console run defaults
+to INFO.
+"""
+
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+from env_flags import env_flag
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# Prefix of an event line on stdout, so readers can tell events from other output
+EVENT_PREFIX = "@event "
+
+
+def events_enabled():
+    """Events go to stdout when RESULT_EVENTS is set to a true value."""
+    return env_flag("RESULT_EVENTS")
+
+
+def log_level():
+    """The configured level; defaults to WARNING with events on, INFO otherwise."""
+    level = os.getenv("RESULT_LOG_LEVEL", "").strip().upper()
+    if level not in LEVELS:
+        level = "WARNING" if events_enabled() else "INFO"
+    return getattr(logging, level)
+
+
+def configure_logging():
+    """Log to stderr at log_level() in the processors' shared format."""
+    logging.basicConfig(level=log_level(), format=LOG_FORMAT)
+
+
+def log_event(logger, event, message=None, **fields):
+    """
+    Report a progress event.
+
+    ``message`` (default: the event name and fields) is logged at INFO; with
+    events enabled the event is also written to stdout, whatever the level,
+    as ``@event {"event": ..., "time": ..., **fields}``.
+    """
+    if message is None:
+        message = f"{event}: " + ", ".join(f"{key}={value}" for key, value in fields.items())
+    logger.info(message)
+    if events_enabled():
+        record = {"event": event, "time": datetime.now().isoformat(timespec="seconds")}
+        record.update(fields)
+        sys.stdout.write(EVENT_PREFIX + json.dumps(record, default=str) + "\n")
+        sys.stdout.flush()
+
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+score_engine.py
+
+Columnar course-score engine shared by the ND, BN and BM regular processors.
+The CA/OBJ/EXAM components of every course are read into matrices once and
+the 20/80 normalisation, the per-component caps and the NOT REG masking are
+applied as whole-array NumPy operations instead of per-student cell loops.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Raw sheet components and the maximum mark each one is entered out of.
+COMPONENTS = ("CA", "OBJ", "EXAM")
+COMPONENT_MAX = {"CA": 20.0, "OBJ": 20.0, "EXAM": 80.0}
+
+# Weighting of the normalised components in the final course score.
+CA_WEIGHT = 0.2
+EXAM_WEIGHT = 0.8
+
+NOT_REG_MARKER = "NOT REG"
+
+# Entries (upper-cased) containing any of these mean the student did not
+# register for the course. Compiled once into a single alternation.
+NOT_REG_PATTERNS = (
+    "NOT REG",
+    "NOT REGISTERED",
+    "NOT-REG",
+    "NOT_REG",
+    "NOT REGISTERED FOR COURSE",
+    "NO REG",
+    "NOT ENROLLED",
+    "NOT TAKING",
+    "NOT OFFERED",
+    "NOT ATTEMPTED",
+)
+NOT_REG_REGEX = re.compile("|".join(re.escape(p) for p in NOT_REG_PATTERNS))
+
+
+# ----------------------------
+# NOT REG Detection
+# ----------------------------
+
+def is_not_registered(value):
+    """Return True if a single cell holds NOT REG (or equivalent) content."""
+    if pd.isna(value) or value == "":
+        return False
+    return NOT_REG_REGEX.search(str(value).upper()) is not None
+
+
+def _series_not_reg_mask(series):
+    """Vectorised NOT REG test for one column using pandas string operations."""
+    if series.dtype != "object" and not pd.api.types.is_string_dtype(series.dtype):
+        # Numeric/bool/datetime columns can never hold NOT REG text
+        return pd.Series(False, index=series.index)
+    text = series.astype(str).str.upper()
+    return text.str.contains(NOT_REG_REGEX, na=False) & series.notna()
+
+
+def not_reg_mask(obj, cache=None):
+    """
+    Boolean NOT REG mask for a Series or DataFrame.
+
+    When ``cache`` (a dict) is given, each column's mask is stored under the
+    column name and reused by later calls as long as the rows are unchanged
+    (same index). Use reorder_not_reg_cache after sorting/filtering rows.
+    """
+    if isinstance(obj, pd.DataFrame):
+        return pd.DataFrame(
+            {col: not_reg_mask(obj[col], cache) for col in obj.columns},
+            index=obj.index,
+        )
+
+    name = obj.name
+    if cache is not None and name in cache:
+        cached = cache[name]
+        if cached.index.equals(obj.index):
+            return cached
+
+    mask = _series_not_reg_mask(obj)
+    if cache is not None and name is not None:
+        cache[name] = mask
+    return mask
+
+
+def reorder_not_reg_cache(cache, labels):
+    """
+    Re-order cached masks to follow ``labels`` (the surviving row labels after a
+    sort/filter) and renumber them 0..n-1 to match a subsequent reset_index.
+    """
+    for name, mask in list(cache.items()):
+        cache[name] = mask.reindex(labels, fill_value=False).reset_index(drop=True)
+    return cache
+
+
+# ----------------------------
+# Course Scoring
+# ----------------------------
+
+def _component_column(merged, code, component):
+    """
+    Return the raw ``(CODE, COMPONENT)`` column of a merge_score_sheets frame
+    (or ``<CODE>_<COMPONENT>`` of a flat frame), or None when absent.
+    """
+    if isinstance(merged.columns, pd.MultiIndex):
+        col = (code, component)
+    else:
+        col = f"{code}_{component}"
+    if col not in merged.columns:
+        return None
+    data = merged[col]
+    # Duplicate headers surface as a DataFrame - keep the first occurrence.
+    if isinstance(data, pd.DataFrame):
+        data = data.iloc[:, 0]
+    return data
+
+
+def build_component_matrix(merged, ordered_codes, component):
+    """
+    Build the (students x courses) float matrix for one sheet component.
+    Missing columns and non-numeric entries become NaN.
+    """
+    matrix = np.full((len(merged), len(ordered_codes)), np.nan, dtype=float)
+    for j, code in enumerate(ordered_codes):
+        data = _component_column(merged, code, component)
+        if data is not None:
+            matrix[:, j] = pd.to_numeric(data, errors="coerce").to_numpy(
+                dtype=float, na_value=np.nan
+            )
+    return matrix
+
+
+def build_not_reg_matrix(merged, ordered_codes, cache=None):
+    """
+    Build the (students x courses) boolean matrix flagging courses where any
+    of the CA/OBJ/EXAM entries is a NOT REG marker.
+    """
+    mask = np.zeros((len(merged), len(ordered_codes)), dtype=bool)
+    for j, code in enumerate(ordered_codes):
+        for component in COMPONENTS:
+            data = _component_column(merged, code, component)
+            if data is not None:
+                mask[:, j] |= not_reg_mask(data, cache).to_numpy(dtype=bool)
+    return mask
+
+
+def _normalise(matrix, component):
+    """Scale a component to a 0-100 range, treating blanks as 0 and capping at 100."""
+    scaled = (matrix / COMPONENT_MAX[component]) * 100
+    scaled = np.where(np.isnan(scaled), 0.0, scaled)
+    return np.minimum(scaled, 100)
+
+
+def compute_course_scores(merged, ordered_codes, mask_not_reg=False, not_reg_cache=None):
+    """
+    Compute the final score of every course for every student in ``merged``.
+
+    ``merged`` holds the matched CA, OBJ and EXAM columns of each code. With
+    ``mask_not_reg`` a course with any NOT REG component is returned as
+    "NOT REG"; ``not_reg_cache`` lets the component masks already built for
+    ``merged`` be reused.
+
+    Returns a DataFrame indexed like ``merged`` with one column per code.
+    """
+    ordered_codes = list(ordered_codes)
+    ca = _normalise(build_component_matrix(merged, ordered_codes, "CA"), "CA")
+    obj = _normalise(build_component_matrix(merged, ordered_codes, "OBJ"), "OBJ")
+    exam = _normalise(build_component_matrix(merged, ordered_codes, "EXAM"), "EXAM")
+
+    totals = np.round((ca * CA_WEIGHT) + (((obj + exam) / 2) * EXAM_WEIGHT), 0)
+    scores = pd.DataFrame(totals, index=merged.index, columns=ordered_codes)
+
+    if mask_not_reg and ordered_codes:
+        not_reg = build_not_reg_matrix(merged, ordered_codes, not_reg_cache)
+        for j in np.flatnonzero(not_reg.any(axis=0)):
+            code = ordered_codes[j]
+            column = scores[code].astype("object")
+            column[not_reg[:, j]] = NOT_REG_MARKER
+            scores[code] = column
+
+    return scores
+
+
+# ----------------------------
+# GPA / TCPE Kernel
+# ----------------------------
+
+def round_exact(values, decimals):
+    """
+    Round like Python's built-in round(). np.round scales by 10**decimals first
+    and can land on the other side of a .5 boundary, which would change GPAs.
+    """
+    return np.fromiter(
+        (round(v, decimals) for v in np.asarray(values, dtype=float).tolist()),
+        dtype=float,
+        count=len(values),
+    )
+
+
+def grade_points(scores, grade_bands):
+    """
+    Vectorised get_grade_point. ``grade_bands`` is a sequence of
+    (minimum score, grade point) pairs; scores below every band (or blank)
+    earn 0.0.
+    """
+    bands = sorted(grade_bands)
+    cutoffs = np.array([low for low, _ in bands], dtype=float)
+    points = np.array([0.0] + [point for _, point in bands], dtype=float)
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    return points[np.searchsorted(cutoffs, scores, side="right")]
+
+
+def derive_semester_results(
+    scores, credit_units, grade_bands, pass_threshold, not_reg=None, skip_blank=False
+):
+    """
+    Derive every per-student semester column from the course-score frame in
+    one pass over a (students x courses) matrix.
+
+    scores:        DataFrame with one column per course code (may hold "NOT REG").
+    credit_units:  credit units aligned with ``scores.columns``.
+    grade_bands:   (minimum score, grade point) pairs for the program's scale.
+    not_reg:       optional boolean mask (DataFrame or array) of NOT REG cells;
+                   those courses are left out of every total.
+    skip_blank:    BN/BM rules for blank (NaN or "") scores: they still count
+                   as failed credit units, but are left out of the GPA units
+                   and the AVERAGE.
+
+    A NaN score counts as a failed 0 but is never listed in FAILED COURSES
+    (float(nan) < pass mark is False in the row-wise versions).
+
+    Returns a DataFrame indexed like ``scores`` with FAILED COURSES, TCPE,
+    CU Passed, CU Failed, Total Registered CU, GPA and AVERAGE.
+    """
+    codes = list(scores.columns)
+    n_students = len(scores)
+    cu = np.asarray(credit_units, dtype=float)
+
+    values = np.empty((n_students, len(codes)), dtype=float)
+    unusable = np.zeros((n_students, len(codes)), dtype=bool)
+    missing = np.zeros((n_students, len(codes)), dtype=bool)
+    empty = np.zeros((n_students, len(codes)), dtype=bool)
+    for j in range(len(codes)):
+        column = scores.iloc[:, j]
+        numeric = pd.to_numeric(column, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        missing[:, j] = column.isna().to_numpy()
+        empty[:, j] = (column == "").to_numpy()
+        # Text that is neither blank nor a number cannot be scored
+        unusable[:, j] = np.isnan(numeric) & ~missing[:, j] & ~empty[:, j]
+        values[:, j] = np.where(np.isnan(numeric), 0.0, numeric)
+
+    registered = ~unusable
+    if not_reg is not None:
+        registered &= ~np.asarray(not_reg, dtype=bool)
+
+    passed = registered & (values >= pass_threshold)
+    failed = registered & ~passed
+    points = grade_points(values, grade_bands)
+    listed = failed & ~missing
+    if skip_blank:
+        scored = registered & ~missing & ~empty
+    else:
+        scored = registered
+
+    tcpe = np.round((points * cu * registered).sum(axis=1), 1)
+    registered_cu = (cu * registered).sum(axis=1)
+    scored_cu = (cu * scored).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gpa = np.where(scored_cu > 0, round_exact(tcpe / scored_cu, 2), 0.0)
+        counts = scored.sum(axis=1)
+        average = np.where(
+            counts > 0, (values * scored).sum(axis=1) / counts, 0.0
+        )
+
+    # FAILED COURSES lists codes alphabetically, as the row-wise version did
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = np.array(codes, dtype=object)[order]
+    failed_sorted = listed[:, order]
+    failed_courses = [", ".join(sorted_codes[row]) for row in failed_sorted]
+
+    return pd.DataFrame(
+        {
+            "FAILED COURSES": failed_courses,
+            "TCPE": tcpe,
+            "CU Passed": (cu * passed).sum(axis=1).astype(int),
+            "CU Failed": (cu * failed).sum(axis=1).astype(int),
+            "Total Registered CU": registered_cu.astype(int),
+            "GPA": gpa,
+            "AVERAGE": np.round(average, 0),
+        },
+        index=scores.index,
+    )
+
+
+def classify_by_passed_share(results, total_cu, below_gpa_status="Probation"):
+    """
+    ND/BN remarks: no failures -> Passed; under 45% of credit units passed ->
+    Withdrawn; otherwise Resit when GPA >= 2.00, else ``below_gpa_status``.
+    """
+    cu_passed = results["CU Passed"].to_numpy(dtype=float)
+    if total_cu > 0:
+        passed_percentage = cu_passed / total_cu * 100
+    else:
+        passed_percentage = np.zeros(len(results))
+    status = np.select(
+        [
+            results["CU Failed"].to_numpy() == 0,
+            passed_percentage < 45,
+            results["GPA"].to_numpy(dtype=float) >= 2.00,
+        ],
+        ["Passed", "Withdrawn", "Resit"],
+        default=below_gpa_status,
+    )
+    return pd.Series(status, index=results.index, dtype=object)
+
+
+def classify_by_failed_share(results, total_cu):
+    """
+    BM (NBTE) remarks: no failures -> Passed; at most 45% of credit units
+    failed -> Resit (GPA >= 2.0) or Probation; more than 45% -> Withdrawn.
+
+    Failures are read from FAILED COURSES, not CU Failed, so a failed
+    0-credit-unit course still keeps a student from Passed.
+    """
+    cu_failed = results["CU Failed"].to_numpy(dtype=float)
+    gpa = results["GPA"].to_numpy(dtype=float)
+    if total_cu > 0:
+        failed_percentage = (cu_failed / total_cu) * 100
+    else:
+        failed_percentage = np.zeros(len(results))
+    within_limit = failed_percentage <= 45
+    status = np.select(
+        [
+            (results["FAILED COURSES"] == "").to_numpy(),
+            (gpa >= 2.0) & within_limit,
+            (gpa < 2.0) & within_limit,
+            failed_percentage > 45,
+        ],
+        ["Passed", "Resit", "Probation", "Withdrawn"],
+        default="Resit",
+    )
+    return pd.Series(status, index=results.index, dtype=object)
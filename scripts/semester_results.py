@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+semester_results.py
+
+Per-run, in-memory hand-off of semester results for the ND and BN processors.
+
+Previous and cumulative CGPA lookups used to reopen mastersheet_{ts}.xlsx and
+probe its header rows for every semester and every file, although the
+semester being looked up had been computed moments earlier in the same run.
+A SemesterResultStore keeps the GPA/credit columns of every semester sheet as
+it is saved, keyed by (workbook path, sheet name), so the loaders can take the
+rows straight from memory. Reading the workbook back remains the fallback for
+sheets this run did not write.
+"""
+
+import os
+
+
+class SemesterResultStore:
+    """GPA/credit frames of the semester sheets written during this run."""
+
+    def __init__(self):
+        self._frames = {}
+
+    @staticmethod
+    def _key(workbook_path, sheet):
+        return (os.path.abspath(workbook_path), sheet)
+
+    def record(self, workbook_path, sheet, mastersheet, columns):
+        """Keep ``columns`` of the ``mastersheet`` just saved as ``sheet``."""
+        columns = [c for c in columns if c in mastersheet.columns]
+        self._frames[self._key(workbook_path, sheet)] = (
+            mastersheet[columns].reset_index(drop=True).copy()
+        )
+
+    def get(self, workbook_path, sheet):
+        """Return a copy of the recorded frame, or None when it was not recorded."""
+        frame = self._frames.get(self._key(workbook_path, sheet))
+        return frame.copy() if frame is not None else None
+
+    def clear(self):
+        self._frames.clear()
+
+    def __len__(self):
+        return len(self._frames)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+sheet_merge.py
+
+Columnar merge of a raw result file's CA, OBJ and EXAM sheets, shared by the
+ND, BN and BM regular processors.
+
+The processors used to rename each sheet's matched course columns one at a
+time to ``<CODE>_<SHEET>``, fold the sheets together with successive outer
+merges on a "REG. No" string column and patch NAME with combine_first after
+every merge. A registration number repeated inside one sheet multiplied rows
+through each later merge, and blank registration cells turned into "nan"
+students. merge_score_sheets factorises each sheet's registration column
+once, normalises only its distinct values into a categorical key, and lines
+all sheets up with one reindex onto the union of keys and one concat.
+
+The merged frame has one row per registration, indexed by ("REG. No",
+"NAME"), and (course code, component) MultiIndex columns such as
+("NUR111", "CA"). Score columns keep the dtype they were read with. Duplicate,
+orphan and blank registrations and unmatched headers are returned in a
+MergeReport for the caller to log.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+REG_KEY = "REG. No"
+NAME_KEY = "NAME"
+COLUMN_LEVELS = ("course", "component")
+
+# Registration cells (lower-cased, stripped) that hold no registration number
+BLANK_REGISTRATIONS = frozenset(("", "nan", "none", "nat", "<na>"))
+
+# duplicates: {sheet: [registrations repeated in the sheet; the first row is kept]}
+# orphans:    {registration: (sheets it is missing from)}
+# blank_rows: {sheet: rows dropped for a blank registration number}
+# unmatched:  {sheet: [headers that matched no course]}
+# skipped:    [sheets with no rows or no registration column]
+MergeReport = namedtuple(
+    "MergeReport", ["duplicates", "orphans", "blank_rows", "unmatched", "skipped"]
+)
+
+
+def registration_keys(values):
+    """
+    Normalised registration numbers of ``values`` as a Categorical.
+
+    Only the distinct values are turned into stripped strings (the same text
+    ``astype(str).str.strip()`` gives); blank registrations become NaN.
+    """
+    codes, uniques = pd.factorize(values)
+    labels = [str(value).strip() for value in uniques]
+    categories = {}
+    remap = np.full(len(labels) + 1, -1, dtype=np.int64)
+    for pos, label in enumerate(labels):
+        if label.lower() not in BLANK_REGISTRATIONS:
+            remap[pos] = categories.setdefault(label, len(categories))
+    # factorize marks missing values -1, which picks the trailing -1 of remap
+    return pd.Categorical.from_codes(remap[codes], categories=list(categories))
+
+
+def _clean_names(names):
+    """Stripped names, leaving missing names missing."""
+    return names.astype(str).str.strip().where(names.notna())
+
+
+def merge_score_sheets(dfs, reg_cols, name_cols, match):
+    """
+    Merge the ``{sheet: DataFrame}`` raw sheets of one result file.
+
+    ``reg_cols`` and ``name_cols`` give each sheet's registration and name
+    header (None falls back to the first and second column). ``match(header)``
+    returns the course code a header belongs to, or None; when several headers
+    of a sheet match one course the first is used.
+
+    Returns ``(merged, report)``; ``merged`` is None when no sheet had rows.
+    """
+    report = MergeReport({}, {}, {}, {}, [])
+    parts = []
+    for sheet, df in dfs.items():
+        if df.empty:
+            report.skipped.append(sheet)
+            continue
+        regcol = reg_cols.get(sheet) or df.columns[0]
+        namecol = name_cols.get(sheet)
+        if not namecol and len(df.columns) > 1:
+            namecol = df.columns[1]
+
+        component = sheet.upper()
+        columns = {}
+        unmatched = []
+        for col in df.columns:
+            if col in (regcol, namecol) or not str(col).strip():
+                continue
+            code = match(col)
+            if code:
+                columns.setdefault((code, component), col)
+            else:
+                unmatched.append(col)
+        if unmatched:
+            report.unmatched[sheet] = unmatched
+
+        keys = registration_keys(df[regcol])
+        blank = keys.codes < 0
+        repeated = pd.Series(keys.codes).duplicated().to_numpy() & ~blank
+        keep = ~blank & ~repeated
+        if blank.any():
+            report.blank_rows[sheet] = int(blank.sum())
+        if repeated.any():
+            report.duplicates[sheet] = list(pd.unique(keys[repeated]))
+
+        scores = df.loc[keep, list(columns.values())]
+        scores.columns = pd.MultiIndex.from_arrays(
+            [[code for code, _ in columns], [comp for _, comp in columns]],
+            names=COLUMN_LEVELS,
+        )
+        names = (
+            _clean_names(df.loc[keep, namecol])
+            if namecol
+            else pd.Series(pd.NA, index=scores.index, dtype=object)
+        )
+        parts.append((sheet, keys[keep], scores, names))
+
+    if not parts:
+        return None, report
+
+    # Union of keys in first-seen order; an outer merge of several sheets sorted them
+    labels = pd.Index(np.concatenate([keys.categories for _, keys, _, _ in parts])).unique()
+    if len(parts) > 1:
+        labels = labels.sort_values()
+    key_dtype = pd.CategoricalDtype(labels)
+    rows = np.arange(len(labels))
+
+    aligned_scores = []
+    aligned_names = []
+    present = np.zeros((len(labels), len(parts)), dtype=bool)
+    for pos, (_, keys, scores, names) in enumerate(parts):
+        codes = keys.set_categories(labels).codes
+        present[codes, pos] = True
+        aligned_scores.append(scores.set_axis(codes).reindex(rows))
+        aligned_names.append(names.set_axis(codes).reindex(rows))
+    merged = pd.concat(aligned_scores, axis=1)
+    names = pd.concat(aligned_names, axis=1).bfill(axis=1).iloc[:, 0]
+
+    sheets = [sheet for sheet, _, _, _ in parts]
+    for row in np.flatnonzero(~present.all(axis=1)):
+        report.orphans[labels[row]] = tuple(
+            sheet for sheet, here in zip(sheets, present[row]) if not here
+        )
+
+    merged.index = pd.MultiIndex.from_arrays(
+        [pd.Categorical.from_codes(rows, dtype=key_dtype), names.to_numpy()],
+        names=[REG_KEY, NAME_KEY],
+    )
+    return merged, report
+
+
+def registrations(merged):
+    """The merged rows' registration numbers and names as plain columns."""
+    return pd.DataFrame(
+        {
+            REG_KEY: merged.index.get_level_values(REG_KEY).astype(str).to_numpy(),
+            NAME_KEY: merged.index.get_level_values(NAME_KEY).to_numpy(),
+        }
+    )
+
+
+def report_summary(report):
+    """One-line summary of a MergeReport, or "" when there is nothing to report."""
+    parts = []
+    duplicates = sum(len(regs) for regs in report.duplicates.values())
+    if duplicates:
+        parts.append(f"{duplicates} duplicate registration(s) (first row kept)")
+    if report.orphans:
+        parts.append(f"{len(report.orphans)} registration(s) missing from some sheets")
+    blank = sum(report.blank_rows.values())
+    if blank:
+        parts.append(f"{blank} row(s) without a registration number dropped")
+    unmatched = sum(len(cols) for cols in report.unmatched.values())
+    if unmatched:
+        parts.append(f"{unmatched} unmatched header(s)")
+    return "; ".join(parts)
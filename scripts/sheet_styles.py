@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+sheet_styles.py
+
+Pooled openpyxl style objects and range helpers for the mastersheet writers.
+
+The writers used to build a fresh Font/PatternFill/Border/Alignment for every
+cell they touched. openpyxl de-duplicates equal styles when the workbook is
+saved, so the objects only cost construction and hashing time. Here each
+distinct style is built once (font(), solid_fill(), alignment(), THIN_BORDER)
+and applied to whole row/column ranges, with per-cell colour classes worked
+out from the in-memory DataFrame rather than read back from the sheet.
+"""
+
+from functools import lru_cache
+
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+THIN_SIDE = Side(style="thin")
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+MEDIUM_SIDE = Side(style="medium")
+MEDIUM_BORDER = Border(
+    left=MEDIUM_SIDE, right=MEDIUM_SIDE, top=MEDIUM_SIDE, bottom=MEDIUM_SIDE
+)
+
+
+def _frozen(kwargs):
+    return tuple(sorted(kwargs.items()))
+
+
+@lru_cache(maxsize=None)
+def _font(items):
+    return Font(**dict(items))
+
+
+@lru_cache(maxsize=None)
+def _alignment(items):
+    return Alignment(**dict(items))
+
+
+def font(**kwargs):
+    """Shared Font for these keyword arguments."""
+    return _font(_frozen(kwargs))
+
+
+def alignment(**kwargs):
+    """Shared Alignment for these keyword arguments."""
+    return _alignment(_frozen(kwargs))
+
+
+@lru_cache(maxsize=None)
+def solid_fill(color):
+    """Shared solid PatternFill in ``color``."""
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+def with_classes(base, class_styles):
+    """{class: base styles updated with that class's styles}, for row-by-row writers."""
+    return {key: {**base, **styles} for key, styles in class_styles.items()}
+
+
+def text_width(values):
+    """Longest str() of ``values`` (0 when empty), as the column auto-fit measures it."""
+    return max((len(str(v)) for v in values), default=0)
+
+
+def _apply(cell, styles):
+    for attr, value in styles.items():
+        setattr(cell, attr, value)
+
+
+def style_range(ws, min_row, max_row, min_col, max_col, **styles):
+    """Set the given style attributes (font=, fill=, border=, alignment=) on a block."""
+    if min_row > max_row or min_col > max_col:
+        return
+    for row in ws.iter_rows(
+        min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col
+    ):
+        for cell in row:
+            _apply(cell, styles)
+
+
+def style_column(ws, column, min_row, max_row, **styles):
+    """Set the given style attributes on rows ``min_row``..``max_row`` of one column."""
+    style_range(ws, min_row, max_row, column, column, **styles)
+
+
+def style_column_by_class(ws, column, first_row, classes, class_styles):
+    """
+    Style one column from a per-row class sequence: row ``first_row + i``
+    gets ``class_styles[classes[i]]``; classes without an entry are left as is.
+    """
+    for offset, key in enumerate(classes):
+        styles = class_styles.get(key)
+        if styles:
+            _apply(ws.cell(row=first_row + offset, column=column), styles)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+sheet_writer.py
+
+Row-ordered sheet writing for the mastersheet writers, over either a normal
+openpyxl worksheet or a write-only (streaming) one.
+
+The semester and CGPA_SUMMARY writers used to append every row to a normal
+worksheet and then walk the sheet again (ws[row], iter_rows, ws.columns) to
+style cells and size columns, so every cell of every sheet stayed in memory
+as a styled Cell object until the workbook was saved. A writer now works out
+column widths, merges and the freeze pane from its DataFrame first and hands
+each row to a SheetSink together with the row's styles, so every row is
+written once, top to bottom. Over a write-only worksheet the row goes
+straight to the sheet's temporary XML stream and no Cell is kept; over a
+normal worksheet the same calls build the same sheet as before.
+
+copy_worksheet streams a sheet that was built the ordinary way (ANALYSIS, or
+a sheet loaded from an existing file) into a write-only worksheet.
+"""
+
+from copy import copy
+
+from openpyxl.cell import MergedCell, WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+
+# Style attributes carried over by copy_worksheet
+CELL_STYLE_ATTRS = ("font", "fill", "border", "alignment", "number_format", "protection")
+
+
+class SheetSink:
+    """
+    Writes one sheet from the top row down.
+
+    Column widths and the freeze pane must be set before the first row, and a
+    row's height before that row is written: a write-only sheet emits them
+    ahead of its rows. Merges and images may be added at any time. ``styles``
+    given to append() run parallel to the values; each entry is None or a
+    dict of cell attributes (font=, fill=, border=, alignment=, ...). A None
+    value with no style leaves the cell out altogether.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.streaming = isinstance(ws, WriteOnlyWorksheet)
+        self.row = 0
+
+    @property
+    def next_row(self):
+        """Row number the next append() writes to."""
+        return self.row + 1
+
+    def _before_rows(self, what):
+        if self.streaming and self.row:
+            raise ValueError(f"{what} must be set before the first row of a streamed sheet")
+
+    def set_widths(self, widths):
+        """Set column widths from {column index: width}."""
+        self._before_rows("Column widths")
+        for col_idx, width in widths.items():
+            self.ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    def set_height(self, row, height):
+        if self.streaming and row <= self.row:
+            raise ValueError(f"Row {row} of a streamed sheet has already been written")
+        self.ws.row_dimensions[row].height = height
+
+    def freeze(self, row, column=1):
+        """Freeze the rows above ``row`` (and the columns left of ``column``)."""
+        self._before_rows("The freeze pane")
+        self.ws.freeze_panes = f"{get_column_letter(column)}{row}"
+
+    def merge(self, ref):
+        if self.streaming:
+            self.ws.merged_cells.add(ref)
+        else:
+            self.ws.merge_cells(ref)
+
+    def add_image(self, img, anchor):
+        self.ws.add_image(img, anchor)
+
+    def append(self, values=(), styles=None):
+        """Write ``values`` as the next row, styling each cell from ``styles``."""
+        self.row += 1
+        styles = styles or ()
+        if self.streaming:
+            cells = []
+            for col_idx, value in enumerate(values):
+                style = styles[col_idx] if col_idx < len(styles) else None
+                if value is None and not style:
+                    cells.append(None)
+                    continue
+                cell = WriteOnlyCell(self.ws, value=value)
+                if style:
+                    for attr, style_value in style.items():
+                        setattr(cell, attr, style_value)
+                cells.append(cell)
+            self.ws.append(cells)
+            return
+        for col_idx, value in enumerate(values, start=1):
+            style = styles[col_idx - 1] if col_idx <= len(styles) else None
+            if value is None and not style:
+                continue
+            cell = self.ws.cell(row=self.row, column=col_idx)
+            if isinstance(cell, MergedCell):
+                continue
+            cell.value = value
+            if style:
+                for attr, style_value in style.items():
+                    setattr(cell, attr, style_value)
+
+    def skip(self, count=1):
+        """Leave ``count`` empty rows."""
+        for _ in range(count):
+            self.append()
+
+
+def copy_worksheet(src, sink):
+    """Stream the normal worksheet ``src`` into ``sink``, styles and layout included."""
+    dst = sink.ws
+    for key, dim in src.column_dimensions.items():
+        if dim.customWidth:
+            dst.column_dimensions[key].width = dim.width
+    for row, dim in src.row_dimensions.items():
+        if dim.ht is not None:
+            sink.set_height(row, dim.ht)
+    if src.freeze_panes:
+        dst.freeze_panes = src.freeze_panes
+    for merged in src.merged_cells.ranges:
+        sink.merge(merged.coord)
+    for img in src._images:
+        sink.add_image(img, img.anchor)
+    for row in src.iter_rows():
+        values = []
+        styles = []
+        for cell in row:
+            if isinstance(cell, MergedCell) or (cell.value is None and not cell.has_style):
+                values.append(None)
+                styles.append(None)
+                continue
+            values.append(cell.value)
+            styles.append(
+                {attr: copy(getattr(cell, attr)) for attr in CELL_STYLE_ATTRS}
+                if cell.has_style
+                else None
+            )
+        sink.append(values, styles)
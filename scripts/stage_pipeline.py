@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+stage_pipeline.py
+
+Small dependency-graph scheduler for running a set's semesters.
+
+The ND, BN and BM mains used to process semesters strictly one after the
+other: parse the raw workbook, score, fold the CGPA, write the mastersheet,
+render the PDF, then move on. Only the CGPA fold actually chains one
+semester to the next. StagePipeline runs named stages once their
+dependencies are done:
+
+- parallel stages (parsing raw workbooks, rendering PDF shards) go to a
+  ProcessPoolExecutor as soon as they are ready;
+- main-process stages (scoring, CGPA, mastersheet, carryover JSON - all of
+  which share the processors' global trackers) run one at a time, in the
+  order they were added.
+
+Stages may add further stages while they run (the PDF renderer queues its
+shards this way). ``deps`` must have succeeded; ``after`` only has to have
+finished, so one failed semester does not stop the next. Errors are kept
+per stage and dependents of a failed stage are skipped; the stages that
+failed or were skipped are listed when a run ends.
+
+The pool has DEFAULT_PIPELINE_WORKERS workers (fewer on a smaller machine):
+the batch entry point runs one pipeline per set, so a per-CPU default would
+start sets x CPUs processes in a small container. Set PIPELINE_WORKERS to
+raise or lower it; with one worker every stage runs in-process, in order.
+If the pool breaks (a worker killed for memory, say), the remaining parallel
+stages run in-process instead.
+"""
+
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from pdf_shards import available_cpus
+from workbook_io import prefetch_raw_sheets, remember_raw_sheets
+
+logger = logging.getLogger(__name__)
+
+# Parallel-stage workers unless PIPELINE_WORKERS says otherwise
+DEFAULT_PIPELINE_WORKERS = 2
+
+Stage = namedtuple(
+    "Stage", ["name", "fn", "args", "kwargs", "deps", "after", "parallel", "on_done"]
+)
+
+
+def pipeline_workers():
+    """Worker processes for parallel stages: PIPELINE_WORKERS, or DEFAULT_PIPELINE_WORKERS capped at the available CPUs."""
+    try:
+        return max(1, int(os.getenv("PIPELINE_WORKERS", "")))
+    except ValueError:
+        return min(DEFAULT_PIPELINE_WORKERS, available_cpus())
+
+
+class StagePipeline:
+    """Runs named stages in dependency order, parallel ones in a process pool."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or pipeline_workers()
+        self.stages = {}
+        self.results = {}
+        self.errors = {}
+        self.skipped = []
+        self._pending = []
+
+    @property
+    def parallel(self):
+        """True when parallel stages really run in worker processes."""
+        return self.workers > 1
+
+    def add(
+        self, name, fn, *args, deps=(), after=(), parallel=False, on_done=None, **kwargs
+    ):
+        """
+        Queue ``fn(*args, **kwargs)`` as stage ``name`` and return the name.
+
+        ``parallel`` stages run in a worker process, so ``fn`` and its
+        arguments must be picklable; ``on_done(result)`` is then called in the
+        main process with what the worker returned.
+        """
+        if name in self.stages:
+            raise ValueError(f"duplicate pipeline stage: {name}")
+        self.stages[name] = Stage(
+            name, fn, args, kwargs, tuple(deps), tuple(after), parallel, on_done
+        )
+        self._pending.append(name)
+        return name
+
+    def failed(self, names):
+        """The stages among ``names`` that raised or were skipped."""
+        return [n for n in names if n in self.errors or n in self.skipped]
+
+    def _state(self, stage):
+        for dep in stage.deps:
+            if dep in self.errors or dep in self.skipped:
+                return "blocked"
+            if dep not in self.results:
+                return "waiting"
+        for dep in stage.after:
+            if dep not in self.results and dep not in self.errors and dep not in self.skipped:
+                return "waiting"
+        return "ready"
+
+    def _finish(self, stage, result=None, error=None):
+        if error is not None:
+            self.errors[stage.name] = error
+            return
+        self.results[stage.name] = result
+        if stage.on_done is not None:
+            try:
+                stage.on_done(result)
+            except Exception as e:
+                del self.results[stage.name]
+                self.errors[stage.name] = e
+
+    def _run_inline(self, stage):
+        try:
+            result = stage.fn(*stage.args, **stage.kwargs)
+        except Exception as e:
+            logger.error("❌ Pipeline stage %s failed: %s", stage.name, e, exc_info=True)
+            self._finish(stage, error=e)
+        else:
+            self._finish(stage, result)
+
+    def run(self):
+        """Run every queued stage (and any they add); return {name: error}."""
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.parallel else None
+        running = {}
+        try:
+            while self._pending or running:
+                progressed = False
+                serial_ready = None
+                for name in list(self._pending):
+                    stage = self.stages[name]
+                    state = self._state(stage)
+                    if state == "blocked":
+                        self._pending.remove(name)
+                        self.skipped.append(name)
+                        progressed = True
+                    elif state == "ready" and stage.parallel and pool is not None:
+                        self._pending.remove(name)
+                        try:
+                            future = pool.submit(stage.fn, *stage.args, **stage.kwargs)
+                        except BrokenProcessPool:
+                            pool = self._drop_pool(pool)
+                            self._run_inline(stage)
+                        except Exception as e:
+                            self._finish(stage, error=e)
+                        else:
+                            running[future] = stage
+                        progressed = True
+                    elif state == "ready" and serial_ready is None:
+                        serial_ready = stage
+
+                if serial_ready is not None:
+                    # One main-process stage at a time, then rescan: it may
+                    # have queued new stages or unblocked parallel ones
+                    self._pending.remove(serial_ready.name)
+                    self._run_inline(serial_ready)
+                    progressed = True
+
+                done = [f for f in running if f.done()]
+                if not done and not progressed and running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error("❌ Pipeline stage %s failed: %s", stage.name, e)
+                        self._finish(stage, error=e)
+                        if isinstance(e, BrokenProcessPool) and pool is not None:
+                            pool = self._drop_pool(pool)
+                    else:
+                        self._finish(stage, result)
+                    progressed = True
+
+                if not progressed and not running:
+                    # Only stages waiting on names that were never added
+                    self.skipped.extend(self._pending)
+                    self._pending = []
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        self.report()
+        return dict(self.errors)
+
+    def _drop_pool(self, pool):
+        """Give up on a broken pool; later parallel stages run in-process."""
+        logger.warning(
+            "⚠️ Pipeline worker pool broke; running the remaining parallel stages in-process"
+        )
+        pool.shutdown(wait=False, cancel_futures=True)
+        return None
+
+    def report(self):
+        """Log the stages that failed or were skipped (blocked by a failed dependency)."""
+        for name, error in self.errors.items():
+            logger.error("❌ Pipeline stage %s failed: %s", name, error)
+        for name in self.skipped:
+            blocked_by = self.failed(self.stages[name].deps)
+            reason = f"blocked by {', '.join(blocked_by)}" if blocked_by else "never became ready"
+            logger.warning("⚠️ Pipeline stage %s skipped: %s", name, reason)
+
+
+# ----------------------------
+# Raw workbook prefetch
+# ----------------------------
+
+
+def queue_raw_prefetch(pipeline, paths, sheets, **read_kwargs):
+    """
+    Add one parallel stage per raw workbook in ``paths`` that parses it with
+    workbook_io.prefetch_raw_sheets; the main process's later
+    load_raw_sheets(path, sheets, **read_kwargs) then returns the parsed
+    sheets at once. Returns the stage names (none when the pipeline has no
+    worker processes - parsing ahead in-process gains nothing).
+    """
+    if not pipeline.parallel:
+        return []
+    names = []
+    for path in paths:
+        name = f"parse:{os.path.abspath(path)}"
+        if name not in pipeline.stages:
+            pipeline.add(
+                name,
+                prefetch_raw_sheets,
+                path,
+                sheets,
+                parallel=True,
+                on_done=remember_raw_sheets,
+                **read_kwargs,
+            )
+        names.append(name)
+    return names
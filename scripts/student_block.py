@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+student_block.py
+
+Whole-block reads, recalculation and writes of the student rows of a
+mastersheet semester sheet, for the carryover processors.
+
+After applying resit scores the carryover flow recalculated every student
+with a ws.cell read per course cell and a ws.cell write per summary cell,
+redoing the grade-point and credit-unit rules in Python for each cell, and
+sorted the sheet by copying every cell's value and number format into a
+dict per cell. read_student_block now streams the rows under the headings
+into a DataFrame once, summarise_scores recomputes CU passed/failed, TCPE,
+GPA, average, failed courses and remarks for all students together with
+column operations, and write_student_block writes the result back row by
+row in one pass. Rows are re-sorted as a whole in memory.
+
+Only cell values and number formats move with a student; fills, fonts and
+borders stay with their worksheet rows, so the sheet's formatting regions
+(heading, student block, summary section) are left where they are.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Exam number cells that mark an empty row
+BLANK_EXAM_NUMBERS = frozenset(("", "NAN", "NONE"))
+
+# rows:    worksheet row of each student, in sheet order
+# values:  DataFrame of the rows' cell values, columns numbered from 1
+# formats: DataFrame of the rows' number formats, same shape as values
+StudentBlock = namedtuple("StudentBlock", ["rows", "values", "formats"])
+
+# The summarise_scores columns, in the order the mastersheet shows them
+SUMMARY_FIELDS = (
+    "FAILED COURSES",
+    "REMARKS",
+    "CU Passed",
+    "CU Failed",
+    "TCPE",
+    "GPA",
+    "AVERAGE",
+)
+
+
+def _exam_text(value):
+    return str(value).strip().upper() if value else ""
+
+
+def read_student_block(ws, header_row, exam_col, ncols=None, stop_at_blank=True):
+    """
+    Read the student rows under ``header_row`` into a StudentBlock.
+
+    The block ends at an exam number containing "SUMMARY" or, with
+    ``stop_at_blank``, at the first row without an exam number; otherwise
+    rows without one are skipped. ``ncols`` defaults to the sheet's width.
+    """
+    ncols = ncols or ws.max_column
+    rows = []
+    values = []
+    formats = []
+    for cells in ws.iter_rows(min_row=header_row + 1, max_row=ws.max_row, max_col=ncols):
+        exam = _exam_text(cells[exam_col - 1].value)
+        if "SUMMARY" in exam:
+            break
+        if exam in BLANK_EXAM_NUMBERS:
+            if stop_at_blank:
+                break
+            continue
+        rows.append(cells[0].row)
+        values.append([cell.value for cell in cells])
+        formats.append([cell.number_format for cell in cells])
+    columns = pd.RangeIndex(1, ncols + 1)
+    return StudentBlock(
+        rows,
+        pd.DataFrame(values, columns=columns, dtype=object),
+        pd.DataFrame(formats, columns=columns, dtype=object),
+    )
+
+
+def grade_points(scores, bands):
+    """
+    Grade points of a score DataFrame; ``bands`` are (minimum score, points)
+    pairs from the highest band down, and lower scores get 0.
+    """
+    conditions = [scores.to_numpy() >= minimum for minimum, _ in bands]
+    return np.select(conditions, [points for _, points in bands], 0.0)
+
+
+def _rounded(values):
+    # Python's round, as the per-student code used, not numpy's
+    return [round(float(value), 2) for value in values]
+
+
+def summarise_scores(scores, units, bands, pass_mark):
+    """
+    Summary columns for every student at once.
+
+    ``scores`` has one column per course, labelled by course code; cells
+    that are not numbers (blank, "NOT REG") are not counted. ``units``
+    gives each course's credit units in the same order. Returns a DataFrame
+    with the SUMMARY_FIELDS columns, on the index of ``scores``.
+    """
+    numeric = scores.apply(pd.to_numeric, errors="coerce")
+    taken = numeric.notna().to_numpy()
+    values = numeric.fillna(0.0).to_numpy(dtype=float)
+    unit_values = np.asarray(units, dtype=float)
+    whole_units = all(isinstance(unit, (int, np.integer)) for unit in units)
+
+    passed = taken & (values >= pass_mark)
+    failed = taken & ~passed
+    total_credits = (taken * unit_values).sum(axis=1)
+    cu_passed = (passed * unit_values).sum(axis=1)
+    cu_failed = (failed * unit_values).sum(axis=1)
+    points = np.where(taken, grade_points(numeric.fillna(0.0), bands), 0.0)
+    total_points = (points * unit_values).sum(axis=1)
+    counted = taken.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gpa = _rounded(np.where(total_credits > 0, total_points / total_credits, 0.0))
+        average = _rounded(np.where(counted > 0, (values * taken).sum(axis=1) / counted, 0.0))
+        passed_share = np.where(total_credits > 0, cu_passed / total_credits, 0.0)
+
+    remarks = np.select(
+        [passed_share < 0.45, cu_failed == 0, np.asarray(gpa) >= 2.0],
+        ["WITHDRAW", "PASSED", "RESIT"],
+        "PROBATION",
+    ).tolist()
+    codes = np.asarray(scores.columns, dtype=object)
+    failed_courses = [", ".join(codes[row]) or "NONE" for row in failed]
+
+    def credit_column(totals):
+        return [int(total) if whole_units else float(total) for total in totals]
+
+    return pd.DataFrame(
+        {
+            "FAILED COURSES": failed_courses,
+            "REMARKS": remarks,
+            "CU Passed": credit_column(cu_passed),
+            "CU Failed": credit_column(cu_failed),
+            "TCPE": credit_column(total_credits),
+            "GPA": gpa,
+            "AVERAGE": average,
+        },
+        index=scores.index,
+        columns=list(SUMMARY_FIELDS),
+    )
+
+
+def write_student_block(ws, rows, values, formats=None, columns=None, style_row=None):
+    """
+    Write ``values`` (and ``formats``) to worksheet ``rows``, one row at a
+    time. ``columns`` limits the write to those sheet columns. ``style_row``
+    is called as style_row(position, cells) after each row is written, with
+    the row's cells by column, to restyle it.
+    """
+    columns = list(values.columns if columns is None else columns)
+    value_rows = values[columns].itertuples(index=False, name=None)
+    format_rows = (
+        formats[columns].itertuples(index=False, name=None) if formats is not None else None
+    )
+    for pos, row in enumerate(rows):
+        row_values = next(value_rows)
+        row_formats = next(format_rows) if format_rows is not None else None
+        cells = {}
+        for idx, col in enumerate(columns):
+            cell = ws.cell(row=row, column=col)
+            cell.value = row_values[idx]
+            if row_formats is not None and row_formats[idx]:
+                cell.number_format = row_formats[idx]
+            cells[col] = cell
+        if style_row is not None:
+            style_row(pos, cells)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+student_history.py
+
+Durable per-set store of each student's semester results for the ND, BN and
+BM processors.
+
+Cross-semester state used to be rebuilt on every run: previous and
+cumulative CGPAs from the mastersheet sheets this run had written (a run
+that only processed a later semester found nothing), withdrawals from
+nothing at all, and carryover counts by globbing and parsing every
+co_student*.json under the program folder. StudentHistory keeps that state
+in one SQLite file in the set directory (next to RAW_RESULTS and
+CLEAN_RESULTS):
+
+- semester_results: one row per student and semester with GPA, credits,
+  remarks, failed courses and a withdrawn flag;
+- carryover: one row per student and semester with the outstanding courses
+  written to the carryover JSON (replaced whenever the semester is
+  recorded, so a semester in semester_results is covered here too).
+
+Both are keyed on (exam_number, semester) and indexed by semester. Each
+semester is replaced in a single transaction, so a re-run overwrites the
+semester instead of piling up rows, and a crash leaves the previous copy.
+
+CGPA lookups are answered in SQL rather than by loading a semester frame:
+gpa() is a primary-key lookup for one student, gpas() one indexed scan of a
+semester, and cumulative_points() sums gpa * total_cu per student over any
+set of semesters.
+
+Set STUDENT_HISTORY=0 to neither read nor write the store.
+"""
+
+import glob
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from env_flags import env_flag
+
+HISTORY_FILENAME = "student_history.sqlite"
+SCHEMA_VERSION = 1
+
+# Result columns kept per student and semester; processors map them to their
+# own mastersheet headers ("EXAM NUMBER" vs "EXAMS NUMBER", ...)
+RESULT_FIELDS = (
+    "exam_number",
+    "name",
+    "gpa",
+    "cu_passed",
+    "cu_failed",
+    "total_cu",
+    "remarks",
+    "failed_courses",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS semester_results (
+    exam_number TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    name TEXT,
+    gpa REAL,
+    cu_passed REAL,
+    cu_failed REAL,
+    total_cu REAL,
+    remarks TEXT,
+    failed_courses TEXT,
+    withdrawn INTEGER NOT NULL DEFAULT 0,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (exam_number, semester)
+);
+CREATE INDEX IF NOT EXISTS semester_results_by_semester
+    ON semester_results (semester, exam_number);
+CREATE TABLE IF NOT EXISTS carryover (
+    exam_number TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    set_name TEXT,
+    failed_courses TEXT NOT NULL,
+    identified_at TEXT NOT NULL,
+    PRIMARY KEY (exam_number, semester)
+);
+CREATE INDEX IF NOT EXISTS carryover_by_semester
+    ON carryover (semester, exam_number);
+"""
+
+# path -> StudentHistory, so a run opens each set's store once
+_OPEN = {}
+
+
+def history_enabled():
+    """The store is used unless STUDENT_HISTORY is set to a false value."""
+    return env_flag("STUDENT_HISTORY", True)
+
+
+def set_dir_for(path):
+    """The set directory above the CLEAN_RESULTS folder that holds ``path``, or None."""
+    current = os.path.abspath(path)
+    while True:
+        parent = os.path.dirname(current)
+        if os.path.basename(current) == "CLEAN_RESULTS":
+            return parent
+        if parent == current:
+            return None
+        current = parent
+
+
+def program_histories(program_dir):
+    """(set name, StudentHistory) for every set under ``program_dir`` with a store."""
+    if not history_enabled():
+        return []
+    histories = []
+    for path in sorted(glob.glob(os.path.join(program_dir, "*", HISTORY_FILENAME))):
+        set_dir = os.path.dirname(path)
+        histories.append((os.path.basename(set_dir), StudentHistory.for_set_dir(set_dir)))
+    return histories
+
+
+def _clean(value):
+    """None for NaN/empty cells, else the value (numpy scalars made plain)."""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, str) and not value.strip():
+        return None
+    return value
+
+
+class StudentHistory:
+    """SQLite store of one set's per-student, per-semester state."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+
+    @classmethod
+    def for_path(cls, path):
+        """
+        The store of the set whose CLEAN_RESULTS contains ``path`` (an output
+        folder or a file in it), or None when the store is disabled or the
+        path is not under a set's CLEAN_RESULTS.
+        """
+        if not history_enabled():
+            return None
+        set_dir = set_dir_for(path)
+        if set_dir is None:
+            return None
+        return cls.for_set_dir(set_dir)
+
+    @classmethod
+    def for_set_dir(cls, set_dir):
+        db_path = os.path.join(os.path.abspath(set_dir), HISTORY_FILENAME)
+        history = _OPEN.get(db_path)
+        if history is None:
+            history = _OPEN[db_path] = cls(db_path)
+        return history
+
+    def exists(self):
+        return self._conn is not None or os.path.exists(self.path)
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.executescript(_SCHEMA)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema', ?)",
+                    (str(SCHEMA_VERSION),),
+                )
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        _OPEN.pop(self.path, None)
+
+    # ----------------------------
+    # Semester results
+    # ----------------------------
+
+    def record_semester(self, semester, frame, columns):
+        """
+        Replace ``semester``'s rows with ``frame``. ``columns`` maps
+        RESULT_FIELDS names to ``frame``'s headers; unmapped fields are
+        stored empty. Returns the number of students written.
+        """
+        fields = [f for f in RESULT_FIELDS if columns.get(f) in frame.columns]
+        if "exam_number" not in fields:
+            raise KeyError(f"exam number column {columns.get('exam_number')!r} missing")
+        recorded_at = datetime.now().isoformat(timespec="seconds")
+        rows = []
+        for values in frame[[columns[f] for f in fields]].itertuples(index=False):
+            row = dict(zip(fields, map(_clean, values)))
+            exam_no = row.get("exam_number")
+            if exam_no is None:
+                continue
+            row["exam_number"] = str(exam_no).strip()
+            remarks = row.get("remarks")
+            rows.append(
+                (
+                    row["exam_number"],
+                    semester,
+                    row.get("name"),
+                    row.get("gpa"),
+                    row.get("cu_passed"),
+                    row.get("cu_failed"),
+                    row.get("total_cu"),
+                    None if remarks is None else str(remarks),
+                    None if row.get("failed_courses") is None else str(row["failed_courses"]),
+                    int(remarks == "Withdrawn"),
+                    recorded_at,
+                )
+            )
+        with self.conn:
+            self.conn.execute("DELETE FROM semester_results WHERE semester = ?", (semester,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO semester_results (exam_number, semester, name, "
+                "gpa, cu_passed, cu_failed, total_cu, remarks, failed_courses, "
+                "withdrawn, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def semester_results(self, semester, columns):
+        """
+        ``semester``'s rows as a frame with ``columns``' headers (RESULT_FIELDS
+        name -> header), or None when the semester was never recorded.
+        """
+        if not self.exists():
+            return None
+        fields = [f for f in RESULT_FIELDS if f in columns]
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(fields)} FROM semester_results "
+            "WHERE semester = ? ORDER BY rowid",
+            (semester,),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+        return pd.DataFrame(rows, columns=[columns[f] for f in fields])
+
+    def gpa(self, exam_number, semester):
+        """``exam_number``'s GPA in ``semester`` (a primary-key lookup), or None."""
+        if not self.exists():
+            return None
+        row = self.conn.execute(
+            "SELECT gpa FROM semester_results WHERE exam_number = ? AND semester = ?",
+            (str(exam_number).strip(), semester),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def gpas(self, semester):
+        """{exam number: GPA} for every student of ``semester`` that has a GPA."""
+        if not self.exists():
+            return {}
+        return dict(
+            self.conn.execute(
+                "SELECT exam_number, gpa FROM semester_results "
+                "WHERE semester = ? AND gpa IS NOT NULL ORDER BY rowid",
+                (semester,),
+            )
+        )
+
+    def cumulative_points(self, semesters):
+        """
+        {exam number: (grade points, credit units)} summed over ``semesters``:
+        SUM(gpa * total_cu) and SUM(total_cu) per student, for the semesters
+        where the student has both a GPA and registered credit units.
+        """
+        semesters = list(semesters)
+        if not semesters or not self.exists():
+            return {}
+        marks = ", ".join("?" for _ in semesters)
+        return {
+            exam_number: (points, units)
+            for exam_number, points, units in self.conn.execute(
+                "SELECT exam_number, SUM(gpa * total_cu), SUM(total_cu) "
+                "FROM semester_results "
+                f"WHERE semester IN ({marks}) AND gpa IS NOT NULL AND total_cu > 0 "
+                "GROUP BY exam_number",
+                semesters,
+            )
+        }
+
+    def semesters(self):
+        """Semesters with recorded results."""
+        if not self.exists():
+            return set()
+        return {
+            semester
+            for (semester,) in self.conn.execute(
+                "SELECT DISTINCT semester FROM semester_results"
+            )
+        }
+
+    def withdrawals(self, semesters):
+        """[(exam number, semester, recorded at)] for students withdrawn in ``semesters``."""
+        semesters = list(semesters)
+        if not semesters or not self.exists():
+            return []
+        marks = ", ".join("?" for _ in semesters)
+        return self.conn.execute(
+            "SELECT exam_number, semester, recorded_at FROM semester_results "
+            f"WHERE withdrawn = 1 AND semester IN ({marks}) ORDER BY rowid",
+            semesters,
+        ).fetchall()
+
+    # ----------------------------
+    # Carryover
+    # ----------------------------
+
+    def record_carryover(self, semester, carryover_students):
+        """Replace ``semester``'s outstanding courses with ``carryover_students``."""
+        rows = [
+            (
+                str(student["exam_number"]).strip(),
+                semester,
+                student.get("set"),
+                json.dumps([c["course_code"] for c in student["failed_courses"]]),
+                student.get("identified_date")
+                or datetime.now().isoformat(timespec="seconds"),
+            )
+            for student in carryover_students
+        ]
+        with self.conn:
+            self.conn.execute("DELETE FROM carryover WHERE semester = ?", (semester,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO carryover (exam_number, semester, set_name, "
+                "failed_courses, identified_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def carryover_keys(self):
+        """[(exam number, semester)] of every student with outstanding courses."""
+        if not self.exists():
+            return []
+        return self.conn.execute(
+            "SELECT exam_number, semester FROM carryover ORDER BY rowid"
+        ).fetchall()
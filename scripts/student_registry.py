@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+student_registry.py
+
+Per-run student tracker shared by the ND, BN and BM processors.
+
+The processors used to keep STUDENT_TRACKER, WITHDRAWN_STUDENTS,
+CARRYOVER_STUDENTS and INACTIVE_STUDENTS as module-level dicts of dicts,
+every student carrying lists of semester keys. Finding inactive students
+meant a list.index() and a list membership test per student and semester,
+and the carryover tracker held a full copy of every JSON record ever loaded
+just so it could be counted.
+
+StudentRegistry interns each exam number to a small integer id and keeps one
+__slots__ record per student. Semester presence, probation/resit history and
+carryover semesters are bitmasks over the program's semester order (bit i is
+semester_order[i]; semesters outside the order get the next free bit), and
+withdrawn students are id sets indexed by the semester they withdrew in. The
+inactive, withdrawn and carryover queries are set and bit operations, so a
+student costs the same whether one semester or a multi-year history is
+loaded.
+"""
+
+import sys
+
+
+class StudentRecord:
+    """One tracked student. Semester fields are bit indexes or bitmasks."""
+
+    __slots__ = (
+        "sid",
+        "name",
+        "present",
+        "first_seen",
+        "last_seen",
+        "flagged",
+        "current_flag",
+        "status",
+        "withdrawn",
+        "withdrawn_semester",
+        "has_cgpa_data",
+        "current_gpa",
+        "cgpa_status",
+    )
+
+    def __init__(self, sid, bit, name):
+        self.sid = sid
+        self.name = name
+        self.present = 1 << bit
+        self.first_seen = bit
+        self.last_seen = bit
+        # Probation (ND, BM) or resit (BN) semesters
+        self.flagged = 0
+        self.current_flag = False
+        self.status = "Active"
+        self.withdrawn = False
+        self.withdrawn_semester = None
+        self.has_cgpa_data = False
+        self.current_gpa = 0.0
+        self.cgpa_status = "Not in CGPA"
+
+
+class Withdrawal:
+    """When a student withdrew, and the semesters they turned up in since."""
+
+    __slots__ = ("withdrawn_semester", "withdrawn_date", "reappeared_semesters")
+
+    def __init__(self, withdrawn_semester, withdrawn_date):
+        self.withdrawn_semester = withdrawn_semester
+        self.withdrawn_date = withdrawn_date
+        self.reappeared_semesters = []
+
+
+class StudentRegistry:
+    """Students seen this run, indexed by interned exam number."""
+
+    def __init__(self, semester_order=()):
+        self.semester_order = list(semester_order)
+        self._bits = {key: i for i, key in enumerate(self.semester_order)}
+        self.clear()
+
+    def clear(self):
+        """Forget every student and withdrawal (carryover and inactive too)."""
+        self._ids = {}
+        self.exam_numbers = []
+        self.records = {}
+        self.withdrawals = {}
+        self._withdrawn_in = {}
+        self.processed = 0
+        self.carryover = {}
+        self.inactive = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    # ----------------------------
+    # Ids and semester bits
+    # ----------------------------
+
+    def intern(self, exam_no):
+        """The integer id for ``exam_no``, allocated on first use."""
+        exam_no = sys.intern(str(exam_no))
+        sid = self._ids.get(exam_no)
+        if sid is None:
+            sid = self._ids[exam_no] = len(self.exam_numbers)
+            self.exam_numbers.append(exam_no)
+        return sid
+
+    def bit(self, semester_key):
+        """Bit index of ``semester_key``; unknown semesters take the next free bit."""
+        bit = self._bits.get(semester_key)
+        if bit is None:
+            bit = self._bits[semester_key] = len(self.semester_order)
+            self.semester_order.append(semester_key)
+        return bit
+
+    def semesters(self, mask):
+        """Semester keys of the bits set in ``mask``, in semester order."""
+        keys = []
+        while mask:
+            low = mask & -mask
+            keys.append(self.semester_order[low.bit_length() - 1])
+            mask ^= low
+        return keys
+
+    # ----------------------------
+    # Presence
+    # ----------------------------
+
+    def get(self, exam_no):
+        """The record for ``exam_no``, or None if it was never seen in a semester."""
+        sid = self._ids.get(str(exam_no))
+        return None if sid is None else self.records.get(sid)
+
+    def record_semester(self, semester_key, exam_numbers, names=None, flagged=None):
+        """
+        Mark ``exam_numbers`` present in ``semester_key``. ``names`` maps exam
+        numbers to names (new students default to "Unknown"); students in
+        ``flagged`` get the semester added to their probation/resit history.
+        Returns (previously withdrawn students seen again, flagged count).
+        """
+        bit = self.bit(semester_key)
+        sem_mask = 1 << bit
+        self.processed |= sem_mask
+        names = names or {}
+        flagged = set(flagged or ())
+        reappeared = []
+        flagged_count = 0
+        for exam_no in exam_numbers:
+            sid = self.intern(exam_no)
+            record = self.records.get(sid)
+            if record is None:
+                record = self.records[sid] = StudentRecord(
+                    sid, bit, names.get(exam_no, "Unknown")
+                )
+            else:
+                record.last_seen = bit
+                record.present |= sem_mask
+                if exam_no in names:
+                    record.name = names[exam_no]
+                if record.withdrawn:
+                    reappeared.append(exam_no)
+                    withdrawal = self.withdrawals.get(sid)
+                    if (
+                        withdrawal is not None
+                        and semester_key not in withdrawal.reappeared_semesters
+                    ):
+                        withdrawal.reappeared_semesters.append(semester_key)
+            if exam_no in flagged:
+                record.flagged |= sem_mask
+                record.current_flag = True
+                flagged_count += 1
+        return reappeared, flagged_count
+
+    def semester_counts(self):
+        """{number of semesters present: students}, fewest semesters first."""
+        counts = {}
+        for record in self.records.values():
+            n = record.present.bit_count()
+            counts[n] = counts.get(n, 0) + 1
+        return dict(sorted(counts.items()))
+
+    # ----------------------------
+    # Withdrawals
+    # ----------------------------
+
+    def withdraw(self, exam_no, semester_key, withdrawn_date, mark_record=True):
+        """
+        Record ``exam_no`` as withdrawn in ``semester_key``; with
+        ``mark_record`` an already tracked student is flagged too. Returns
+        True when the student was not withdrawn before.
+        """
+        sid = self.intern(exam_no)
+        bit = self.bit(semester_key)
+        record = self.records.get(sid) if mark_record else None
+        if record is not None:
+            record.withdrawn = True
+            record.withdrawn_semester = bit
+            record.status = "Withdrawn"
+        if sid in self.withdrawals:
+            return False
+        self.withdrawals[sid] = Withdrawal(semester_key, withdrawn_date)
+        self._withdrawn_in.setdefault(bit, set()).add(sid)
+        return True
+
+    def is_withdrawn(self, exam_no):
+        sid = self._ids.get(str(exam_no))
+        return sid is not None and sid in self.withdrawals
+
+    def withdrawal(self, exam_no):
+        """The Withdrawal for ``exam_no``, or None."""
+        sid = self._ids.get(str(exam_no))
+        return None if sid is None else self.withdrawals.get(sid)
+
+    def withdrawn_before(self, semester_key):
+        """Exam numbers withdrawn in a semester other than ``semester_key``."""
+        sids = self.withdrawals.keys() - self._withdrawn_in.get(self.bit(semester_key), set())
+        return {self.exam_numbers[sid] for sid in sids}
+
+    def reappeared(self):
+        """[(exam number, Withdrawal)] for withdrawn students seen again since."""
+        return [
+            (self.exam_numbers[sid], withdrawal)
+            for sid, withdrawal in self.withdrawals.items()
+            if withdrawal.reappeared_semesters
+        ]
+
+    # ----------------------------
+    # Carryover
+    # ----------------------------
+
+    def mark_carryover(self, exam_no, semester_key):
+        """Note that ``exam_no`` carries courses over from ``semester_key``."""
+        sid = self.intern(exam_no)
+        self.carryover[sid] = self.carryover.get(sid, 0) | 1 << self.bit(semester_key)
+
+    def carryover_count(self):
+        """Carryover records: one per student and semester."""
+        return sum(mask.bit_count() for mask in self.carryover.values())
+
+    def carryover_counts(self):
+        """{semester key: carryover students}, in semester order."""
+        counts = {}
+        for bit, key in enumerate(self.semester_order):
+            count = sum(mask >> bit & 1 for mask in self.carryover.values())
+            if count:
+                counts[key] = count
+        return counts
+
+    # ----------------------------
+    # Inactive students
+    # ----------------------------
+
+    def find_inactive(self):
+        """
+        Students who are not withdrawn but are missing from a processed
+        semester between their first and last appearance, followed by
+        students with CGPA data who are missing from the most recent
+        processed semester. Returns {sid: missing semester mask} (also kept
+        as ``self.inactive``), or None with fewer than two semesters
+        processed.
+        """
+        processed = self.processed
+        if processed.bit_count() < 2:
+            return None
+        most_recent = 1 << (processed.bit_length() - 1)
+        inactive = {}
+        for sid, record in self.records.items():
+            if sid in self.withdrawals:
+                continue
+            span = ((2 << record.last_seen) - 1) & ~((1 << record.first_seen) - 1)
+            missing = span & processed & ~record.present
+            if missing:
+                inactive[sid] = missing
+        for sid, record in self.records.items():
+            if sid in inactive or sid in self.withdrawals:
+                continue
+            if record.has_cgpa_data and not record.present & most_recent:
+                inactive[sid] = most_recent
+        self.inactive = inactive
+        return inactive
+
+    def inactive_counts(self):
+        """
+        (regular, cgpa) counts of ``self.inactive``: students missing an
+        intermediate semester, and students with CGPA data missing only
+        after their last appearance (i.e. from the most recent semester).
+        """
+        cgpa = sum(
+            1
+            for sid, missing in self.inactive.items()
+            if missing >> self.records[sid].last_seen
+        )
+        return len(self.inactive) - cgpa, cgpa
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+workbook_io.py
+
+Workbook readers shared by the ND, BN and BM regular processors.
+
+Raw result files from the CBT platform hold the CA, OBJ and EXAM sheets in a
+single workbook. load_raw_sheets opens the workbook once (openpyxl in
+read-only mode, so rows are streamed rather than materialised as styled
+cells) and parses every wanted sheet from that one handle.
+
+WorkbookSession keeps the output mastersheet open for a whole run, so the
+semester, CGPA_SUMMARY and ANALYSIS sheets are added to one in-memory
+workbook instead of loading and re-saving the file for every sheet. Set
+MASTERSHEET_CHECKPOINT=1 to also save after every change (crash-safe).
+
+Sheets whose size grows with the cohort (the semester sheets and
+CGPA_SUMMARY) are written through write_sheet() with a SheetSink writer. The
+session keeps only those writers and runs them into an openpyxl write-only
+workbook when it saves, so styled cells are streamed to disk instead of held
+in memory; other sheets are copied across. Streaming is on by default, so a
+large cohort's styled mastersheet never sits in memory whole; set
+MASTERSHEET_STREAMING=0 to build the sheets in memory instead. With
+MASTERSHEET_CHECKPOINT also on, every save re-runs every registered writer,
+so each checkpoint costs a full rewrite.
+
+prefetch_raw_sheets lets a worker process parse a raw workbook ahead of
+time; remember_raw_sheets hands the result to the next load_raw_sheets call
+for the same, unchanged file in the main process.
+"""
+
+import os
+from collections import namedtuple
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from env_flags import env_flag
+from sheet_writer import SheetSink, copy_worksheet
+
+RAW_SHEETS = ("CA", "OBJ", "EXAM")
+
+# sheet_names: every sheet in the workbook
+# frames:      {sheet: DataFrame} for the wanted sheets that could be read
+# errors:      {sheet: [exception, ...]} for every failed read attempt
+RawSheets = namedtuple("RawSheets", ["sheet_names", "frames", "errors"])
+
+# _raw_key(...) -> RawSheets parsed ahead of time by prefetch_raw_sheets
+_PREFETCHED = {}
+
+
+def _raw_key(path, sheets, dtype, header, fallback):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size, tuple(sheets), dtype, header, fallback)
+
+
+def load_raw_sheets(path, sheets=RAW_SHEETS, dtype=str, header=0, fallback=False):
+    """
+    Read ``sheets`` from the workbook at ``path`` in one open.
+
+    Sheets missing from the workbook are simply absent from ``frames``.
+    When a sheet cannot be read with ``dtype`` and ``fallback`` is set, it is
+    parsed again from the same handle without a dtype before giving up.
+    Errors opening the workbook itself are raised to the caller.
+    """
+    if _PREFETCHED:
+        try:
+            prefetched = _PREFETCHED.pop(_raw_key(path, sheets, dtype, header, fallback), None)
+        except OSError:
+            prefetched = None
+        if prefetched is not None:
+            return prefetched
+    frames = {}
+    errors = {}
+    with pd.ExcelFile(path) as xl:
+        sheet_names = list(xl.sheet_names)
+        for sheet in sheets:
+            if sheet not in sheet_names:
+                continue
+            try:
+                frames[sheet] = xl.parse(sheet, dtype=dtype, header=header)
+            except Exception as e:
+                errors[sheet] = [e]
+                if not fallback:
+                    continue
+                try:
+                    frames[sheet] = xl.parse(sheet, header=header)
+                except Exception as e2:
+                    errors[sheet].append(e2)
+    return RawSheets(sheet_names, frames, errors)
+
+
+def prefetch_raw_sheets(path, sheets=RAW_SHEETS, dtype=str, header=0, fallback=False):
+    """
+    Worker-side load_raw_sheets: returns (key, RawSheets), or None when the
+    workbook cannot be opened - the main process then reads it again and
+    reports the error itself.
+    """
+    try:
+        key = _raw_key(path, sheets, dtype, header, fallback)
+        return key, load_raw_sheets(path, sheets, dtype, header, fallback)
+    except Exception:
+        return None
+
+
+def remember_raw_sheets(prefetched):
+    """Keep a prefetch_raw_sheets result for the matching load_raw_sheets call."""
+    if prefetched is not None:
+        key, raw = prefetched
+        _PREFETCHED[key] = raw
+
+
+def forget_raw_sheets():
+    """Drop prefetched workbooks that were never asked for (e.g. cache hits)."""
+    _PREFETCHED.clear()
+
+
+def checkpoint_enabled():
+    """Save after every sheet when MASTERSHEET_CHECKPOINT is on (default off)."""
+    return env_flag("MASTERSHEET_CHECKPOINT")
+
+
+def streaming_enabled():
+    """Save through a write-only workbook unless MASTERSHEET_STREAMING is off."""
+    return env_flag("MASTERSHEET_STREAMING", True)
+
+
+class WorkbookSession:
+    """
+    Output workbooks held open across a run.
+
+    open() loads a workbook (or starts an empty one) the first time it is
+    asked for and hands back the same object afterwards. Callers mark_dirty()
+    after changing it; flush() writes dirty workbooks to disk - needed before
+    anything re-reads the file with pandas - and close() flushes and forgets
+    them. Saves go through a temporary file, so an interrupted save never
+    leaves a truncated workbook behind.
+
+    A streaming session keeps an empty placeholder for every sheet added with
+    write_sheet() and runs its writer only when the workbook is saved.
+    """
+
+    def __init__(self, checkpoint=None, streaming=None):
+        self.checkpoint = checkpoint_enabled() if checkpoint is None else checkpoint
+        self.streaming = streaming_enabled() if streaming is None else streaming
+        self._books = {}
+        self._dirty = set()
+        # path -> {sheet title: (placeholder worksheet, writer)}
+        self._writers = {}
+
+    def open(self, path):
+        """Return the session's workbook for ``path``."""
+        path = os.path.abspath(path)
+        wb = self._books.get(path)
+        if wb is None:
+            if os.path.exists(path):
+                wb = load_workbook(path)
+            else:
+                wb = Workbook()
+                if wb.active:
+                    wb.remove(wb.active)
+            self._books[path] = wb
+        return wb
+
+    def exists(self, path):
+        """True when ``path`` is open in the session or already on disk."""
+        return os.path.abspath(path) in self._books or os.path.exists(path)
+
+    def write_sheet(self, path, title, writer, index=None):
+        """
+        Replace sheet ``title`` of the workbook for ``path`` with what
+        ``writer(sink)`` writes to a SheetSink, and mark the workbook dirty.
+        The sheet goes to position ``index``, or keeps its current one (new
+        sheets go last). A streaming session runs ``writer`` at every save
+        instead, so it must only use data that no longer changes.
+        """
+        path = os.path.abspath(path)
+        wb = self.open(path)
+        if title in wb.sheetnames:
+            if index is None:
+                index = wb.sheetnames.index(title)
+            wb.remove(wb[title])
+        ws = wb.create_sheet(title, index)
+        if self.streaming:
+            self._writers.setdefault(path, {})[title] = (ws, writer)
+        else:
+            writer(SheetSink(ws))
+        self.mark_dirty(path)
+
+    def _save(self, path, target):
+        wb = self._books[path]
+        if not self.streaming:
+            wb.save(target)
+            return
+        writers = self._writers.get(path, {})
+        out = Workbook(write_only=True)
+        for ws in wb.worksheets:
+            sink = SheetSink(out.create_sheet(ws.title))
+            placeholder, writer = writers.get(ws.title, (None, None))
+            if placeholder is ws:
+                writer(sink)
+            else:
+                copy_worksheet(ws, sink)
+        out.save(target)
+
+    def mark_dirty(self, path):
+        """Record that the workbook for ``path`` changed (saved now if checkpointing)."""
+        path = os.path.abspath(path)
+        self._dirty.add(path)
+        if self.checkpoint:
+            self.flush(path)
+
+    def flush(self, path=None):
+        """Save the dirty workbook for ``path`` (every dirty workbook if None)."""
+        paths = sorted(self._dirty) if path is None else [os.path.abspath(path)]
+        for target in paths:
+            if target not in self._dirty:
+                continue
+            tmp = f"{target}.{os.getpid()}.tmp"
+            try:
+                self._save(target, tmp)
+                os.replace(tmp, target)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            self._dirty.discard(target)
+
+    def close(self, path=None):
+        """Flush and drop the workbook for ``path`` (every workbook if None)."""
+        self.flush(path)
+        if path is None:
+            self._books.clear()
+            self._writers.clear()
+        else:
+            self._books.pop(os.path.abspath(path), None)
+            self._writers.pop(os.path.abspath(path), None)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+zip_patch.py
+
+Member-level updates of result ZIPs for the ND, BN and BM carryover
+processors.
+
+Applying resit scores changes one file of a result ZIP, the mastersheet, but
+the carryover processors extracted the whole archive to a temporary
+directory and zipped the tree up again, inflating and re-deflating every
+semester PDF on the way. patch_zip streams the old archive into the new one
+instead: the members being replaced are written from their new files and
+every other member's compressed bytes are copied across verbatim, so nothing
+is decompressed or recompressed. extract_member pulls a single member out
+without unpacking the rest, and write_tree builds an archive from a
+directory for output that has no earlier archive to patch.
+
+Every archive is written to a temporary file beside its destination and
+moved into place with os.replace, so a failed or interrupted run never
+leaves a truncated ZIP under the destination's name.
+"""
+
+import os
+import posixpath
+import shutil
+import struct
+import tempfile
+import zipfile
+from contextlib import contextmanager
+
+COPY_CHUNK = 1024 * 1024
+
+# Extensions whose contents are already compressed; deflating them again
+# costs time and saves next to nothing, so write_tree stores them as they are
+STORED_EXTENSIONS = frozenset((".xlsx", ".docx", ".zip", ".png", ".jpg", ".jpeg"))
+
+# _copy_raw reads the local header and appends to the central directory
+# through private zipfile names. Verified on CPython 3.11.7; anything
+# missing on another version sends patch_zip through zin.read()/writestr(),
+# which gives the same archive at the cost of recompressing the member.
+_RAW_COPY_NAMES = (
+    "structFileHeader",
+    "sizeFileHeader",
+    "stringFileHeader",
+    "_FH_SIGNATURE",
+    "_FH_FILENAME_LENGTH",
+    "_FH_EXTRA_FIELD_LENGTH",
+    "_MASK_USE_DATA_DESCRIPTOR",
+)
+_RAW_COPY_ATTRS = ("fp", "filelist", "NameToInfo", "start_dir", "_didModify")
+
+
+def is_mastersheet(name):
+    """True for a mastersheet workbook member of a result ZIP (not a _BACKUP copy)."""
+    return (
+        "mastersheet" in name.lower()
+        and name.endswith(".xlsx")
+        and not name.endswith("_BACKUP.xlsx")
+    )
+
+
+def find_member(zip_path, match=is_mastersheet):
+    """Name of the first member of ``zip_path`` (in archive order) that satisfies ``match``, or None."""
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        for name in zf.namelist():
+            if match(name):
+                return name
+    return None
+
+
+def extract_member(zip_path, member, dest_path):
+    """Stream the single member ``member`` of ``zip_path`` to ``dest_path``."""
+    with zipfile.ZipFile(zip_path, "r") as zf, zf.open(member) as src, open(
+        dest_path, "wb"
+    ) as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK)
+    return dest_path
+
+
+@contextmanager
+def _atomic_zip(dest_path):
+    """A ZipFile open for writing that replaces ``dest_path`` only once it is complete."""
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=".", suffix=".part", dir=os.path.dirname(os.path.abspath(dest_path))
+    )
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zout:
+            yield zout
+        # mkstemp creates the file private to its owner; give it the usual mode
+        if os.path.exists(dest_path):
+            shutil.copymode(dest_path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _can_copy_raw(zin, zout):
+    """True when this zipfile module exposes the internals _copy_raw relies on."""
+    return (
+        all(hasattr(zipfile, name) for name in _RAW_COPY_NAMES)
+        and all(hasattr(zout, attr) for attr in _RAW_COPY_ATTRS)
+        and hasattr(zin, "fp")
+    )
+
+
+def _copy_decoded(zin, zout, info):
+    """Fallback for _copy_raw: decompress ``info`` from ``zin`` and write it to ``zout``."""
+    out = zipfile.ZipInfo(info.filename, info.date_time)
+    out.compress_type = info.compress_type
+    out.create_system = info.create_system
+    out.external_attr = info.external_attr
+    out.comment = info.comment
+    zout.writestr(out, zin.read(info))
+
+
+def _copy_raw(zin, zout, info):
+    """Append member ``info`` of ``zin`` to ``zout`` without decompressing it."""
+    zin.fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, zin.fp.read(zipfile.sizeFileHeader))
+    if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header for member {info.filename!r}")
+    zin.fp.seek(
+        header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], 1
+    )
+
+    out = zipfile.ZipInfo(info.filename, info.date_time)
+    out.compress_type = info.compress_type
+    out.create_system = info.create_system
+    out.create_version = info.create_version
+    out.extract_version = info.extract_version
+    out.external_attr = info.external_attr
+    out.comment = info.comment
+    # CRC and sizes go in the local header, so no data descriptor follows the data
+    out.flag_bits = info.flag_bits & ~zipfile._MASK_USE_DATA_DESCRIPTOR
+    out.CRC = info.CRC
+    out.compress_size = info.compress_size
+    out.file_size = info.file_size
+
+    fp = zout.fp
+    out.header_offset = fp.tell()
+    fp.write(out.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(COPY_CHUNK, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated data for member {info.filename!r}")
+        fp.write(chunk)
+        remaining -= len(chunk)
+
+    zout.filelist.append(out)
+    zout.NameToInfo[out.filename] = out
+    zout.start_dir = fp.tell()
+    zout._didModify = True
+
+
+def patch_zip(src_path, replacements, dest_path=None):
+    """
+    Write ``src_path`` to ``dest_path`` (default: over ``src_path``) with
+    some members changed.
+
+    ``replacements`` maps member names to the path of their new content, or
+    to None to drop the member; names not in the archive are added at the
+    end. Replaced members keep their place and compression method, and all
+    other members are copied as raw compressed bytes (or re-encoded, if this
+    Python's zipfile lacks the internals _copy_raw needs).
+
+    Returns ``(copied, written)``, the number of members copied verbatim and
+    written from new files.
+    """
+    dest_path = dest_path or src_path
+    pending = dict(replacements)
+    copied = written = 0
+    with zipfile.ZipFile(src_path, "r") as zin, _atomic_zip(dest_path) as zout:
+        copy = _copy_raw if _can_copy_raw(zin, zout) else _copy_decoded
+        for info in zin.infolist():
+            if info.filename not in pending:
+                copy(zin, zout, info)
+                copied += 1
+                continue
+            new_path = pending.pop(info.filename)
+            if new_path is not None:
+                zout.write(new_path, info.filename, compress_type=info.compress_type)
+                written += 1
+        for name, new_path in pending.items():
+            if new_path is not None:
+                zout.write(new_path, name)
+                written += 1
+    return copied, written
+
+
+def write_tree(source_dir, zip_path, select=None):
+    """
+    Zip the files under ``source_dir`` into ``zip_path``, named relative to
+    it. ``select(arcname)`` may limit the files taken; already-compressed
+    formats are stored rather than deflated. Returns the arcnames written.
+    """
+    written = []
+    with _atomic_zip(zip_path) as zout:
+        # The archive may be written inside the tree it is made from
+        skip = {os.path.abspath(zip_path), os.path.abspath(zout.filename)}
+        for root, dirs, files in os.walk(source_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                if os.path.abspath(file_path) in skip:
+                    continue
+                arcname = os.path.relpath(file_path, source_dir).replace(os.sep, "/")
+                if select is not None and not select(arcname):
+                    continue
+                ext = posixpath.splitext(arcname)[1].lower()
+                compress_type = (
+                    zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                )
+                zout.write(file_path, arcname, compress_type=compress_type)
+                written.append(arcname)
+    return written
@@ -0,0 +1,171 @@
+import difflib
+import re
+
+import pytest
+
+import course_matcher
+from course_matcher import CourseMatcher, clear_match_cache, get_course_matcher
+
+KEY_WORDS = ("foundation", "nursing", "emergency", "care", "communication", "anatomy", "physiology")
+
+
+def normalize(name):
+    if not isinstance(name, str):
+        return ""
+    normalized = re.sub(r"\s+", " ", name.lower().strip())
+    normalized = re.sub(r"[^\w\s]", "", normalized)
+    for old, new in {"nsg": "nursing", "foundation": "foundations"}.items():
+        normalized = normalized.replace(old, new)
+    return normalized.strip()
+
+
+def baseline_match(column_name, course_map):
+    """The row-by-row ND matcher CourseMatcher replaced."""
+    if not isinstance(column_name, str):
+        return None
+    normalized_column = normalize(column_name)
+    if " " in normalized_column:
+        potential_code = normalized_column.split(" ")[0]
+    elif "_" in normalized_column:
+        potential_code = normalized_column.split("_")[0]
+    else:
+        potential_code = normalized_column
+    potential_code = re.sub(r"[^a-z0-9]", "", potential_code)
+    code_to_info = {info["code"].lower(): info for info in course_map.values()}
+    if potential_code in code_to_info:
+        return code_to_info[potential_code]
+    if normalized_column in course_map:
+        return course_map[normalized_column]
+    for course_norm, course_info in course_map.items():
+        if course_norm in normalized_column or normalized_column in course_norm:
+            return course_info
+    column_words = set(normalized_column.split())
+    best_match = None
+    best_score = 0
+    for course_norm, course_info in course_map.items():
+        course_words = set(course_norm.split())
+        common_words = column_words.intersection(course_words)
+        if common_words:
+            score = len(common_words)
+            for word in KEY_WORDS:
+                if word in column_words and word in course_words:
+                    score += 2
+            if score > best_score:
+                best_score = score
+                best_match = course_info
+    if best_match and best_score >= 2:
+        return best_match
+    best_match = None
+    best_ratio = 0
+    for course_norm, course_info in course_map.items():
+        ratio = difflib.SequenceMatcher(None, normalized_column, course_norm).ratio()
+        if ratio > best_ratio and ratio > 0.6:
+            best_ratio = ratio
+            best_match = course_info
+    return best_match
+
+
+def _course_map():
+    titles = {
+        "NUR111": "Foundations of Nursing I",
+        "NUR112": "Anatomy and Physiology I",
+        "NUR113": "Communication in Nursing",
+        "NUR114": "Emergency Care and First Aid",
+        "GNS101": "Use of English",
+        "BIO113": "General Biology",
+        "CHM101": "General Chemistry",
+        "NUR121": "Community Health Nursing",
+    }
+    return {normalize(title): {"code": code, "title": title} for code, title in titles.items()}
+
+
+HEADERS = [
+    "NUR111",
+    "nur112_CA",
+    "GNS101 EXAM",
+    "Foundation of NSG I",
+    "ANATOMY & PHYSIOLOGY I",
+    "communication",
+    "Emergency care",
+    "Use of Englsh",
+    "General Chemstry",
+    "Community Health",
+    "Health Education",
+    "Mathematics",
+    "",
+    None,
+    42,
+]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry():
+    clear_match_cache()
+    yield
+    clear_match_cache()
+
+
+@pytest.mark.parametrize("header", HEADERS)
+def test_decisions_match_baseline(header):
+    course_map = _course_map()
+    matcher = CourseMatcher(course_map, normalize, KEY_WORDS, match_codes=True)
+    assert matcher.match(header) is baseline_match(header, course_map)
+    # The cached decision is the same one
+    assert matcher.match(header) is baseline_match(header, course_map)
+
+
+def test_headers_are_decided_once(monkeypatch):
+    matcher = get_course_matcher(_course_map(), normalize, KEY_WORDS, match_codes=True)
+    calls = []
+    decide = matcher._decide
+    monkeypatch.setattr(matcher, "_decide", lambda header: calls.append(header) or decide(header))
+    for _ in range(3):
+        for header in ("NUR111", "Use of Englsh", "Mathematics"):
+            matcher.match(header)
+    assert calls == ["NUR111", "Use of Englsh", "Mathematics"]
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(course_matcher, "MATCH_CACHE_SIZE", 2)
+    matcher = CourseMatcher(_course_map(), normalize, KEY_WORDS, match_codes=True)
+    for header in ("NUR111", "NUR112", "NUR111", "NUR113"):
+        matcher.match(header)
+    # NUR112 was the least recently used
+    assert list(matcher._matches) == ["NUR111", "NUR113"]
+
+
+def test_registry_reuses_the_matcher_of_the_same_map():
+    course_map = _course_map()
+    matcher = get_course_matcher(course_map, normalize, KEY_WORDS, match_codes=True)
+    assert get_course_matcher(course_map, normalize, KEY_WORDS, match_codes=True) is matcher
+    # A different configuration gets its own matcher
+    other = get_course_matcher(course_map, normalize, KEY_WORDS)
+    assert other is not matcher
+    assert other.match("NUR111") is None
+
+
+def test_reloaded_catalogue_replaces_the_old_matcher():
+    old_map = _course_map()
+    old = get_course_matcher(old_map, normalize, KEY_WORDS, match_codes=True)
+    old.match("Use of Englsh")
+    # Same catalogue loaded again: the old matcher is dropped and cleared
+    new_map = _course_map()
+    new = get_course_matcher(new_map, normalize, KEY_WORDS, match_codes=True)
+    assert new is not old
+    assert not old._matches
+    assert list(course_matcher._MATCHERS.values()) == [new]
+    assert new.match("Use of Englsh") is new_map["use of english"]
+    # A changed catalogue gets a matcher that sees the change
+    changed = dict(new_map)
+    changed["use of english"] = {"code": "GNS102", "title": "Use of English"}
+    assert get_course_matcher(changed, normalize, KEY_WORDS, match_codes=True).match("GNS102") is changed[
+        "use of english"
+    ]
+
+
+def test_clear_match_cache_forgets_everything():
+    matcher = get_course_matcher(_course_map(), normalize, KEY_WORDS, match_codes=True)
+    matcher.match("NUR111")
+    clear_match_cache()
+    assert not matcher._matches
+    assert not course_matcher._MATCHERS
@@ -0,0 +1,92 @@
+import re
+
+import pytest
+
+import pdf_shards
+
+reportlab = pytest.importorskip("reportlab")
+PIL_Image = pytest.importorskip("PIL.Image")
+
+from reportlab.lib.styles import getSampleStyleSheet  # noqa: E402
+from reportlab.platypus import Image, Paragraph  # noqa: E402
+
+
+@pytest.fixture
+def logo(tmp_path):
+    # RGBA, so ReportLab writes the image with a /SMask like the real logo
+    path = tmp_path / "logo.png"
+    img = PIL_Image.new("RGBA", (120, 120))
+    img.putdata([(x % 256, y % 256, 90, (x * y) % 256) for y in range(120) for x in range(120)])
+    img.save(path)
+    return str(path)
+
+
+def _student_pages(logo, count):
+    style = getSampleStyleSheet()["Normal"]
+    return [
+        (f"S{i:03d}", [Image(logo, 50, 50), Paragraph(f"Student {i} " * 40, style)])
+        for i in range(count)
+    ]
+
+
+def _image_objects(path):
+    with open(path, "rb") as f:
+        return len(re.findall(rb"/Subtype /Image", f.read()))
+
+
+def _check_references(path):
+    objects, root, pages_root, info, page_nums = pdf_shards._read_pdf(path)
+    for body in objects.values():
+        head, _ = pdf_shards._split_stream(body)
+        for num in pdf_shards._REF.findall(head):
+            assert int(num) in objects
+    return page_nums
+
+
+def test_merged_build_matches_single_process(tmp_path, logo, monkeypatch):
+    monkeypatch.setenv("PDF_SHARD_SIZE", "2")
+    merged = tmp_path / "merged.pdf"
+    single = tmp_path / "single.pdf"
+
+    assert pdf_shards.build_student_pdf(_student_pages(logo, 5), str(merged), {}, workers=2) == 3
+    pdf_shards.build_student_pdf(_student_pages(logo, 5), str(single), {}, workers=1)
+
+    assert len(_check_references(merged)) == len(_check_references(single)) == 5
+    assert _image_objects(merged) == _image_objects(single) == 2
+    assert merged.stat().st_size <= single.stat().st_size * 1.1
+
+
+def test_merge_pdfs_concatenates_pages_in_order(tmp_path, logo):
+    parts = []
+    for i, count in enumerate((3, 1, 2)):
+        part = tmp_path / f"part{i}.pdf"
+        pdf_shards.render_pdf(str(part), _student_pages(logo, count), {})
+        parts.append(str(part))
+    out = tmp_path / "out.pdf"
+
+    pdf_shards.merge_pdfs(parts, str(out))
+
+    assert len(_check_references(out)) == 6
+    assert _image_objects(out) == 2
+
+
+def test_merge_pdfs_rejects_page_count_mismatch(tmp_path, logo, monkeypatch):
+    parts = []
+    for i in range(2):
+        part = tmp_path / f"part{i}.pdf"
+        pdf_shards.render_pdf(str(part), _student_pages(logo, 2), {})
+        parts.append(str(part))
+    out = tmp_path / "out.pdf"
+    read_pdf = pdf_shards._read_pdf
+
+    def drop_last_page(path):
+        objects, root, pages_root, info, page_nums = read_pdf(path)
+        if path.endswith(".tmp"):
+            page_nums = page_nums[:-1]
+        return objects, root, pages_root, info, page_nums
+
+    monkeypatch.setattr(pdf_shards, "_read_pdf", drop_last_page)
+    with pytest.raises(ValueError, match="merged 3 pages"):
+        pdf_shards.merge_pdfs(parts, str(out))
+    assert not out.exists()
+    assert list(tmp_path.glob("*.tmp")) == []
@@ -0,0 +1,91 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from resit_index import build_course_index, build_student_index, code_key, find_student
+
+PREFIX = r"^(BN|NUR|NSC)"
+
+
+def baseline_find(exam_no, exam_numbers):
+    """The three iterrows passes of BN's find_student_in_mastersheet_fixed, as positions."""
+    exam_no_clean = re.sub(r"[^A-Z0-9]", "", str(exam_no).strip().upper())
+    cells = [str(v).strip().upper() if pd.notna(v) else "" for v in exam_numbers]
+    for pos, current in enumerate(cells):
+        if re.sub(r"[^A-Z0-9]", "", current) == exam_no_clean:
+            return pos
+    for pos, current in enumerate(cells):
+        current_clean = re.sub(r"[^A-Z0-9]", "", current)
+        if exam_no_clean in current_clean or current_clean in exam_no_clean:
+            return pos
+    for pos, current in enumerate(cells):
+        if re.sub(PREFIX, "", current) == re.sub(PREFIX, "", exam_no_clean):
+            return pos
+    return None
+
+
+EXAM_NUMBERS = [
+    "FCTCONS/BN24/001",
+    "FCTCONS/BN24/002",
+    "fctcons bn24 003",
+    "FCTCONS/BN24/001",
+    "BN24004",
+    "NUR24005",
+    "FCTCONS/BN24/0100",
+]
+
+
+@pytest.mark.parametrize(
+    "exam_no",
+    [
+        "FCTCONS/BN24/001",
+        "fctcons-bn24-002",
+        "FCTCONS/BN24/003",
+        "FCTCONS/BN24/01",
+        "BN24/004",
+        "NSC24005",
+        "24004",
+        "FCTCONS/BN24/999",
+        "XYZ",
+    ],
+)
+def test_find_student_matches_baseline(exam_no):
+    index = build_student_index(EXAM_NUMBERS, PREFIX)
+    assert find_student(index, exam_no) == baseline_find(exam_no, EXAM_NUMBERS)
+
+
+def test_blank_rows_are_never_matched():
+    cells = ["", np.nan, None, "nan", "None", "FCTCONS/BN24/001"]
+    index = build_student_index(cells, PREFIX)
+    assert index.exact == {"FCTCONSBN24001": 5}
+    assert find_student(index, "FCTCONS/BN24/009") is None
+    assert find_student(index, "  ") is None
+
+
+def test_code_key():
+    assert code_key(" nur-101 ") == code_key("NUR 101") == "NUR101"
+
+
+def test_course_index_prefers_headings_and_drops_ambiguous_variants():
+    def variants(heading):
+        key = code_key(heading)
+        # The code with and without a programme prefix
+        return [key, re.sub(r"^[A-Z]+", "", key), "NUR" + re.sub(r"^[A-Z]+", "", key)]
+
+    columns = build_course_index({"NUR 101": 3, "BIO-101": 4, "GNS102": 5}, variants)
+    assert columns["NUR101"] == 3
+    assert columns["BIO101"] == 4
+    assert columns["GNS102"] == 5
+    # "101" would name both NUR 101 and BIO-101, so it names neither
+    assert "101" not in columns
+    assert columns["102"] == 5
+    assert columns["NUR102"] == 5
+
+
+def test_course_index_of_plain_headings():
+    assert build_course_index(["NUR 101", "", "nur101", "GNS-102"]) == {
+        "NUR101": "NUR 101",
+        "GNS102": "GNS-102",
+    }
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from score_engine import (
+    compute_course_scores,
+    derive_semester_results,
+    is_not_registered,
+    not_reg_mask,
+)
+
+# ND's 4.0 scale and pass mark
+ND_GRADE_BANDS = ((70, 4.0), (60, 3.0), (50, 2.0), (45, 1.0))
+PASS_THRESHOLD = 50
+CODES = ["NUR111", "NUR112", "GNS101", "BIO113"]
+CREDIT_UNITS = {"NUR111": 3, "NUR112": 2, "GNS101": 2, "BIO113": 0}
+
+
+# The row-wise ND scoring the engine replaced, kept as the reference
+
+
+def baseline_grade_point(score):
+    try:
+        score = float(score)
+        if score >= 70:
+            return 4.0
+        elif score >= 60:
+            return 3.0
+        elif score >= 50:
+            return 2.0
+        elif score >= 45:
+            return 1.0
+        else:
+            return 0.0
+    except BaseException:
+        return 0.0
+
+
+def baseline_scores(merged, codes):
+    scores = pd.DataFrame(index=merged.index)
+    for code in codes:
+        ca_col, obj_col, exam_col = f"{code}_CA", f"{code}_OBJ", f"{code}_EXAM"
+        scores[code] = 0
+        scores[code] = scores[code].astype("object")
+        for idx in merged.index:
+            if any(
+                col in merged.columns and is_not_registered(merged.at[idx, col])
+                for col in (ca_col, obj_col, exam_col)
+            ):
+                scores.at[idx, code] = "NOT REG"
+                continue
+            parts = []
+            for col in (ca_col, obj_col, exam_col):
+                value = (
+                    pd.to_numeric(merged.at[idx, col], errors="coerce")
+                    if col in merged.columns and pd.notna(merged.at[idx, col])
+                    else 0
+                )
+                parts.append(value)
+            ca, obj, exam = parts
+            ca_norm = min((float(ca) / 20) * 100 if not pd.isna(ca) else 0, 100)
+            obj_norm = min((float(obj) / 20) * 100 if not pd.isna(obj) else 0, 100)
+            exam_norm = min((float(exam) / 80) * 100 if not pd.isna(exam) else 0, 100)
+            scores.at[idx, code] = round((ca_norm * 0.2) + (((obj_norm + exam_norm) / 2) * 0.8), 0)
+    return scores
+
+
+def baseline_results(scores, codes, credit_units):
+    rows = []
+    for _, row in scores.iterrows():
+        fails = []
+        for c in codes:
+            score = row.get(c)
+            if is_not_registered(score):
+                continue
+            try:
+                if float(score or 0) < PASS_THRESHOLD:
+                    fails.append(c)
+            except (ValueError, TypeError):
+                continue
+        tcpe, tcup, tcuf, registered_cu = 0.0, 0, 0, 0
+        for code in codes:
+            score = row.get(code)
+            if is_not_registered(score):
+                continue
+            try:
+                score_val = float(score) if pd.notna(score) and score != "" else 0
+                cu = credit_units.get(code, 0)
+                tcpe += baseline_grade_point(score_val) * cu
+                registered_cu += cu
+                if score_val >= PASS_THRESHOLD:
+                    tcup += cu
+                else:
+                    tcuf += cu
+            except (ValueError, TypeError):
+                continue
+        tcpe = round(tcpe, 1)
+        rows.append(
+            {
+                "FAILED COURSES": ", ".join(sorted(fails)) if fails else "",
+                "TCPE": tcpe,
+                "CU Passed": tcup,
+                "CU Failed": tcuf,
+                "Total Registered CU": registered_cu,
+                "GPA": round(tcpe / registered_cu, 2) if registered_cu > 0 else 0.0,
+            }
+        )
+    return pd.DataFrame(rows, index=scores.index)
+
+
+def _engine_results(scores):
+    return derive_semester_results(
+        scores,
+        [CREDIT_UNITS[c] for c in CODES],
+        ND_GRADE_BANDS,
+        PASS_THRESHOLD,
+        not_reg=not_reg_mask(scores[CODES]),
+    )
+
+
+def _assert_same(engine, baseline):
+    for col in baseline.columns:
+        if col == "FAILED COURSES":
+            assert list(engine[col]) == list(baseline[col])
+        else:
+            np.testing.assert_allclose(
+                engine[col].to_numpy(dtype=float), baseline[col].to_numpy(dtype=float), err_msg=col
+            )
+
+
+@pytest.fixture
+def merged():
+    rng = np.random.default_rng(7)
+    n = 60
+    frame = {"REG. No": [f"FPI/ND/{i:03d}" for i in range(n)]}
+    for code in CODES:
+        frame[f"{code}_CA"] = rng.integers(0, 25, n).astype(object)
+        frame[f"{code}_OBJ"] = rng.integers(0, 22, n).astype(object)
+        frame[f"{code}_EXAM"] = rng.integers(0, 85, n).astype(object)
+    frame = pd.DataFrame(frame)
+    # Blank, text and NOT REG components
+    frame.loc[1, "NUR111_CA"] = np.nan
+    frame.loc[2, "NUR112_EXAM"] = "ABS"
+    frame.loc[3, "GNS101_OBJ"] = "NOT REG"
+    frame.loc[4, "BIO113_EXAM"] = "not registered"
+    frame.loc[5, ["NUR111_CA", "NUR111_OBJ", "NUR111_EXAM"]] = np.nan
+    return frame
+
+
+def test_course_scores_match_baseline(merged):
+    engine = compute_course_scores(merged, CODES, mask_not_reg=True)
+    baseline = baseline_scores(merged, CODES)
+    assert engine.astype(str).equals(baseline.astype(str))
+
+
+def test_semester_results_match_baseline(merged):
+    scores = baseline_scores(merged, CODES)
+    _assert_same(_engine_results(scores), baseline_results(scores, CODES, CREDIT_UNITS))
+
+
+def test_nan_and_blank_scores_match_baseline():
+    # A NaN score is a failed 0 for the credit units but is not listed in
+    # FAILED COURSES; a "" score is listed; unreadable text is skipped
+    scores = pd.DataFrame(
+        {
+            "NUR111": [np.nan, 72, "", 30],
+            "NUR112": [55, np.nan, 40, "ABS"],
+            "GNS101": ["NOT REG", 61, np.nan, 49],
+            "BIO113": [10, 80, 90, np.nan],
+        },
+        dtype=object,
+    )
+    engine = _engine_results(scores)
+    baseline = baseline_results(scores, CODES, CREDIT_UNITS)
+    _assert_same(engine, baseline)
+    assert engine.loc[0, "FAILED COURSES"] == "BIO113"
+    assert engine.loc[0, "CU Failed"] == 3
+    assert engine.loc[2, "FAILED COURSES"] == "NUR111, NUR112"
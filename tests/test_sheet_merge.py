@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from sheet_merge import (
+    MergeReport,
+    merge_score_sheets,
+    registration_keys,
+    registrations,
+    report_summary,
+)
+
+CODES = {"nursing i": "NUR111", "anatomy": "NUR112", "english": "GNS101"}
+
+
+def match(header):
+    return CODES.get(str(header).strip().lower())
+
+
+def _sheets():
+    ca = pd.DataFrame(
+        {
+            "REG. No": ["FPI/003", " FPI/001", "FPI/002", "FPI/001", np.nan, ""],
+            "NAME": ["CHIDI", "ADA ", "BOLA", "ADA AGAIN", "GHOST", "GHOST"],
+            "Nursing I": ["15", "18", "NOT REG", "5", "1", "1"],
+            "Anatomy": ["12", "10", "9", "1", "1", "1"],
+            "Remarks": ["", "", "", "", "", ""],
+        },
+        dtype=object,
+    )
+    obj = pd.DataFrame(
+        {
+            "Reg No": ["FPI/001", "FPI/002", "FPI/004"],
+            "Full Name": ["ADA", np.nan, "DAYO"],
+            "Nursing I": ["17", "14", "11"],
+            "English": ["19", "16", "20"],
+        },
+        dtype=object,
+    )
+    exam = pd.DataFrame(
+        {
+            "REG. No": ["FPI/002", "FPI/001"],
+            "NAME": ["BOLA", "ADA"],
+            "NURSING I": ["70", "64"],
+            "nursing i": ["1", "1"],
+        },
+        dtype=object,
+    )
+    return {"CA": ca, "OBJ": obj, "EXAM": exam}
+
+
+def _merge(sheets=None):
+    sheets = sheets or _sheets()
+    return merge_score_sheets(
+        sheets,
+        {"CA": "REG. No", "OBJ": "Reg No", "EXAM": "REG. No"},
+        {"CA": "NAME", "OBJ": "Full Name", "EXAM": "NAME"},
+        match,
+    )
+
+
+def test_registration_keys_normalise_distinct_values():
+    keys = registration_keys(pd.Series([" A1", "A1", None, "nan", "B2 ", 7]))
+    assert list(keys.categories) == ["A1", "B2", "7"]
+    assert list(keys.codes) == [0, 0, -1, -1, 1, 2]
+
+
+def test_one_row_per_registration_with_component_columns():
+    merged, _ = _merge()
+    regs = registrations(merged)
+    assert list(regs["REG. No"]) == ["FPI/001", "FPI/002", "FPI/003", "FPI/004"]
+    assert list(regs["NAME"]) == ["ADA", "BOLA", "CHIDI", "DAYO"]
+    assert list(merged.columns) == [
+        ("NUR111", "CA"),
+        ("NUR112", "CA"),
+        ("NUR111", "OBJ"),
+        ("GNS101", "OBJ"),
+        ("NUR111", "EXAM"),
+    ]
+    row = dict(zip(merged.columns, merged.iloc[0]))
+    # The first row of a repeated registration, the first of duplicate headers
+    assert row[("NUR111", "CA")] == "18"
+    assert row[("NUR111", "EXAM")] == "64"
+    assert merged.iloc[1][("NUR111", "CA")] == "NOT REG"
+    # Registrations missing from a sheet get NaN there
+    assert pd.isna(merged.iloc[3][("NUR111", "CA")])
+    assert pd.isna(merged.iloc[2][("NUR111", "EXAM")])
+
+
+def test_report_lists_duplicates_orphans_blanks_and_unmatched():
+    _, report = _merge()
+    assert report.duplicates == {"CA": ["FPI/001"]}
+    assert report.blank_rows == {"CA": 2}
+    assert report.orphans == {"FPI/003": ("OBJ", "EXAM"), "FPI/004": ("CA", "EXAM")}
+    assert report.unmatched == {"CA": ["Remarks"]}
+    assert report.skipped == []
+    assert report_summary(report) == (
+        "1 duplicate registration(s) (first row kept); "
+        "2 registration(s) missing from some sheets; "
+        "2 row(s) without a registration number dropped; "
+        "1 unmatched header(s)"
+    )
+    assert report_summary(MergeReport({}, {}, {}, {}, [])) == ""
+
+
+def test_single_sheet_keeps_first_seen_order_and_empty_sheets_are_skipped():
+    sheets = _sheets()
+    merged, report = _merge({"CA": sheets["CA"], "OBJ": sheets["OBJ"].iloc[0:0]})
+    assert list(registrations(merged)["REG. No"]) == ["FPI/003", "FPI/001", "FPI/002"]
+    assert report.skipped == ["OBJ"]
+    assert _merge({"CA": sheets["CA"].iloc[0:0]}) == (None, MergeReport({}, {}, {}, {}, ["CA"]))
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from student_history import StudentHistory
+
+COLUMNS = {
+    "exam_number": "EXAM NUMBER",
+    "name": "NAME",
+    "gpa": "GPA",
+    "total_cu": "Total Registered CU",
+    "remarks": "REMARKS",
+}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = StudentHistory(str(tmp_path / "student_history.sqlite"))
+    yield history
+    history.close()
+
+
+def _semester(rows):
+    return pd.DataFrame(rows, columns=["EXAM NUMBER", "NAME", "GPA", "Total Registered CU", "REMARKS"])
+
+
+def _record_two_semesters(history):
+    history.record_semester(
+        "ND-FIRST-YEAR-FIRST-SEMESTER",
+        _semester(
+            [
+                ["FPI/001", "ADA", 3.5, 20, "Passed"],
+                ["FPI/002", "BOLA", 2.0, 18, "Resit"],
+                ["FPI/003", "CHIDI", float("nan"), 0, "Withdrawn"],
+            ]
+        ),
+        COLUMNS,
+    )
+    history.record_semester(
+        "ND-FIRST-YEAR-SECOND-SEMESTER",
+        _semester(
+            [
+                ["FPI/001", "ADA", 3.0, 10, "Passed"],
+                [" FPI/002 ", "BOLA", 2.5, 22, "Passed"],
+            ]
+        ),
+        COLUMNS,
+    )
+
+
+def test_gpa_lookup(history):
+    assert history.gpa("FPI/001", "ND-FIRST-YEAR-FIRST-SEMESTER") is None
+    _record_two_semesters(history)
+    assert history.gpa("FPI/001", "ND-FIRST-YEAR-FIRST-SEMESTER") == 3.5
+    assert history.gpa(" FPI/002", "ND-FIRST-YEAR-SECOND-SEMESTER") == 2.5
+    assert history.gpa("FPI/003", "ND-FIRST-YEAR-FIRST-SEMESTER") is None
+    assert history.gpa("FPI/999", "ND-FIRST-YEAR-FIRST-SEMESTER") is None
+
+
+def test_gpas_skip_students_without_a_gpa(history):
+    _record_two_semesters(history)
+    assert history.gpas("ND-FIRST-YEAR-FIRST-SEMESTER") == {"FPI/001": 3.5, "FPI/002": 2.0}
+    assert history.gpas("ND-SECOND-YEAR-FIRST-SEMESTER") == {}
+
+
+def test_cumulative_points_weight_gpa_by_credit_units(history):
+    _record_two_semesters(history)
+    points = history.cumulative_points(
+        ["ND-FIRST-YEAR-FIRST-SEMESTER", "ND-FIRST-YEAR-SECOND-SEMESTER"]
+    )
+    assert set(points) == {"FPI/001", "FPI/002"}
+    assert points["FPI/001"] == pytest.approx((3.5 * 20 + 3.0 * 10, 30))
+    assert points["FPI/002"] == pytest.approx((2.0 * 18 + 2.5 * 22, 40))
+    assert history.cumulative_points(["ND-FIRST-YEAR-SECOND-SEMESTER"])["FPI/001"] == (30.0, 10.0)
+    assert history.cumulative_points([]) == {}
+
+
+def test_rerecording_a_semester_replaces_it(history):
+    _record_two_semesters(history)
+    history.record_semester(
+        "ND-FIRST-YEAR-FIRST-SEMESTER",
+        _semester([["FPI/001", "ADA", 4.0, 20, "Passed"]]),
+        COLUMNS,
+    )
+    assert history.gpas("ND-FIRST-YEAR-FIRST-SEMESTER") == {"FPI/001": 4.0}
+    assert history.semesters() == {"ND-FIRST-YEAR-FIRST-SEMESTER", "ND-FIRST-YEAR-SECOND-SEMESTER"}
+    frame = history.semester_results("ND-FIRST-YEAR-FIRST-SEMESTER", COLUMNS)
+    assert list(frame["EXAM NUMBER"]) == ["FPI/001"]
+
+
+def test_queries_do_not_create_a_missing_store(tmp_path):
+    history = StudentHistory(str(tmp_path / "none" / "student_history.sqlite"))
+    assert history.gpa("FPI/001", "ND-FIRST-YEAR-FIRST-SEMESTER") is None
+    assert history.gpas("ND-FIRST-YEAR-FIRST-SEMESTER") == {}
+    assert history.cumulative_points(["ND-FIRST-YEAR-FIRST-SEMESTER"]) == {}
+    assert not (tmp_path / "none").exists()
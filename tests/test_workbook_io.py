@@ -0,0 +1,55 @@
+from openpyxl import load_workbook
+from openpyxl.styles import Font
+
+import workbook_io
+from workbook_io import WorkbookSession
+
+
+def _semester_writer(sink):
+    sink.set_widths({1: 18, 2: 30})
+    sink.freeze(3)
+    sink.merge("A1:C1")
+    sink.append(["ND-FIRST-YEAR-FIRST-SEMESTER"], [{"font": Font(bold=True, size=14)}])
+    sink.append(["EXAM NUMBER", "NAME", "GPA"])
+    for i in range(50):
+        sink.append([f"FPI/{i:03d}", f"Student {i}", round(i / 20, 2)])
+
+
+def _build(path, streaming):
+    session = WorkbookSession(checkpoint=False, streaming=streaming)
+    session.write_sheet(path, "ND-FIRST-YEAR-FIRST-SEMESTER", _semester_writer)
+    # A sheet built the ordinary way, like ANALYSIS
+    ws = session.open(path).create_sheet("ANALYSIS")
+    ws["A1"] = "SEMESTER"
+    ws["A1"].font = Font(italic=True)
+    ws.column_dimensions["A"].width = 12
+    session.mark_dirty(path)
+    session.close(path)
+    return load_workbook(path)
+
+
+def _sheet_state(ws):
+    return (
+        [list(row) for row in ws.iter_rows(values_only=True)],
+        sorted(str(r) for r in ws.merged_cells.ranges),
+        ws.freeze_panes,
+        {k: d.width for k, d in ws.column_dimensions.items() if d.customWidth},
+    )
+
+
+def test_streamed_save_matches_in_memory_save(tmp_path):
+    streamed = _build(str(tmp_path / "streamed.xlsx"), streaming=True)
+    in_memory = _build(str(tmp_path / "in_memory.xlsx"), streaming=False)
+    assert streamed.sheetnames == in_memory.sheetnames
+    for title in in_memory.sheetnames:
+        assert _sheet_state(streamed[title]) == _sheet_state(in_memory[title])
+    assert streamed["ND-FIRST-YEAR-FIRST-SEMESTER"]["A1"].font.b
+    assert streamed["ANALYSIS"]["A1"].font.i
+
+
+def test_streaming_is_on_by_default(monkeypatch):
+    monkeypatch.delenv("MASTERSHEET_STREAMING", raising=False)
+    assert workbook_io.streaming_enabled()
+    assert WorkbookSession().streaming
+    monkeypatch.setenv("MASTERSHEET_STREAMING", "0")
+    assert not WorkbookSession().streaming
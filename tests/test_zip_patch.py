@@ -0,0 +1,108 @@
+import os
+import struct
+import zipfile
+
+import pytest
+
+import zip_patch
+from zip_patch import extract_member, find_member, patch_zip, write_tree
+
+
+def _raw_member(path, name):
+    """The compressed bytes of member ``name`` exactly as stored in the archive."""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name)
+        zf.fp.seek(info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, zf.fp.read(zipfile.sizeFileHeader))
+        zf.fp.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+        return info.compress_type, info.CRC, zf.fp.read(info.compress_size)
+
+
+@pytest.fixture
+def result_zip(tmp_path):
+    path = tmp_path / "ND-2024_RESULT.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("ND-2024/mastersheet_2024.xlsx", b"old workbook" * 100, zipfile.ZIP_STORED)
+        zf.writestr("ND-2024/Y1S1.pdf", os.urandom(2048) + b"%PDF" * 500, zipfile.ZIP_DEFLATED)
+        zf.writestr("ND-2024/notes.txt", "carryover notes\n" * 50, zipfile.ZIP_DEFLATED)
+        zf.writestr("ND-2024/mastersheet_2024_BACKUP.xlsx", b"backup", zipfile.ZIP_STORED)
+    return str(path)
+
+
+def _new_file(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+@pytest.mark.parametrize("raw", [True, False])
+def test_patch_replaces_member_and_copies_the_rest(tmp_path, result_zip, raw, monkeypatch):
+    if not raw:
+        monkeypatch.setattr(zip_patch, "_can_copy_raw", lambda zin, zout: False)
+    untouched = ["ND-2024/Y1S1.pdf", "ND-2024/notes.txt", "ND-2024/mastersheet_2024_BACKUP.xlsx"]
+    before = {name: _raw_member(result_zip, name) for name in untouched}
+    with zipfile.ZipFile(result_zip) as zf:
+        order = zf.namelist()
+
+    workbook = _new_file(tmp_path, "new.xlsx", b"new workbook")
+    copied, written = patch_zip(result_zip, {"ND-2024/mastersheet_2024.xlsx": workbook})
+
+    assert (copied, written) == (3, 1)
+    with zipfile.ZipFile(result_zip) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == order
+        assert zf.read("ND-2024/mastersheet_2024.xlsx") == b"new workbook"
+        assert zf.getinfo("ND-2024/mastersheet_2024.xlsx").compress_type == zipfile.ZIP_STORED
+    for name in untouched:
+        assert _raw_member(result_zip, name) == before[name]
+
+
+def test_patch_drops_and_adds_members(tmp_path, result_zip):
+    dest = str(tmp_path / "patched.zip")
+    extra = _new_file(tmp_path, "extra.json", b"{}")
+    copied, written = patch_zip(
+        result_zip,
+        {"ND-2024/notes.txt": None, "ND-2024/co_student.json": extra},
+        dest,
+    )
+    assert (copied, written) == (3, 1)
+    with zipfile.ZipFile(dest) as zf:
+        assert zf.namelist() == [
+            "ND-2024/mastersheet_2024.xlsx",
+            "ND-2024/Y1S1.pdf",
+            "ND-2024/mastersheet_2024_BACKUP.xlsx",
+            "ND-2024/co_student.json",
+        ]
+    # The source is left alone when a destination is given
+    with zipfile.ZipFile(result_zip) as zf:
+        assert "ND-2024/notes.txt" in zf.namelist()
+
+
+def test_failed_patch_keeps_the_original(tmp_path, result_zip):
+    with open(result_zip, "rb") as f:
+        original = f.read()
+    with pytest.raises(FileNotFoundError):
+        patch_zip(result_zip, {"ND-2024/mastersheet_2024.xlsx": str(tmp_path / "missing.xlsx")})
+    with open(result_zip, "rb") as f:
+        assert f.read() == original
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".part")]
+
+
+def test_find_and_extract_mastersheet(tmp_path, result_zip):
+    member = find_member(result_zip)
+    assert member == "ND-2024/mastersheet_2024.xlsx"
+    dest = extract_member(result_zip, member, str(tmp_path / "mastersheet.xlsx"))
+    with open(dest, "rb") as f:
+        assert f.read() == b"old workbook" * 100
+
+
+def test_write_tree_stores_compressed_formats(tmp_path):
+    tree = tmp_path / "ND-2024"
+    (tree / "sub").mkdir(parents=True)
+    (tree / "mastersheet.xlsx").write_bytes(b"xlsx")
+    (tree / "sub" / "notes.txt").write_text("notes")
+    zip_path = str(tree / "out.zip")
+    assert sorted(write_tree(str(tree), zip_path)) == ["mastersheet.xlsx", "sub/notes.txt"]
+    with zipfile.ZipFile(zip_path) as zf:
+        assert zf.getinfo("mastersheet.xlsx").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("sub/notes.txt").compress_type == zipfile.ZIP_DEFLATED